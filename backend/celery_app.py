@@ -2,6 +2,7 @@
 Celery application configuration for background tasks
 """
 from celery import Celery
+from celery.schedules import crontab
 import os
 from dotenv import load_dotenv
 
@@ -9,13 +10,15 @@ load_dotenv()
 
 # Get Redis URL from environment
 REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+MINT_RECEIPT_POLL_SECONDS = float(os.getenv("MINT_RECEIPT_POLL_SECONDS", "10"))
+VERIFY_REFRESH_SECONDS = float(os.getenv("VERIFY_REFRESH_SECONDS", "300"))
 
 # Create Celery app
 celery_app = Celery(
     "dca_lms",
     broker=REDIS_URL,
     backend=REDIS_URL,
-    include=['tasks.email_tasks']  # Import task modules
+    include=['tasks.email_tasks', 'tasks.analytics_tasks', 'tasks.media_tasks', 'tasks.blockchain_tasks', 'tasks.notification_tasks']  # Import task modules
 )
 
 # Celery configuration
@@ -47,10 +50,50 @@ celery_app.conf.update(
     task_reject_on_worker_lost=True,
 
     # Task autodiscovery
-    imports=['tasks.email_tasks'],  # Explicitly import task modules
+    imports=['tasks.email_tasks', 'tasks.analytics_tasks', 'tasks.media_tasks', 'tasks.blockchain_tasks', 'tasks.notification_tasks'],  # Explicitly import task modules
+
+    # Media processing (thumbnails, ffprobe) is CPU-bound and slow, so it has
+    # its own queue and worker pool:
+    #   celery -A celery_app worker -Q media -n media@%h --concurrency=2 --prefetch-multiplier=1
+    # Other workers consume only the default queue: -Q celery
+    # Minting signs transactions from a single account, so its queue has one
+    # worker that sends them in nonce order:
+    #   celery -A celery_app worker -Q blockchain -n blockchain@%h --concurrency=1
+    task_routes={
+        'tasks.media_tasks.*': {'queue': 'media'},
+        'tasks.blockchain_tasks.*': {'queue': 'blockchain'},
+        # Read-only chain checks; kept off the minting worker
+        'tasks.blockchain_tasks.refresh_certificate_verifications_task': {'queue': 'celery'},
+    },
 
     # Beat schedule (for periodic tasks)
     beat_schedule={
+        # Roll up yesterday and re-check days with changed rows; the analytics
+        # endpoints compute the days after the last run live
+        'update-analytics-rollups': {
+            'task': 'tasks.analytics_tasks.update_analytics_rollups_task',
+            'schedule': crontab(minute=10),
+        },
+        # Apply new sessions, lesson progress and user changes to the cohort
+        # retention matrix
+        'update-cohort-retention': {
+            'task': 'tasks.analytics_tasks.update_cohort_retention_task',
+            'schedule': crontab(minute='*/15'),
+        },
+        # Record receipts of submitted mint transactions; a poll that waited
+        # longer than the interval is dropped rather than run late
+        'poll-mint-receipts': {
+            'task': 'tasks.blockchain_tasks.poll_mint_receipts_task',
+            'schedule': MINT_RECEIPT_POLL_SECONDS,
+            'options': {'expires': MINT_RECEIPT_POLL_SECONDS},
+        },
+        # Re-check the next slice of minted certificates on chain for the
+        # public verify endpoint
+        'refresh-certificate-verifications': {
+            'task': 'tasks.blockchain_tasks.refresh_certificate_verifications_task',
+            'schedule': VERIFY_REFRESH_SECONDS,
+            'options': {'expires': VERIFY_REFRESH_SECONDS},
+        },
         # Example: Send weekly reports every Monday at 9 AM
         # 'send-weekly-reports': {
         #     'task': 'tasks.email_tasks.send_weekly_reports',
@@ -12,10 +12,14 @@ from dotenv import load_dotenv
 from database.connection import database, engine, metadata
 from routers import (
     auth, users, courses, lessons, categories, enrollments,
-    progress, certificates, notifications, admin, analytics, sections, assignments
+    progress, certificates, notifications, admin, analytics, sections, assignments, search, media
 )
 from middleware.auth import get_current_user
 from middleware.logging import setup_logging
+from utils.progress_buffer import progress_buffer, PROGRESS_WRITE_BEHIND
+from utils.password_pool import shutdown_process_pool
+from utils.redis_client import close_redis_connections
+from utils.catalog_index import catalog_index, CATALOG_SEARCH_INDEX
 
 load_dotenv()
 
@@ -26,8 +30,18 @@ setup_logging()
 async def lifespan(app: FastAPI):
     # Startup
     await database.connect()
+    if PROGRESS_WRITE_BEHIND:
+        progress_buffer.start()
+    if CATALOG_SEARCH_INDEX:
+        await catalog_index.start()
     yield
     # Shutdown
+    if CATALOG_SEARCH_INDEX:
+        await catalog_index.stop()
+    if PROGRESS_WRITE_BEHIND:
+        await progress_buffer.stop()
+    shutdown_process_pool()
+    await close_redis_connections()
     await database.disconnect()
 
 app = FastAPI(
@@ -44,7 +58,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
-    expose_headers=["Content-Range", "Accept-Ranges", "Content-Length", "Content-Type"],
+    expose_headers=["Content-Range", "Accept-Ranges", "Content-Length", "Content-Type", "X-Next-Cursor"],
 )
 
 # Include routers
@@ -61,6 +75,8 @@ app.include_router(admin.router, prefix="/api/admin", tags=["Admin"])
 app.include_router(analytics.router, prefix="/api/analytics", tags=["Analytics"])
 app.include_router(sections.router, prefix="/api/sections", tags=["Sections"])
 app.include_router(assignments.router, prefix="/api/assignments", tags=["Assignments"])
+app.include_router(search.router, prefix="/api/search", tags=["Search"])
+app.include_router(media.router, prefix="/api/media", tags=["Media"])
 
 # Mount static files directory for uploaded files
 from utils.file_upload import LOCAL_UPLOAD_PATH
@@ -92,7 +108,7 @@ async def health_check():
 
     # Test Redis connection
     try:
-        if check_redis_connection():
+        if await check_redis_connection():
             health_status["redis"] = "connected"
         else:
             health_status["redis"] = "disconnected"
@@ -4,11 +4,16 @@ from jose import JWTError, jwt, ExpiredSignatureError
 import bcrypt
 from datetime import datetime, timedelta, UTC
 from typing import Optional
+import asyncio
 import os
+import uuid
 from dotenv import load_dotenv
 
 from database.connection import database
 from models.schemas import UserResponse, UserRole
+from utils.user_cache import user_cache, CachedUser
+from utils.redis_client import token_version_manager
+from utils.password_pool import password_pool
 
 load_dotenv()
 
@@ -16,6 +21,11 @@ SECRET_KEY = os.getenv("SECRET_KEY", "your-secret-key-here-change-in-production"
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", "30"))
 REFRESH_TOKEN_EXPIRE_DAYS = int(os.getenv("REFRESH_TOKEN_EXPIRE_DAYS", "7"))
+# Claims mode: access tokens carry role/status so requests can be authorized
+# without loading the user row. Revocation goes through token_version_manager.
+AUTH_CLAIMS_MODE = os.getenv("AUTH_CLAIMS_MODE", "false").lower() == "true"
+# Attempts to bump a user's token version before revocation is reported failed
+TOKEN_REVOKE_ATTEMPTS = int(os.getenv("TOKEN_REVOKE_ATTEMPTS", "3"))
 
 security = HTTPBearer()
 
@@ -32,18 +42,61 @@ def get_password_hash(password: str) -> str:
     hashed = bcrypt.hashpw(password.encode('utf-8'), salt)
     return hashed.decode('utf-8')
 
-def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
-    """Create a JWT access token"""
+async def verify_password_async(plain_password: str, hashed_password: str) -> bool:
+    """Verify a password on the bounded bcrypt pool without blocking the event loop"""
+    return await password_pool.run(verify_password, plain_password, hashed_password)
+
+async def get_password_hash_async(password: str) -> str:
+    """Hash a password on the bounded bcrypt pool without blocking the event loop"""
+    return await password_pool.run(get_password_hash, password)
+
+class ClaimsPrincipal(CachedUser):
+    """Authenticated user built from access token claims (id, email, role, status only)"""
+
+    def __init__(self, payload: dict):
+        super().__init__(
+            id=uuid.UUID(payload["sub"]),
+            email=payload.get("email"),
+            role=payload["role"],
+            status=payload["status"]
+        )
+        self.issued_at = payload.get("iat", 0)
+
+def create_access_token(
+    data: dict, expires_delta: Optional[timedelta] = None, user=None, version: Optional[int] = None
+):
+    """
+    Create a JWT access token. In claims mode, pass the user row and its
+    token version to embed claims; create_access_token_async looks the
+    version up.
+    """
     to_encode = data.copy()
+    if AUTH_CLAIMS_MODE and user is not None:
+        # Without a version the token could not be revoked, so leave claims out
+        if version is not None:
+            to_encode.update({
+                "email": user.email,
+                "role": user.role,
+                "status": user.status,
+                "ver": version
+            })
     if expires_delta:
         expire = datetime.now(UTC) + expires_delta
     else:
         expire = datetime.now((UTC)) + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
     
-    to_encode.update({"exp": expire, "type": "access"})
+    # iat keys the user principal cache, so a new token always starts fresh
+    to_encode.update({"exp": expire, "iat": datetime.now(UTC), "type": "access"})
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
+async def create_access_token_async(data: dict, expires_delta: Optional[timedelta] = None, user=None):
+    """Create a JWT access token, with the user's claims embedded in claims mode"""
+    version = None
+    if AUTH_CLAIMS_MODE and user is not None:
+        version = await token_version_manager.get_version(str(user.id))
+    return create_access_token(data, expires_delta, user, version)
+
 def create_refresh_token(data: dict):
     """Create a JWT refresh token"""
     to_encode = data.copy()
@@ -81,10 +134,22 @@ async def authenticate_user(email: str, password: str):
     user = await get_user_by_email(email)
     if not user:
         return False
-    if not verify_password(password, user.password_hash):
+    if not await verify_password_async(password, user.password_hash):
         return False
     return user
 
+async def load_user(user_id: str, issued_at: int = 0):
+    """Load a user row through the principal cache"""
+    cached_user = await user_cache.get(user_id, issued_at)
+    if cached_user is not None:
+        return cached_user
+    
+    user = await get_user_by_id(user_id)
+    if user is None:
+        return None
+    
+    return await user_cache.set(user_id, issued_at, user)
+
 async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)):
     """Get the current authenticated user from JWT token"""
     credentials_exception = HTTPException(
@@ -97,13 +162,23 @@ async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(s
         payload = jwt.decode(credentials.credentials, SECRET_KEY, algorithms=[ALGORITHM])
         user_id: str = payload.get("sub")
         token_type: str = payload.get("type")
+        issued_at: int = payload.get("iat", 0)
         
         if user_id is None or token_type != "access":
             raise credentials_exception
     except JWTError:
         raise credentials_exception
     
-    user = await get_user_by_id(user_id)
+    # Fast path: authorize from claims unless the user's tokens were revoked
+    if AUTH_CLAIMS_MODE and "ver" in payload:
+        current_version = await token_version_manager.get_version(user_id)
+        if current_version is not None:
+            if payload["ver"] != current_version:
+                raise credentials_exception
+            return ClaimsPrincipal(payload)
+        # Redis unavailable: fall back to the database
+    
+    user = await load_user(user_id, issued_at)
     if user is None:
         raise credentials_exception
     
@@ -118,6 +193,37 @@ async def get_current_active_user(current_user = Depends(get_current_user)):
         )
     return current_user
 
+async def get_current_active_user_record(current_user = Depends(get_current_active_user)):
+    """Get the full user row for the current active user, even in claims mode"""
+    if not isinstance(current_user, ClaimsPrincipal):
+        return current_user
+    
+    user = await load_user(str(current_user.id), current_user.issued_at)
+    if user is None:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Could not validate credentials",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    return user
+
+async def revoke_user_tokens(user_id):
+    """
+    Make outstanding claims tokens for a user stale after a role, status or
+    email change. Raises 503 if the token version could not be bumped, since
+    the old tokens would otherwise stay valid.
+    """
+    await user_cache.invalidate(user_id)
+    for attempt in range(TOKEN_REVOKE_ATTEMPTS):
+        if await token_version_manager.bump_version(str(user_id)):
+            return
+        if attempt + 1 < TOKEN_REVOKE_ATTEMPTS:
+            await asyncio.sleep(0.1 * 2 ** attempt)
+    raise HTTPException(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        detail="The change was saved but existing sessions could not be revoked; try again"
+    )
+
 async def require_role(required_roles: list):
     """Require specific roles for access"""
     def role_checker(current_user = Depends(get_current_active_user)):
@@ -687,12 +687,26 @@ class PaginationParams(BaseSchema):
             raise ValueError('Size must be between 1 and 1000')
         return v
 
+class KeysetPaginationParams(PaginationParams):
+    # Passing cursor (empty for the first page) switches to keyset pagination
+    cursor: Optional[str] = None
+    # "estimated" reads the row count from planner statistics instead of COUNT(*)
+    total_mode: str = "exact"
+    
+    @validator('total_mode')
+    def validate_total_mode(cls, v):
+        if v not in ("exact", "estimated"):
+            raise ValueError('Total mode must be exact or estimated')
+        return v
+
 class PaginatedResponse(BaseSchema):
     items: List[Any]
     total: int
     page: int
     size: int
     pages: int
+    next_cursor: Optional[str] = None
+    total_estimated: bool = False
 
 # File upload schemas
 class FileUploadResponse(BaseSchema):
@@ -701,11 +715,19 @@ class FileUploadResponse(BaseSchema):
     size: int
     content_type: str
     uploaded_at: datetime
+    media_id: Optional[str] = None
+    status: Optional[str] = None  # 'processing' until thumbnails / metadata are ready
 
 class VideoUploadResponse(FileUploadResponse):
     duration: Optional[int] = None
     thumbnail_url: Optional[str] = None
 
+class ResumableUploadCreate(BaseSchema):
+    filename: str
+    content_type: str
+    size: int
+    lesson_id: Optional[uuid.UUID] = None
+
 # Review and Rating schemas
 class ReviewBase(BaseSchema):
     rating: int
@@ -1,21 +1,26 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Query, Body, UploadFile, File, Form
+from fastapi import APIRouter, Depends, HTTPException, status, Query, Body, UploadFile, File, Form, BackgroundTasks
 from typing import List, Optional, Dict, Any
 import uuid
-from datetime import datetime, timedelta, UTC
-import io
+from datetime import datetime, timedelta
 
 from database.connection import database
 from models.schemas import (
     AdminDashboardStats, AdminUserResponse, AdminCourseResponse, BasicUser,
-    PaginationParams, PaginatedResponse, AdminAuditLog, UserResponse
+    PaginationParams, KeysetPaginationParams, PaginatedResponse, AdminAuditLog, UserResponse
 )
-from middleware.auth import get_password_hash, get_user_by_email, require_admin, get_current_active_user
+from middleware.auth import get_password_hash_async, get_user_by_email, require_admin, get_current_active_user, revoke_user_tokens
 from utils.analytics import (
     AnalyticsCalculator, UserAnalytics, CourseAnalytics, 
     RevenueAnalytics, get_platform_kpis, get_top_performing_content
 )
 from tasks.email_tasks import send_admin_created_user_email_task
-from routers.admin_import import import_admin_data
+from routers.admin_import import import_admin_data, get_import_job
+from routers.admin_export import EXPORT_FORMATS, build_export_query, streaming_export, log_export
+from utils.user_cache import user_cache
+from utils.result_cache import cached, invalidate_tags, result_cache
+from utils.password_pool import password_pool
+from utils.pagination import Keyset, fetch_total
+from utils.search import TextSearch
 import secrets
 import string
 import json
@@ -63,6 +68,7 @@ async def update_user_by_admin(
     """
 
     updated = await database.fetch_one(query, values=values)
+    await revoke_user_tokens(user_id)
 
     # Audit log (parameterized and cast metadata to JSONB)
     log_query = """
@@ -78,9 +84,11 @@ async def update_user_by_admin(
         "metadata": json.dumps({k: payload[k] for k in payload if k in allowed_fields})
     })
 
+    await invalidate_tags("users")
     return UserResponse(**updated)
 
 @router.get("/dashboard", response_model=AdminDashboardStats)
+@cached("admin_dashboard", ttl=60, tags=("users", "courses", "enrollments", "certificates", "revenue"), stale_ttl=600)
 async def get_admin_dashboard(current_user = Depends(require_admin)):
     """Get admin dashboard statistics"""
     
@@ -193,7 +201,7 @@ async def create_user(
     temp_password = ''.join(secrets.choice(alphabet) for _ in range(16))
 
     # Hash password and create user
-    hashed_password = get_password_hash(temp_password)
+    hashed_password = await get_password_hash_async(temp_password)
     user_id = uuid.uuid4()
 
     query = """
@@ -226,11 +234,12 @@ async def create_user(
         # Do not fail user creation if email queueing fails
         pass
 
+    await invalidate_tags("users")
     return UserResponse(**new_user)
 
 @router.get("/users", response_model=PaginatedResponse)
 async def get_admin_users(
-    pagination: PaginationParams = Depends(),
+    pagination: KeysetPaginationParams = Depends(),
     role: Optional[str] = Query(None),
     status: Optional[str] = Query(None),
     search: Optional[str] = Query(None),
@@ -251,18 +260,19 @@ async def get_admin_users(
         values["status"] = status
     
     if search:
-        where_conditions.append("""
-            (u.first_name ILIKE :search OR u.last_name ILIKE :search OR 
-             u.email ILIKE :search OR u.username ILIKE :search)
-        """)
-        values["search"] = f"%{search}%"
+        where_conditions.append(TextSearch(search).contains(
+            values, "u.first_name", "u.last_name", "u.email", "u.username"
+        ))
     
     where_clause = "WHERE " + " AND ".join(where_conditions) if where_conditions else ""
     
     # Get total count
-    count_query = f"SELECT COUNT(*) as total FROM users u {where_clause}"
-    total_result = await database.fetch_one(count_query, values=values)
-    total = total_result.total
+    total, total_estimated = await fetch_total(
+        f"FROM users u {where_clause}", values, pagination.total_mode
+    )
+    
+    keyset = Keyset(pagination.cursor, pagination.size, "created_at", "u.created_at", "u.id")
+    where_clause, limit_clause = keyset.clauses(where_conditions, values)
     
     # Get users with additional admin info
     query = f"""
@@ -271,18 +281,21 @@ async def get_admin_users(
                (SELECT COUNT(*) FROM certificates WHERE user_id = u.id) as total_certificates,
                (SELECT balance FROM l_tokens WHERE user_id = u.id) as token_balance
         FROM users u {where_clause}
-        ORDER BY u.created_at DESC
-        LIMIT :size OFFSET :offset
+        ORDER BY {keyset.order_by}
+        {limit_clause}
     """
     
     users = await database.fetch_all(query, values=values)
+    users, next_cursor = keyset.page(users)
     
     return PaginatedResponse(
         items=[AdminUserResponse(**user) for user in users],
         total=total,
         page=pagination.page,
         size=pagination.size,
-        pages=(total + pagination.size - 1) // pagination.size
+        pages=(total + pagination.size - 1) // pagination.size,
+        next_cursor=next_cursor,
+        total_estimated=total_estimated
     )
 
 @router.get("/courses", response_model=PaginatedResponse)
@@ -311,17 +324,14 @@ async def get_admin_courses(
         values["instructor_id"] = instructor_id
     
     if search:
-        where_conditions.append("""
-            (c.title ILIKE :search OR c.description ILIKE :search)
-        """)
-        values["search"] = f"%{search}%"
+        where_conditions.append(TextSearch(search).matches("courses", "c.id", values))
     
     where_clause = "WHERE " + " AND ".join(where_conditions) if where_conditions else ""
     
     # ---- Only pass the parameters used in the count query ----
     count_values = {
         k: v for k, v in values.items()
-        if k in ["status", "instructor_id", "search"]
+        if k in ["status", "instructor_id", "search_query"]
     }
     
     count_query = f"SELECT COUNT(*) as total FROM courses c {where_clause}"
@@ -382,6 +392,7 @@ async def deactivate_user(
         RETURNING *
     """
     updated_user = await database.fetch_one(update_query, values={"user_id": user_id})
+    await revoke_user_tokens(user_id)
 
     # Audit log
     log_query = """
@@ -397,6 +408,7 @@ async def deactivate_user(
         "metadata": json.dumps({"old_status": user.status, "new_status": "inactive", "reason": reason})
     })
 
+    await invalidate_tags("users")
     return {"message": "User deactivated"}
 
 @router.patch("/users/{user_id}/soft-delete")
@@ -429,6 +441,7 @@ async def soft_delete_user(
         RETURNING *
     """
     updated_user = await database.fetch_one(update_query, values={"user_id": user_id})
+    await revoke_user_tokens(user_id)
 
     # Audit log
     log_query = """
@@ -444,6 +457,7 @@ async def soft_delete_user(
         "metadata": json.dumps({"old_status": user.status, "new_status": "deleted", "reason": reason})
     })
 
+    await invalidate_tags("users")
     return {"message": "User soft deleted"}
 
 
@@ -468,6 +482,7 @@ async def reactivate_user(
         RETURNING *
     """
     updated_user = await database.fetch_one(update_query, values={"user_id": user_id})
+    await revoke_user_tokens(user_id)
 
     log_query = """
         INSERT INTO admin_audit_log (admin_user_id, action, target_type, target_id, description, metadata)
@@ -482,6 +497,7 @@ async def reactivate_user(
         "metadata": json.dumps({"old_status": user.status, "new_status": "active", "reason": reason})
     })
 
+    await invalidate_tags("users")
     return {"message": "User reactivated"}
 
 
@@ -521,6 +537,7 @@ async def update_user_status(
         "status": status,
         "user_id": user_id
     })
+    await revoke_user_tokens(user_id)
     
     # Log admin action
     log_query = """
@@ -536,6 +553,7 @@ async def update_user_status(
         "metadata": {"old_status": user.status, "new_status": status, "reason": reason}
     })
     
+    await invalidate_tags("users")
     return {"message": f"User status updated to {status}"}
 
 @router.put("/courses/{course_id}/status")
@@ -589,11 +607,12 @@ async def update_course_status(
         "metadata": {"old_status": course.status, "new_status": status, "reason": reason}
     })
     
+    await invalidate_tags("courses")
     return {"message": f"Course status updated to {status}"}
 
 @router.get("/audit-log", response_model=PaginatedResponse)
 async def get_audit_log(
-    pagination: PaginationParams = Depends(),
+    pagination: KeysetPaginationParams = Depends(),
     admin_user_id: Optional[uuid.UUID] = Query(None),
     action: Optional[str] = Query(None),
     target_type: Optional[str] = Query(None),
@@ -620,9 +639,12 @@ async def get_audit_log(
     where_clause = "WHERE " + " AND ".join(where_conditions) if where_conditions else ""
     
     # Get total count
-    count_query = f"SELECT COUNT(*) as total FROM admin_audit_log aal {where_clause}"
-    total_result = await database.fetch_one(count_query, values=values)
-    total = total_result.total
+    total, total_estimated = await fetch_total(
+        f"FROM admin_audit_log aal {where_clause}", values, pagination.total_mode
+    )
+    
+    keyset = Keyset(pagination.cursor, pagination.size, "created_at", "aal.created_at", "aal.id")
+    where_clause, limit_clause = keyset.clauses(where_conditions, values)
     
     # Get audit log entries
     query = f"""
@@ -630,18 +652,21 @@ async def get_audit_log(
         FROM admin_audit_log aal
         JOIN users u ON aal.admin_user_id = u.id
         {where_clause}
-        ORDER BY aal.created_at DESC
-        LIMIT :size OFFSET :offset
+        ORDER BY {keyset.order_by}
+        {limit_clause}
     """
     
     logs = await database.fetch_all(query, values=values)
+    logs, next_cursor = keyset.page(logs)
     
     return PaginatedResponse(
         items=[AdminAuditLog(**log) for log in logs],
         total=total,
         page=pagination.page,
         size=pagination.size,
-        pages=(total + pagination.size - 1) // pagination.size
+        pages=(total + pagination.size - 1) // pagination.size,
+        next_cursor=next_cursor,
+        total_estimated=total_estimated
     )
 
 @router.post("/reports/generate")
@@ -690,9 +715,12 @@ async def generate_admin_report(
             # Get top performing courses
             top_courses = await get_top_performing_content("courses", "enrollments", 20, start_date, end_date)
             
+            health_scores = await CourseAnalytics.calculate_course_health_scores(
+                [course["id"] for course in top_courses]
+            )
             course_health = []
             for course in top_courses:
-                health = await CourseAnalytics.calculate_course_health_score(course["id"])
+                health = health_scores[course["id"]]
                 course_health.append({
                     "course_id": course["id"],
                     "title": course["title"],
@@ -741,185 +769,38 @@ async def export_admin_data(
     export_type: str = Body(...),
     format: str = Body("json"),
     filters: Optional[Dict[str, Any]] = Body(None),
+    compress: bool = Body(False),
     current_user = Depends(require_admin)
 ):
-    """Export admin data"""
+    """Export admin data. CSV and NDJSON are streamed; compress=true gzips the stream."""
 
-    # Debug logging
-    print(f"Export request by user: {current_user.id} ({current_user.email}) with role: {current_user.role}")
-    print(f"Export params: type={export_type}, format={format}, filters={filters}")
-    
-    if format not in ["json", "csv"]:
+    if format not in EXPORT_FORMATS:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Invalid export format. Supported: json, csv"
+            detail="Invalid export format. Supported: json, csv, ndjson"
         )
     
     try:
-        export_data = {}
+        if format in ["csv", "ndjson"]:
+            response = streaming_export(export_type, format, filters, compress)
+            await log_export(current_user, export_type, format)
+            return response
         
-        if export_type == "users":
-            # Export user data
-            where_conditions = []
-            values = {}
-
-            if filters:
-                if filters.get("role"):
-                    where_conditions.append("u.role = :role")
-                    values["role"] = filters["role"]
-                if filters.get("status"):
-                    where_conditions.append("u.status = :status")
-                    values["status"] = filters["status"]
-                if filters.get("search"):
-                    where_conditions.append("""
-                        (u.first_name ILIKE :search OR u.last_name ILIKE :search OR
-                         u.email ILIKE :search OR u.username ILIKE :search)
-                    """)
-                    values["search"] = f"%{filters['search']}%"
-
-            where_clause = "WHERE " + " AND ".join(where_conditions) if where_conditions else ""
-
-            query = f"""
-                SELECT u.id, u.first_name, u.last_name, u.email, u.username, u.role, u.status,
-                       u.created_at, u.last_login_at, u.phone, u.bio,
-                       (SELECT COUNT(*) FROM course_enrollments WHERE user_id = u.id) as total_enrollments,
-                       (SELECT COUNT(*) FROM certificates WHERE user_id = u.id) as total_certificates,
-                       (SELECT COUNT(*) FROM course_enrollments WHERE user_id = u.id AND status = 'completed') as completed_courses,
-                       (SELECT balance FROM l_tokens WHERE user_id = u.id) as token_balance
-                FROM users u {where_clause}
-                ORDER BY u.created_at DESC
-            """
-
-            users = await database.fetch_all(query, values=values)
-
-            if format == "csv":
-                # Return CSV file
-                import csv
-                from fastapi.responses import StreamingResponse
-
-                users_data = [dict(user) for user in users]
-                
-                # Create CSV content
-                output = io.StringIO()
-                writer = csv.writer(output)
-                
-                # Write headers
-                headers = ["ID", "First Name", "Last Name", "Email", "Username", "Role", "Status", 
-                          "Join Date", "Last Login", "Phone", "Bio", "Total Enrollments", 
-                          "Completed Courses", "Total Certificates", "Token Balance"]
-                writer.writerow(headers)
-                
-                # Write data rows
-                for user in users_data:
-                    row = [
-                        user.get("id", ""),
-                        user.get("first_name", ""),
-                        user.get("last_name", ""),
-                        user.get("email", ""),
-                        user.get("username", ""),
-                        user.get("role", ""),
-                        user.get("status", ""),
-                        user.get("created_at", "").isoformat() if user.get("created_at") else "",
-                        user.get("last_login_at", "").isoformat() if user.get("last_login_at") else "",
-                        user.get("phone", ""),
-                        user.get("bio", ""),
-                        user.get("total_enrollments", 0),
-                        user.get("completed_courses", 0),
-                        user.get("total_certificates", 0),
-                        user.get("token_balance", 0)
-                    ]
-                    writer.writerow(row)
-                
-                # Create buffer
-                buffer = io.BytesIO(output.getvalue().encode('utf-8'))
-                filename = f"users_export_{datetime.now(UTC).strftime('%Y%m%d_%H%M%S')}.csv"
-                return StreamingResponse(
-                    buffer,
-                    media_type="text/csv",
-                    headers={"Content-Disposition": f"attachment; filename={filename}"}
-                )
-            else:
-                # Return JSON
-                return {
-                    "export_type": export_type,
-                    "format": format,
-                    "exported_at": datetime.utcnow(),
-                    "record_count": len(users),
-                    "data": {"users": [dict(user) for user in users]}
-                }
+        query, values = build_export_query(export_type, filters)
+        records = await database.fetch_all(query, values=values)
         
-        elif export_type == "courses":
-            # Export course data
-            query = """
-                SELECT c.id, c.title, c.description, c.status, c.price, c.enrollment_count,
-                       u.first_name as instructor_first_name, u.last_name as instructor_last_name,
-                       c.created_at, c.updated_at
-                FROM courses c
-                LEFT JOIN users u ON c.instructor_id = u.id
-                ORDER BY c.created_at DESC
-            """
-            
-            courses = await database.fetch_all(query)
-            export_data = {"courses": [dict(course) for course in courses]}
-        
-        elif export_type == "enrollments":
-            # Export enrollment data
-            query = """
-                SELECT ce.id, ce.user_id, ce.course_id, ce.status, ce.progress_percentage,
-                       ce.enrolled_at, ce.completed_at,
-                       u.first_name, u.last_name, u.email,
-                       c.title as course_title
-                FROM course_enrollments ce
-                JOIN users u ON ce.user_id = u.id
-                JOIN courses c ON ce.course_id = c.id
-                ORDER BY ce.enrolled_at DESC
-            """
-            
-            enrollments = await database.fetch_all(query)
-            export_data = {"enrollments": [dict(enrollment) for enrollment in enrollments]}
-        
-        elif export_type == "revenue":
-            # Export revenue data
-            query = """
-                SELECT rr.id, rr.user_id, rr.course_id, rr.amount, rr.currency, rr.status,
-                       rr.payment_method, rr.created_at,
-                       u.first_name, u.last_name, u.email,
-                       c.title as course_title
-                FROM revenue_records rr
-                JOIN users u ON rr.user_id = u.id
-                LEFT JOIN courses c ON rr.course_id = c.id
-                ORDER BY rr.created_at DESC
-            """
-            
-            revenue = await database.fetch_all(query)
-            export_data = {"revenue": [dict(record) for record in revenue]}
-        
-        else:
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail="Invalid export type"
-            )
-        
-        # Log data export
-        log_query = """
-            INSERT INTO admin_audit_log (admin_user_id, action, target_type, description, metadata)
-            VALUES (:admin_id, 'data_exported', 'system', :description, :metadata)
-        """
-        
-        await database.execute(log_query, values={
-            "admin_id": current_user.id,
-            "description": f"Exported {export_type} data as {format}",
-            "metadata": {"export_type": export_type, "format": format}
-        })
+        await log_export(current_user, export_type, format)
         
         return {
             "export_type": export_type,
             "format": format,
             "exported_at": datetime.utcnow(),
-            "record_count": len(list(export_data.values())[0]) if export_data else 0,
-            "data": export_data
+            "record_count": len(records),
+            "data": {export_type: [dict(record) for record in records]}
         }
         
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -928,12 +809,22 @@ async def export_admin_data(
 
 @router.post("/import")
 async def import_admin_data_endpoint(
+    background_tasks: BackgroundTasks,
     file: UploadFile = File(...),
     import_type: str = Form(...),
+    background: bool = Form(False),
+    current_user = Depends(require_admin)
+):
+    """Import admin data from CSV file. With background=true, returns a job id to poll."""
+    return await import_admin_data(file, import_type, current_user, background, background_tasks)
+
+@router.get("/import/{job_id}")
+async def get_import_job_endpoint(
+    job_id: str,
     current_user = Depends(require_admin)
 ):
-    """Import admin data from CSV file"""
-    return await import_admin_data(file, import_type, current_user)
+    """Get progress and the per-row error report of a background import"""
+    return await get_import_job(job_id)
 
 @router.get("/system-health")
 async def get_system_health(current_user = Depends(require_admin)):
@@ -971,6 +862,9 @@ async def get_system_health(current_user = Depends(require_admin)):
             "error_count_1h": error_result.error_count,
             "total_requests_1h": performance_result.total_requests or 0,
             "avg_response_time": float(performance_result.avg_response_time) if performance_result.avg_response_time else 0,
+            "user_cache": user_cache.get_stats(),
+            "result_cache": result_cache.get_stats(),
+            "password_pool": password_pool.get_stats(),
             "timestamp": datetime.utcnow()
         }
         
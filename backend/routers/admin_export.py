@@ -0,0 +1,215 @@
+from fastapi import HTTPException, status
+from fastapi.responses import StreamingResponse
+from typing import Dict, Any, List, Optional, Tuple, AsyncIterator
+from datetime import datetime, UTC
+import io
+import os
+import csv
+import json
+import zlib
+
+from database.connection import database
+from utils.search import TextSearch
+
+EXPORT_FORMATS = ["json", "csv", "ndjson"]
+# Rows are buffered until this many bytes, then sent as one chunk
+EXPORT_CHUNK_BYTES = int(os.getenv("EXPORT_CHUNK_BYTES", "65536"))
+
+# (CSV header, column) per export type
+EXPORT_COLUMNS: Dict[str, List[Tuple[str, str]]] = {
+    "users": [
+        ("ID", "id"), ("First Name", "first_name"), ("Last Name", "last_name"),
+        ("Email", "email"), ("Username", "username"), ("Role", "role"), ("Status", "status"),
+        ("Join Date", "created_at"), ("Last Login", "last_login_at"), ("Phone", "phone"),
+        ("Bio", "bio"), ("Total Enrollments", "total_enrollments"),
+        ("Completed Courses", "completed_courses"), ("Total Certificates", "total_certificates"),
+        ("Token Balance", "token_balance"),
+    ],
+    "courses": [
+        (column, column) for column in [
+            "id", "title", "description", "status", "price", "enrollment_count",
+            "instructor_first_name", "instructor_last_name", "created_at", "updated_at",
+        ]
+    ],
+    "enrollments": [
+        (column, column) for column in [
+            "id", "user_id", "course_id", "status", "progress_percentage", "enrolled_at",
+            "completed_at", "first_name", "last_name", "email", "course_title",
+        ]
+    ],
+    "revenue": [
+        (column, column) for column in [
+            "id", "user_id", "course_id", "amount", "currency", "status", "payment_method",
+            "created_at", "first_name", "last_name", "email", "course_title",
+        ]
+    ],
+}
+
+# Per-user counts are aggregated once per table and joined, instead of
+# four correlated subqueries per exported user
+USERS_EXPORT_QUERY = """
+    SELECT u.id, u.first_name, u.last_name, u.email, u.username, u.role, u.status,
+           u.created_at, u.last_login_at, u.phone, u.bio,
+           COALESCE(e.total_enrollments, 0) as total_enrollments,
+           COALESCE(cert.total_certificates, 0) as total_certificates,
+           COALESCE(e.completed_courses, 0) as completed_courses,
+           t.balance as token_balance
+    FROM users u
+    LEFT JOIN (
+        SELECT user_id,
+               COUNT(*) as total_enrollments,
+               COUNT(*) FILTER (WHERE status = 'completed') as completed_courses
+        FROM course_enrollments
+        GROUP BY user_id
+    ) e ON e.user_id = u.id
+    LEFT JOIN (
+        SELECT user_id, COUNT(*) as total_certificates
+        FROM certificates
+        GROUP BY user_id
+    ) cert ON cert.user_id = u.id
+    LEFT JOIN l_tokens t ON t.user_id = u.id
+    {where_clause}
+    ORDER BY u.created_at DESC
+"""
+
+COURSES_EXPORT_QUERY = """
+    SELECT c.id, c.title, c.description, c.status, c.price, c.enrollment_count,
+           u.first_name as instructor_first_name, u.last_name as instructor_last_name,
+           c.created_at, c.updated_at
+    FROM courses c
+    LEFT JOIN users u ON c.instructor_id = u.id
+    ORDER BY c.created_at DESC
+"""
+
+ENROLLMENTS_EXPORT_QUERY = """
+    SELECT ce.id, ce.user_id, ce.course_id, ce.status, ce.progress_percentage,
+           ce.enrolled_at, ce.completed_at,
+           u.first_name, u.last_name, u.email,
+           c.title as course_title
+    FROM course_enrollments ce
+    JOIN users u ON ce.user_id = u.id
+    JOIN courses c ON ce.course_id = c.id
+    ORDER BY ce.enrolled_at DESC
+"""
+
+REVENUE_EXPORT_QUERY = """
+    SELECT rr.id, rr.user_id, rr.course_id, rr.amount, rr.currency, rr.status,
+           rr.payment_method, rr.created_at,
+           u.first_name, u.last_name, u.email,
+           c.title as course_title
+    FROM revenue_records rr
+    JOIN users u ON rr.user_id = u.id
+    LEFT JOIN courses c ON rr.course_id = c.id
+    ORDER BY rr.created_at DESC
+"""
+
+def build_export_query(export_type: str, filters: Optional[Dict[str, Any]]) -> Tuple[str, Dict[str, Any]]:
+    """Return the SQL and values for an export type"""
+
+    if export_type == "users":
+        where_conditions = []
+        values = {}
+
+        if filters:
+            if filters.get("role"):
+                where_conditions.append("u.role = :role")
+                values["role"] = filters["role"]
+            if filters.get("status"):
+                where_conditions.append("u.status = :status")
+                values["status"] = filters["status"]
+            if filters.get("search"):
+                where_conditions.append(TextSearch(filters["search"]).contains(
+                    values, "u.first_name", "u.last_name", "u.email", "u.username"
+                ))
+
+        where_clause = "WHERE " + " AND ".join(where_conditions) if where_conditions else ""
+        return USERS_EXPORT_QUERY.format(where_clause=where_clause), values
+
+    queries = {
+        "courses": COURSES_EXPORT_QUERY,
+        "enrollments": ENROLLMENTS_EXPORT_QUERY,
+        "revenue": REVENUE_EXPORT_QUERY,
+    }
+    if export_type not in queries:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid export type"
+        )
+    return queries[export_type], {}
+
+def _csv_value(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return value
+
+def _json_value(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return str(value)
+
+async def _encode_rows(query: str, values: Dict[str, Any], export_type: str, format: str) -> AsyncIterator[str]:
+    """Read rows through a server-side cursor and yield encoded text chunks"""
+    columns = EXPORT_COLUMNS[export_type]
+    output = io.StringIO()
+    writer = csv.writer(output)
+
+    if format == "csv":
+        writer.writerow([header for header, _ in columns])
+
+    async for row in database.iterate(query, values=values):
+        if format == "csv":
+            writer.writerow([_csv_value(row[column]) for _, column in columns])
+        else:
+            record = {column: row[column] for _, column in columns}
+            output.write(json.dumps(record, default=_json_value))
+            output.write("\n")
+
+        if output.tell() >= EXPORT_CHUNK_BYTES:
+            yield output.getvalue()
+            output.seek(0)
+            output.truncate()
+
+    if output.tell():
+        yield output.getvalue()
+
+async def _stream_export(chunks: AsyncIterator[str], compress: bool) -> AsyncIterator[bytes]:
+    # wbits=31 writes a gzip header so the file opens with any gunzip
+    compressor = zlib.compressobj(wbits=31) if compress else None
+    async for chunk in chunks:
+        data = chunk.encode('utf-8')
+        if compressor:
+            data = compressor.compress(data)
+        if data:
+            yield data
+    if compressor:
+        yield compressor.flush()
+
+def streaming_export(export_type: str, format: str, filters: Optional[Dict[str, Any]], compress: bool = False) -> StreamingResponse:
+    """Stream an export as CSV or NDJSON with constant memory, optionally gzipped"""
+    query, values = build_export_query(export_type, filters)
+
+    extension = "csv" if format == "csv" else "ndjson"
+    media_type = "text/csv" if format == "csv" else "application/x-ndjson"
+    filename = f"{export_type}_export_{datetime.now(UTC).strftime('%Y%m%d_%H%M%S')}.{extension}"
+    if compress:
+        media_type = "application/gzip"
+        filename += ".gz"
+
+    return StreamingResponse(
+        _stream_export(_encode_rows(query, values, export_type, format), compress),
+        media_type=media_type,
+        headers={"Content-Disposition": f"attachment; filename={filename}"}
+    )
+
+async def log_export(current_user, export_type: str, format: str):
+    """Record the export in the admin audit log"""
+    log_query = """
+        INSERT INTO admin_audit_log (admin_user_id, action, target_type, description, metadata)
+        VALUES (:admin_id, 'data_exported', 'system', :description, CAST(:metadata AS JSONB))
+    """
+
+    await database.execute(log_query, values={
+        "admin_id": current_user.id,
+        "description": f"Exported {export_type} data as {format}",
+        "metadata": json.dumps({"export_type": export_type, "format": format})
+    })
@@ -1,19 +1,92 @@
-from fastapi import HTTPException, status, UploadFile, File, Form
-from typing import Dict, Any
+from fastapi import HTTPException, status, UploadFile, File, Form, BackgroundTasks
+from typing import Dict, Any, Iterable, List, Optional, Set
+from datetime import datetime, UTC
 import uuid
 import io
+import os
 import csv
 import secrets
+import shutil
 import string
+import tempfile
 import json
+import asyncio
 
 from database.connection import database
-from middleware.auth import get_password_hash
+from utils.password_pool import bulk_random_password_hashes
+from utils.redis_client import async_redis_client
+from utils.result_cache import invalidate_tags
+
+# Rows are validated, checked and inserted this many at a time
+IMPORT_CHUNK_SIZE = int(os.getenv("IMPORT_CHUNK_SIZE", "1000"))
+IMPORT_JOB_TTL_SECONDS = int(os.getenv("IMPORT_JOB_TTL_SECONDS", "86400"))
+# Errors shown while a background import runs; the full list is stored when it ends
+IMPORT_JOB_ERROR_SAMPLE = int(os.getenv("IMPORT_JOB_ERROR_SAMPLE", "100"))
+
+VALID_ROLES = ['student', 'instructor', 'admin']
+USERNAME_MAX_LENGTH = 100
+# Column limits from the users table; checked up front so one bad row
+# can't fail a whole chunk insert
+FIELD_MAX_LENGTHS = {"email": 255, "first_name": 100, "last_name": 100, "phone": 20}
+
+# Multi-row insert for a whole chunk. ON CONFLICT catches emails or usernames
+# taken by someone else between the pre-check and the insert.
+INSERT_USERS_QUERY = """
+    INSERT INTO users (id, email, username, password_hash, first_name, last_name, role, phone, bio)
+    SELECT * FROM UNNEST(
+        CAST(:ids AS UUID[]),
+        CAST(:emails AS VARCHAR[]),
+        CAST(:usernames AS VARCHAR[]),
+        CAST(:password_hashes AS VARCHAR[]),
+        CAST(:first_names AS VARCHAR[]),
+        CAST(:last_names AS VARCHAR[]),
+        CAST(:roles AS user_role[]),
+        CAST(:phones AS VARCHAR[]),
+        CAST(:bios AS TEXT[])
+    )
+    ON CONFLICT DO NOTHING
+    RETURNING email
+"""
+
+
+class ImportJobStore:
+    """Progress of background imports, mirrored to Redis so any worker can answer a poll"""
+
+    def __init__(self, client=async_redis_client, ttl: int = IMPORT_JOB_TTL_SECONDS):
+        self.client = client
+        self.ttl = ttl
+        self._jobs: Dict[str, Dict[str, Any]] = {}
+
+    @staticmethod
+    def _redis_key(job_id: str) -> str:
+        return f"import_job:{job_id}"
+
+    async def save(self, job: Dict[str, Any]):
+        self._jobs[job["job_id"]] = job
+        try:
+            await self.client.setex(self._redis_key(job["job_id"]), self.ttl, json.dumps(job, default=str))
+        except Exception as e:
+            print(f"[Import] Error saving job {job['job_id']}: {e}")
+
+    async def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        try:
+            json_data = await self.client.get(self._redis_key(job_id))
+            if json_data:
+                return json.loads(json_data)
+        except Exception as e:
+            print(f"[Import] Error reading job {job_id}: {e}")
+        return self._jobs.get(job_id)
+
+
+import_jobs = ImportJobStore()
+
 
 async def import_admin_data(
     file: UploadFile = File(...),
     import_type: str = Form(...),
-    current_user = None
+    current_user = None,
+    background: bool = False,
+    background_tasks: Optional[BackgroundTasks] = None
 ):
     """Import admin data from CSV file"""
 
@@ -29,16 +102,20 @@ async def import_admin_data(
             detail="Only CSV files are supported"
         )
 
-    try:
-        # Read file content
-        content = await file.read()
-        csv_content = content.decode('utf-8')
+    if background:
+        return await start_import_job(file, current_user, background_tasks)
 
-        # Parse CSV
-        csv_reader = csv.DictReader(io.StringIO(csv_content))
+    try:
+        # Parse the upload as a stream instead of decoding it all at once
+        csv_stream = io.TextIOWrapper(file.file, encoding='utf-8', newline='')
+        try:
+            csv_reader = csv.DictReader(csv_stream)
 
-        if import_type == "users":
-            return await import_users(csv_reader, current_user)
+            if import_type == "users":
+                return await import_users(csv_reader, current_user)
+        finally:
+            # Leave the upload itself for FastAPI to close
+            csv_stream.detach()
 
     except Exception as e:
         raise HTTPException(
@@ -46,94 +123,118 @@ async def import_admin_data(
             detail=f"Failed to import data: {str(e)}"
         )
 
-async def import_users(csv_reader, current_user):
+async def start_import_job(file: UploadFile, current_user, background_tasks: BackgroundTasks):
+    """Spool the upload to disk and import it after the response is sent"""
+
+    # The upload is closed once the response is sent, so keep our own copy
+    with tempfile.NamedTemporaryFile(prefix="user_import_", suffix=".csv", delete=False) as spool:
+        await asyncio.to_thread(shutil.copyfileobj, file.file, spool)
+        path = spool.name
+
+    job = {
+        "job_id": str(uuid.uuid4()),
+        "import_type": "users",
+        "status": "queued",
+        "filename": file.filename,
+        "admin_user_id": str(current_user.id),
+        "bytes_total": os.path.getsize(path),
+        "bytes_processed": 0,
+        "percent": 0.0,
+        "processed_rows": 0,
+        "imported_count": 0,
+        "errors_count": 0,
+        "errors": [],
+        "created_at": datetime.now(UTC).isoformat(),
+        "started_at": None,
+        "finished_at": None,
+        "message": "Import queued"
+    }
+    await import_jobs.save(job)
+    background_tasks.add_task(run_import_job, job, path, current_user)
+
+    return {
+        "job_id": job["job_id"],
+        "status": job["status"],
+        "message": job["message"]
+    }
+
+async def run_import_job(job: Dict[str, Any], path: str, current_user):
+    """Background task body for a spooled user import"""
+
+    job["status"] = "running"
+    job["started_at"] = datetime.now(UTC).isoformat()
+    await import_jobs.save(job)
+
+    try:
+        with open(path, 'rb') as raw:
+            csv_stream = io.TextIOWrapper(raw, encoding='utf-8', newline='')
+            result = await import_users(
+                csv.DictReader(csv_stream),
+                current_user,
+                job=job,
+                bytes_read=raw.tell
+            )
+        job.update(result)
+        job["status"] = "completed"
+        job["bytes_processed"] = job["bytes_total"]
+        job["percent"] = 100.0
+    except Exception as e:
+        print(f"[Import] Job {job['job_id']} failed: {e}")
+        job["status"] = "failed"
+        job["message"] = f"Failed to import data: {str(e)}"
+    finally:
+        job["finished_at"] = datetime.now(UTC).isoformat()
+        await import_jobs.save(job)
+        os.unlink(path)
+
+async def get_import_job(job_id: str) -> Dict[str, Any]:
+    """Return the progress and per-row error report of a background import"""
+    job = await import_jobs.get(job_id)
+    if not job:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Import job not found"
+        )
+    return job
+
+async def import_users(
+    csv_reader: Iterable[Dict[str, str]],
+    current_user,
+    job: Optional[Dict[str, Any]] = None,
+    bytes_read=None
+):
     """Import users from CSV data"""
     imported_count = 0
     errors = []
     row_number = 1  # Start from 1 (header is row 0)
+    seen_emails: Set[str] = set()
+    assigned_usernames: Set[str] = set()
+    chunk = []
+
+    async def flush_chunk():
+        nonlocal imported_count, chunk
+        imported_count += await _import_user_chunk(chunk, seen_emails, assigned_usernames, errors)
+        chunk = []
+        if job is not None:
+            job["processed_rows"] = row_number - 1
+            job["imported_count"] = imported_count
+            job["errors_count"] = len(errors)
+            job["errors"] = errors[:IMPORT_JOB_ERROR_SAMPLE]
+            if bytes_read is not None and job["bytes_total"]:
+                job["bytes_processed"] = bytes_read()
+                job["percent"] = round(100.0 * job["bytes_processed"] / job["bytes_total"], 1)
+            job["message"] = f"Imported {imported_count} users so far"
+            await import_jobs.save(job)
 
     for row in csv_reader:
         row_number += 1
-        try:
-            # Validate required fields
-            email = row.get('Email', '').strip()
-            first_name = row.get('First Name', '').strip()
-            last_name = row.get('Last Name', '').strip()
-            role = row.get('Role', 'student').strip().lower()
-
-            if not email or not first_name:
-                errors.append(f"Row {row_number}: Email and First Name are required")
-                continue
-
-            # Check if user already exists
-            existing_user = await database.fetch_one(
-                "SELECT id FROM users WHERE email = :email",
-                values={"email": email}
-            )
-            if existing_user:
-                errors.append(f"Row {row_number}: User with email {email} already exists")
-                continue
-
-            # Validate role
-            if role not in ['student', 'instructor', 'admin']:
-                errors.append(f"Row {row_number}: Invalid role '{role}'. Must be student, instructor, or admin")
-                continue
-
-            # Derive username from first_name
-            username = first_name.lower()
-
-            # Ensure username uniqueness
-            base_username = username
-            attempt = 0
-            while True:
-                existing_username = await database.fetch_one(
-                    "SELECT id FROM users WHERE username = :username",
-                    values={"username": username}
-                )
-                if not existing_username:
-                    break
-                attempt += 1
-                suffix = ''.join(secrets.choice(string.ascii_lowercase + string.digits) for _ in range(3))
-                username = f"{base_username}{suffix}"
-                if attempt > 5:
-                    username = f"{base_username}{uuid.uuid4().hex[:6]}"
-                    break
-
-            # Generate temporary password
-            alphabet = string.ascii_letters + string.digits + string.punctuation
-            temp_password = ''.join(secrets.choice(alphabet) for _ in range(16))
-
-            # Hash password and create user
-            hashed_password = get_password_hash(temp_password)
-            user_id = uuid.uuid4()
-
-            # Optional fields
-            phone = row.get('Phone', '').strip() or None
-            bio = row.get('Bio', '').strip() or None
-
-            query = """
-                INSERT INTO users (id, email, username, password_hash, first_name, last_name, role, phone, bio)
-                VALUES (:id, :email, :username, :password_hash, :first_name, :last_name, :role, :phone, :bio)
-            """
-
-            values = {
-                "id": user_id,
-                "email": email,
-                "username": username,
-                "password_hash": hashed_password,
-                "first_name": first_name,
-                "last_name": last_name,
-                "role": role,
-                "phone": phone,
-                "bio": bio,
-            }
-
-            await database.execute(query, values=values)
-            imported_count += 1
+        chunk.append((row_number, row))
+        if len(chunk) >= IMPORT_CHUNK_SIZE:
+            await flush_chunk()
 
-        except Exception as e:
-            errors.append(f"Row {row_number}: {str(e)}")
-            continue
+    if chunk:
+        await flush_chunk()
+    await invalidate_tags("users")
 
     # Log import action
     log_query = """
@@ -156,3 +257,148 @@ async def import_users(csv_reader, current_user):
         "errors": errors,
         "message": f"Successfully imported {imported_count} users" + (f" with {len(errors)} errors" if errors else "")
     }
+
+def _clean(row: Dict[str, str], column: str, default: str = '') -> str:
+    # Short rows yield None for missing columns
+    return (row.get(column) or default).strip()
+
+def _validate_row(row_number: int, row: Dict[str, str], seen_emails: Set[str], errors: List[str]) -> Optional[Dict[str, Any]]:
+    """Validate one CSV row in memory; returns the user to insert or None"""
+    email = _clean(row, 'Email')
+    first_name = _clean(row, 'First Name')
+    last_name = _clean(row, 'Last Name')
+    role = _clean(row, 'Role', 'student').lower()
+
+    if not email or not first_name:
+        errors.append(f"Row {row_number}: Email and First Name are required")
+        return None
+
+    if role not in VALID_ROLES:
+        errors.append(f"Row {row_number}: Invalid role '{role}'. Must be student, instructor, or admin")
+        return None
+
+    if email in seen_emails:
+        errors.append(f"Row {row_number}: Duplicate email {email} in file")
+        return None
+
+    user = {
+        "row_number": row_number,
+        "id": uuid.uuid4(),
+        "email": email,
+        "first_name": first_name,
+        "last_name": last_name,
+        "role": role,
+        # Optional fields
+        "phone": _clean(row, 'Phone') or None,
+        "bio": _clean(row, 'Bio') or None,
+    }
+
+    for field, max_length in FIELD_MAX_LENGTHS.items():
+        if user[field] and len(user[field]) > max_length:
+            errors.append(f"Row {row_number}: {field.replace('_', ' ').title()} is longer than {max_length} characters")
+            return None
+
+    seen_emails.add(email)
+    return user
+
+def _username_candidates(first_name: str) -> List[str]:
+    """Derive username from first_name, plus the suffixed fallbacks to try"""
+    base_username = first_name.lower()[:USERNAME_MAX_LENGTH - 6]
+    suffixes = [
+        ''.join(secrets.choice(string.ascii_lowercase + string.digits) for _ in range(3))
+        for _ in range(5)
+    ]
+    return [base_username] + [f"{base_username}{suffix}" for suffix in suffixes]
+
+async def _assign_usernames(users: List[Dict[str, Any]], assigned_usernames: Set[str]):
+    """Pick a unique username for every user with one lookup for the whole chunk"""
+    candidates = {user["id"]: _username_candidates(user["first_name"]) for user in users}
+
+    rows = await database.fetch_all(
+        "SELECT username FROM users WHERE username = ANY(:usernames)",
+        values={"usernames": list({name for names in candidates.values() for name in names})}
+    )
+    taken = {row.username for row in rows} | assigned_usernames
+
+    for user in users:
+        names = candidates[user["id"]]
+        username = next((name for name in names if name not in taken), None)
+        if username is None:
+            username = f"{names[0]}{uuid.uuid4().hex[:6]}"
+        taken.add(username)
+        assigned_usernames.add(username)
+        user["username"] = username
+
+async def _insert_users(users: List[Dict[str, Any]]) -> Set[str]:
+    """Insert users in one statement; returns the emails that were inserted"""
+    rows = await database.fetch_all(INSERT_USERS_QUERY, values={
+        "ids": [user["id"] for user in users],
+        "emails": [user["email"] for user in users],
+        "usernames": [user["username"] for user in users],
+        "password_hashes": [user["password_hash"] for user in users],
+        "first_names": [user["first_name"] for user in users],
+        "last_names": [user["last_name"] for user in users],
+        "roles": [user["role"] for user in users],
+        "phones": [user["phone"] for user in users],
+        "bios": [user["bio"] for user in users],
+    })
+    return {row.email for row in rows}
+
+async def _import_user_chunk(
+    chunk: List[tuple],
+    seen_emails: Set[str],
+    assigned_usernames: Set[str],
+    errors: List[str]
+) -> int:
+    """Validate, pre-check, hash and insert one chunk of rows; returns rows imported"""
+    candidates = [
+        user for user in (
+            _validate_row(row_number, row, seen_emails, errors) for row_number, row in chunk
+        ) if user
+    ]
+    if not candidates:
+        return 0
+
+    # Check if users already exist
+    existing = await database.fetch_all(
+        "SELECT email FROM users WHERE email = ANY(:emails)",
+        values={"emails": [user["email"] for user in candidates]}
+    )
+    existing_emails = {row.email for row in existing}
+
+    new_users = []
+    for user in candidates:
+        if user["email"] in existing_emails:
+            errors.append(f"Row {user['row_number']}: User with email {user['email']} already exists")
+        else:
+            new_users.append(user)
+    if not new_users:
+        return 0
+
+    # Temporary passwords are generated and hashed in worker processes while
+    # usernames are resolved
+    password_hashes, _ = await asyncio.gather(
+        bulk_random_password_hashes(len(new_users)),
+        _assign_usernames(new_users, assigned_usernames)
+    )
+    for user, password_hash in zip(new_users, password_hashes):
+        user["password_hash"] = password_hash
+
+    try:
+        inserted = await _insert_users(new_users)
+    except Exception as e:
+        # Fall back to row-by-row so the error lands on the offending row
+        print(f"[Import] Chunk insert failed, retrying row by row: {e}")
+        inserted = set()
+        for user in new_users:
+            try:
+                inserted |= await _insert_users([user])
+            except Exception as row_error:
+                errors.append(f"Row {user['row_number']}: {str(row_error)}")
+                user["failed"] = True
+
+    for user in new_users:
+        if user["email"] not in inserted and not user.get("failed"):
+            errors.append(f"Row {user['row_number']}: Email or username was taken while importing")
+
+    return len(inserted)
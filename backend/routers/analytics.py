@@ -9,6 +9,9 @@ from models.schemas import (
     PaginationParams, PaginatedResponse
 )
 from middleware.auth import get_current_active_user, require_instructor_or_admin, require_admin
+from utils.analytics_rollups import daily_source, total, amount, ratio
+from utils.result_cache import cached
+from utils.cohort_retention import retention_triangle, month_start, add_months
 
 router = APIRouter()
 
@@ -91,6 +94,7 @@ async def get_student_analytics(
     }
 
 @router.get("/users")
+@cached("analytics_users", ttl=60, tags=("users",), stale_ttl=600)
 async def get_user_analytics(
     current_user = Depends(require_admin)
 ):
@@ -115,6 +119,7 @@ async def get_user_analytics(
     }
 
 @router.get("/overview")
+@cached("analytics_overview", ttl=120, tags=("users", "courses", "enrollments", "revenue"), stale_ttl=900)
 async def get_analytics_overview(
     start_date: Optional[datetime] = Query(None),
     end_date: Optional[datetime] = Query(None),
@@ -128,19 +133,35 @@ async def get_analytics_overview(
     if not end_date:
         end_date = datetime.utcnow()
     
-    # User analytics
-    user_analytics_query = """
+    # Users, revenue and certificates from the daily rollups
+    user_values = {"period_start": start_date.date()}
+    user_daily = daily_source("user_analytics_daily", user_values, None, end_date.date())
+    daily_stats_query = f"""
         SELECT 
-            COUNT(*) as total_users,
-            COUNT(CASE WHEN created_at >= :start_date THEN 1 END) as new_users,
-            COUNT(CASE WHEN last_login_at >= :start_date THEN 1 END) as active_users,
-            COUNT(CASE WHEN role = 'student' THEN 1 END) as total_students,
-            COUNT(CASE WHEN role = 'instructor' THEN 1 END) as total_instructors
+            {total("new_active_users")} as total_users,
+            {total("new_active_users", "date >= :period_start")} as new_users,
+            {total("new_students")} as total_students,
+            {total("new_instructors")} as total_instructors,
+            {amount("revenue_total")} as total_revenue,
+            {amount("revenue_total", "date >= :period_start")} as period_revenue,
+            {total("revenue_completed_transactions")} as completed_transactions,
+            {ratio("revenue_total", "revenue_transactions")} as avg_transaction_value,
+            {total("certificates_issued")} as total_certificates,
+            {total("certificates_issued", "date >= :period_start")} as new_certificates,
+            {total("certificates_minted")} as minted_certificates
+        FROM {user_daily} daily
+    """
+    
+    daily_stats = await database.fetch_one(daily_stats_query, values=user_values)
+    
+    # Users active since the start of the period (last_login_at is indexed)
+    active_users_query = """
+        SELECT COUNT(*) as active_users
         FROM users 
-        WHERE status = 'active' AND created_at <= :end_date
+        WHERE status = 'active' AND last_login_at >= :start_date AND created_at <= :end_date
     """
     
-    user_stats = await database.fetch_one(user_analytics_query, values={
+    active_users = await database.fetch_val(active_users_query, values={
         "start_date": start_date,
         "end_date": end_date
     })
@@ -162,63 +183,46 @@ async def get_analytics_overview(
         "end_date": end_date
     })
     
-    # Enrollment analytics
-    enrollment_analytics_query = """
+    # Enrollment analytics from the per-course rollups
+    enrollment_values = {"period_start": start_date.date()}
+    course_daily = daily_source("course_analytics_daily", enrollment_values, None, end_date.date())
+    enrollment_analytics_query = f"""
         SELECT 
-            COUNT(*) as total_enrollments,
-            COUNT(CASE WHEN enrolled_at >= :start_date THEN 1 END) as new_enrollments,
-            COUNT(CASE WHEN status = 'completed' THEN 1 END) as completed_enrollments,
-            COUNT(CASE WHEN status = 'active' THEN 1 END) as active_enrollments
-        FROM course_enrollments 
-        WHERE enrolled_at <= :end_date
-    """
-    
-    enrollment_stats = await database.fetch_one(enrollment_analytics_query, values={
-        "start_date": start_date,
-        "end_date": end_date
-    })
-    
-    # Revenue analytics
-    revenue_analytics_query = """
-        SELECT 
-            COALESCE(SUM(amount), 0) as total_revenue,
-            COALESCE(SUM(CASE WHEN created_at >= :start_date THEN amount ELSE 0 END), 0) as period_revenue,
-            COUNT(CASE WHEN status = 'completed' THEN 1 END) as completed_transactions,
-            COALESCE(AVG(amount), 0) as avg_transaction_value
-        FROM revenue_records 
-        WHERE created_at <= :end_date
+            {total("enrollments")} as total_enrollments,
+            {total("enrollments", "date >= :period_start")} as new_enrollments,
+            {total("completed_enrollments")} as completed_enrollments,
+            {total("active_enrollments")} as active_enrollments
+        FROM {course_daily} daily
     """
     
-    revenue_stats = await database.fetch_one(revenue_analytics_query, values={
-        "start_date": start_date,
-        "end_date": end_date
-    })
-    
-    # Certificate analytics
-    certificate_analytics_query = """
-        SELECT 
-            COUNT(*) as total_certificates,
-            COUNT(CASE WHEN issued_at >= :start_date THEN 1 END) as new_certificates,
-            COUNT(CASE WHEN status = 'minted' THEN 1 END) as minted_certificates
-        FROM certificates 
-        WHERE issued_at <= :end_date
-    """
-    
-    certificate_stats = await database.fetch_one(certificate_analytics_query, values={
-        "start_date": start_date,
-        "end_date": end_date
-    })
+    enrollment_stats = await database.fetch_one(enrollment_analytics_query, values=enrollment_values)
     
     return {
         "period": {"start_date": start_date, "end_date": end_date},
-        "users": dict(user_stats),
+        "users": {
+            "total_users": daily_stats["total_users"],
+            "new_users": daily_stats["new_users"],
+            "active_users": active_users or 0,
+            "total_students": daily_stats["total_students"],
+            "total_instructors": daily_stats["total_instructors"]
+        },
         "courses": dict(course_stats),
         "enrollments": dict(enrollment_stats),
-        "revenue": dict(revenue_stats),
-        "certificates": dict(certificate_stats)
+        "revenue": {
+            "total_revenue": daily_stats["total_revenue"],
+            "period_revenue": daily_stats["period_revenue"],
+            "completed_transactions": daily_stats["completed_transactions"],
+            "avg_transaction_value": daily_stats["avg_transaction_value"]
+        },
+        "certificates": {
+            "total_certificates": daily_stats["total_certificates"],
+            "new_certificates": daily_stats["new_certificates"],
+            "minted_certificates": daily_stats["minted_certificates"]
+        }
     }
 
 @router.get("/courses/{course_id}")
+@cached("analytics_course", ttl=120, tags=("courses", "enrollments", "revenue"), stale_ttl=900, per_user=True)
 async def get_course_analytics(
     course_id: uuid.UUID,
     start_date: Optional[datetime] = Query(None),
@@ -251,24 +255,34 @@ async def get_course_analytics(
     if not end_date:
         end_date = datetime.utcnow()
     
-    # Enrollment analytics
-    enrollment_query = """
+    # Enrollment and revenue analytics from the daily rollups
+    rollup_values = {"course_id": course_id}
+    course_daily = daily_source(
+        "course_analytics_daily", rollup_values, start_date.date(), end_date.date(),
+        course_filter="course_id = :course_id"
+    )
+    rollup_query = f"""
         SELECT 
-            COUNT(*) as total_enrollments,
-            COUNT(CASE WHEN status = 'completed' THEN 1 END) as completions,
-            COUNT(CASE WHEN status = 'active' THEN 1 END) as active_enrollments,
-            COUNT(CASE WHEN status = 'dropped' THEN 1 END) as dropped_enrollments,
-            COALESCE(AVG(progress_percentage), 0) as avg_progress
-        FROM course_enrollments 
-        WHERE course_id = :course_id 
-        AND enrolled_at BETWEEN :start_date AND :end_date
+            {total("enrollments")} as total_enrollments,
+            {total("completed_enrollments")} as completions,
+            {total("active_enrollments")} as active_enrollments,
+            {total("dropped_enrollments")} as dropped_enrollments,
+            {ratio("enrollment_progress_total", "enrollments")} as avg_progress,
+            {amount("revenue")} as total_revenue,
+            {total("revenue_transactions")} as total_transactions,
+            {ratio("revenue", "revenue_transactions")} as avg_transaction_value
+        FROM {course_daily} daily
     """
     
-    enrollment_stats = await database.fetch_one(enrollment_query, values={
-        "course_id": course_id,
-        "start_date": start_date,
-        "end_date": end_date
-    })
+    rollup_stats = await database.fetch_one(rollup_query, values=rollup_values)
+    enrollment_stats = {
+        key: rollup_stats[key]
+        for key in ("total_enrollments", "completions", "active_enrollments", "dropped_enrollments", "avg_progress")
+    }
+    revenue_stats = {
+        key: rollup_stats[key]
+        for key in ("total_revenue", "total_transactions", "avg_transaction_value")
+    }
     
     # Lesson engagement
     lesson_engagement_query = """
@@ -314,24 +328,6 @@ async def get_course_analytics(
         "end_date": end_date
     })
     
-    # Revenue analytics
-    revenue_query = """
-        SELECT 
-            COALESCE(SUM(amount), 0) as total_revenue,
-            COUNT(*) as total_transactions,
-            COALESCE(AVG(amount), 0) as avg_transaction_value
-        FROM revenue_records 
-        WHERE course_id = :course_id 
-        AND created_at BETWEEN :start_date AND :end_date
-        AND status = 'completed'
-    """
-    
-    revenue_stats = await database.fetch_one(revenue_query, values={
-        "course_id": course_id,
-        "start_date": start_date,
-        "end_date": end_date
-    })
-    
     # Student demographics
     demographics_query = """
         SELECT 
@@ -357,14 +353,15 @@ async def get_course_analytics(
         course_id=course_id,
         course_title=course.title,
         period={"start_date": start_date, "end_date": end_date},
-        enrollments=dict(enrollment_stats),
+        enrollments=enrollment_stats,
         lessons=[dict(lesson) for lesson in lesson_stats],
         quizzes=[dict(quiz) for quiz in quiz_stats],
-        revenue=dict(revenue_stats),
+        revenue=revenue_stats,
         demographics=[dict(demo) for demo in demographics]
     )
 
 @router.get("/instructors/{instructor_id}")
+@cached("analytics_instructor", ttl=120, tags=("courses", "enrollments", "revenue"), stale_ttl=900, per_user=True)
 async def get_instructor_analytics(
     instructor_id: uuid.UUID,
     start_date: Optional[datetime] = Query(None),
@@ -416,23 +413,21 @@ async def get_instructor_analytics(
         "end_date": end_date
     })
     
-    # Revenue statistics
-    revenue_stats_query = """
+    # Revenue statistics from the daily rollups of the instructor's courses
+    revenue_values = {"instructor_id": instructor_id, "period_start": start_date.date()}
+    course_daily = daily_source(
+        "course_analytics_daily", revenue_values, None, end_date.date(),
+        course_filter="course_id IN (SELECT id FROM courses WHERE instructor_id = :instructor_id)"
+    )
+    revenue_stats_query = f"""
         SELECT 
-            COALESCE(SUM(rr.amount), 0) as total_revenue,
-            COALESCE(SUM(CASE WHEN rr.created_at >= :start_date THEN rr.amount ELSE 0 END), 0) as period_revenue,
-            COUNT(CASE WHEN rr.status = 'completed' THEN 1 END) as completed_transactions
-        FROM revenue_records rr
-        JOIN courses c ON rr.course_id = c.id
-        WHERE c.instructor_id = :instructor_id 
-        AND rr.created_at <= :end_date
+            {amount("gross_revenue")} as total_revenue,
+            {amount("gross_revenue", "date >= :period_start")} as period_revenue,
+            {total("revenue_transactions")} as completed_transactions
+        FROM {course_daily} daily
     """
     
-    revenue_stats = await database.fetch_one(revenue_stats_query, values={
-        "instructor_id": instructor_id,
-        "start_date": start_date,
-        "end_date": end_date
-    })
+    revenue_stats = await database.fetch_one(revenue_stats_query, values=revenue_values)
     
     # Student statistics
     student_stats_query = """
@@ -479,6 +474,7 @@ async def get_instructor_analytics(
     }
 
 @router.get("/revenue")
+@cached("analytics_revenue", ttl=300, tags=("revenue",), stale_ttl=1800)
 async def get_revenue_analytics(
     start_date: Optional[datetime] = Query(None),
     end_date: Optional[datetime] = Query(None),
@@ -499,90 +495,85 @@ async def get_revenue_analytics(
     
     # Revenue over time
     if group_by == "day":
-        date_trunc = "DATE(created_at)"
+        date_trunc = "date"
     elif group_by == "week":
-        date_trunc = "DATE_TRUNC('week', created_at)"
+        date_trunc = "DATE_TRUNC('week', date)"
     else:  # month
-        date_trunc = "DATE_TRUNC('month', created_at)"
+        date_trunc = "DATE_TRUNC('month', date)"
+    
+    period_start, period_end = start_date.date(), end_date.date()
     
+    over_time_values = {}
+    user_daily = daily_source("user_analytics_daily", over_time_values, period_start, period_end)
     revenue_over_time_query = f"""
         SELECT 
             {date_trunc} as period,
-            COALESCE(SUM(amount), 0) as revenue,
-            COUNT(*) as transactions
-        FROM revenue_records 
-        WHERE created_at BETWEEN :start_date AND :end_date
-        AND status = 'completed'
+            {amount("revenue_completed")} as revenue,
+            {total("revenue_completed_transactions")} as transactions
+        FROM {user_daily} daily
         GROUP BY {date_trunc}
+        HAVING SUM(revenue_completed_transactions) > 0
         ORDER BY period
     """
     
-    revenue_over_time = await database.fetch_all(revenue_over_time_query, values={
-        "start_date": start_date,
-        "end_date": end_date
-    })
+    revenue_over_time = await database.fetch_all(revenue_over_time_query, values=over_time_values)
     
     # Revenue by course
-    revenue_by_course_query = """
+    by_course_values = {}
+    course_daily = daily_source("course_analytics_daily", by_course_values, period_start, period_end)
+    revenue_by_course_query = f"""
         SELECT 
             c.id, c.title,
-            COALESCE(SUM(rr.amount), 0) as revenue,
-            COUNT(rr.id) as transactions
-        FROM courses c
-        LEFT JOIN revenue_records rr ON c.id = rr.course_id 
-            AND rr.created_at BETWEEN :start_date AND :end_date
-            AND rr.status = 'completed'
+            {amount("daily.revenue")} as revenue,
+            {total("daily.revenue_transactions")} as transactions
+        FROM {course_daily} daily
+        JOIN courses c ON c.id = daily.course_id
         WHERE c.status = 'published'
         GROUP BY c.id, c.title
-        HAVING SUM(rr.amount) > 0
+        HAVING SUM(daily.revenue) > 0
         ORDER BY revenue DESC
         LIMIT 10
     """
     
-    revenue_by_course = await database.fetch_all(revenue_by_course_query, values={
-        "start_date": start_date,
-        "end_date": end_date
-    })
+    revenue_by_course = await database.fetch_all(revenue_by_course_query, values=by_course_values)
     
     # Revenue by instructor
-    revenue_by_instructor_query = """
+    by_instructor_values = {}
+    course_daily = daily_source("course_analytics_daily", by_instructor_values, period_start, period_end)
+    revenue_by_instructor_query = f"""
         SELECT 
             u.id, u.first_name, u.last_name,
-            COALESCE(SUM(rr.amount), 0) as revenue,
-            COUNT(rr.id) as transactions
-        FROM users u
-        JOIN courses c ON u.id = c.instructor_id
-        LEFT JOIN revenue_records rr ON c.id = rr.course_id 
-            AND rr.created_at BETWEEN :start_date AND :end_date
-            AND rr.status = 'completed'
+            {amount("daily.revenue")} as revenue,
+            {total("daily.revenue_transactions")} as transactions
+        FROM {course_daily} daily
+        JOIN courses c ON c.id = daily.course_id
+        JOIN users u ON u.id = c.instructor_id
         WHERE u.role = 'instructor'
         GROUP BY u.id, u.first_name, u.last_name
-        HAVING SUM(rr.amount) > 0
+        HAVING SUM(daily.revenue) > 0
         ORDER BY revenue DESC
         LIMIT 10
     """
     
-    revenue_by_instructor = await database.fetch_all(revenue_by_instructor_query, values={
-        "start_date": start_date,
-        "end_date": end_date
-    })
+    revenue_by_instructor = await database.fetch_all(revenue_by_instructor_query, values=by_instructor_values)
     
     # Total revenue summary
-    total_revenue_query = """
+    summary_values = {}
+    user_daily = daily_source("user_analytics_daily", summary_values, period_start, period_end, param="user_rollup")
+    course_daily = daily_source("course_analytics_daily", summary_values, period_start, period_end, param="course_rollup")
+    total_revenue_query = f"""
         SELECT 
-            COALESCE(SUM(amount), 0) as total_revenue,
-            COUNT(*) as total_transactions,
-            COALESCE(AVG(amount), 0) as avg_transaction_value,
-            COUNT(DISTINCT course_id) as courses_with_revenue
-        FROM revenue_records 
-        WHERE created_at BETWEEN :start_date AND :end_date
-        AND status = 'completed'
+            {amount("revenue_completed")} as total_revenue,
+            {total("revenue_completed_transactions")} as total_transactions,
+            {ratio("revenue_completed", "revenue_completed_transactions")} as avg_transaction_value,
+            (
+                SELECT COUNT(DISTINCT course_id) FROM {course_daily} course_daily
+                WHERE revenue_transactions > 0
+            ) as courses_with_revenue
+        FROM {user_daily} daily
     """
     
-    total_revenue = await database.fetch_one(total_revenue_query, values={
-        "start_date": start_date,
-        "end_date": end_date
-    })
+    total_revenue = await database.fetch_one(total_revenue_query, values=summary_values)
     
     return RevenueAnalytics(
         period={"start_date": start_date, "end_date": end_date},
@@ -593,6 +584,7 @@ async def get_revenue_analytics(
     )
 
 @router.get("/engagement")
+@cached("analytics_engagement", ttl=300, tags=("enrollments", "progress", "users"), stale_ttl=1800)
 async def get_engagement_analytics(
     start_date: Optional[datetime] = Query(None),
     end_date: Optional[datetime] = Query(None),
@@ -606,71 +598,53 @@ async def get_engagement_analytics(
     if not end_date:
         end_date = datetime.utcnow()
     
-    # Daily active users
-    dau_query = """
+    # Daily active users and course engagement from the daily rollups
+    engagement_values = {}
+    user_daily = daily_source("user_analytics_daily", engagement_values, start_date.date(), end_date.date())
+    daily_engagement_query = f"""
         SELECT 
-            DATE(last_login_at) as date,
-            COUNT(DISTINCT id) as active_users
-        FROM users 
-        WHERE last_login_at BETWEEN :start_date AND :end_date
-        AND status = 'active'
-        GROUP BY DATE(last_login_at)
+            date,
+            CAST(active_users AS BIGINT) as active_users,
+            CAST(engaged_users AS BIGINT) as engaged_users,
+            CAST(lesson_interactions AS BIGINT) as lesson_interactions,
+            COALESCE(time_spent_total::numeric / NULLIF(lesson_interactions, 0), 0) as avg_time_spent
+        FROM {user_daily} daily
+        WHERE active_users > 0 OR lesson_interactions > 0
         ORDER BY date
     """
     
-    daily_active_users = await database.fetch_all(dau_query, values={
-        "start_date": start_date,
-        "end_date": end_date
-    })
-    
-    # Course engagement
-    course_engagement_query = """
-        SELECT 
-            DATE(lp.updated_at) as date,
-            COUNT(DISTINCT lp.user_id) as engaged_users,
-            COUNT(lp.id) as lesson_interactions,
-            COALESCE(AVG(lp.time_spent), 0) as avg_time_spent
-        FROM lesson_progress lp
-        WHERE lp.updated_at BETWEEN :start_date AND :end_date
-        GROUP BY DATE(lp.updated_at)
-        ORDER BY date
-    """
-    
-    course_engagement = await database.fetch_all(course_engagement_query, values={
-        "start_date": start_date,
-        "end_date": end_date
-    })
-    
-    # User retention
-    retention_query = """
-        WITH user_cohorts AS (
-            SELECT 
-                u.id,
-                DATE_TRUNC('month', u.created_at) as cohort_month,
-                DATE_TRUNC('month', u.last_login_at) as login_month
-            FROM users u
-            WHERE u.created_at >= :start_date - INTERVAL '6 months'
-            AND u.status = 'active'
-        )
-        SELECT 
-            cohort_month,
-            COUNT(DISTINCT id) as cohort_size,
-            COUNT(DISTINCT CASE WHEN login_month = cohort_month THEN id END) as month_0,
-            COUNT(DISTINCT CASE WHEN login_month = cohort_month + INTERVAL '1 month' THEN id END) as month_1,
-            COUNT(DISTINCT CASE WHEN login_month = cohort_month + INTERVAL '2 months' THEN id END) as month_2,
-            COUNT(DISTINCT CASE WHEN login_month = cohort_month + INTERVAL '3 months' THEN id END) as month_3
-        FROM user_cohorts
-        GROUP BY cohort_month
-        ORDER BY cohort_month
-    """
-    
-    retention_data = await database.fetch_all(retention_query, values={
-        "start_date": start_date
-    })
+    daily_engagement = await database.fetch_all(daily_engagement_query, values=engagement_values)
+    daily_active_users = [
+        {"date": row["date"], "active_users": row["active_users"]}
+        for row in daily_engagement if row["active_users"] > 0
+    ]
+    course_engagement = [
+        {
+            "date": row["date"],
+            "engaged_users": row["engaged_users"],
+            "lesson_interactions": row["lesson_interactions"],
+            "avg_time_spent": row["avg_time_spent"]
+        }
+        for row in daily_engagement if row["lesson_interactions"] > 0
+    ]
+    
+    # User retention from the precomputed cohort matrix
+    retention_data = await retention_triangle(add_months(month_start(start_date), -6), periods=4)
+    user_retention = [
+        {
+            "cohort_month": cohort["cohort_month"],
+            "cohort_size": cohort["cohort_size"],
+            **{
+                f"month_{period}": (cohort["active_users"][period] if period < len(cohort["active_users"]) else 0)
+                for period in range(4)
+            }
+        }
+        for cohort in retention_data
+    ]
     
     return {
         "period": {"start_date": start_date, "end_date": end_date},
-        "daily_active_users": [dict(item) for item in daily_active_users],
-        "course_engagement": [dict(item) for item in course_engagement],
-        "user_retention": [dict(item) for item in retention_data]
+        "daily_active_users": daily_active_users,
+        "course_engagement": course_engagement,
+        "user_retention": user_retention
     }
@@ -11,6 +11,8 @@ from models.schemas import (
 )
 from middleware.auth import get_current_active_user, require_instructor_or_admin
 from utils.file_upload import upload_file
+from utils.progress_buffer import progress_buffer
+from utils.search import TextSearch
 
 router = APIRouter()
 
@@ -50,13 +52,16 @@ async def get_all_assignments(
 
     # Search filter
     if search:
-        where_conditions.append("""
-            (a.title ILIKE :search OR
-             a.description ILIKE :search OR
-             c.title ILIKE :search OR
-             l.title ILIKE :search)
+        text_search = TextSearch(search)
+        where_conditions.append(f"""
+            a.id IN (
+                {text_search.document_ids("assignments", params)}
+                UNION
+                SELECT id FROM assignments WHERE course_id IN ({text_search.document_ids("courses", params)})
+                UNION
+                SELECT id FROM assignments WHERE lesson_id IN ({text_search.document_ids("lessons", params)})
+            )
         """)
-        params["search"] = f"%{search}%"
 
     where_clause = " AND ".join(where_conditions) if where_conditions else "1=1"
 
@@ -452,6 +457,11 @@ async def submit_assignment(
     }
 
     new_submission = await database.fetch_one(query, values=values)
+
+    # Submitting starts the lesson for progress purposes
+    if assignment.lesson_id:
+        await progress_buffer.forget(current_user.id, assignment.lesson_id)
+
     return AssignmentSubmissionResponse(**new_submission)
 
 @router.get("/{assignment_id}/submissions", response_model=List[AssignmentSubmissionResponse])
@@ -503,7 +513,7 @@ async def grade_assignment_submission(
 ):
     # Check if submission exists and user has permission
     check_query = """
-        SELECT sub.*, a.id as assignment_id, c.instructor_id
+        SELECT sub.*, a.id as assignment_id, a.lesson_id, c.instructor_id
         FROM assignment_submissions sub
         JOIN assignments a ON sub.assignment_id = a.id
         JOIN courses c ON a.course_id = c.id
@@ -551,6 +561,11 @@ async def grade_assignment_submission(
     }
 
     updated_submission = await database.fetch_one(update_query, values=values)
+
+    # Grading can complete the lesson the assignment belongs to
+    if submission.lesson_id:
+        await progress_buffer.forget(submission.user_id, submission.lesson_id)
+
     return AssignmentSubmissionResponse(**updated_submission)
 
 @router.get("/submissions/{submission_id}", response_model=AssignmentSubmissionResponse)
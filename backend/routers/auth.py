@@ -13,14 +13,15 @@ from models.schemas import (
 )
 from models.auth_schemas import TwoFactorAuthResponse, TwoFactorVerifyRequest
 from middleware.auth import (
-    authenticate_user, create_access_token, create_refresh_token,
-    verify_refresh_token, get_password_hash,
-    ACCESS_TOKEN_EXPIRE_MINUTES, REFRESH_TOKEN_EXPIRE_DAYS, get_user_by_email
+    authenticate_user, create_access_token, create_access_token_async, create_refresh_token,
+    verify_refresh_token, get_password_hash_async, get_user_by_id, revoke_user_tokens,
+    ACCESS_TOKEN_EXPIRE_MINUTES, REFRESH_TOKEN_EXPIRE_DAYS, AUTH_CLAIMS_MODE, get_user_by_email
 )
 from utils.email import send_password_reset_email, send_welcome_email
 from utils.email_async import send_welcome_email_async, send_two_factor_auth_email_async  # Celery background tasks
 from utils.validation import validate_email
 from utils.redis_client import two_fa_manager, check_redis_connection
+from utils.result_cache import invalidate_tags
 
 router = APIRouter()
 
@@ -44,7 +45,7 @@ async def register(user: UserCreate):
         )
 
     # Hash password and create user
-    hashed_password = get_password_hash(user.password)
+    hashed_password = await get_password_hash_async(user.password)
     user_id = uuid.uuid4()
 
     query = """
@@ -100,6 +101,7 @@ async def register(user: UserCreate):
         except Exception as e2:
             print(f"Fallback email also failed: {e2}")
 
+    await invalidate_tags("users")
     return {
         "message": "Registration successful. Please check your email for verification code.",
         "user_id": str(user_id),
@@ -143,7 +145,7 @@ async def login(login_data: LoginRequest, request: Request, response: Response):
 
         # Create session in Redis
         session_id = str(uuid.uuid4())
-        session_created = two_fa_manager.create_2fa_session(
+        session_created = await two_fa_manager.create_2fa_session(
             session_id=session_id,
             user_id=str(user.id),
             email=user.email,
@@ -188,8 +190,9 @@ async def login(login_data: LoginRequest, request: Request, response: Response):
 
     # Create access token
     access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
-    access_token = create_access_token(
-        data={"sub": str(user.id)}, expires_delta=access_token_expires
+    access_token = await create_access_token_async(
+        data={"sub": str(user.id)}, expires_delta=access_token_expires,
+        user=user if not is_mock_login else None
     )
 
     # Create refresh token
@@ -224,7 +227,7 @@ async def login(login_data: LoginRequest, request: Request, response: Response):
 @router.post("/verify-2fa")
 async def verify_two_factor(verify_data: TwoFactorVerifyRequest, response: Response):
     # Verify 2FA code using Redis
-    session = two_fa_manager.verify_2fa_code(
+    session = await two_fa_manager.verify_2fa_code(
         session_id=verify_data.session_id,
         code=verify_data.code
     )
@@ -268,8 +271,9 @@ async def verify_two_factor(verify_data: TwoFactorVerifyRequest, response: Respo
 
     # Create access token
     access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
-    access_token = create_access_token(
-        data={"sub": user_id}, expires_delta=access_token_expires
+    access_token = await create_access_token_async(
+        data={"sub": user_id}, expires_delta=access_token_expires,
+        user=user if user_email != "admin@dcalms.com" else None
     )
 
     # Create refresh token
@@ -287,7 +291,7 @@ async def verify_two_factor(verify_data: TwoFactorVerifyRequest, response: Respo
     )
 
     # Clean up session from Redis
-    two_fa_manager.invalidate_2fa_session(verify_data.session_id)
+    await two_fa_manager.invalidate_2fa_session(verify_data.session_id)
 
     return {
         "access_token": access_token,
@@ -321,10 +325,11 @@ async def refresh_token(request: Request, response: Response):
             detail="Invalid or expired refresh token"
         )
 
-    # Create new access token
+    # Create new access token (claims mode re-reads role/status for the new token)
     access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
-    access_token = create_access_token(
-        data={"sub": user_id}, expires_delta=access_token_expires
+    access_token = await create_access_token_async(
+        data={"sub": user_id}, expires_delta=access_token_expires,
+        user=await get_user_by_id(user_id) if AUTH_CLAIMS_MODE else None
     )
 
     # Optionally rotate refresh token (create new one)
@@ -395,7 +400,7 @@ async def reset_password(reset_data: PasswordReset):
         )
     
     # Hash new password
-    hashed_password = get_password_hash(reset_data.new_password)
+    hashed_password = await get_password_hash_async(reset_data.new_password)
     
     # Update user password
     update_query = "UPDATE users SET password_hash = :password_hash WHERE id = :user_id"
@@ -433,6 +438,7 @@ async def verify_email(token: str):
         WHERE id = :user_id
     """
     await database.execute(update_user_query, values={"user_id": token_record.user_id})
+    await revoke_user_tokens(token_record.user_id)
 
     # Mark token as verified
     mark_verified_query = """
@@ -480,6 +486,7 @@ async def verify_email_code(verification_data: dict, response: Response):
         WHERE id = :user_id
     """
     await database.execute(update_user_query, values={"user_id": user_id})
+    await revoke_user_tokens(user_id)
 
     # Mark token as verified
     mark_verified_query = """
@@ -12,6 +12,8 @@ from models.schemas import (
     PaginationParams
 )
 from middleware.auth import get_current_active_user, require_admin
+from utils.search import TextSearch
+from utils.catalog_index import catalog_index
 import logging
 
 router = APIRouter()
@@ -141,22 +143,29 @@ async def get_popular_categories(limit: int = Query(10, ge=1, le=50)):
 @router.get("/search")
 async def search_categories(q: str = Query(..., min_length=1)):
     """
-    Search categories by name or description
+    Search categories by name or description, best matches first
     """
     try:
-        query = """
+        if catalog_index.ready:
+            return catalog_index.search_categories(q)
+
+        text_search = TextSearch(q)
+        values = {}
+        query = f"""
             SELECT c.*, 
                    COUNT(DISTINCT co.id) as course_count
             FROM categories c
+            JOIN category_search_documents d ON d.category_id = c.id
             LEFT JOIN courses co ON co.category_id = c.id
             WHERE c.is_active = true 
-              AND (c.name ILIKE :search OR c.description ILIKE :search)
+              AND {text_search.matches("categories", "c.id", values)}
             GROUP BY c.id, c.name, c.slug, c.description, c.icon, c.color, 
-                     c.parent_id, c.sort_order, c.is_active, c.created_at, c.updated_at
-            ORDER BY c.name
+                     c.parent_id, c.sort_order, c.is_active, c.created_at, c.updated_at,
+                     d.category_id
+            ORDER BY {text_search.rank("d.document", values)} DESC, c.name
             LIMIT 20
         """
-        categories = await database.fetch_all(query, {"search": f"%{q}%"})
+        categories = await database.fetch_all(query, values)
         return categories
         
     except Exception as e:
@@ -417,6 +426,7 @@ async def create_category(
         }
         
         category = await database.fetch_one(query, values)
+        await catalog_index.refresh_categories()
         return category
         
     except Exception as e:
@@ -470,6 +480,7 @@ async def update_category(
         """
         
         category = await database.fetch_one(query, values)
+        await catalog_index.refresh_categories()
         return category
         
     except HTTPException:
@@ -522,6 +533,7 @@ async def delete_category(
         delete_query = "DELETE FROM categories WHERE id = :category_id"
         await database.execute(delete_query, {"category_id": category_id})
         
+        await catalog_index.refresh_categories()
         return {"message": "Category deleted successfully"}
         
     except HTTPException:
@@ -592,6 +604,7 @@ async def toggle_category_status(
                 detail="Category not found"
             )
         
+        await catalog_index.refresh_categories()
         return category
         
     except HTTPException:
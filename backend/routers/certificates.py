@@ -8,8 +8,10 @@ from models.schemas import (
     CertificateResponse, CertificateCreate, CertificateUpdate,
     PaginationParams, PaginatedResponse
 )
-from middleware.auth import get_current_active_user, require_admin
-from utils.blockchain import mint_certificate_nft, verify_certificate_on_chain
+from middleware.auth import get_current_active_user, get_current_active_user_record, require_admin
+from utils.blockchain import blockchain_service
+from utils.certificate_verification import get_certificate_verification, invalidate_certificate_verification
+from utils.minting import queue_mint, queue_course_mints, latest_mint_job
 from utils.notifications import send_certificate_notification
 
 router = APIRouter()
@@ -65,53 +67,19 @@ async def get_certificate(
 async def verify_certificate(certificate_id: uuid.UUID):
     """Public endpoint to verify certificate authenticity"""
     
-    query = """
-        SELECT c.*, co.title as course_title, u.first_name, u.last_name
-        FROM certificates c
-        JOIN courses co ON c.course_id = co.id
-        JOIN users u ON c.user_id = u.id
-        WHERE c.id = :certificate_id AND c.status = 'issued'
-    """
-    
-    certificate = await database.fetch_one(query, values={"certificate_id": certificate_id})
-    
-    if not certificate:
-        return {"valid": False, "message": "Certificate not found or not issued"}
-    
-    # Verify on blockchain if available
-    blockchain_verified = False
-    if certificate.token_id and certificate.contract_address:
-        try:
-            blockchain_verified = await verify_certificate_on_chain(
-                certificate.contract_address,
-                certificate.token_id
-            )
-        except Exception:
-            pass  # Blockchain verification failed, but certificate still exists in DB
-    
-    return {
-        "valid": True,
-        "certificate_id": certificate_id,
-        "recipient_name": f"{certificate.first_name} {certificate.last_name}",
-        "course_title": certificate.course_title,
-        "issued_at": certificate.issued_at,
-        "blockchain_verified": blockchain_verified,
-        "blockchain_network": certificate.blockchain_network,
-        "token_id": certificate.token_id
-    }
+    return await get_certificate_verification(certificate_id)
 
-@router.post("/{certificate_id}/mint")
+@router.post("/{certificate_id}/mint", status_code=status.HTTP_202_ACCEPTED)
 async def mint_certificate(
     certificate_id: uuid.UUID,
-    current_user = Depends(get_current_active_user)
+    current_user = Depends(get_current_active_user_record)
 ):
-    """Mint certificate as NFT on blockchain"""
+    """Queue minting of the certificate as an NFT; poll GET /{certificate_id}/mint for the result"""
     
     # Get certificate
     query = """
-        SELECT c.*, co.title as course_title, u.wallet_address
+        SELECT c.*, u.wallet_address
         FROM certificates c
-        JOIN courses co ON c.course_id = co.id
         JOIN users u ON c.user_id = u.id
         WHERE c.id = :certificate_id AND c.user_id = :user_id
     """
@@ -144,60 +112,85 @@ async def mint_certificate(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Wallet address required for minting"
         )
+
+    if not blockchain_service.can_mint:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Blockchain minting is not configured"
+        )
+    
+    job = await queue_mint(certificate_id, current_user.id, certificate.wallet_address)
     
-    try:
-        # Mint NFT on blockchain
-        mint_result = await mint_certificate_nft(
-            recipient_address=certificate.wallet_address,
-            certificate_data={
-                "certificate_id": str(certificate_id),
-                "recipient_name": f"{current_user.first_name} {current_user.last_name}",
-                "course_title": certificate.course_title,
-                "issued_at": certificate.issued_at.isoformat(),
-                "description": certificate.description
-            }
+    return {
+        "message": "Certificate queued for minting" if job["queued"] else "Certificate is already being minted",
+        "job_id": job["job_id"],
+        "status": job["status"]
+    }
+
+@router.get("/{certificate_id}/mint")
+async def get_mint_status(
+    certificate_id: uuid.UUID,
+    current_user = Depends(get_current_active_user)
+):
+    """Status of the certificate's latest mint job: queued, submitting, submitted, confirmed or failed"""
+    
+    owner_id = await database.fetch_val(
+        "SELECT user_id FROM certificates WHERE id = :certificate_id",
+        values={"certificate_id": certificate_id}
+    )
+    
+    if owner_id is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Certificate not found"
         )
-        
-        # Update certificate with blockchain info
-        update_query = """
-            UPDATE certificates 
-            SET token_id = :token_id, 
-                contract_address = :contract_address,
-                transaction_hash = :transaction_hash,
-                blockchain_network = :blockchain_network,
-                status = 'minted',
-                updated_at = NOW()
-            WHERE id = :certificate_id
-            RETURNING *
-        """
-        
-        updated_certificate = await database.fetch_one(update_query, values={
-            "token_id": mint_result["token_id"],
-            "contract_address": mint_result["contract_address"],
-            "transaction_hash": mint_result["transaction_hash"],
-            "blockchain_network": mint_result["network"],
-            "certificate_id": certificate_id
-        })
-        
-        # Send notification
-        await send_certificate_notification(
-            current_user.id,
-            certificate.course_title,
-            "minted"
+    
+    if str(owner_id) != str(current_user.id) and current_user.role != "admin":
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Not authorized to view this certificate"
         )
-        
-        return {
-            "message": "Certificate minted successfully",
-            "token_id": mint_result["token_id"],
-            "transaction_hash": mint_result["transaction_hash"],
-            "contract_address": mint_result["contract_address"]
-        }
-        
-    except Exception as e:
+    
+    job = await latest_mint_job(certificate_id)
+    if not job:
         raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail=f"Failed to mint certificate: {str(e)}"
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Certificate has not been queued for minting"
         )
+    
+    return {
+        "job_id": str(job["id"]),
+        "status": job["status"],
+        "transaction_hash": job["transaction_hash"],
+        "token_id": job["token_id"],
+        "attempts": job["attempts"],
+        "error": job["error"],
+        "submitted_at": job["submitted_at"],
+        "confirmed_at": job["confirmed_at"]
+    }
+
+@router.post("/courses/{course_id}/mint", status_code=status.HTTP_202_ACCEPTED)
+async def mint_course_certificates(
+    course_id: uuid.UUID,
+    current_user = Depends(require_admin)
+):
+    """Admin endpoint to mint every unminted certificate of a course, in batches"""
+    
+    if not blockchain_service.can_mint:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Blockchain minting is not configured"
+        )
+    
+    result = await queue_course_mints(course_id)
+    
+    return {
+        "message": f"{result['queued']} certificates queued for minting",
+        "queued": result["queued"],
+        "job_ids": result["job_ids"],
+        "without_wallet": result["without_wallet"],
+        "invalid_wallet": result["invalid_wallet"]
+    }
 
 @router.get("/", response_model=PaginatedResponse)
 async def get_all_certificates(
@@ -328,6 +321,7 @@ async def create_certificate(
     }
     
     new_certificate = await database.fetch_one(query, values=values)
+    await invalidate_certificate_verification(certificate_id)
     
     # Send notification
     await send_certificate_notification(
@@ -376,6 +370,7 @@ async def update_certificate(
     """
     
     updated_certificate = await database.fetch_one(query, values=values)
+    await invalidate_certificate_verification(certificate_id)
     return CertificateResponse(**updated_certificate)
 
 @router.delete("/{certificate_id}")
@@ -409,6 +404,7 @@ async def revoke_certificate(
     """
     
     await database.execute(query, values={"certificate_id": certificate_id})
+    await invalidate_certificate_verification(certificate_id)
     
     # Send notification
     await send_certificate_notification(
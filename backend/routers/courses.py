@@ -5,16 +5,20 @@ import uuid
 from database.connection import database
 from models.schemas import (
     CourseResponse, CourseCreate, CourseUpdate, CategoryResponse,
-    PaginationParams, PaginatedResponse, CourseLevel, CourseStatus, FileUploadResponse
+    KeysetPaginationParams, PaginatedResponse, CourseLevel, CourseStatus, FileUploadResponse
 )
 from middleware.auth import get_current_active_user, require_instructor_or_admin, require_admin
-from utils.file_upload import upload_image, upload_video
+from utils.media_processing import upload_image, upload_video
+from utils.pagination import Keyset, fetch_total
+from utils.search import TextSearch
+from utils.catalog_index import catalog_index
+from utils.result_cache import invalidate_tags
 
 router = APIRouter()
 
 @router.get("/", response_model=PaginatedResponse)
 async def get_courses(
-    pagination: PaginationParams = Depends(),
+    pagination: KeysetPaginationParams = Depends(),
     category_id: Optional[uuid.UUID] = Query(None),
     level: Optional[CourseLevel] = Query(None),
     is_free: Optional[bool] = Query(None),
@@ -23,6 +27,25 @@ async def get_courses(
     instructor_id: Optional[uuid.UUID] = Query(None),
     status: Optional[CourseStatus] = Query(None)
 ):
+    # Anonymous catalog search is answered from the in-memory index
+    if search and status == CourseStatus.published and pagination.cursor is None and catalog_index.ready:
+        matches = catalog_index.search_courses(
+            search,
+            category_id=category_id,
+            level=level,
+            is_free=is_free,
+            is_featured=is_featured,
+            instructor_id=instructor_id
+        )
+        offset = (pagination.page - 1) * pagination.size
+        return PaginatedResponse(
+            items=[CourseResponse(**course) for course in matches[offset:offset + pagination.size]],
+            total=len(matches),
+            page=pagination.page,
+            size=pagination.size,
+            pages=(len(matches) + pagination.size - 1) // pagination.size
+        )
+
     # Build query with filters
     where_conditions = []
     values = {
@@ -55,22 +78,17 @@ async def get_courses(
         values["instructor_id"] = instructor_id
     
     if search:
-        where_conditions.append("""
-            (c.title ILIKE :search OR c.description ILIKE :search OR 
-             c.short_description ILIKE :search)
-        """)
-        values["search"] = f"%{search}%"
+        where_conditions.append(TextSearch(search).matches("courses", "c.id", values))
     
     where_clause = "WHERE " + " AND ".join(where_conditions) if where_conditions else ""
     
-    # Get total count (exclude pagination params)
-    count_query = f"""
-        SELECT COUNT(*) as total 
-        FROM courses c {where_clause}
-    """
-    count_values = {k: v for k, v in values.items() if k not in ["size", "offset"]}
-    total_result = await database.fetch_one(count_query, values=count_values)
-    total = total_result["total"] if total_result else 0
+    # Get total count
+    total, total_estimated = await fetch_total(
+        f"FROM courses c {where_clause}", values, pagination.total_mode
+    )
+    
+    keyset = Keyset(pagination.cursor, pagination.size, "created_at", "c.created_at", "c.id")
+    where_clause, limit_clause = keyset.clauses(where_conditions, values)
     
     # Get courses with instructor info
     query = f"""
@@ -81,18 +99,21 @@ async def get_courses(
         LEFT JOIN users u ON c.instructor_id = u.id
         LEFT JOIN categories cat ON c.category_id = cat.id
         {where_clause}
-        ORDER BY c.created_at DESC
-        LIMIT :size OFFSET :offset
+        ORDER BY {keyset.order_by}
+        {limit_clause}
     """
     
     courses = await database.fetch_all(query, values=values)
+    courses, next_cursor = keyset.page(courses)
     
     return PaginatedResponse(
         items=[CourseResponse(**course) for course in courses],
         total=total,
         page=pagination.page,
         size=pagination.size,
-        pages=(total + pagination.size - 1) // pagination.size
+        pages=(total + pagination.size - 1) // pagination.size,
+        next_cursor=next_cursor,
+        total_estimated=total_estimated
     )
 
 @router.get("/featured/", response_model=List[CourseResponse])
@@ -205,6 +226,9 @@ async def create_course(
             "description": f"Created course: {course.title}"
         })
     
+    await invalidate_tags("courses")
+    await catalog_index.refresh_course(course_id)
+    
     return CourseResponse(**new_course)
 
 @router.put("/{course_id}", response_model=CourseResponse)
@@ -264,6 +288,9 @@ async def update_course(
             "description": f"Updated course: {existing_course.title}"
         })
     
+    await invalidate_tags("courses")
+    await catalog_index.refresh_course(course_id)
+    
     return CourseResponse(**updated_course)
 
 @router.delete("/{course_id}")
@@ -309,6 +336,9 @@ async def delete_course(
             "description": f"Deleted course: {existing_course.title}"
         })
     
+    await invalidate_tags("courses", "enrollments")
+    await catalog_index.refresh_course(course_id)
+    
     return {"message": "Course deleted successfully"}
 
 @router.post("/{course_id}/publish")
@@ -355,6 +385,9 @@ async def publish_course(
         "description": f"Published course: {existing_course.title}"
     })
     
+    await invalidate_tags("courses")
+    await catalog_index.refresh_course(course_id)
+    
     return CourseResponse(**updated_course)
 
 @router.post("/{course_id}/unpublish")
@@ -402,6 +435,9 @@ async def unpublish_course(
             "description": f"Unpublished course: {existing_course.title}"
         })
 
+    await invalidate_tags("courses")
+    await catalog_index.refresh_course(course_id)
+    
     return CourseResponse(**updated_course)
 
 @router.post("/upload-thumbnail", response_model=FileUploadResponse)
@@ -411,7 +447,7 @@ async def upload_course_thumbnail(
 ):
     """Upload course thumbnail image"""
     try:
-        result = await upload_image(file, "courses/thumbnails")
+        result = await upload_image(file, "courses/thumbnails", owner_id=current_user.id)
         return FileUploadResponse(**result)
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
@@ -423,7 +459,7 @@ async def upload_course_trailer(
 ):
     """Upload course trailer video"""
     try:
-        result = await upload_video(file, "courses/trailers")
+        result = await upload_video(file, "courses/trailers", owner_id=current_user.id)
         return FileUploadResponse(**result)
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
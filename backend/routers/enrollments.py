@@ -6,11 +6,13 @@ from datetime import datetime
 from database.connection import database
 from models.schemas import (
     EnrollmentCreate, EnrollmentResponse, CourseResponse,
-    PaginationParams, PaginatedResponse
+    PaginationParams, KeysetPaginationParams, PaginatedResponse
 )
 from middleware.auth import get_current_active_user
 from utils.tokens import award_tokens
 from utils.notifications import send_enrollment_notification
+from utils.pagination import Keyset, fetch_total
+from utils.result_cache import invalidate_tags
 
 router = APIRouter()
 
@@ -99,6 +101,7 @@ async def enroll_in_course(
     # Send enrollment notification
     await send_enrollment_notification(current_user.id, course.title, enrollment.course_id)
     
+    await invalidate_tags("enrollments", "courses")
     return EnrollmentResponse(**new_enrollment)
 
 @router.get("/my-courses", response_model=PaginatedResponse)
@@ -216,6 +219,7 @@ async def drop_course(
     """
     await database.execute(update_course_query, values={"course_id": enrollment.course_id})
     
+    await invalidate_tags("enrollments", "courses")
     return {"message": "Successfully dropped from course"}
 
 @router.get("/progress/{course_id}")
@@ -282,7 +286,7 @@ async def get_enrollment_progress_by_slug(
 @router.get("/course/{course_id}/students", response_model=PaginatedResponse)
 async def get_course_students(
     course_id: uuid.UUID,
-    pagination: PaginationParams = Depends(),
+    pagination: KeysetPaginationParams = Depends(),
     current_user = Depends(get_current_active_user)
 ):
     # Check if user is instructor of the course or admin
@@ -301,37 +305,42 @@ async def get_course_students(
             detail="Not authorized to view course students"
         )
 
+    where_conditions = ["ce.course_id = :course_id", "ce.status = 'active'"]
+    values = {
+        "course_id": course_id,
+        "size": pagination.size,
+        "offset": (pagination.page - 1) * pagination.size
+    }
+
     # Get total count
-    count_query = """
-        SELECT COUNT(*) as total
-        FROM course_enrollments ce
-        WHERE ce.course_id = :course_id AND ce.status = 'active'
-    """
-    total_result = await database.fetch_one(count_query, values={"course_id": course_id})
-    total = total_result.total
+    total, total_estimated = await fetch_total(
+        "FROM course_enrollments ce WHERE " + " AND ".join(where_conditions),
+        values,
+        pagination.total_mode
+    )
+
+    keyset = Keyset(pagination.cursor, pagination.size, "enrolled_at", "ce.enrolled_at", "ce.id")
+    where_clause, limit_clause = keyset.clauses(where_conditions, values)
 
     # Get students
-    query = """
+    query = f"""
         SELECT ce.*, u.first_name, u.last_name, u.email, u.avatar_url
         FROM course_enrollments ce
         JOIN users u ON ce.user_id = u.id
-        WHERE ce.course_id = :course_id AND ce.status = 'active'
-        ORDER BY ce.enrolled_at DESC
-        LIMIT :size OFFSET :offset
+        {where_clause}
+        ORDER BY {keyset.order_by}
+        {limit_clause}
     """
 
-    values = {
-        "course_id": course_id,
-        "size": pagination.size,
-        "offset": (pagination.page - 1) * pagination.size
-    }
-
     students = await database.fetch_all(query, values=values)
+    students, next_cursor = keyset.page(students)
 
     return PaginatedResponse(
         items=[EnrollmentResponse(**student) for student in students],
         total=total,
         page=pagination.page,
         size=pagination.size,
-        pages=(total + pagination.size - 1) // pagination.size
+        pages=(total + pagination.size - 1) // pagination.size,
+        next_cursor=next_cursor,
+        total_estimated=total_estimated
     )
@@ -1,4 +1,4 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Query, UploadFile, File
+from fastapi import APIRouter, Depends, HTTPException, status, Query, UploadFile, File, Request, Header
 from typing import List, Optional
 import uuid
 import os
@@ -10,10 +10,16 @@ from models.schemas import (
     QuizQuestionCreate, QuizQuestionUpdate, QuizQuestionResponse,
     QuizAttemptCreate, QuizAttemptResponse,
     AssignmentCreate, AssignmentResponse,
-    PaginationParams, PaginatedResponse
+    PaginationParams, PaginatedResponse,
+    ResumableUploadCreate
 )
 from middleware.auth import get_current_active_user, require_instructor_or_admin
-from utils.file_upload import upload_video, upload_image, upload_file
+from utils.file_upload import upload_file, file_upload_service, ALLOWED_VIDEO_TYPES
+from utils.media_processing import upload_video, upload_image, queue_media_processing
+from utils.resumable_upload import resumable_upload_service, MAX_RESUMABLE_VIDEO_SIZE
+from utils.pagination import Keyset, fetch_total
+from utils.search import TextSearch
+from utils.catalog_index import catalog_index
 
 router = APIRouter()
 
@@ -27,6 +33,8 @@ async def get_all_lessons(
     search: Optional[str] = None,
     sort_by: str = Query("created_at", regex="^(created_at|updated_at|title|sort_order)$"),
     sort_order: str = Query("desc", regex="^(asc|desc)$"),
+    cursor: Optional[str] = Query(None),
+    total_mode: str = Query("exact", regex="^(exact|estimated)$"),
     current_user = Depends(require_instructor_or_admin)
 ):
     """Get all lessons for admin management with filtering and pagination"""
@@ -55,18 +63,40 @@ async def get_all_lessons(
 
     # Search filter
     if search:
-        where_conditions.append("""
-            (l.title ILIKE :search OR
-             l.description ILIKE :search OR
-             c.title ILIKE :search OR
-             u.first_name || ' ' || u.last_name ILIKE :search)
+        text_search = TextSearch(search)
+        where_conditions.append(f"""
+            l.id IN (
+                {text_search.document_ids("lessons", params)}
+                UNION
+                SELECT id FROM lessons WHERE course_id IN ({text_search.document_ids("courses", params)})
+                UNION
+                SELECT sl.id FROM lessons sl
+                JOIN courses sc ON sl.course_id = sc.id
+                JOIN users su ON sc.instructor_id = su.id
+                WHERE {text_search.contains(params, "su.first_name || ' ' || su.last_name")}
+            )
         """)
-        params["search"] = f"%{search}%"
 
-    where_clause = " AND ".join(where_conditions) if where_conditions else "1=1"
+    where_clause = "WHERE " + " AND ".join(where_conditions) if where_conditions else ""
+
+    # Count query for pagination
+    total, total_estimated = await fetch_total(
+        f"""
+        FROM lessons l
+        JOIN courses c ON l.course_id = c.id
+        JOIN users u ON c.instructor_id = u.id
+        {where_clause}
+        """,
+        params,
+        total_mode
+    )
 
     # Build ORDER BY
-    order_clause = f"l.{sort_by} {sort_order.upper()}"
+    keyset = Keyset(
+        cursor, size, sort_by, f"l.{sort_by}", "l.id",
+        descending=sort_order == "desc", nullable=sort_by not in ("title", "sort_order")
+    )
+    where_clause, limit_clause = keyset.clauses(where_conditions, params, "limit", "offset")
 
     # Main query
     query = f"""
@@ -108,25 +138,15 @@ async def get_all_lessons(
             FROM lesson_progress
             GROUP BY lesson_id
         ) lp ON l.id = lp.lesson_id
-        WHERE {where_clause}
-        ORDER BY {order_clause}
-        LIMIT :limit OFFSET :offset
-    """
-
-    # Count query for pagination
-    count_query = f"""
-        SELECT COUNT(*) as total
-        FROM lessons l
-        JOIN courses c ON l.course_id = c.id
-        JOIN users u ON c.instructor_id = u.id
-        WHERE {where_clause}
+        {where_clause}
+        ORDER BY {keyset.order_by}
+        {limit_clause}
     """
 
     # Execute queries
     lessons = await database.fetch_all(query, values=params)
-    count_result = await database.fetch_one(count_query, values={k: v for k, v in params.items() if k not in ["offset", "limit"]})
+    lessons, next_cursor = keyset.page(lessons)
 
-    total = count_result.total if count_result else 0
     total_pages = (total + size - 1) // size
 
     # Transform results to match frontend expectations
@@ -169,7 +189,9 @@ async def get_all_lessons(
         total=total,
         page=page,
         size=size,
-        pages=total_pages
+        pages=total_pages,
+        next_cursor=next_cursor,
+        total_estimated=total_estimated
     )
 
 @router.get("/course/slug/{course_slug}", response_model=List[LessonResponse])
@@ -409,6 +431,7 @@ async def create_lesson(
 
         # Update course duration
         await update_course_duration(lesson.course_id)
+        await catalog_index.refresh_course(lesson.course_id)
 
         return LessonResponse(**new_lesson)
     except Exception as e:
@@ -484,6 +507,10 @@ async def update_lesson(
     if 'estimated_duration' in lesson_update.dict(exclude_unset=True) or 'video_duration' in update_dict:
         await update_course_duration(existing_lesson.course_id)
     
+    # Lesson titles are part of the catalog search index
+    if 'title' in update_dict or 'is_published' in update_dict:
+        await catalog_index.refresh_course(existing_lesson.course_id)
+    
     return LessonResponse(**updated_lesson)
 
 @router.delete("/{lesson_id}")
@@ -518,6 +545,7 @@ async def delete_lesson(
     
     # Update course duration
     await update_course_duration(existing_lesson.course_id)
+    await catalog_index.refresh_course(existing_lesson.course_id)
     
     return {"message": "Lesson deleted successfully"}
 
@@ -529,10 +557,17 @@ async def upload_video_temp(
     """Upload video file temporarily for lesson creation"""
     try:
         # Upload video file
-        video_result = await upload_video(file, "temp")
+        video_result = await upload_video(file, "temp", owner_id=current_user.id)
 
-        return {"video_url": video_result["url"], "message": "Video uploaded successfully"}
+        return {
+            "video_url": video_result["url"],
+            "media_id": video_result["media_id"],
+            "status": video_result["status"],
+            "message": "Video uploaded successfully"
+        }
 
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -568,29 +603,138 @@ async def upload_lesson_video(
     
     # Upload video file
     try:
-        video_url = await upload_video(file, f"lessons/{lesson_id}")
+        video_result = await file_upload_service.upload_video(file, f"lessons/{lesson_id}")
+        video_url = video_result["url"]
         
-        # Update lesson with video URL
+        # Update lesson with video URL before queueing processing: the worker
+        # only writes the duration while the lesson still has this URL
         update_query = """
             UPDATE lessons 
             SET video_url = :video_url, updated_at = NOW()
             WHERE id = :lesson_id
-            RETURNING *
         """
         
-        updated_lesson = await database.fetch_one(update_query, values={
+        await database.execute(update_query, values={
             "video_url": video_url,
             "lesson_id": lesson_id
         })
         
-        return {"video_url": video_url, "message": "Video uploaded successfully"}
+        processing = await queue_media_processing("video", video_result, current_user.id, lesson_id)
+        
+        return {
+            "video_url": video_url,
+            "media_id": processing["media_id"],
+            "status": processing["status"],
+            "message": "Video uploaded successfully"
+        }
         
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Failed to upload video: {str(e)}"
         )
 
+# Resumable video uploads: create a session, PUT its chunks (retrying or
+# resuming from GET's missing_chunks), then complete it. See
+# utils/resumable_upload.py.
+@router.post("/video-uploads")
+async def create_video_upload(
+    upload_data: ResumableUploadCreate,
+    current_user = Depends(require_instructor_or_admin)
+):
+    """Start a resumable video upload, for a lesson or for lesson creation"""
+    prefix = "temp"
+    target = {}
+    if upload_data.lesson_id:
+        lesson = await database.fetch_one("""
+            SELECT l.id, c.instructor_id
+            FROM lessons l
+            JOIN courses c ON l.course_id = c.id
+            WHERE l.id = :lesson_id
+        """, values={"lesson_id": upload_data.lesson_id})
+
+        if not lesson:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Lesson not found"
+            )
+
+        if current_user.role != "admin" and str(lesson.instructor_id) != str(current_user.id):
+            raise HTTPException(
+                status_code=status.HTTP_403_FORBIDDEN,
+                detail="Not authorized to upload video for this lesson"
+            )
+
+        prefix = f"lessons/{upload_data.lesson_id}"
+        target = {"lesson_id": str(upload_data.lesson_id)}
+
+    return await resumable_upload_service.create_session(
+        current_user.id, upload_data.filename, upload_data.content_type, upload_data.size,
+        prefix, ALLOWED_VIDEO_TYPES, MAX_RESUMABLE_VIDEO_SIZE, target
+    )
+
+@router.get("/video-uploads/{upload_id}")
+async def get_video_upload(
+    upload_id: str,
+    current_user = Depends(require_instructor_or_admin)
+):
+    """Received byte ranges and missing chunks of a resumable upload"""
+    session = await resumable_upload_service.get_session(upload_id, current_user)
+    return await resumable_upload_service.status(session)
+
+@router.put("/video-uploads/{upload_id}/chunks/{index}")
+async def put_video_upload_chunk(
+    upload_id: str,
+    index: int,
+    request: Request,
+    upload_offset: Optional[int] = Header(None),
+    current_user = Depends(require_instructor_or_admin)
+):
+    """Store one chunk (raw request body); the optional Upload-Offset header is checked against the index"""
+    session = await resumable_upload_service.get_session(upload_id, current_user)
+    return await resumable_upload_service.put_chunk(session, index, request.stream(), upload_offset)
+
+@router.post("/video-uploads/{upload_id}/complete")
+async def complete_video_upload(
+    upload_id: str,
+    current_user = Depends(require_instructor_or_admin)
+):
+    """Assemble a fully received upload and attach it to its lesson, if any"""
+    session = await resumable_upload_service.get_session(upload_id, current_user)
+    video_result = await resumable_upload_service.complete(session)
+    video_url = video_result["url"]
+
+    lesson_id = session["target"].get("lesson_id")
+    if lesson_id:
+        lesson_id = uuid.UUID(lesson_id)
+        await database.execute("""
+            UPDATE lessons
+            SET video_url = :video_url, updated_at = NOW()
+            WHERE id = :lesson_id
+        """, values={"video_url": video_url, "lesson_id": lesson_id})
+
+    processing = await queue_media_processing("video", video_result, current_user.id, lesson_id)
+
+    return {
+        "video_url": video_url,
+        "size": video_result["size"],
+        "media_id": processing["media_id"],
+        "status": processing["status"],
+        "message": "Video uploaded successfully"
+    }
+
+@router.delete("/video-uploads/{upload_id}")
+async def abort_video_upload(
+    upload_id: str,
+    current_user = Depends(require_instructor_or_admin)
+):
+    """Cancel a resumable upload and discard its chunks"""
+    session = await resumable_upload_service.get_session(upload_id, current_user)
+    await resumable_upload_service.abort(session)
+    return {"message": "Upload cancelled"}
+
 @router.post("/upload-audio-temp")
 async def upload_audio_temp(
     file: UploadFile = File(...),
@@ -669,9 +813,14 @@ async def upload_image_temp(
     """Upload image file temporarily for lesson creation"""
     try:
         # Upload image file
-        image_result = await upload_image(file, "temp/images")
+        image_result = await upload_image(file, "temp/images", owner_id=current_user.id)
 
-        return {"image_url": image_result["url"], "message": "Image uploaded successfully"}
+        return {
+            "image_url": image_result["url"],
+            "media_id": image_result["media_id"],
+            "status": image_result["status"],
+            "message": "Image uploaded successfully"
+        }
 
     except Exception as e:
         raise HTTPException(
@@ -709,9 +858,13 @@ async def upload_lesson_images(
     # Upload image files
     try:
         uploaded_urls = []
+        media_ids = []
         for file in files:
-            image_result = await upload_image(file, f"lessons/{lesson_id}/images")
+            image_result = await upload_image(
+                file, f"lessons/{lesson_id}/images", owner_id=current_user.id, lesson_id=lesson_id
+            )
             uploaded_urls.append(image_result["url"])
+            media_ids.append(image_result["media_id"])
 
         # For now, store the first image URL in video_url field
         # TODO: Update database schema to support multiple image URLs
@@ -728,7 +881,12 @@ async def upload_lesson_images(
                 "lesson_id": lesson_id
             })
 
-        return {"image_urls": uploaded_urls, "message": f"{len(uploaded_urls)} images uploaded successfully"}
+        return {
+            "image_urls": uploaded_urls,
+            "media_ids": media_ids,
+            "status": "processing",
+            "message": f"{len(uploaded_urls)} images uploaded successfully"
+        }
 
     except Exception as e:
         raise HTTPException(
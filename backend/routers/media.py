@@ -0,0 +1,38 @@
+from fastapi import APIRouter, Depends, HTTPException, status
+import uuid
+
+from middleware.auth import require_instructor_or_admin
+from utils.media_processing import media_status
+
+router = APIRouter()
+
+@router.get("/{media_id}")
+async def get_media(
+    media_id: uuid.UUID,
+    current_user = Depends(require_instructor_or_admin)
+):
+    """Processing status of an upload; thumbnails (variants) and metadata once ready"""
+    media = await media_status(media_id)
+
+    if not media:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Media not found"
+        )
+
+    if current_user.role != "admin" and str(media["owner_id"]) != str(current_user.id):
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Not authorized to view this media"
+        )
+
+    return {
+        "media_id": str(media["id"]),
+        "kind": media["kind"],
+        "url": media["url"],
+        "status": media["status"],
+        "metadata": media["metadata"],
+        "variants": media["variants"],
+        "error": media["error"],
+        "processed_at": media["processed_at"],
+    }
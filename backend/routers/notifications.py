@@ -6,16 +6,18 @@ from datetime import datetime
 from database.connection import database
 from models.schemas import (
     NotificationResponse, NotificationCreate, NotificationUpdate,
-    PaginationParams, PaginatedResponse, NotificationType
+    KeysetPaginationParams, PaginatedResponse, NotificationType
 )
 from middleware.auth import get_current_active_user, require_admin
 from utils.notifications import send_push_notification, send_email_notification
+from utils.broadcasts import create_broadcast, get_broadcast
+from utils.pagination import Keyset, fetch_total
 
 router = APIRouter()
 
 @router.get("/", response_model=PaginatedResponse)
 async def get_notifications(
-    pagination: PaginationParams = Depends(),
+    pagination: KeysetPaginationParams = Depends(),
     is_read: Optional[bool] = Query(None),
     type: Optional[NotificationType] = Query(None),
     current_user = Depends(get_current_active_user)
@@ -39,29 +41,32 @@ async def get_notifications(
     where_clause = "WHERE " + " AND ".join(where_conditions)
     
     # Get total count
-    count_query = f"""
-        SELECT COUNT(*) as total 
-        FROM notifications n {where_clause}
-    """
-    total_result = await database.fetch_one(count_query, values=values)
-    total = total_result.total
+    total, total_estimated = await fetch_total(
+        f"FROM notifications n {where_clause}", values, pagination.total_mode
+    )
+    
+    keyset = Keyset(pagination.cursor, pagination.size, "created_at", "n.created_at", "n.id")
+    where_clause, limit_clause = keyset.clauses(where_conditions, values)
     
     # Get notifications
     query = f"""
         SELECT n.* FROM notifications n
         {where_clause}
-        ORDER BY n.created_at DESC
-        LIMIT :size OFFSET :offset
+        ORDER BY {keyset.order_by}
+        {limit_clause}
     """
     
     notifications = await database.fetch_all(query, values=values)
+    notifications, next_cursor = keyset.page(notifications)
     
     return PaginatedResponse(
         items=[NotificationResponse(**notification) for notification in notifications],
         total=total,
         page=pagination.page,
         size=pagination.size,
-        pages=(total + pagination.size - 1) // pagination.size
+        pages=(total + pagination.size - 1) // pagination.size,
+        next_cursor=next_cursor,
+        total_estimated=total_estimated
     )
 
 @router.get("/unread-count")
@@ -184,68 +189,42 @@ async def create_notification(
     
     return NotificationResponse(**new_notification)
 
-@router.post("/broadcast")
+@router.post("/broadcast", status_code=status.HTTP_202_ACCEPTED)
 async def broadcast_notification(
     notification: NotificationCreate,
     user_ids: Optional[List[uuid.UUID]] = None,
     role: Optional[str] = Query(None),
     current_user = Depends(require_admin)
 ):
-    """Admin endpoint to broadcast notifications to multiple users"""
-    
-    # Determine target users
-    if user_ids:
-        target_users = user_ids
-    elif role:
-        # Get users by role
-        users_query = "SELECT id FROM users WHERE role = :role AND status = 'active'"
-        users = await database.fetch_all(users_query, values={"role": role})
-        target_users = [user.id for user in users]
-    else:
-        # Get all active users
-        users_query = "SELECT id FROM users WHERE status = 'active'"
-        users = await database.fetch_all(users_query)
-        target_users = [user.id for user in users]
+    """
+    Admin endpoint to broadcast notifications to multiple users; push
+    notifications are sent by a worker, poll GET /broadcasts/{broadcast_id}
+    for progress
+    """
+    
+    broadcast = await create_broadcast(notification, user_ids, role, current_user.id)
     
-    if not target_users:
+    if not broadcast:
         return {"message": "No target users found"}
     
-    # Create notifications for all target users
-    notifications_data = []
-    for user_id in target_users:
-        notification_id = uuid.uuid4()
-        notifications_data.append({
-            "id": notification_id,
-            "user_id": user_id,
-            "type": notification.type,
-            "title": notification.title,
-            "message": notification.message,
-            "data": notification.data,
-            "priority": notification.priority
-        })
-    
-    # Bulk insert notifications
-    if notifications_data:
-        query = """
-            INSERT INTO notifications (id, user_id, type, title, message, data, priority)
-            VALUES (:id, :user_id, :type, :title, :message, :data, :priority)
-        """
-        
-        await database.execute_many(query, notifications_data)
-        
-        # Send push notifications (async, don't wait for completion)
-        for user_id in target_users:
-            try:
-                await send_push_notification(
-                    user_id=user_id,
-                    title=notification.title,
-                    message=notification.message,
-                    data=notification.data
-                )
-            except Exception:
-                continue  # Continue with other notifications if one fails
-    
-    return {"message": f"Broadcast sent to {len(target_users)} users"}
+    return {"message": f"Broadcast sent to {broadcast['recipients']} users", **broadcast}
+
+@router.get("/broadcasts/{broadcast_id}")
+async def get_broadcast_status(
+    broadcast_id: uuid.UUID,
+    current_user = Depends(require_admin)
+):
+    """Admin endpoint for a broadcast's push delivery progress and stats"""
+    
+    broadcast = await get_broadcast(broadcast_id)
+    
+    if not broadcast:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Broadcast not found"
+        )
+    
+    return broadcast
 
 @router.get("/settings")
 async def get_notification_settings(current_user = Depends(get_current_active_user)):
@@ -1,4 +1,4 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, status, BackgroundTasks
 from typing import List, Optional
 import uuid
 from datetime import datetime
@@ -9,8 +9,10 @@ from models.schemas import (
     QuizAttemptResponse, CompletionStatus
 )
 from middleware.auth import get_current_active_user
-from utils.tokens import award_tokens
+from utils.tokens import award_tokens, award_tokens_bulk
 from utils.notifications import send_lesson_completion_notification
+from utils.progress_buffer import progress_buffer, PROGRESS_WRITE_BEHIND
+from utils.result_cache import invalidate_tags
 
 router = APIRouter()
 
@@ -101,154 +103,157 @@ async def get_course_progress(
 
     return [LessonProgressResponse(**p) for p in progress]
 
+# Single-statement progress pipeline: enrollment check, assessment status,
+# completion decision and upsert all happen in one round trip. The
+# `previous` CTE reads the row as it was before the upsert so the caller can
+# detect a transition into 'completed'.
+LESSON_PROGRESS_UPSERT_QUERY = """
+    WITH lesson AS (
+        SELECT l.id, l.course_id, l.title
+        FROM lessons l
+        JOIN course_enrollments ce ON l.course_id = ce.course_id
+        WHERE l.id = :lesson_id AND ce.user_id = :user_id AND ce.status = 'active'
+    ),
+    assessment AS (
+        -- A lesson is complete when every published quiz/assignment on it is done:
+        -- latest quiz attempt passed, latest assignment submission graded
+        SELECT
+            (q.id IS NULL OR COALESCE(qa.passed OR qa.score >= q.passing_score, false))
+            AND (a.id IS NULL OR COALESCE(sub.status = 'graded' OR sub.grade IS NOT NULL, false))
+                AS complete,
+            (qa.quiz_id IS NOT NULL OR sub.assignment_id IS NOT NULL) AS has_started
+        FROM lesson l
+        LEFT JOIN quizzes q ON q.lesson_id = l.id AND q.is_published = true
+        LEFT JOIN assignments a ON a.lesson_id = l.id AND a.is_published = true
+        LEFT JOIN LATERAL (
+            SELECT qa.quiz_id, qa.score, qa.passed
+            FROM quiz_attempts qa
+            WHERE qa.user_id = :user_id AND qa.quiz_id = q.id
+            ORDER BY qa.completed_at DESC
+            LIMIT 1
+        ) qa ON true
+        LEFT JOIN LATERAL (
+            SELECT sub.assignment_id, sub.grade, sub.status
+            FROM assignment_submissions sub
+            WHERE sub.user_id = :user_id AND sub.assignment_id = a.id
+            ORDER BY sub.submitted_at DESC
+            LIMIT 1
+        ) sub ON true
+        LIMIT 1
+    ),
+    decision AS (
+        SELECT
+            l.course_id,
+            CAST(CASE
+                WHEN s.complete THEN 'completed'
+                WHEN :progress_percentage > 0 OR s.has_started THEN 'in_progress'
+                ELSE 'not_started'
+            END AS completion_status) AS status,
+            CASE
+                WHEN s.complete THEN 100
+                -- Video watched but assessments pending: cap until they are done
+                WHEN :progress_percentage >= 100 THEN 95
+                ELSE :progress_percentage
+            END AS progress_percentage
+        FROM lesson l CROSS JOIN assessment s
+    ),
+    previous AS (
+        SELECT status FROM lesson_progress
+        WHERE user_id = :user_id AND lesson_id = :lesson_id
+    ),
+    upserted AS (
+        INSERT INTO lesson_progress AS lp (
+            user_id, lesson_id, course_id, status, progress_percentage,
+            time_spent, last_position, notes, started_at, completed_at
+        )
+        SELECT
+            CAST(:user_id AS UUID), CAST(:lesson_id AS UUID), d.course_id, d.status,
+            d.progress_percentage, COALESCE(:time_spent, 0), COALESCE(:last_position, 0),
+            CAST(:notes AS TEXT),
+            CASE WHEN d.status != 'not_started' THEN NOW() END,
+            CASE WHEN d.status = 'completed' THEN NOW() END
+        FROM decision d
+        ON CONFLICT (user_id, lesson_id) DO UPDATE SET
+            status = EXCLUDED.status,
+            progress_percentage = EXCLUDED.progress_percentage,
+            time_spent = COALESCE(:time_spent, lp.time_spent),
+            last_position = COALESCE(:last_position, lp.last_position),
+            notes = COALESCE(CAST(:notes AS TEXT), lp.notes),
+            started_at = CASE
+                WHEN EXCLUDED.status != 'not_started' THEN COALESCE(lp.started_at, NOW())
+                ELSE lp.started_at
+            END,
+            completed_at = CASE
+                WHEN EXCLUDED.status = 'completed' AND lp.status != 'completed' THEN NOW()
+                ELSE lp.completed_at
+            END,
+            updated_at = NOW()
+        RETURNING lp.*
+    )
+    SELECT u.id, u.user_id, u.lesson_id, u.course_id, u.status, u.started_at, u.completed_at,
+           COALESCE(u.time_spent, 0) AS time_spent,
+           COALESCE(u.progress_percentage, 0) AS progress_percentage,
+           COALESCE(u.last_position, 0) AS last_position,
+           u.notes, u.created_at, u.updated_at,
+           l.title AS lesson_title,
+           (SELECT status FROM previous) AS previous_status
+    FROM upserted u CROSS JOIN lesson l
+"""
+
 @router.put("/lesson/{lesson_id}", response_model=LessonProgressResponse)
 async def update_lesson_progress(
     lesson_id: uuid.UUID,
     progress_update: LessonProgressUpdate,
+    background_tasks: BackgroundTasks,
     current_user = Depends(get_current_active_user)
 ):
-    # Get lesson info and check enrollment
-    lesson_query = """
-        SELECT l.*, ce.id as enrollment_id
-        FROM lessons l
-        JOIN course_enrollments ce ON l.course_id = ce.course_id
-        WHERE l.id = :lesson_id AND ce.user_id = :user_id AND ce.status = 'active'
-    """
+    # Heartbeats that stay within the current status are coalesced in memory
+    if PROGRESS_WRITE_BEHIND:
+        buffered = await progress_buffer.absorb(
+            current_user.id,
+            lesson_id,
+            progress_update.progress_percentage or 0,
+            time_spent=progress_update.time_spent,
+            last_position=progress_update.last_position,
+            notes=progress_update.notes
+        )
+        if buffered is not None:
+            return LessonProgressResponse(**buffered)
 
-    lesson = await database.fetch_one(lesson_query, values={
+    updated_progress = await database.fetch_one(LESSON_PROGRESS_UPSERT_QUERY, values={
+        "user_id": current_user.id,
         "lesson_id": lesson_id,
-        "user_id": current_user.id
+        "progress_percentage": progress_update.progress_percentage or 0,
+        "time_spent": progress_update.time_spent,
+        "last_position": progress_update.last_position,
+        "notes": progress_update.notes,
     })
 
-    if not lesson:
+    if not updated_progress:
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="Lesson not found or not enrolled in course"
         )
 
-    # Check assessment completion status
-    assessment_status = await check_lesson_assessment_completion(current_user.id, lesson_id)
-
-    # Check if progress record exists
-    existing_query = """
-        SELECT * FROM lesson_progress
-        WHERE user_id = :user_id AND lesson_id = :lesson_id
-    """
-    existing_progress = await database.fetch_one(existing_query, values={
-        "user_id": current_user.id,
-        "lesson_id": lesson_id
-    })
-
-    # Determine completion status based on video progress AND assessments
-    video_progress = progress_update.progress_percentage if progress_update.progress_percentage is not None else 0
-    assessment_complete = assessment_status['overall_complete']
-
-    # Use string values directly instead of enum
-    status_string = "not_started"
-    final_progress_percentage = video_progress
-
-    if video_progress > 0 or assessment_status['has_started']:
-        status_string = "in_progress"
-
-    # Lesson is complete if video is watched AND all assessments are complete
-    if video_progress >= 100 and assessment_complete:
-        status_string = "completed"
-        final_progress_percentage = 100
-    elif video_progress >= 100 and not assessment_complete:
-        # Video complete but assessments pending
-        final_progress_percentage = min(95, video_progress)  # Cap at 95% until assessments done
-    elif assessment_complete and video_progress < 100:
-        # Assessments done but video not complete - allow completion anyway
-        status_string = "completed"
-        final_progress_percentage = 100
-
-    if existing_progress:
-        # Update existing progress
-        # Always update status and progress percentage
-        update_fields = [
-            "status = CAST(:status AS completion_status)",
-            "progress_percentage = :progress_percentage",
-        ]
-        values = {
-            "user_id": str(current_user.id),
-            "lesson_id": str(lesson_id),
-            "status": status_string,
-            "progress_percentage": int(final_progress_percentage),
-        }
-
-        # Optional fields from payload
-        for field, value in progress_update.dict(exclude_unset=True).items():
-            if field and value is not None and field not in ("progress_percentage",):
-                update_fields.append(f"{field} = :{field}")
-                values[field] = value
-
-        # Set timestamps based on status transitions
-        if (status_string == "completed" and existing_progress.status != "completed"):
-            update_fields.append("completed_at = NOW()")
-            update_fields.append("started_at = COALESCE(started_at, NOW())")
-        elif status_string == "in_progress" and existing_progress.status == "not_started":
-            update_fields.append("started_at = NOW()")
-
-        query = f"""
-            UPDATE lesson_progress
-            SET {', '.join(update_fields)}, updated_at = NOW()
-            WHERE user_id = :user_id AND lesson_id = :lesson_id
-            RETURNING id, user_id, lesson_id, course_id, status, started_at, completed_at,
-                      COALESCE(time_spent, 0) AS time_spent,
-                      COALESCE(progress_percentage, 0) AS progress_percentage,
-                      COALESCE(last_position, 0) AS last_position,
-                      notes, created_at, updated_at
-        """
-
-        updated_progress = await database.fetch_one(query, values=values)
-    else:
-        # Create new progress record
-        progress_id = uuid.uuid4()
-
-        query = """
-            INSERT INTO lesson_progress (
-                id, user_id, lesson_id, course_id, status, progress_percentage,
-                time_spent, last_position, notes, started_at, completed_at
-            )
-            VALUES (
-                :id, :user_id, :lesson_id, :course_id, CAST(:status AS completion_status), :progress_percentage,
-                COALESCE(:time_spent, 0), COALESCE(:last_position, 0), :notes,
-                CASE WHEN CAST(:status AS completion_status) != 'not_started'::completion_status THEN NOW() END,
-                CASE WHEN CAST(:status AS completion_status) = 'completed'::completion_status THEN NOW() END
-            )
-            RETURNING *
-        """
-
-        values = {
-            "id": str(progress_id),
-            "user_id": str(current_user.id),
-            "lesson_id": str(lesson_id),
-            "course_id": str(lesson.course_id),
-            "status": status_string,  # Use string directly
-            "progress_percentage": int(final_progress_percentage),
-            **progress_update.dict()
-        }
-
-        updated_progress = await database.fetch_one(query, values=values)
-
-    # Award tokens if lesson just completed
-    if (status_string == "completed" and
-        (not existing_progress or existing_progress.status != "completed")):
-
-        await award_tokens(
-            user_id=current_user.id,
-            amount=10.0,
-            description=f"Completed lesson: {lesson.title}",
-            reference_type="lesson_completed",
-            reference_id=lesson_id
+    if PROGRESS_WRITE_BEHIND:
+        await progress_buffer.remember(dict(updated_progress))
+
+    # Engagement analytics count lesson starts and completions; heartbeats
+    # within a status are left to the cache TTL
+    if updated_progress.status != updated_progress.previous_status:
+        await invalidate_tags("progress")
+
+    # Completion side-effects run after the response has been sent
+    if (updated_progress.status == "completed" and
+        updated_progress.previous_status != "completed"):
+        background_tasks.add_task(
+            process_lesson_completion,
+            current_user.id,
+            lesson_id,
+            updated_progress.lesson_title,
+            updated_progress.course_id
         )
 
-        # Send completion notification
-        await send_lesson_completion_notification(current_user.id, lesson.title, lesson.course_id)
-
-        # Update course progress
-        await update_course_progress(current_user.id, lesson.course_id)
-
     return LessonProgressResponse(**updated_progress)
 
 @router.post("/quiz/attempt", response_model=QuizAttemptResponse)
@@ -340,6 +345,10 @@ async def submit_quiz_attempt(
     }
     
     new_attempt = await database.fetch_one(insert_query, values=values)
+
+    # A new attempt can complete (or reopen) the lesson it belongs to
+    if quiz.lesson_id:
+        await progress_buffer.forget(current_user.id, quiz.lesson_id)
     
     # Award tokens if passed
     if passed:
@@ -390,6 +399,26 @@ async def get_quiz_attempts(
     
     return [QuizAttemptResponse(**attempt) for attempt in attempts]
 
+async def process_lesson_completion(
+    user_id: uuid.UUID,
+    lesson_id: uuid.UUID,
+    lesson_title: str,
+    course_id: uuid.UUID
+):
+    """Award tokens, notify and roll up course progress for a completed lesson"""
+
+    try:
+        # Idempotent, so a lesson that is reopened and completed again pays out once
+        await award_tokens_bulk([
+            (user_id, 10.0, f"Completed lesson: {lesson_title}", "lesson_completed", lesson_id)
+        ])
+
+        await send_lesson_completion_notification(user_id, lesson_title, course_id)
+
+        await update_course_progress(user_id, course_id)
+    except Exception as e:
+        print(f"Lesson completion processing failed: {e}")
+
 async def update_course_progress(user_id: uuid.UUID, course_id: uuid.UUID):
     """Update overall course progress based on lesson completions"""
     
@@ -432,124 +461,15 @@ async def update_course_progress(user_id: uuid.UUID, course_id: uuid.UUID):
     
     # If course completed, award bonus tokens and issue certificate
     if progress_percentage >= 100:
-        # Check if already awarded completion bonus
-        existing_bonus_query = """
-            SELECT id FROM token_transactions 
-            WHERE user_id = :user_id AND reference_type = 'course_completed' 
-            AND reference_id = :course_id
-        """
-        existing_bonus = await database.fetch_one(existing_bonus_query, values={
-            "user_id": user_id,
-            "course_id": course_id
-        })
+        # Award the completion bonus once; only the first award issues the certificate
+        bonus = await award_tokens_bulk([
+            (user_id, 50.0, "Course completion bonus", "course_completed", course_id)
+        ])
         
-        if not existing_bonus:
-            # Award course completion bonus
-            await award_tokens(
-                user_id=user_id,
-                amount=50.0,
-                description="Course completion bonus",
-                reference_type="course_completed",
-                reference_id=course_id
-            )
-            
+        if bonus["success"] and bonus["awarded"]:
             # Issue certificate (this would trigger blockchain minting in production)
             await issue_certificate(user_id, course_id)
 
-async def check_lesson_assessment_completion(user_id: uuid.UUID, lesson_id: uuid.UUID):
-    """
-    Check if user has completed all required assessments for a lesson.
-    Returns dict with completion status for quizzes, assignments, and overall.
-    """
-
-    # Get lesson assessment requirements - check for existence of related records
-    assessment_query = """
-        SELECT
-               q.id as quiz_id, q.passing_score as quiz_passing_score,
-               a.id as assignment_id
-        FROM lessons l
-        LEFT JOIN quizzes q ON q.lesson_id = l.id AND q.is_published = true
-        LEFT JOIN assignments a ON a.lesson_id = l.id AND a.is_published = true
-        WHERE l.id = :lesson_id
-    """
-    lesson = await database.fetch_one(assessment_query, values={"lesson_id": lesson_id})
-
-    if not lesson:
-        return {
-            'has_quiz': False,
-            'has_assignment': False,
-            'quiz_complete': True,  # No quiz required
-            'assignment_complete': True,  # No assignment required
-            'overall_complete': True,
-            'has_started': False
-        }
-
-    # Lesson has assessments if related records exist
-    has_quiz = lesson.quiz_id is not None
-    has_assignment = lesson.assignment_id is not None
-    has_started = False
-
-    # Check quiz completion
-    quiz_complete = True
-    if has_quiz:
-        quiz_attempt_query = """
-            SELECT qa.score, qa.passed, q.passing_score
-            FROM quiz_attempts qa
-            JOIN quizzes q ON qa.quiz_id = q.id
-            WHERE qa.user_id = :user_id AND qa.quiz_id = :quiz_id
-            ORDER BY qa.completed_at DESC
-            LIMIT 1
-        """
-        latest_attempt = await database.fetch_one(quiz_attempt_query, values={
-            "user_id": user_id,
-            "quiz_id": lesson.quiz_id
-        })
-
-        if latest_attempt:
-            has_started = True
-            quiz_complete = latest_attempt.passed or latest_attempt.score >= lesson.quiz_passing_score
-        else:
-            quiz_complete = False  # Quiz exists but not attempted
-
-    # Check assignment completion
-    assignment_complete = True
-    if has_assignment:
-        assignment_submission_query = """
-            SELECT sub.grade, sub.status, a.max_points
-            FROM assignment_submissions sub
-            JOIN assignments a ON sub.assignment_id = a.id
-            WHERE sub.user_id = :user_id AND sub.assignment_id = :assignment_id
-            ORDER BY sub.submitted_at DESC
-            LIMIT 1
-        """
-        latest_submission = await database.fetch_one(assignment_submission_query, values={
-            "user_id": user_id,
-            "assignment_id": lesson.assignment_id
-        })
-
-        if latest_submission:
-            has_started = True
-            # Assignment is complete if submitted and graded (or if grading not required)
-            assignment_complete = latest_submission.status == 'graded' or latest_submission.grade is not None
-        else:
-            assignment_complete = False  # Assignment exists but not submitted
-
-    # Overall completion: all required assessments must be complete
-    overall_complete = True
-    if has_quiz and not quiz_complete:
-        overall_complete = False
-    if has_assignment and not assignment_complete:
-        overall_complete = False
-
-    return {
-        'has_quiz': has_quiz,
-        'has_assignment': has_assignment,
-        'quiz_complete': quiz_complete,
-        'assignment_complete': assignment_complete,
-        'overall_complete': overall_complete,
-        'has_started': has_started
-    }
-
 async def issue_certificate(user_id: uuid.UUID, course_id: uuid.UUID):
     """Issue NFT certificate for course completion"""
 
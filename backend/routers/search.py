@@ -0,0 +1,152 @@
+from fastapi import APIRouter, Depends, Query
+from typing import Dict, Any, List, Optional
+
+from database.connection import database
+from middleware.auth import get_current_active_user
+from utils.search import TextSearch, render_highlight
+
+router = APIRouter()
+
+SEARCH_TYPES = ["courses", "lessons", "assignments", "categories", "users"]
+STAFF_ROLES = ["instructor", "admin"]
+
+def _visible_courses(current_user, values: Dict[str, Any]) -> Optional[str]:
+    """Courses outside the user's reach are limited to published ones"""
+    if current_user.role == "admin":
+        return None
+    values["user_id"] = current_user.id
+    return "(c.status = 'published' OR c.instructor_id = :user_id)"
+
+async def _search_courses(text_search: TextSearch, current_user, limit: int) -> List[Dict[str, Any]]:
+    values = {"limit": limit}
+    conditions = [text_search.matches_document("d.document", values)]
+    visibility = _visible_courses(current_user, values)
+    if visibility:
+        conditions.append(visibility)
+
+    query = f"""
+        SELECT c.id, c.title, c.slug, c.status, c.thumbnail_url,
+               {text_search.rank("d.document", values)} as rank,
+               {text_search.highlight("c.title", values)} as title_highlight,
+               {text_search.highlight("COALESCE(c.short_description, c.description)", values)} as snippet
+        FROM courses c
+        JOIN course_search_documents d ON d.course_id = c.id
+        WHERE {" AND ".join(conditions)}
+        ORDER BY rank DESC, c.created_at DESC
+        LIMIT :limit
+    """
+    return await database.fetch_all(query, values=values)
+
+async def _search_lessons(text_search: TextSearch, current_user, limit: int) -> List[Dict[str, Any]]:
+    values = {"limit": limit}
+    conditions = [text_search.matches_document("d.document", values)]
+    if current_user.role != "admin":
+        values["user_id"] = current_user.id
+        conditions.append("((c.status = 'published' AND l.is_published = true) OR c.instructor_id = :user_id)")
+
+    query = f"""
+        SELECT l.id, l.title, l.slug, l.type, l.course_id, c.title as course_title, c.slug as course_slug,
+               {text_search.rank("d.document", values)} as rank,
+               {text_search.highlight("l.title", values)} as title_highlight,
+               {text_search.highlight("l.description", values)} as snippet
+        FROM lessons l
+        JOIN lesson_search_documents d ON d.lesson_id = l.id
+        JOIN courses c ON l.course_id = c.id
+        WHERE {" AND ".join(conditions)}
+        ORDER BY rank DESC, l.created_at DESC
+        LIMIT :limit
+    """
+    return await database.fetch_all(query, values=values)
+
+async def _search_assignments(text_search: TextSearch, current_user, limit: int) -> List[Dict[str, Any]]:
+    if current_user.role not in STAFF_ROLES:
+        return []
+
+    values = {"limit": limit}
+    conditions = [text_search.matches_document("d.document", values)]
+    if current_user.role != "admin":
+        values["user_id"] = current_user.id
+        conditions.append("c.instructor_id = :user_id")
+
+    query = f"""
+        SELECT a.id, a.title, a.due_date, a.course_id, a.lesson_id, c.title as course_title,
+               {text_search.rank("d.document", values)} as rank,
+               {text_search.highlight("a.title", values)} as title_highlight,
+               {text_search.highlight("a.description", values)} as snippet
+        FROM assignments a
+        JOIN assignment_search_documents d ON d.assignment_id = a.id
+        JOIN courses c ON a.course_id = c.id
+        WHERE {" AND ".join(conditions)}
+        ORDER BY rank DESC, a.created_at DESC
+        LIMIT :limit
+    """
+    return await database.fetch_all(query, values=values)
+
+async def _search_categories(text_search: TextSearch, current_user, limit: int) -> List[Dict[str, Any]]:
+    values = {"limit": limit}
+    query = f"""
+        SELECT c.id, c.name as title, c.slug,
+               {text_search.rank("d.document", values)} as rank,
+               {text_search.highlight("c.name", values)} as title_highlight,
+               {text_search.highlight("c.description", values)} as snippet
+        FROM categories c
+        JOIN category_search_documents d ON d.category_id = c.id
+        WHERE c.is_active = true AND {text_search.matches_document("d.document", values)}
+        ORDER BY rank DESC, c.name
+        LIMIT :limit
+    """
+    return await database.fetch_all(query, values=values)
+
+async def _search_users(text_search: TextSearch, current_user, limit: int) -> List[Dict[str, Any]]:
+    if current_user.role != "admin":
+        return []
+
+    values = {"limit": limit}
+    full_name = "u.first_name || ' ' || u.last_name"
+    query = f"""
+        SELECT u.id, {full_name} as title, u.email, u.username, u.role, u.status,
+               {text_search.similarity(values, full_name, "u.email", "u.username")} as rank
+        FROM users u
+        WHERE {text_search.contains(values, full_name, "u.first_name", "u.last_name", "u.email", "u.username")}
+        ORDER BY rank DESC, u.created_at DESC
+        LIMIT :limit
+    """
+    return await database.fetch_all(query, values=values)
+
+SEARCHERS = {
+    "courses": _search_courses,
+    "lessons": _search_lessons,
+    "assignments": _search_assignments,
+    "categories": _search_categories,
+    "users": _search_users,
+}
+
+@router.get("/")
+async def search(
+    q: str = Query(..., min_length=1),
+    types: Optional[str] = Query(None, description="Comma-separated subset of: " + ", ".join(SEARCH_TYPES)),
+    limit: int = Query(10, ge=1, le=50),
+    current_user = Depends(get_current_active_user)
+):
+    """
+    Ranked search across courses, lessons, assignments, categories and users.
+    Words match as prefixes; highlights wrap matches in <mark> and are HTML-escaped.
+    """
+    requested = [t.strip() for t in types.split(",")] if types else SEARCH_TYPES
+    text_search = TextSearch(q)
+
+    results = {}
+    for search_type in requested:
+        if search_type not in SEARCHERS:
+            continue
+        rows = await SEARCHERS[search_type](text_search, current_user, limit)
+        items = []
+        for row in rows:
+            item = dict(row)
+            item["rank"] = float(item["rank"])
+            item["title_highlight"] = render_highlight(item.get("title_highlight"))
+            item["snippet"] = render_highlight(item.get("snippet"))
+            items.append(item)
+        results[search_type] = items
+
+    return {"query": q, "results": results}
@@ -1,4 +1,4 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Query
+from fastapi import APIRouter, Depends, HTTPException, status, Query, Response
 from typing import List, Optional
 import uuid
 
@@ -7,19 +7,26 @@ from models.schemas import (
     UserResponse, UserUpdate, UserProfile, TokenBalance, 
     TokenTransaction, PaginationParams, PaginatedResponse, UserCreate, AdminUserResponse
 )
-from middleware.auth import get_current_active_user, require_admin, get_password_hash, get_user_by_email
+from middleware.auth import (
+    get_current_active_user, get_current_active_user_record, require_admin,
+    get_password_hash, get_user_by_email, revoke_user_tokens
+)
+from utils.user_cache import invalidate_user
+from utils.result_cache import invalidate_tags
+from utils.pagination import Keyset
+from utils.search import TextSearch
 
 router = APIRouter()
 
 @router.get("/me", response_model=UserResponse)
-async def get_current_user_profile(current_user=Depends(get_current_active_user)):
+async def get_current_user_profile(current_user=Depends(get_current_active_user_record)):
     return current_user
 
 
 @router.put("/me", response_model=UserResponse)
 async def update_current_user(
     user_update: UserUpdate,
-    current_user=Depends(get_current_active_user)
+    current_user=Depends(get_current_active_user_record)
 ):
     update_fields = []
     values = {"user_id": current_user.id}
@@ -41,6 +48,7 @@ async def update_current_user(
     """
 
     updated_user = await database.fetch_one(query, values=values)
+    await invalidate_user(current_user.id)
 
     if not updated_user:
         raise HTTPException(
@@ -106,6 +114,9 @@ async def update_user_profile(
         """
         updated_profile = await database.fetch_one(query, values=values)
     
+    # Profile columns are part of the cached principal
+    await invalidate_user(current_user.id)
+
     return UserProfile(**updated_profile)
 
 @router.get("/me/tokens", response_model=TokenBalance)
@@ -126,24 +137,34 @@ async def get_token_balance(current_user = Depends(get_current_active_user)):
 
 @router.get("/me/tokens/transactions", response_model=List[TokenTransaction])
 async def get_token_transactions(
+    response: Response,
     current_user = Depends(get_current_active_user),
     page: int = Query(1, ge=1),
-    size: int = Query(20, ge=1, le=100)
+    size: int = Query(20, ge=1, le=100),
+    cursor: Optional[str] = Query(None)
 ):
+    """With cursor set (empty for the first page), the next cursor is returned in X-Next-Cursor"""
     offset = (page - 1) * size
+    values = {
+        "user_id": current_user.id,
+        "size": size,
+        "offset": offset
+    }
     
-    query = """
+    keyset = Keyset(cursor, size, "created_at", "created_at", "id")
+    where_clause, limit_clause = keyset.clauses(["user_id = :user_id"], values)
+    
+    query = f"""
         SELECT * FROM token_transactions 
-        WHERE user_id = :user_id 
-        ORDER BY created_at DESC 
-        LIMIT :size OFFSET :offset
+        {where_clause}
+        ORDER BY {keyset.order_by}
+        {limit_clause}
     """
     
-    transactions = await database.fetch_all(query, values={
-        "user_id": current_user.id,
-        "size": size,
-        "offset": offset
-    })
+    transactions = await database.fetch_all(query, values=values)
+    transactions, next_cursor = keyset.page(transactions)
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
     
     return [TokenTransaction(**transaction) for transaction in transactions]
 
@@ -191,13 +212,9 @@ async def get_users(
         values["status"] = status
 
     if search:
-        where_conditions.append(
-            """
-            (u.first_name ILIKE :search OR u.last_name ILIKE :search OR 
-             u.email ILIKE :search OR u.username ILIKE :search)
-            """
-        )
-        values["search"] = f"%{search}%"
+        where_conditions.append(TextSearch(search).contains(
+            values, "u.first_name", "u.last_name", "u.email", "u.username"
+        ))
 
     where_clause = "WHERE " + " AND ".join(where_conditions) if where_conditions else ""
 
@@ -259,6 +276,7 @@ async def update_user_status(
         "status": status,
         "user_id": user_id
     })
+    await revoke_user_tokens(user_id)
     
     if not updated_user:
         raise HTTPException(
@@ -279,6 +297,7 @@ async def update_user_status(
         "description": f"Changed user status to {status}"
     })
     
+    await invalidate_tags("users")
     return {"message": f"User status updated to {status}"}
 
 @router.delete("/{user_id}")
@@ -303,6 +322,7 @@ async def delete_user(
     """
     
     await database.execute(query, values={"user_id": user_id})
+    await revoke_user_tokens(user_id)
     
     # Log admin action
     log_query = """
@@ -315,4 +335,5 @@ async def delete_user(
         "target_id": user_id
     })
     
+    await invalidate_tags("users")
     return {"message": "User deleted successfully"}
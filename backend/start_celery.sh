@@ -47,7 +47,12 @@ echo "Press Ctrl+C to stop"
 echo ""
 
 # Start Celery worker with auto-reload for development
-celery -A celery_app worker --loglevel=info --pool=solo
+# --beat also runs the periodic tasks (analytics rollups); in production run
+# a single separate beat process instead: celery -A celery_app beat
+# -Q also takes the media and blockchain queues; in production give them their own workers:
+# celery -A celery_app worker -Q media -n media@%h --concurrency=2 --prefetch-multiplier=1
+# celery -A celery_app worker -Q blockchain -n blockchain@%h --concurrency=1
+celery -A celery_app worker --beat --loglevel=info --pool=solo -Q celery,media,blockchain
 
 # Note: --pool=solo is used for macOS compatibility
 # For production on Linux, remove --pool=solo for better performance
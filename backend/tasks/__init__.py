@@ -10,6 +10,15 @@ from tasks.email_tasks import (
     send_email_verification_task,
     send_two_factor_auth_email_task,
 )
+from tasks.analytics_tasks import update_analytics_rollups_task, update_cohort_retention_task
+from tasks.media_tasks import process_image_task, process_video_task
+from tasks.blockchain_tasks import (
+    submit_mint_task,
+    submit_mint_batch_task,
+    poll_mint_receipts_task,
+    refresh_certificate_verifications_task,
+)
+from tasks.notification_tasks import send_push_broadcast_task
 
 __all__ = [
     'send_welcome_email_task',
@@ -20,4 +29,13 @@ __all__ = [
     'send_password_reset_email_task',
     'send_email_verification_task',
     'send_two_factor_auth_email_task',
+    'update_analytics_rollups_task',
+    'update_cohort_retention_task',
+    'process_image_task',
+    'process_video_task',
+    'submit_mint_task',
+    'submit_mint_batch_task',
+    'poll_mint_receipts_task',
+    'refresh_certificate_verifications_task',
+    'send_push_broadcast_task',
 ]
@@ -0,0 +1,43 @@
+"""
+Celery tasks for analytics maintenance
+
+Thin wrappers around utils/analytics_rollups.py and utils/cohort_retention.py,
+run on the beat schedule in celery_app.py. That code is async, so each task
+runs it on its own event loop with its own database connection.
+"""
+import asyncio
+
+from celery_app import celery_app
+from tasks.runtime import run_once
+from utils.analytics_rollups import run_rollups
+from utils.cohort_retention import update_cohort_retention
+
+
+@celery_app.task(bind=True, max_retries=3, default_retry_delay=60)
+def update_analytics_rollups_task(self):
+    """
+    Celery task that brings course_analytics_daily and user_analytics_daily
+    up to yesterday, recomputing only days with new or changed rows
+    """
+    try:
+        result = asyncio.run(run_once(run_rollups))
+        print(f"[Celery] Analytics rollups: {result}")
+        return result
+    except Exception as e:
+        print(f"[Celery] Analytics rollup failed: {e}")
+        raise self.retry(exc=e)
+
+
+@celery_app.task(bind=True, max_retries=3, default_retry_delay=60)
+def update_cohort_retention_task(self):
+    """
+    Celery task that applies users, sessions and lesson progress changed
+    since the last run to the cohort retention matrix
+    """
+    try:
+        result = asyncio.run(run_once(update_cohort_retention))
+        print(f"[Celery] Cohort retention: {result}")
+        return result
+    except Exception as e:
+        print(f"[Celery] Cohort retention update failed: {e}")
+        raise self.retry(exc=e)
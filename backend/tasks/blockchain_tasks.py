@@ -0,0 +1,90 @@
+"""
+Celery tasks for certificate NFT minting
+
+Thin wrappers around utils/minting.py. They are routed to the 'blockchain'
+queue (see celery_app.py), worked by a single dedicated worker, so
+transactions from the minting account are signed and sent one at a time.
+The verification refresher only reads the chain and runs on the default queue.
+"""
+import asyncio
+import redis.asyncio as aioredis
+
+from celery_app import celery_app
+from tasks.runtime import run_once
+from utils.certificate_verification import CertificateVerificationCache, refresh_minted_verifications
+from utils.redis_client import REDIS_URL
+from utils.minting import submit_mint, submit_mint_batch, poll_mint_receipts, mark_mint_failed
+
+
+@celery_app.task(bind=True, max_retries=5, default_retry_delay=30)
+def submit_mint_task(self, job_id: str):
+    """
+    Celery task that signs and sends a certificate's mint transaction; the
+    receipt is picked up by poll_mint_receipts_task
+    """
+    try:
+        result = asyncio.run(run_once(lambda: submit_mint(job_id)))
+        print(f"[Celery] Mint job {job_id}: {result['status']}")
+        return result
+    except Exception as e:
+        print(f"[Celery] Mint job {job_id} failed: {e}")
+        if self.request.retries >= self.max_retries:
+            err = str(e)
+            asyncio.run(run_once(lambda: mark_mint_failed(job_id, err)))
+            raise
+        raise self.retry(exc=e)
+
+
+@celery_app.task(bind=True, max_retries=5, default_retry_delay=30)
+def submit_mint_batch_task(self, job_ids: list):
+    """
+    Celery task that mints a cohort's certificates, many to a transaction,
+    sending every transaction without waiting for the one before
+    """
+    try:
+        result = asyncio.run(run_once(lambda: submit_mint_batch(job_ids)))
+        print(f"[Celery] Mint batch of {len(job_ids)}: {result}")
+        return result
+    except Exception as e:
+        print(f"[Celery] Mint batch of {len(job_ids)} failed: {e}")
+        if self.request.retries >= self.max_retries:
+            err = str(e)
+
+            async def fail_all():
+                for job_id in job_ids:
+                    await mark_mint_failed(job_id, err)
+            asyncio.run(run_once(fail_all))
+            raise
+        raise self.retry(exc=e)
+
+
+@celery_app.task
+def poll_mint_receipts_task():
+    """
+    Celery task that records the receipts of submitted mint transactions,
+    re-broadcasts dropped ones and re-queues stalled jobs
+    """
+    result = asyncio.run(run_once(poll_mint_receipts))
+    if any(result.values()):
+        print(f"[Celery] Mint receipts: {result}")
+    return result
+
+
+@celery_app.task
+def refresh_certificate_verifications_task():
+    """
+    Celery task that re-checks minted certificates on chain and refreshes
+    their cached verify responses
+    """
+    async def refresh():
+        # The shared asyncio client is bound to the API's event loop; each
+        # run gets its own
+        client = aioredis.from_url(REDIS_URL, decode_responses=True)
+        try:
+            return await refresh_minted_verifications(cache=CertificateVerificationCache(client=client))
+        finally:
+            await client.aclose()
+
+    result = asyncio.run(run_once(refresh))
+    print(f"[Celery] Certificate verifications: {result}")
+    return result
@@ -0,0 +1,44 @@
+"""
+Celery tasks for media processing
+
+Thin wrappers around utils/media_processing.py. They are routed to the
+'media' queue (see celery_app.py), which has its own worker pool so that
+thumbnailing and ffprobe never delay emails or analytics.
+"""
+import asyncio
+
+from celery_app import celery_app
+from tasks.runtime import run_once
+from utils.media_processing import process_media, mark_media_failed
+
+
+def _process(task, media_id: str, label: str):
+    try:
+        result = asyncio.run(run_once(lambda: process_media(media_id)))
+        print(f"[Celery] {label} {media_id}: {result['status']}")
+        return {"status": result["status"], "media_id": media_id}
+    except Exception as e:
+        print(f"[Celery] {label} {media_id} failed: {e}")
+        if task.request.retries >= task.max_retries:
+            err = str(e)
+            asyncio.run(run_once(lambda: mark_media_failed(media_id, err)))
+            raise
+        raise task.retry(exc=e)
+
+
+@celery_app.task(bind=True, max_retries=2, default_retry_delay=30)
+def process_image_task(self, media_id: str):
+    """
+    Celery task that renders the thumbnails of an uploaded image, every
+    size as JPEG and WebP from one decode
+    """
+    return _process(self, media_id, "Image processing")
+
+
+@celery_app.task(bind=True, max_retries=2, default_retry_delay=30, time_limit=600, soft_time_limit=540)
+def process_video_task(self, media_id: str):
+    """
+    Celery task that extracts an uploaded video's metadata with ffprobe and
+    copies its duration to the lesson
+    """
+    return _process(self, media_id, "Video processing")
@@ -0,0 +1,29 @@
+"""
+Celery tasks for notification fan-out
+
+Thin wrappers around utils/broadcasts.py, on the default queue.
+"""
+import asyncio
+
+from celery_app import celery_app
+from tasks.runtime import run_once
+from utils.broadcasts import send_push_broadcast, mark_broadcast_failed
+
+
+@celery_app.task(bind=True, max_retries=5, default_retry_delay=30)
+def send_push_broadcast_task(self, broadcast_id: str):
+    """
+    Celery task that sends a broadcast's push notifications in multicast
+    batches; a retry resumes after the last page recorded as sent
+    """
+    try:
+        result = asyncio.run(run_once(lambda: send_push_broadcast(broadcast_id)))
+        print(f"[Celery] Push broadcast {broadcast_id}: {result}")
+        return result
+    except Exception as e:
+        print(f"[Celery] Push broadcast {broadcast_id} failed: {e}")
+        if self.request.retries >= self.max_retries:
+            err = str(e)
+            asyncio.run(run_once(lambda: mark_broadcast_failed(broadcast_id, err)))
+            raise
+        raise self.retry(exc=e)
@@ -0,0 +1,16 @@
+"""
+Shared helper for Celery tasks that run async code
+
+Each task calls asyncio.run, so it gets a fresh event loop; the database
+connection pool belongs to that loop and is opened and closed around the job.
+"""
+from database.connection import database
+
+
+async def run_once(job):
+    """Run the coroutine function `job` with the database connected for it"""
+    await database.connect()
+    try:
+        return await job()
+    finally:
+        await database.disconnect()
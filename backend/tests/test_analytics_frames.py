@@ -0,0 +1,135 @@
+"""
+Benchmark for the columnar analytics (utils/analytics_frames.py)
+
+Computes lesson performance and course health for the N courses with the
+most lessons, once with the per-course queries and Python loops that
+utils/analytics.py used before, once with the columnar versions, checks that
+the shared fields agree and prints both timings.
+
+Usage (from the backend directory, with DATABASE_URL pointing at a test DB):
+    python tests/test_analytics_frames.py [courses]
+"""
+import sys
+import os
+import asyncio
+import time
+
+# Add backend to path
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from database.connection import database
+from utils.analytics import AnalyticsCalculator
+from utils.analytics_frames import lesson_performance, course_health_scores
+
+
+async def per_row_lesson_performance(course_id):
+    lessons = await database.fetch_all("""
+        SELECT
+            l.id, l.sort_order,
+            COUNT(lp.id) as total_views,
+            COUNT(CASE WHEN lp.status = 'completed' THEN 1 END) as completions,
+            COALESCE(AVG(lp.time_spent), 0) as avg_time_spent,
+            COALESCE(MIN(lp.time_spent), 0) as min_time_spent,
+            COALESCE(MAX(lp.time_spent), 0) as max_time_spent
+        FROM lessons l
+        LEFT JOIN lesson_progress lp ON l.id = lp.lesson_id
+        WHERE l.course_id = :course_id AND l.is_published = true
+        GROUP BY l.id, l.sort_order
+        ORDER BY l.sort_order, l.id
+    """, values={"course_id": course_id})
+    result = []
+    for lesson in lessons:
+        result.append({
+            "lesson_id": lesson.id,
+            "total_views": lesson.total_views,
+            "completions": lesson.completions,
+            "completion_rate": AnalyticsCalculator.calculate_completion_rate(
+                lesson.completions, lesson.total_views
+            ),
+            "avg_time_spent": round(float(lesson.avg_time_spent), 2),
+            "min": lesson.min_time_spent,
+            "max": lesson.max_time_spent,
+        })
+    return result
+
+
+async def per_row_health_score(course_id):
+    enrollment = await database.fetch_one("""
+        SELECT COUNT(*) as total, COUNT(CASE WHEN status = 'completed' THEN 1 END) as completions,
+               COUNT(CASE WHEN status = 'dropped' THEN 1 END) as dropouts
+        FROM course_enrollments WHERE course_id = :course_id
+    """, values={"course_id": course_id})
+    review = await database.fetch_one("""
+        SELECT COALESCE(AVG(rating), 0) as avg_rating FROM course_reviews
+        WHERE course_id = :course_id AND is_published = true
+    """, values={"course_id": course_id})
+    engagement = await database.fetch_one("""
+        SELECT COALESCE(AVG(lp.time_spent), 0) as avg_time_per_lesson
+        FROM lessons l LEFT JOIN lesson_progress lp ON l.id = lp.lesson_id
+        WHERE l.course_id = :course_id AND l.is_published = true
+    """, values={"course_id": course_id})
+    completion_rate = AnalyticsCalculator.calculate_completion_rate(enrollment.completions, enrollment.total)
+    dropout_rate = AnalyticsCalculator.calculate_churn_rate(enrollment.dropouts, enrollment.total)
+    rating_score = float(review.avg_rating) / 5 * 100
+    engagement_score = min(float(engagement.avg_time_per_lesson) / 300 * 100, 100)
+    return round(
+        completion_rate * 0.3 + (100 - dropout_rate) * 0.2 + rating_score * 0.3 + engagement_score * 0.2, 2
+    )
+
+
+async def timed(label, coroutine):
+    started = time.perf_counter()
+    result = await coroutine
+    print(f"{label:<40}{(time.perf_counter() - started) * 1000:>10.1f} ms")
+    return result
+
+
+async def main(count: int):
+    await database.connect()
+    try:
+        courses = await database.fetch_all("""
+            SELECT course_id FROM lessons WHERE is_published = true
+            GROUP BY course_id ORDER BY COUNT(*) DESC LIMIT :count
+        """, values={"count": count})
+        course_ids = [row["course_id"] for row in courses]
+        print(f"{len(course_ids)} courses\n")
+
+        async def per_row_lessons():
+            return {course_id: await per_row_lesson_performance(course_id) for course_id in course_ids}
+
+        async def per_row_health():
+            return {course_id: await per_row_health_score(course_id) for course_id in course_ids}
+
+        expected_lessons = await timed("lesson performance, per course", per_row_lessons())
+        lessons = await timed("lesson performance, columnar", lesson_performance(course_ids))
+        expected_health = await timed("health scores, per course", per_row_health())
+        health = await timed("health scores, columnar", course_health_scores(course_ids))
+
+        ok = True
+        for course_id in course_ids:
+            actual = [
+                {
+                    "lesson_id": lesson["lesson_id"],
+                    "total_views": lesson["total_views"],
+                    "completions": lesson["completions"],
+                    "completion_rate": lesson["completion_rate"],
+                    "avg_time_spent": lesson["avg_time_spent"],
+                    "min": lesson["time_range"]["min"],
+                    "max": lesson["time_range"]["max"],
+                }
+                for lesson in lessons.get(course_id, [])
+            ]
+            if actual != expected_lessons[course_id]:
+                print(f"❌ lesson performance differs for course {course_id}")
+                ok = False
+            if abs(health[course_id]["health_score"] - expected_health[course_id]) > 0.01:
+                print(f"❌ health score for {course_id}: {health[course_id]['health_score']} "
+                      f"vs {expected_health[course_id]}")
+                ok = False
+        print("\n" + ("SUCCESS" if ok else "FAILURE"))
+    finally:
+        await database.disconnect()
+
+
+if __name__ == "__main__":
+    asyncio.run(main(int(sys.argv[1]) if len(sys.argv) > 1 else 50))
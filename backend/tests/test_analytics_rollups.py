@@ -0,0 +1,78 @@
+"""
+Consistency check for the daily analytics rollups (utils/analytics_rollups.py)
+
+Runs the rollup job, then compares the state columns stored in
+course_analytics_daily and user_analytics_daily with the same days computed
+live from the source tables. Activity columns are frozen once a day is
+rolled up, so they are only printed. Requires migration 011.
+
+Usage (from the backend directory, with DATABASE_URL pointing at a test DB):
+    python tests/test_analytics_rollups.py [days]
+"""
+import sys
+import os
+import asyncio
+import time
+from datetime import timedelta
+
+# Add backend to path
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from database.connection import database
+from utils.analytics_rollups import ROLLUPS, rollup_columns, daily_select, run_rollups
+
+
+async def compare(table: str, first, last) -> bool:
+    state_columns = rollup_columns(table, activity=False)
+    activity_columns = [c for c in rollup_columns(table) if c not in state_columns]
+    values = {"range_start": first, "range_end": last + timedelta(days=1)}
+    sums = ", ".join(f"COALESCE(SUM({column}), 0) AS {column}" for column in rollup_columns(table))
+
+    stored = await database.fetch_one(
+        f"SELECT {sums} FROM {table} WHERE date >= :range_start AND date < :range_end",
+        values=values
+    )
+    live = await database.fetch_one(
+        f"""SELECT {sums} FROM ({daily_select(
+            table, "CAST(:range_start AS DATE)", "CAST(:range_end AS DATE)"
+        )}) daily""",
+        values=values
+    )
+
+    ok = True
+    for column in state_columns:
+        if stored[column] != live[column]:
+            print(f"❌ {table}.{column}: stored {stored[column]}, live {live[column]}")
+            ok = False
+    if ok:
+        print(f"✅ {table}: {len(state_columns)} state columns match")
+    for column in activity_columns:
+        print(f"   {table}.{column}: stored {stored[column]}, live now {live[column]}")
+    return ok
+
+
+async def main(days: int):
+    await database.connect()
+    try:
+        started = time.perf_counter()
+        result = await run_rollups()
+        print(f"run_rollups: {result} in {time.perf_counter() - started:.2f}s")
+        started = time.perf_counter()
+        result = await run_rollups()
+        print(f"second run (nothing changed): {result} in {time.perf_counter() - started:.2f}s")
+
+        last = await database.fetch_val(
+            "SELECT rolled_up_through FROM analytics_rollup_state WHERE name = 'daily'"
+        )
+        first = last - timedelta(days=days - 1)
+        print(f"\nComparing {first} .. {last}")
+        ok = True
+        for table in ROLLUPS:
+            ok = await compare(table, first, last) and ok
+        print("\n" + ("SUCCESS" if ok else "FAILURE"))
+    finally:
+        await database.disconnect()
+
+
+if __name__ == "__main__":
+    asyncio.run(main(int(sys.argv[1]) if len(sys.argv) > 1 else 90))
@@ -0,0 +1,87 @@
+"""
+Benchmark for the authenticated-user cache (utils/user_cache.py)
+
+Runs a synthetic authenticated GET (/api/users/me) in-process with the cache
+disabled and then enabled, and reports requests/sec, database round trips
+and the cache hit rate.
+
+Usage (from the backend directory, against a seeded database and Redis):
+    python tests/test_auth_cache_benchmark.py <user_id> [requests] [concurrency]
+"""
+import sys
+import os
+import asyncio
+import time
+
+import httpx
+
+# Add backend to path
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from main import app
+from database.connection import database
+from middleware.auth import create_access_token
+from utils.user_cache import user_cache
+
+
+def count_queries(counter: dict):
+    """Wrap fetch_one so every user lookup round trip is counted"""
+    original = database.fetch_one
+
+    def wrapper(*args, **kwargs):
+        counter["queries"] += 1
+        return original(*args, **kwargs)
+
+    database.fetch_one = wrapper
+
+
+async def run_round(client, headers, total_requests: int, concurrency: int) -> float:
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one_request():
+        async with semaphore:
+            response = await client.get("/api/users/me", headers=headers)
+            if response.status_code != 200:
+                raise RuntimeError(f"{response.status_code} {response.text}")
+
+    start = time.perf_counter()
+    await asyncio.gather(*[one_request() for _ in range(total_requests)])
+    return total_requests / (time.perf_counter() - start)
+
+
+async def main(user_id: str, total_requests: int, concurrency: int):
+    await database.connect()
+    counter = {"queries": 0}
+    count_queries(counter)
+
+    headers = {"Authorization": f"Bearer {create_access_token({'sub': user_id})}"}
+
+    try:
+        async with httpx.AsyncClient(app=app, base_url="http://bench") as client:
+            for enabled in (False, True):
+                user_cache.enabled = enabled
+                await user_cache.invalidate(user_id)
+                user_cache.stats = {key: 0 for key in user_cache.stats}
+                counter["queries"] = 0
+
+                rps = await run_round(client, headers, total_requests, concurrency)
+
+                print("=" * 60)
+                print(f"User cache {'enabled' if enabled else 'disabled'}")
+                print("=" * 60)
+                print(f"Requests/sec:        {rps:.1f}")
+                print(f"DB lookups:          {counter['queries']}")
+                if enabled:
+                    print(f"Cache stats:         {user_cache.get_stats()}")
+    finally:
+        await database.disconnect()
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print(__doc__)
+        sys.exit(1)
+
+    total = int(sys.argv[2]) if len(sys.argv) > 2 else 5000
+    workers = int(sys.argv[3]) if len(sys.argv) > 3 else 50
+    asyncio.run(main(sys.argv[1], total, workers))
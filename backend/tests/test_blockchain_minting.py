@@ -0,0 +1,448 @@
+"""
+Checks for the minting worker's chain calls (utils/blockchain.py)
+
+Runs against a local dev-chain stand-in: a JSON-RPC node on its own thread
+that keeps a mempool, mines a block every BLOCK_SECONDS with the
+transactions whose nonce is next for their sender, and answers mints and
+batch mints with a receipt carrying one ERC-721 Transfer event per token.
+Gas follows a simple model: 21000 per transaction, calldata at 16 gas a
+non-zero byte and 4 a zero byte, and MINT_GAS per token. It can also drop a
+transaction from its mempool, as a real node does under pressure, and
+reverts mints to the zero address, both when they are mined and when their
+gas is estimated.
+
+Checks that a batch of mints signed with consecutive nonces is accepted and
+mined with distinct token IDs, found by concurrent receipt polls, that a
+resend of a known transaction is recognised, that a dropped transaction
+holds back later nonces until it is re-broadcast, and that a revert comes
+back with status 0. Also times one mint the old way, with
+wait_for_transaction_receipt on the event loop, against signing and sending
+without waiting.
+
+Then mints a cohort three ways and compares transactions, gas and time
+until every receipt is in: one mint at a time, each waiting for its
+receipt; one transaction per certificate with consecutive nonces, all sent
+at once; and mintCertificateBatch, MINT_BATCH_SIZE to a transaction, also
+sent at once. Checks every certificate of a batch gets its own token, and
+that a cohort with one recipient the contract rejects is split around it so
+the other certificates still mint.
+
+Usage (from the backend directory):
+    python tests/test_blockchain_minting.py [mints] [block_seconds] [cohort]
+"""
+import sys
+import os
+import asyncio
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import rlp
+from eth_account import Account
+from web3 import Web3
+
+# Add backend to path
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+MINTS = 20
+BLOCK_SECONDS = 0.25
+COHORT = 40
+MINT_GAS = 60000
+CHAIN_ID = 1337
+CONTRACT = Web3.to_checksum_address("0x" + "c0" * 20)
+ZERO_ADDRESS = "0x" + "00" * 20
+TRANSFER_TOPIC = Web3.keccak(text="Transfer(address,address,uint256)").hex()
+
+
+def hex_int(value: int) -> str:
+    return hex(value)
+
+
+def word(value) -> str:
+    if isinstance(value, str):
+        value = int(value, 16)
+    return "0x" + value.to_bytes(32, "big").hex()
+
+
+class DevChain:
+    """Just enough of an Ethereum node for sending mints and reading receipts"""
+
+    def __init__(self, block_seconds: float):
+        self.block_seconds = block_seconds
+        self.lock = threading.Lock()
+        self.started = time.monotonic()
+        self.block_number = 0
+        self.mined_nonces = {}  # sender -> next nonce to mine
+        self.mempool = {}  # hash -> transaction
+        self.transactions = {}  # hash -> mined transaction
+        self.receipts = {}
+        self.next_token_id = 1
+        self.drop_next = False
+
+    def mine_due_blocks(self):
+        due = int((time.monotonic() - self.started) / self.block_seconds)
+        while self.block_number < due:
+            self.block_number += 1
+            self.mine_block()
+
+    def mine_block(self):
+        block_hash = word(self.block_number)
+        included = []
+        progress = True
+        while progress:
+            progress = False
+            for tx_hash, tx in list(self.mempool.items()):
+                if tx["nonce"] == self.mined_nonces.get(tx["from"], 0):
+                    self.mined_nonces[tx["from"]] = tx["nonce"] + 1
+                    included.append((tx_hash, self.mempool.pop(tx_hash)))
+                    progress = True
+        for index, (tx_hash, tx) in enumerate(included):
+            tx.update(blockHash=block_hash, blockNumber=hex_int(self.block_number), transactionIndex=hex_int(index))
+            self.transactions[tx_hash] = tx
+            reverted = ZERO_ADDRESS in tx["recipients"]
+            logs = []
+            for to in ([] if reverted else tx["recipients"]):
+                logs.append({
+                    "address": CONTRACT, "topics": [TRANSFER_TOPIC, word(0), word(to), word(self.next_token_id)],
+                    "data": "0x", "blockNumber": hex_int(self.block_number), "blockHash": block_hash,
+                    "transactionHash": tx_hash, "transactionIndex": hex_int(index), "logIndex": hex_int(len(logs)),
+                    "removed": False,
+                })
+                self.next_token_id += 1
+            self.receipts[tx_hash] = {
+                "transactionHash": tx_hash, "transactionIndex": hex_int(index), "blockHash": block_hash,
+                "blockNumber": hex_int(self.block_number), "from": tx["from"], "to": tx["to"],
+                "cumulativeGasUsed": tx["gas_used"], "gasUsed": tx["gas_used"],
+                "effectiveGasPrice": tx["gasPrice"], "contractAddress": None, "logs": logs,
+                "logsBloom": "0x" + "00" * 256, "status": "0x0" if reverted else "0x1", "type": "0x0",
+            }
+
+    def pending_count(self, sender: str) -> int:
+        nonce = self.mined_nonces.get(sender, 0)
+        queued = {tx["nonce"] for tx in self.mempool.values() if tx["from"] == sender}
+        while nonce in queued:
+            nonce += 1
+        return nonce
+
+    def gas_for(self, data: bytes):
+        """Recipients of a mint or batch mint call and the gas it uses"""
+        from utils.blockchain import CERTIFICATE_ABI
+        function, arguments = Web3().eth.contract(abi=CERTIFICATE_ABI).decode_function_input(data)
+        recipients = arguments["recipients"] if function.fn_name == "mintCertificateBatch" else [arguments["to"]]
+        recipients = [address.lower() for address in recipients]
+        calldata = sum(16 if byte else 4 for byte in data)
+        return recipients, 21000 + calldata + MINT_GAS * len(recipients)
+
+    def send_raw(self, raw: str) -> str:
+        raw_bytes = bytes.fromhex(raw[2:])
+        tx_hash = Web3.keccak(raw_bytes).hex()
+        if tx_hash in self.mempool or tx_hash in self.transactions:
+            raise ValueError("already known")
+        nonce, gas_price, gas, to, value, data, v, r, s = rlp.decode(raw_bytes)
+        sender = Account.recover_transaction(raw_bytes)
+        nonce = int.from_bytes(nonce, "big")
+        if nonce < self.mined_nonces.get(sender, 0):
+            raise ValueError("nonce too low")
+        if any(tx["from"] == sender and tx["nonce"] == nonce for tx in self.mempool.values()):
+            raise ValueError("replacement transaction underpriced")
+        recipients, gas_used = self.gas_for(data)
+        tx = {
+            "hash": tx_hash, "from": sender, "to": Web3.to_checksum_address(to), "nonce": nonce,
+            "gas": hex_int(int.from_bytes(gas, "big")), "gasPrice": hex_int(int.from_bytes(gas_price, "big")),
+            "value": "0x0", "input": "0x" + data.hex(), "v": hex_int(int.from_bytes(v, "big")),
+            "r": "0x" + r.hex(), "s": "0x" + s.hex(), "type": "0x0", "chainId": hex_int(CHAIN_ID),
+            "blockHash": None, "blockNumber": None, "transactionIndex": None,
+            "recipients": recipients, "gas_used": hex_int(gas_used),
+        }
+        if self.drop_next:
+            # Accepted, then evicted from the mempool
+            self.drop_next = False
+        else:
+            self.mempool[tx_hash] = tx
+        return tx_hash
+
+    def call(self, method: str, params: list):
+        with self.lock:
+            self.mine_due_blocks()
+            if method == "web3_clientVersion":
+                return "devchain/stand-in"
+            if method == "eth_chainId":
+                return hex_int(CHAIN_ID)
+            if method == "eth_gasPrice":
+                return hex_int(Web3.to_wei(30, "gwei"))
+            if method == "eth_blockNumber":
+                return hex_int(self.block_number)
+            if method == "eth_getTransactionCount":
+                sender = Web3.to_checksum_address(params[0])
+                count = self.pending_count(sender) if params[1] == "pending" else self.mined_nonces.get(sender, 0)
+                return hex_int(count)
+            if method == "eth_estimateGas":
+                recipients, gas_used = self.gas_for(bytes.fromhex(params[0]["data"][2:]))
+                if ZERO_ADDRESS in recipients:
+                    raise ValueError("execution reverted: mint to the zero address")
+                return hex_int(gas_used)
+            if method == "eth_sendRawTransaction":
+                return self.send_raw(params[0])
+            if method == "eth_getTransactionByHash":
+                tx = self.transactions.get(params[0]) or self.mempool.get(params[0])
+                return {k: (hex_int(v) if k == "nonce" else v) for k, v in tx.items() if k not in ("recipients", "gas_used")} if tx else None
+            if method == "eth_getTransactionReceipt":
+                return self.receipts.get(params[0])
+            raise ValueError(f"method {method} not supported")
+
+
+def start_dev_chain(chain: DevChain) -> str:
+    class Handler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            request = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+            try:
+                response = {"jsonrpc": "2.0", "id": request["id"], "result": chain.call(request["method"], request["params"])}
+            except ValueError as e:
+                response = {"jsonrpc": "2.0", "id": request["id"], "error": {"code": -32000, "message": str(e)}}
+            body = json.dumps(response).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return f"http://127.0.0.1:{server.server_address[1]}"
+
+
+chain = DevChain(BLOCK_SECONDS)
+os.environ["POLYGON_RPC_URL"] = start_dev_chain(chain)
+os.environ["CERTIFICATE_CONTRACT_ADDRESS"] = CONTRACT
+os.environ["BLOCKCHAIN_PRIVATE_KEY"] = Account.create().key.hex()
+os.environ.setdefault("MINT_BATCH_SIZE", "20")
+
+from utils.blockchain import BlockchainService, MINT_BATCH_SIZE
+from utils.minting import _mintable_batches
+
+
+def check(ok: bool, message: str) -> bool:
+    print(f"{'✅' if ok else '❌'} {message}")
+    return ok
+
+
+async def watch_loop(stop: asyncio.Event, lag: list):
+    """Record the gap between ticks of a 5 ms timer"""
+    while not stop.is_set():
+        started = time.perf_counter()
+        await asyncio.sleep(0.005)
+        lag.append(time.perf_counter() - started - 0.005)
+
+
+async def wait_for_receipts(service: BlockchainService, hashes, timeout: float):
+    """Poll all receipts at once, as poll_mint_receipts does, until every one is in"""
+    receipts = {}
+    deadline = time.monotonic() + timeout
+    while len(receipts) < len(hashes) and time.monotonic() < deadline:
+        waiting = [tx_hash for tx_hash in hashes if tx_hash not in receipts]
+        for tx_hash, receipt in zip(waiting, await asyncio.gather(*[service.get_receipt(h) for h in waiting])):
+            if receipt is not None:
+                receipts[tx_hash] = receipt
+        await asyncio.sleep(BLOCK_SECONDS / 4)
+    return receipts
+
+
+def recipient(index: int) -> str:
+    return Web3.to_checksum_address(f"0x{index + 1:040x}")
+
+
+async def mint_the_old_way(service: BlockchainService) -> float:
+    """Sign and send with the synchronous client and block on the receipt, as the endpoint did"""
+    w3 = service.w3
+    contract = w3.eth.contract(address=CONTRACT, abi=service.async_contract.abi)
+    transaction = contract.functions.mintCertificate(recipient(999), "ipfs://old").build_transaction({
+        'from': service.account.address,
+        'nonce': w3.eth.get_transaction_count(service.account.address, "pending"),
+        'gas': 200000,
+        'gasPrice': w3.to_wei('30', 'gwei')
+    })
+    signed = service.account.sign_transaction(transaction)
+    w3.eth.wait_for_transaction_receipt(w3.eth.send_raw_transaction(signed.rawTransaction), poll_latency=0.1)
+
+
+async def timed(label: str, work):
+    stop, lag = asyncio.Event(), []
+    watcher = asyncio.create_task(watch_loop(stop, lag))
+    await asyncio.sleep(0.01)
+    started = time.perf_counter()
+    result = await work()
+    elapsed = time.perf_counter() - started
+    stop.set()
+    await watcher
+    print(f"   {label:<42} {elapsed * 1000:8.1f} ms   worst loop stall {max(lag, default=0) * 1000:7.1f} ms")
+    return result
+
+
+async def mint_one_at_a_time(service: BlockchainService, recipients):
+    """Each certificate sent and its receipt awaited before the next, as the endpoint did"""
+    receipts = []
+    for index, address in enumerate(recipients):
+        tx_hash, raw = await service.sign_mint(address, f"ipfs://cohort-{index}", await service.pending_nonce())
+        await service.send_raw_transaction(raw)
+        receipts += (await wait_for_receipts(service, [tx_hash], BLOCK_SECONDS * 5)).values()
+    return [receipts]
+
+
+async def mint_pipelined(service: BlockchainService, recipients):
+    """One transaction per certificate, consecutive nonces, all sent at once"""
+    first_nonce = await service.pending_nonce()
+    signed = await asyncio.gather(*[
+        service.sign_mint(address, f"ipfs://cohort-{index}", first_nonce + index)
+        for index, address in enumerate(recipients)
+    ])
+    await asyncio.gather(*[service.send_raw_transaction(raw) for _, raw in signed])
+    receipts = await wait_for_receipts(service, [tx_hash for tx_hash, _ in signed], BLOCK_SECONDS * 10)
+    return [[receipts[tx_hash] for tx_hash, _ in signed if tx_hash in receipts]]
+
+
+async def mint_batched(service: BlockchainService, recipients):
+    """mintCertificateBatch, MINT_BATCH_SIZE to a transaction, consecutive nonces, all sent at once"""
+    batches = [recipients[start:start + MINT_BATCH_SIZE] for start in range(0, len(recipients), MINT_BATCH_SIZE)]
+    first_nonce = await service.pending_nonce()
+    signed = await asyncio.gather(*[
+        service.sign_mint_batch(batch, [f"ipfs://cohort-{address}" for address in batch], first_nonce + index)
+        for index, batch in enumerate(batches)
+    ])
+    await asyncio.gather(*[service.send_raw_transaction(raw) for _, raw in signed])
+    receipts = await wait_for_receipts(service, [tx_hash for tx_hash, _ in signed], BLOCK_SECONDS * 10)
+    return [[receipts[tx_hash] for tx_hash, _ in signed if tx_hash in receipts], batches]
+
+
+async def main():
+    service = BlockchainService()
+    ok = check(service.can_mint and service.w3.is_connected(), f"dev chain up, {BLOCK_SECONDS:g}s blocks")
+
+    # A batch of mints with consecutive nonces, all in flight at once
+    first_nonce = await service.pending_nonce()
+    signed = await asyncio.gather(*[
+        service.sign_mint(recipient(i), f"ipfs://certificate-{i}", first_nonce + i) for i in range(MINTS)
+    ])
+    await asyncio.gather(*[service.send_raw_transaction(raw) for _, raw in signed])
+    hashes = [tx_hash for tx_hash, _ in signed]
+    ok = check(
+        await service.pending_nonce() == first_nonce + MINTS,
+        f"{MINTS} mints accepted, pending nonce includes the mempool"
+    ) and ok
+
+    receipts = await wait_for_receipts(service, hashes, BLOCK_SECONDS * 5)
+    token_ids = [service.token_id_from_receipt(receipts[h]) for h in hashes if h in receipts]
+    ok = check(
+        len(receipts) == MINTS and all(r["status"] == 1 for r in receipts.values())
+        and len(set(token_ids)) == MINTS and None not in token_ids,
+        f"all mined with distinct token IDs ({token_ids[0]}..{token_ids[-1]})"
+    ) and ok
+
+    try:
+        await service.send_raw_transaction(signed[0][1])
+        resent = False
+    except Exception:
+        resent = await service.is_transaction_known(hashes[0])
+    ok = check(resent, "resending a mined transaction is refused and it is still known to the node") and ok
+
+    # The node drops one transaction; the next nonce waits behind it
+    nonce = await service.pending_nonce()
+    chain.drop_next = True
+    dropped_hash, dropped_raw = await service.sign_mint(recipient(100), "ipfs://dropped", nonce)
+    await service.send_raw_transaction(dropped_raw)
+    later_hash, later_raw = await service.sign_mint(recipient(101), "ipfs://later", nonce + 1)
+    await service.send_raw_transaction(later_raw)
+    await asyncio.sleep(BLOCK_SECONDS * 2)
+    ok = check(
+        not await service.is_transaction_known(dropped_hash) and await service.get_receipt(later_hash) is None,
+        "dropped transaction is unknown to the node and holds back the next nonce"
+    ) and ok
+    await service.send_raw_transaction(dropped_raw)
+    receipts = await wait_for_receipts(service, [dropped_hash, later_hash], BLOCK_SECONDS * 5)
+    ok = check(len(receipts) == 2, "after re-broadcast both are mined") and ok
+
+    # A mint the contract reverts
+    reverted_hash, reverted_raw = await service.sign_mint(ZERO_ADDRESS, "ipfs://nobody", await service.pending_nonce())
+    await service.send_raw_transaction(reverted_raw)
+    receipt = (await wait_for_receipts(service, [reverted_hash], BLOCK_SECONDS * 5)).get(reverted_hash)
+    ok = check(
+        receipt is not None and receipt["status"] == 0 and service.token_id_from_receipt(receipt) is None,
+        "reverted mint has status 0 and no token ID"
+    ) and ok
+
+    print("\nOne mint, event loop watched by a 5 ms timer:")
+    await timed("before: send and wait for the receipt", lambda: mint_the_old_way(service))
+
+    async def sign_and_send():
+        tx_hash, raw = await service.sign_mint(recipient(200), "ipfs://new", await service.pending_nonce())
+        await service.send_raw_transaction(raw)
+        return tx_hash
+
+    tx_hash = await timed("now: sign and send, receipt polled later", sign_and_send)
+    ok = check(bool(await wait_for_receipts(service, [tx_hash], BLOCK_SECONDS * 5)), "polled receipt arrives") and ok
+
+    print(f"\nCohort of {COHORT}, a block every {BLOCK_SECONDS:g}s:")
+    recipients = [recipient(1000 + i) for i in range(COHORT)]
+    results = {}
+    for label, mint in [
+        ("one at a time, waiting for each receipt", mint_one_at_a_time),
+        ("one transaction each, sent at once", mint_pipelined),
+        (f"batches of {MINT_BATCH_SIZE}, sent at once", mint_batched),
+    ]:
+        started = time.perf_counter()
+        outcome = await mint(service, recipients)
+        elapsed = time.perf_counter() - started
+        receipts = outcome[0]
+        gas = sum(receipt["gasUsed"] for receipt in receipts)
+        results[mint] = (receipts, gas, elapsed, outcome[1:])
+        print(f"   {label:<42} {len(receipts):4} transactions   gas {gas:>10,}   {elapsed:6.2f}s")
+
+    receipts, batch_gas, batch_time, (batches,) = results[mint_batched]
+    minted = [token for receipt in receipts for token in service.minted_tokens(receipt)]
+    ok = check(
+        len(receipts) == len(batches) and all(r["status"] == 1 for r in receipts)
+        and [to for to, _ in minted] == recipients and len({token for _, token in minted}) == COHORT,
+        f"every certificate of the {len(batches)} batches has its own token, in recipient order"
+    ) and ok
+    _, single_gas, single_time, _ = results[mint_one_at_a_time]
+    ok = check(
+        batch_gas < results[mint_pipelined][1] and batch_time < single_time,
+        f"batches use {batch_gas / single_gas:.0%} of the gas and {batch_time / single_time:.0%} of the time"
+    ) and ok
+
+    # One recipient in the cohort that the contract rejects
+    jobs = [{"recipient_address": recipient(2000 + i), "token_uri": f"ipfs://split-{i}"} for i in range(COHORT)]
+    jobs[COHORT // 3]["recipient_address"] = ZERO_ADDRESS
+    mintable, rejected = await _mintable_batches(
+        [jobs[start:start + MINT_BATCH_SIZE] for start in range(0, COHORT, MINT_BATCH_SIZE)], service
+    )
+    first_nonce = await service.pending_nonce()
+    signed = await asyncio.gather(*[
+        service.sign_mint_batch(
+            [job["recipient_address"] for job in batch], [job["token_uri"] for job in batch], first_nonce + index, gas
+        )
+        for index, (batch, gas) in enumerate(mintable)
+    ])
+    await asyncio.gather(*[service.send_raw_transaction(raw) for _, raw in signed])
+    receipts = await wait_for_receipts(service, [tx_hash for tx_hash, _ in signed], BLOCK_SECONDS * 10)
+    minted = [to for receipt in receipts.values() for to, _ in service.minted_tokens(receipt)]
+    ok = check(
+        [job for job, _ in rejected] == [jobs[COHORT // 3]]
+        and [job for batch, _ in mintable for job in batch] == jobs[:COHORT // 3] + jobs[COHORT // 3 + 1:]
+        and len(receipts) == len(mintable) and all(r["status"] == 1 for r in receipts.values())
+        and sorted(minted) == sorted(job["recipient_address"] for batch, _ in mintable for job in batch),
+        f"a reverting recipient is split out of its batch, the other {COHORT - 1} mint in {len(mintable)} transactions"
+    ) and ok
+
+    print("\n" + ("SUCCESS" if ok else "FAILURE"))
+
+
+if __name__ == "__main__":
+    MINTS = int(sys.argv[1]) if len(sys.argv) > 1 else MINTS
+    BLOCK_SECONDS = float(sys.argv[2]) if len(sys.argv) > 2 else BLOCK_SECONDS
+    COHORT = int(sys.argv[3]) if len(sys.argv) > 3 else COHORT
+    chain.block_seconds = BLOCK_SECONDS
+    asyncio.run(main())
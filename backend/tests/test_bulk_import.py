@@ -0,0 +1,97 @@
+"""
+End-to-end check for the background CSV user import (POST /api/admin/import)
+
+Generates a roster with some deliberately bad rows, uploads it as a
+background job, polls progress until it finishes and checks the counts.
+
+Usage (with the API running on BASE_URL):
+    python tests/test_bulk_import.py <admin_user_id> [rows]
+
+Admin logins require 2FA, so the script signs its own access token.
+"""
+import sys
+import os
+import io
+import csv
+import time
+import uuid
+
+import requests
+
+# Add backend to path
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from middleware.auth import create_access_token
+
+BASE_URL = "http://localhost:8000"
+
+
+def build_roster(rows: int):
+    """Return CSV bytes and the number of rows that should fail"""
+    run_id = uuid.uuid4().hex[:8]
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(["Email", "First Name", "Last Name", "Role", "Phone", "Bio"])
+
+    bad_rows = 0
+    for i in range(rows):
+        if i % 100 == 1:
+            writer.writerow(["", "NoEmail", "Row", "student", "", ""])
+            bad_rows += 1
+        elif i % 100 == 2:
+            writer.writerow([f"badrole_{run_id}_{i}@test.com", "Bad", "Role", "wizard", "", ""])
+            bad_rows += 1
+        elif i % 100 == 3:
+            # Same email as the row before the missing-email row
+            writer.writerow([f"import_{run_id}_{i - 3}@test.com", "Dup", "Row", "student", "", ""])
+            bad_rows += 1
+        else:
+            # Few distinct first names so usernames collide heavily
+            writer.writerow([f"import_{run_id}_{i}@test.com", f"Student{i % 7}", "Import", "student", "", ""])
+
+    return buffer.getvalue().encode("utf-8"), bad_rows
+
+
+def main(admin_user_id: str, rows: int):
+    headers = {"Authorization": f"Bearer {create_access_token({'sub': admin_user_id})}"}
+
+    content, bad_rows = build_roster(rows)
+    start = time.perf_counter()
+    response = requests.post(
+        f"{BASE_URL}/api/admin/import",
+        files={"file": ("roster.csv", content, "text/csv")},
+        data={"import_type": "users", "background": "true"},
+        headers=headers
+    )
+    if response.status_code != 200:
+        print(f"❌ Upload failed: {response.status_code} {response.text}")
+        return
+    job_id = response.json()["job_id"]
+    print(f"Job {job_id} queued after {time.perf_counter() - start:.2f}s")
+
+    while True:
+        job = requests.get(f"{BASE_URL}/api/admin/import/{job_id}", headers=headers).json()
+        print(f"  {job['status']:<10} {job['percent']:5.1f}%  rows {job['processed_rows']}  "
+              f"imported {job['imported_count']}  errors {job['errors_count']}")
+        if job["status"] in ("completed", "failed"):
+            break
+        time.sleep(1)
+
+    elapsed = time.perf_counter() - start
+    print("=" * 60)
+    print(f"{rows} rows in {elapsed:.2f}s ({rows / elapsed:.0f} rows/s)")
+    ok = job["status"] == "completed"
+    ok &= job["imported_count"] == rows - bad_rows
+    ok &= job["errors_count"] == bad_rows
+    print("✅ Counts match" if ok else f"❌ Expected {rows - bad_rows} imported and {bad_rows} errors")
+    for error in job["errors"][:5]:
+        print(f"  {error}")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print(__doc__)
+        sys.exit(1)
+
+    total = int(sys.argv[2]) if len(sys.argv) > 2 else 5000
+    main(sys.argv[1], total)
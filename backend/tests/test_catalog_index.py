@@ -0,0 +1,93 @@
+"""
+Checks and benchmark for the in-memory catalog index (utils/catalog_index.py)
+
+Loads a few known courses plus N synthetic ones (default 5,000), checks
+ranking, prefix and typo matching, filters and incremental updates, then
+prints the query latency for a few terms. No database is needed.
+
+Usage (from the backend directory):
+    python tests/test_catalog_index.py [courses] [repeats]
+"""
+import sys
+import os
+import random
+import string
+import time
+import statistics
+
+# Add backend to path
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from utils.catalog_index import CatalogIndex
+
+KNOWN_COURSES = [
+    {"id": "python", "title": "Python for Beginners", "short_description": "Start programming",
+     "description": "Learn programming with Python", "lesson_titles": ["Variables", "Loops"],
+     "level": "beginner", "is_free": True},
+    {"id": "javascript", "title": "Advanced JavaScript", "short_description": None,
+     "description": "Closures, promises and the event loop", "lesson_titles": ["Async programming"],
+     "level": "advanced", "is_free": False},
+    {"id": "data", "title": "Data Science", "short_description": "Analysis with Python",
+     "description": "pandas and numpy", "lesson_titles": ["DataFrames", "Plotting"],
+     "level": "beginner", "is_free": False},
+]
+TERMS = ["python", "pyth", "pyton", "programing", "async loops", "zzzz"]
+
+
+def synthetic_courses(count: int):
+    rng = random.Random(42)
+    words = ["".join(rng.choices(string.ascii_lowercase, k=rng.randint(4, 10))) for _ in range(20000)]
+    for number in range(count):
+        yield {
+            "id": f"synthetic-{number}",
+            "title": " ".join(rng.choices(words, k=5)),
+            "description": " ".join(rng.choices(words, k=60)),
+            "lesson_titles": [" ".join(rng.choices(words, k=4)) for _ in range(10)],
+        }
+
+
+def ids(results):
+    return [course["id"] for course in results]
+
+
+def check(index: CatalogIndex):
+    assert ids(index.search_courses("python"))[:2] == ["python", "data"], "title match ranks first"
+    assert ids(index.search_courses("pyth"))[:2] == ["python", "data"], "prefix match"
+    assert "python" in ids(index.search_courses("pyton")), "typo match"
+    assert "javascript" in ids(index.search_courses("programing")), "typo in a longer word"
+    assert ids(index.search_courses("python loops")) == ["python"], "every word must match"
+    assert ids(index.search_courses("the")) == [], "stop words alone match nothing"
+    assert ids(index.search_courses("python", level="beginner", is_free=False)) == ["data"], "filters"
+
+    index._courses.add("python", {"title": "Rust for Beginners"})
+    assert "python" not in ids(index.search_courses("python")), "updated course is reindexed"
+    index._courses.remove("data")
+    assert ids(index.search_courses("python")) == [], "removed course is gone"
+    print("checks passed")
+
+
+def main(count: int, repeats: int):
+    index = CatalogIndex()
+    started = time.perf_counter()
+    index.load_courses(KNOWN_COURSES + list(synthetic_courses(count)))
+    print(f"built index over {count + len(KNOWN_COURSES)} courses in "
+          f"{time.perf_counter() - started:.2f}s")
+
+    print("=" * 50)
+    print(f"{'term':<22}{'matches':>10}{'median ms':>14}")
+    print("=" * 50)
+    for term in TERMS:
+        timings = []
+        for _ in range(repeats):
+            started = time.perf_counter()
+            results = index.search_courses(term)
+            timings.append((time.perf_counter() - started) * 1000)
+        print(f"{term:<22}{len(results):>10}{statistics.median(timings):>14.3f}")
+
+    check(index)
+
+
+if __name__ == "__main__":
+    total = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    runs = int(sys.argv[2]) if len(sys.argv) > 2 else 50
+    main(total, runs)
@@ -0,0 +1,100 @@
+"""
+Checks for the certificate verification cache (utils/certificate_verification.py)
+
+Fires concurrent verify lookups at a slow loader and checks that they share
+one load, that L1 and L2 hits skip it, that unknown certificates are cached
+as negatives, that invalidation drops both levels, and that chain checks
+are held to the per-second budget. Requires Redis (REDIS_URL).
+
+Usage (from the backend directory):
+    python tests/test_certificate_verification.py [concurrency]
+"""
+import sys
+import os
+import asyncio
+import time
+import uuid
+
+# Add backend to path
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from utils.certificate_verification import (
+    CertificateVerificationCache,
+    NOT_FOUND,
+    VERIFY_CACHE_TTL_SECONDS,
+    VERIFY_NEGATIVE_TTL_SECONDS,
+    invalidate_certificate_verification,
+    verification_cache,
+)
+
+loads = 0
+
+
+def loader(result, ttl):
+    async def load():
+        global loads
+        loads += 1
+        await asyncio.sleep(0.2)
+        return {"result": result, "chain": None}, ttl
+    return load
+
+
+async def timed(coroutine):
+    started = time.perf_counter()
+    result = await coroutine
+    return result, (time.perf_counter() - started) * 1000
+
+
+async def main(concurrency: int):
+    global loads
+    cache = verification_cache
+    certificate_id = str(uuid.uuid4())
+    verified = {"valid": True, "certificate_id": certificate_id, "blockchain_verified": True}
+    load = loader(verified, VERIFY_CACHE_TTL_SECONDS)
+
+    results, elapsed = await timed(asyncio.gather(*[
+        cache.get_or_load(certificate_id, load) for _ in range(concurrency)
+    ]))
+    assert loads == 1, f"{concurrency} concurrent misses loaded {loads} times"
+    assert all(result == verified for result in results)
+    print(f"✅ {concurrency} concurrent misses, one load, {elapsed:.0f} ms")
+
+    result, l1_ms = await timed(cache.get_or_load(certificate_id, load))
+    assert result == verified and loads == 1
+    cache.forget(certificate_id)
+    result, l2_ms = await timed(cache.get_or_load(certificate_id, load))
+    assert result == verified and loads == 1, "L2 hit after L1 was dropped"
+    print(f"✅ L1 hit in {l1_ms:.3f} ms, L2 hit in {l2_ms:.2f} ms, no loads")
+
+    await invalidate_certificate_verification(certificate_id)
+    assert await cache.get(certificate_id) is None, "invalidation drops both levels"
+    await cache.get_or_load(certificate_id, load)
+    assert loads == 2
+    print("✅ invalidation forces a reload")
+
+    unknown_id = str(uuid.uuid4())
+    missing = loader(NOT_FOUND, VERIFY_NEGATIVE_TTL_SECONDS)
+    for _ in range(5):
+        assert await cache.get_or_load(unknown_id, missing) == NOT_FOUND
+    assert loads == 3, "unknown certificate is loaded once"
+    ttl = await cache.client.ttl(f"certificate_verify:{unknown_id}")
+    assert 0 < ttl <= VERIFY_NEGATIVE_TTL_SECONDS
+    print(f"✅ unknown certificate cached as a negative for {ttl}s")
+
+    budgeted = CertificateVerificationCache(chain_checks_per_second=3)
+    # Start at the beginning of a second so the window doesn't roll over mid-check
+    await asyncio.sleep(1 - time.time() % 1)
+    allowed = [await budgeted.take_chain_budget() for _ in range(10)]
+    assert allowed.count(True) == 3, f"{allowed.count(True)} of 10 chain checks allowed"
+    await asyncio.sleep(1 - time.time() % 1)
+    assert await budgeted.take_chain_budget(), "budget resets the next second"
+    print("✅ chain checks held to 3 per second")
+
+    await invalidate_certificate_verification(certificate_id, unknown_id)
+    print(cache.get_stats())
+    await cache.client.aclose()
+    print("\nSUCCESS")
+
+
+if __name__ == "__main__":
+    asyncio.run(main(int(sys.argv[1]) if len(sys.argv) > 1 else 50))
@@ -0,0 +1,93 @@
+"""
+Consistency check for the cohort retention matrix (utils/cohort_retention.py)
+
+Runs the incremental update, then rebuilds every cohort from
+user_activity_months and users in one query and compares it with
+retention_cohorts and retention_matrix cell by cell. Also times a 12-month
+triangle read. Requires migration 012.
+
+Usage (from the backend directory, with DATABASE_URL pointing at a test DB):
+    python tests/test_cohort_retention.py
+"""
+import sys
+import os
+import asyncio
+import time
+from datetime import datetime
+
+# Add backend to path
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from database.connection import database
+from utils.cohort_retention import (
+    update_cohort_retention, retention_triangle, months_between, month_start, add_months
+)
+
+LIVE_SIZES_QUERY = """
+    SELECT CAST(DATE_TRUNC('month', created_at) AS DATE) AS cohort_month, COUNT(*) AS cohort_size
+    FROM users WHERE status = 'active'
+    GROUP BY 1
+"""
+
+LIVE_CELLS_QUERY = f"""
+    SELECT c.cohort_month, {months_between("c.cohort_month", "a.activity_month")} AS period_number,
+           COUNT(*) AS active_users
+    FROM (
+        SELECT id, CAST(DATE_TRUNC('month', created_at) AS DATE) AS cohort_month
+        FROM users WHERE status = 'active'
+    ) c
+    JOIN user_activity_months a ON a.user_id = c.id AND a.activity_month >= c.cohort_month
+    GROUP BY 1, 2
+"""
+
+
+async def main():
+    await database.connect()
+    try:
+        for run in ("first run", "second run"):
+            started = time.perf_counter()
+            result = await update_cohort_retention()
+            print(f"{run}: {result} in {time.perf_counter() - started:.2f}s")
+
+        live_sizes = {row["cohort_month"]: row["cohort_size"] for row in await database.fetch_all(LIVE_SIZES_QUERY)}
+        stored_sizes = {
+            row["cohort_month"]: row["cohort_size"]
+            for row in await database.fetch_all("SELECT * FROM retention_cohorts WHERE cohort_size <> 0")
+        }
+        live_cells = {
+            (row["cohort_month"], row["period_number"]): row["active_users"]
+            for row in await database.fetch_all(LIVE_CELLS_QUERY)
+        }
+        stored_cells = {
+            (row["cohort_month"], row["period_number"]): row["active_users"]
+            for row in await database.fetch_all("SELECT * FROM retention_matrix WHERE active_users <> 0")
+        }
+
+        ok = True
+        if live_sizes != stored_sizes:
+            print(f"❌ cohort sizes differ: stored {stored_sizes}, live {live_sizes}")
+            ok = False
+        else:
+            print(f"✅ {len(stored_sizes)} cohort sizes match")
+        if live_cells != stored_cells:
+            diff = {key for key in live_cells.keys() | stored_cells.keys()
+                    if live_cells.get(key) != stored_cells.get(key)}
+            print(f"❌ {len(diff)} matrix cells differ, e.g. {sorted(diff)[:5]}")
+            ok = False
+        else:
+            print(f"✅ {len(stored_cells)} matrix cells match")
+
+        started = time.perf_counter()
+        triangle = await retention_triangle(add_months(month_start(datetime.utcnow()), -12))
+        print(f"\n12-month triangle ({len(triangle)} cohorts) read in "
+              f"{(time.perf_counter() - started) * 1000:.1f} ms")
+        for cohort in triangle:
+            print(f"  {cohort['cohort_month']}  {cohort['cohort_size']:>6}  {cohort['active_users']}")
+
+        print("\n" + ("SUCCESS" if ok else "FAILURE"))
+    finally:
+        await database.disconnect()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
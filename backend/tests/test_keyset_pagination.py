@@ -0,0 +1,87 @@
+"""
+Consistency check for keyset (cursor) pagination
+
+Walks each list endpoint page by page with OFFSET and again with cursors,
+and checks that both walks return the same ids in the same order. Also
+prints exact vs estimated totals.
+
+Usage (with the API running on BASE_URL):
+    python tests/test_keyset_pagination.py <admin_user_id> [page_size]
+
+Admin logins require 2FA, so the script signs its own access token.
+"""
+import sys
+import os
+
+import requests
+
+# Add backend to path
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from middleware.auth import create_access_token
+
+BASE_URL = "http://localhost:8000"
+
+ENDPOINTS = [
+    "/api/courses/",
+    "/api/lessons/",
+    "/api/admin/users",
+    "/api/admin/audit-log",
+    "/api/notifications/",
+]
+
+MAX_PAGES = 50
+
+
+def walk_offset(headers, path: str, size: int):
+    ids = []
+    page = 1
+    while page <= MAX_PAGES:
+        body = requests.get(f"{BASE_URL}{path}", params={"page": page, "size": size}, headers=headers).json()
+        ids += [item["id"] for item in body["items"]]
+        if page >= body["pages"]:
+            break
+        page += 1
+    return ids, body["total"]
+
+
+def walk_cursor(headers, path: str, size: int):
+    ids = []
+    cursor = ""
+    for _ in range(MAX_PAGES):
+        body = requests.get(
+            f"{BASE_URL}{path}",
+            params={"cursor": cursor, "size": size, "total_mode": "estimated"},
+            headers=headers
+        ).json()
+        ids += [item["id"] for item in body["items"]]
+        cursor = body["next_cursor"]
+        if not cursor:
+            break
+    return ids, body["total"]
+
+
+def main(admin_user_id: str, size: int):
+    headers = {"Authorization": f"Bearer {create_access_token({'sub': admin_user_id})}"}
+    ok = True
+
+    for path in ENDPOINTS:
+        offset_ids, exact_total = walk_offset(headers, path, size)
+        cursor_ids, estimated_total = walk_cursor(headers, path, size)
+
+        if offset_ids == cursor_ids:
+            print(f"✅ {path}: {len(cursor_ids)} rows match (total {exact_total}, estimated {estimated_total})")
+        else:
+            print(f"❌ {path}: offset walk returned {len(offset_ids)} rows, cursor walk {len(cursor_ids)}")
+            ok = False
+
+    print("\n" + ("SUCCESS" if ok else "FAILURE"))
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print(__doc__)
+        sys.exit(1)
+
+    page_size = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+    main(sys.argv[1], page_size)
@@ -0,0 +1,78 @@
+"""
+Login-storm load test for the bcrypt worker pool (utils/password_pool.py)
+
+Measures latency of a cheap endpoint on its own, then again while a burst of
+concurrent logins runs. With bcrypt on the event loop the cheap endpoint
+stalls behind every hash; with the pool its p99 should barely move, and
+logins beyond the pool's queue are shed with 503 instead of queuing forever.
+
+Usage (with the API running on BASE_URL):
+    python tests/test_login_load.py <email> <password> [logins] [probes]
+"""
+import sys
+import asyncio
+import time
+
+import httpx
+
+BASE_URL = "http://localhost:8000"
+PROBE_PATH = "/health"
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+async def probe(client: httpx.AsyncClient, total: int, interval: float = 0.01):
+    """Hit the cheap endpoint sequentially and return latencies in ms"""
+    latencies = []
+    for _ in range(total):
+        start = time.perf_counter()
+        await client.get(PROBE_PATH)
+        latencies.append((time.perf_counter() - start) * 1000)
+        await asyncio.sleep(interval)
+    return latencies
+
+
+async def login(client: httpx.AsyncClient, email: str, password: str) -> int:
+    response = await client.post("/api/auth/login", json={"email": email, "password": password})
+    return response.status_code
+
+
+def report(label: str, latencies):
+    print(f"{label:<24} p50 {percentile(latencies, 50):8.2f} ms   "
+          f"p99 {percentile(latencies, 99):8.2f} ms   max {max(latencies):8.2f} ms")
+
+
+async def main(email: str, password: str, logins: int, probes: int):
+    limits = httpx.Limits(max_connections=logins + 10)
+    async with httpx.AsyncClient(base_url=BASE_URL, limits=limits, timeout=120) as client:
+        baseline = await probe(client, probes)
+
+        storm = asyncio.gather(*[login(client, email, password) for _ in range(logins)])
+        under_load = await probe(client, probes)
+        statuses = await storm
+
+    print("=" * 60)
+    print(f"GET {PROBE_PATH} latency, {logins} concurrent logins")
+    print("=" * 60)
+    report("Baseline", baseline)
+    report("During login storm", under_load)
+
+    counts = {}
+    for code in statuses:
+        counts[code] = counts.get(code, 0) + 1
+    print(f"Login responses: {dict(sorted(counts.items()))}")
+    print("(503 = shed by the password pool; raise PASSWORD_HASH_MAX_QUEUE to queue more)")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 3:
+        print(__doc__)
+        sys.exit(1)
+
+    total_logins = int(sys.argv[3]) if len(sys.argv) > 3 else 200
+    total_probes = int(sys.argv[4]) if len(sys.argv) > 4 else 200
+    asyncio.run(main(sys.argv[1], sys.argv[2], total_logins, total_probes))
@@ -0,0 +1,91 @@
+"""
+Checks for the media processing pipeline (utils/media_processing.py)
+
+Renders thumbnails for a large photo-like JPEG and a transparent PNG, checks
+every size in THUMBNAIL_SIZES comes out in each format within its bounds,
+and times the single-decode renderer against decoding the original once per
+variant as FileUploadService.generate_thumbnail used to. With ffprobe on
+PATH and a video given, also prints its probed metadata.
+
+Usage (from the backend directory):
+    python tests/test_media_processing.py [video_path]
+"""
+import sys
+import os
+import io
+import time
+
+from PIL import Image
+
+# Add backend to path
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from utils.media_processing import render_thumbnails, probe_video, THUMBNAIL_SIZES, THUMBNAIL_FORMATS
+
+
+def sample_image(size, mode: str, pil_format: str) -> bytes:
+    gradient = Image.linear_gradient("L").resize(size)
+    noise = Image.effect_noise(size, 40)
+    bands = [gradient, noise, gradient.transpose(Image.Transpose.FLIP_LEFT_RIGHT)]
+    if mode == "RGBA":
+        bands.append(gradient.rotate(90))
+    buffer = io.BytesIO()
+    Image.merge(mode, bands).save(buffer, pil_format, quality=90)
+    return buffer.getvalue()
+
+
+def per_variant(content: bytes):
+    """One decode and resize per size and format"""
+    variants = {}
+    for size in THUMBNAIL_SIZES:
+        for name, (pil_format, _, _) in THUMBNAIL_FORMATS.items():
+            with Image.open(io.BytesIO(content)) as img:
+                img = img.convert("RGB")
+                img.thumbnail((size, size), Image.Resampling.LANCZOS)
+                buffer = io.BytesIO()
+                img.save(buffer, pil_format, quality=85)
+                variants.setdefault(size, {})[name] = buffer.getvalue()
+    return variants
+
+
+def check_variants(label: str, variants, expect_alpha: bool) -> bool:
+    ok = True
+    for size in THUMBNAIL_SIZES:
+        for name, (pil_format, _, _) in THUMBNAIL_FORMATS.items():
+            with Image.open(io.BytesIO(variants[size][name])) as img:
+                if img.format != pil_format or max(img.size) > size:
+                    print(f"❌ {label}: {size} {name} is {img.format} {img.size}")
+                    ok = False
+                if name == "webp" and expect_alpha and img.mode != "RGBA":
+                    print(f"❌ {label}: {size} webp lost its transparency")
+                    ok = False
+    return ok
+
+
+def main(video_path=None):
+    ok = True
+    for label, content, expect_alpha in [
+        ("jpeg 4000x3000", sample_image((4000, 3000), "RGB", "JPEG"), False),
+        ("png 1600x1200 rgba", sample_image((1600, 1200), "RGBA", "PNG"), True),
+    ]:
+        started = time.perf_counter()
+        metadata, variants = render_thumbnails(content)
+        single = time.perf_counter() - started
+        started = time.perf_counter()
+        per_variant(content)
+        legacy = time.perf_counter() - started
+
+        passed = check_variants(label, variants, expect_alpha)
+        ok = ok and passed
+        print(f"{'✅' if passed else '❌'} {label} ({metadata['width']}x{metadata['height']}): "
+              f"{len(THUMBNAIL_SIZES)} sizes x {len(THUMBNAIL_FORMATS)} formats in {single * 1000:.0f} ms, "
+              f"decoding per variant {legacy * 1000:.0f} ms")
+
+    if video_path:
+        print(f"\n{video_path}: {probe_video(video_path)}")
+
+    print("\n" + ("SUCCESS" if ok else "FAILURE"))
+
+
+if __name__ == "__main__":
+    main(sys.argv[1] if len(sys.argv) > 1 else None)
@@ -0,0 +1,101 @@
+"""
+Benchmark for PUT /api/progress/lesson/{lesson_id}
+
+Drives the app in-process and reports database round trips per request and
+latency percentiles for a stream of video heartbeats.
+
+Usage (from the backend directory, against a seeded database):
+    python tests/test_progress_benchmark.py <user_id> <lesson_id> [requests]
+
+The user must be actively enrolled in the lesson's course.
+"""
+import sys
+import os
+import asyncio
+import time
+import statistics
+
+import httpx
+
+# Add backend to path
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from main import app
+from database.connection import database
+from middleware.auth import create_access_token
+
+QUERY_METHODS = ("fetch_one", "fetch_all", "fetch_val", "execute", "execute_many")
+
+
+def instrument_database(counter: dict):
+    """Wrap the shared database object so every round trip is counted"""
+    for name in QUERY_METHODS:
+        original = getattr(database, name)
+
+        def wrapper(*args, _original=original, **kwargs):
+            counter["queries"] += 1
+            return _original(*args, **kwargs)
+
+        setattr(database, name, wrapper)
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+async def run_benchmark(user_id: str, lesson_id: str, total_requests: int):
+    await database.connect()
+
+    counter = {"queries": 0}
+    instrument_database(counter)
+
+    token = create_access_token({"sub": user_id})
+    headers = {"Authorization": f"Bearer {token}"}
+
+    latencies = []
+    query_counts = []
+
+    try:
+        async with httpx.AsyncClient(app=app, base_url="http://bench") as client:
+            for i in range(total_requests):
+                # Heartbeats creep forward without reaching 100%
+                payload = {
+                    "progress_percentage": min(99, 1 + i % 99),
+                    "time_spent": 5 * (i + 1),
+                    "last_position": 5 * (i + 1),
+                }
+
+                counter["queries"] = 0
+                start = time.perf_counter()
+                response = await client.put(
+                    f"/api/progress/lesson/{lesson_id}",
+                    json=payload,
+                    headers=headers
+                )
+                latencies.append((time.perf_counter() - start) * 1000)
+                query_counts.append(counter["queries"])
+
+                if response.status_code != 200:
+                    print(f"❌ Request {i} failed: {response.status_code} {response.text}")
+                    return
+    finally:
+        await database.disconnect()
+
+    print("=" * 60)
+    print(f"PUT /api/progress/lesson/{lesson_id} x {total_requests}")
+    print("=" * 60)
+    print(f"Queries per request (incl. auth): {statistics.mean(query_counts):.2f}")
+    print(f"Latency p50: {percentile(latencies, 50):.2f} ms")
+    print(f"Latency p90: {percentile(latencies, 90):.2f} ms")
+    print(f"Latency p99: {percentile(latencies, 99):.2f} ms")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 3:
+        print(__doc__)
+        sys.exit(1)
+
+    total = int(sys.argv[3]) if len(sys.argv) > 3 else 500
+    asyncio.run(run_benchmark(sys.argv[1], sys.argv[2], total))
@@ -0,0 +1,112 @@
+"""
+Checks for push fan-out (utils/notifications.deliver_push)
+
+Runs against a local push-provider stub that takes multicast batches of up
+to 500 tokens, answers each call after a fixed round trip, reports some
+tokens as unregistered and fails every call containing a poisoned token.
+
+Checks that every token is sent exactly once in batches no larger than the
+provider's limit, that calls in flight stay within the concurrency bound,
+that unregistered tokens come back for deletion and that a failed call only
+fails its own batch. Then compares the time to reach every device against
+the old way, one provider call per device, timed on a sample and
+extrapolated.
+
+Usage (from the backend directory):
+    python tests/test_push_broadcast.py [devices] [round_trip_ms]
+"""
+import sys
+import os
+import asyncio
+import time
+from collections import Counter
+
+# Add backend to path
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from utils.notifications import deliver_push
+from utils.push import PushBatchResult, PushProvider
+
+DEVICES = 200000
+ROUND_TRIP = 0.05
+CONCURRENCY = 10
+OLD_WAY_SAMPLE = 100
+
+
+class StubPushProvider(PushProvider):
+    max_batch_size = 500
+
+    def __init__(self, unregistered=(), poisoned=()):
+        self.unregistered = set(unregistered)
+        self.poisoned = set(poisoned)
+        self.sent = Counter()
+        self.batch_sizes = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    async def send_multicast(self, tokens, title, message, data=None):
+        assert len(tokens) <= self.max_batch_size, f"batch of {len(tokens)}"
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            await asyncio.sleep(ROUND_TRIP)
+            if self.poisoned.intersection(tokens):
+                raise Exception("503 from provider")
+            self.sent.update(tokens)
+            self.batch_sizes.append(len(tokens))
+            invalid = [token for token in tokens if token in self.unregistered]
+            return PushBatchResult(delivered=len(tokens) - len(invalid), invalid_tokens=invalid)
+        finally:
+            self.in_flight -= 1
+
+
+async def main():
+    tokens = [f"device-{i}" for i in range(DEVICES)]
+    unregistered = tokens[::1000]
+    poisoned = tokens[DEVICES // 2]
+    provider = StubPushProvider(unregistered=unregistered, poisoned=[poisoned])
+
+    started = time.perf_counter()
+    result = await deliver_push(tokens, "Maintenance", "Tonight 22:00 UTC", {"window": 2}, provider, CONCURRENCY)
+    elapsed = time.perf_counter() - started
+
+    expected_batches = -(-DEVICES // provider.max_batch_size)
+    assert result["batches"] == expected_batches, result["batches"]
+    assert max(provider.batch_sizes) <= provider.max_batch_size
+    print(f"✅ {DEVICES} devices in {result['batches']} batches of up to {provider.max_batch_size}")
+
+    failed_batch = DEVICES // 2 // provider.max_batch_size
+    failed_tokens = set(tokens[failed_batch * provider.max_batch_size:(failed_batch + 1) * provider.max_batch_size])
+    assert result["failed"] == len(failed_tokens), result["failed"]
+    assert set(provider.sent) == set(tokens) - failed_tokens, "every other token sent"
+    assert max(provider.sent.values()) == 1, "no token sent twice"
+    print(f"✅ a failed call fails only its batch ({result['failed']} devices)")
+
+    expected_invalid = [token for token in unregistered if token not in failed_tokens]
+    assert sorted(result["invalid_tokens"]) == sorted(expected_invalid)
+    assert result["delivered"] == DEVICES - len(failed_tokens) - len(expected_invalid)
+    print(f"✅ {len(result['invalid_tokens'])} unregistered tokens reported, {result['delivered']} delivered")
+
+    assert provider.max_in_flight <= CONCURRENCY, provider.max_in_flight
+    print(f"✅ at most {provider.max_in_flight} calls in flight")
+
+    old_provider = StubPushProvider()
+    started = time.perf_counter()
+    for token in tokens[:OLD_WAY_SAMPLE]:
+        await old_provider.send_multicast([token], "Maintenance", "Tonight 22:00 UTC")
+    per_device = (time.perf_counter() - started) / OLD_WAY_SAMPLE
+    old_elapsed = per_device * DEVICES
+
+    print(f"\n   {DEVICES} devices, {ROUND_TRIP * 1000:.0f} ms per provider call")
+    print(f"   {'one call per device (extrapolated)':<38} {old_elapsed:10.1f}s")
+    print(f"   {'multicast, ' + str(CONCURRENCY) + ' calls in flight':<38} {elapsed:10.2f}s")
+    assert elapsed < old_elapsed / 100
+    print(f"✅ fan-out {old_elapsed / elapsed:.0f}x faster")
+
+    print("\nSUCCESS")
+
+
+if __name__ == "__main__":
+    DEVICES = int(sys.argv[1]) if len(sys.argv) > 1 else DEVICES
+    ROUND_TRIP = float(sys.argv[2]) / 1000 if len(sys.argv) > 2 else ROUND_TRIP
+    asyncio.run(main())
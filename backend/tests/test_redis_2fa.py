@@ -2,16 +2,17 @@
 Test script for Redis 2FA session management
 Run this to verify Redis integration is working correctly
 """
+import asyncio
 import uuid
-from utils.redis_client import two_fa_manager, check_redis_connection, redis_client
+from utils.redis_client import two_fa_manager, check_redis_connection, close_redis_connections
 
-def test_redis_connection():
+async def test_redis_connection():
     """Test 1: Check Redis connection"""
     print("\n" + "="*60)
     print("TEST 1: Redis Connection")
     print("="*60)
     
-    if check_redis_connection():
+    if await check_redis_connection():
         print("✅ Redis is connected and responsive")
         return True
     else:
@@ -19,7 +20,7 @@ def test_redis_connection():
         print("   Make sure Redis is running: redis-server")
         return False
 
-def test_create_session():
+async def test_create_session():
     """Test 2: Create 2FA session"""
     print("\n" + "="*60)
     print("TEST 2: Create 2FA Session")
@@ -28,7 +29,7 @@ def test_create_session():
     session_id = str(uuid.uuid4())
     print(f"Session ID: {session_id}")
     
-    success = two_fa_manager.create_2fa_session(
+    success = await two_fa_manager.create_2fa_session(
         session_id=session_id,
         user_id="test-user-123",
         email="test@example.com",
@@ -40,11 +41,11 @@ def test_create_session():
         print("✅ Session created successfully")
         
         # Verify it exists in Redis
-        exists = two_fa_manager.session_exists(session_id)
+        exists = await two_fa_manager.session_exists(session_id)
         print(f"✅ Session exists in Redis: {exists}")
         
         # Check TTL
-        ttl = two_fa_manager.get_session_ttl(session_id)
+        ttl = await two_fa_manager.get_session_ttl(session_id)
         print(f"✅ Session TTL: {ttl} seconds (~10 minutes)")
         
         return session_id
@@ -52,13 +53,13 @@ def test_create_session():
         print("❌ Failed to create session")
         return None
 
-def test_retrieve_session(session_id):
+async def test_retrieve_session(session_id):
     """Test 3: Retrieve session data"""
     print("\n" + "="*60)
     print("TEST 3: Retrieve Session Data")
     print("="*60)
     
-    session = two_fa_manager.get_session(session_id)
+    session = await two_fa_manager.get_session(session_id)
     
     if session:
         print("✅ Session retrieved successfully")
@@ -71,7 +72,7 @@ def test_retrieve_session(session_id):
         print("❌ Failed to retrieve session")
         return False
 
-def test_verify_code(session_id):
+async def test_verify_code(session_id):
     """Test 4: Verify 2FA code"""
     print("\n" + "="*60)
     print("TEST 4: Verify 2FA Code")
@@ -79,7 +80,7 @@ def test_verify_code(session_id):
     
     # Test with wrong code
     print("Testing with wrong code (999999)...")
-    result = two_fa_manager.verify_2fa_code(session_id, "999999")
+    result = await two_fa_manager.verify_2fa_code(session_id, "999999")
     if result is None:
         print("✅ Correctly rejected wrong code")
     else:
@@ -87,7 +88,7 @@ def test_verify_code(session_id):
     
     # Test with correct code
     print("\nTesting with correct code (123456)...")
-    result = two_fa_manager.verify_2fa_code(session_id, "123456")
+    result = await two_fa_manager.verify_2fa_code(session_id, "123456")
     if result:
         print("✅ Correctly verified code")
         print(f"   Session marked as verified: {result.get('verified')}")
@@ -96,20 +97,20 @@ def test_verify_code(session_id):
         print("❌ Failed to verify correct code")
         return False
 
-def test_session_cleanup(session_id):
+async def test_session_cleanup(session_id):
     """Test 5: Clean up session"""
     print("\n" + "="*60)
     print("TEST 5: Session Cleanup")
     print("="*60)
     
     # Delete session
-    success = two_fa_manager.invalidate_2fa_session(session_id)
+    success = await two_fa_manager.invalidate_2fa_session(session_id)
     
     if success:
         print("✅ Session deleted successfully")
         
         # Verify it's gone
-        exists = two_fa_manager.session_exists(session_id)
+        exists = await two_fa_manager.session_exists(session_id)
         if not exists:
             print("✅ Session no longer exists in Redis")
             return True
@@ -120,7 +121,7 @@ def test_session_cleanup(session_id):
         print("❌ Failed to delete session")
         return False
 
-def test_session_expiration():
+async def test_session_expiration():
     """Test 6: Session expiration"""
     print("\n" + "="*60)
     print("TEST 6: Session Expiration")
@@ -130,7 +131,7 @@ def test_session_expiration():
     print(f"Creating session with 5 second expiration...")
     
     # Create session with short expiration
-    success = two_fa_manager.create_2fa_session(
+    success = await two_fa_manager.create_2fa_session(
         session_id=session_id,
         user_id="test-user-456",
         email="test2@example.com",
@@ -142,29 +143,28 @@ def test_session_expiration():
         print("✅ Session created")
         
         # Check TTL
-        ttl = two_fa_manager.get_session_ttl(session_id)
+        ttl = await two_fa_manager.get_session_ttl(session_id)
         print(f"✅ Initial TTL: {ttl} seconds")
         
         # Wait for expiration
-        import time
         print("⏳ Waiting 6 seconds for expiration...")
-        time.sleep(6)
+        await asyncio.sleep(6)
         
         # Check if expired
-        exists = two_fa_manager.session_exists(session_id)
+        exists = await two_fa_manager.session_exists(session_id)
         if not exists:
             print("✅ Session expired automatically")
             return True
         else:
             print("❌ Session should have expired")
             # Clean up
-            two_fa_manager.invalidate_2fa_session(session_id)
+            await two_fa_manager.invalidate_2fa_session(session_id)
             return False
     else:
         print("❌ Failed to create session")
         return False
 
-def test_multiple_sessions():
+async def test_multiple_sessions():
     """Test 7: Multiple concurrent sessions"""
     print("\n" + "="*60)
     print("TEST 7: Multiple Concurrent Sessions")
@@ -176,7 +176,7 @@ def test_multiple_sessions():
     print("Creating 5 concurrent sessions...")
     for i in range(5):
         session_id = str(uuid.uuid4())
-        success = two_fa_manager.create_2fa_session(
+        success = await two_fa_manager.create_2fa_session(
             session_id=session_id,
             user_id=f"user-{i}",
             email=f"user{i}@example.com",
@@ -195,12 +195,66 @@ def test_multiple_sessions():
     # Clean up
     print("\nCleaning up sessions...")
     for session_id in sessions:
-        two_fa_manager.invalidate_2fa_session(session_id)
+        await two_fa_manager.invalidate_2fa_session(session_id)
     
     print("✅ All sessions cleaned up")
     return True
 
-def run_all_tests():
+async def test_concurrent_verify():
+    """Test 8: A code can only be used once, even by concurrent requests"""
+    print("\n" + "="*60)
+    print("TEST 8: Concurrent Verification")
+    print("="*60)
+    
+    session_id = str(uuid.uuid4())
+    await two_fa_manager.create_2fa_session(
+        session_id=session_id,
+        user_id="test-user-789",
+        email="test3@example.com",
+        code="246810",
+        expiry_minutes=10
+    )
+    
+    results = await asyncio.gather(*[
+        two_fa_manager.verify_2fa_code(session_id, "246810") for _ in range(10)
+    ])
+    accepted = sum(1 for result in results if result)
+    await two_fa_manager.invalidate_2fa_session(session_id)
+    
+    if accepted == 1:
+        print("✅ 10 concurrent verifications, exactly 1 accepted")
+        return True
+    print(f"❌ {accepted} of 10 concurrent verifications accepted")
+    return False
+
+async def test_update_and_extend():
+    """Test 9: update_session keeps the TTL, extend_session adds to it"""
+    print("\n" + "="*60)
+    print("TEST 9: Update and Extend")
+    print("="*60)
+    
+    session_id = str(uuid.uuid4())
+    await two_fa_manager.set_session(session_id, {"step": 1}, expiry_seconds=100)
+    
+    updated = await two_fa_manager.update_session(session_id, {"step": 2})
+    ttl = await two_fa_manager.get_session_ttl(session_id)
+    session = await two_fa_manager.get_session(session_id)
+    kept = updated and 0 < ttl <= 100 and session == {"step": 2}
+    print(f"{'✅' if kept else '❌'} Updated to {session}, TTL still {ttl} seconds")
+    
+    extended = await two_fa_manager.extend_session(session_id, 50)
+    ttl = await two_fa_manager.get_session_ttl(session_id)
+    extended = extended and 100 < ttl <= 150
+    print(f"{'✅' if extended else '❌'} Extended TTL to {ttl} seconds")
+    
+    await two_fa_manager.invalidate_2fa_session(session_id)
+    untouched = not await two_fa_manager.update_session(session_id, {"step": 3})
+    untouched = untouched and not await two_fa_manager.extend_session(session_id, 50)
+    untouched = untouched and not await two_fa_manager.session_exists(session_id)
+    print(f"{'✅' if untouched else '❌'} Deleted sessions are not recreated by update or extend")
+    return kept and extended and untouched
+
+async def run_all_tests():
     """Run all tests"""
     print("\n" + "="*60)
     print("REDIS 2FA SESSION MANAGEMENT TESTS")
@@ -209,13 +263,13 @@ def run_all_tests():
     results = []
     
     # Test 1: Connection
-    if not test_redis_connection():
+    if not await test_redis_connection():
         print("\n❌ Redis connection failed. Cannot continue tests.")
         return
     results.append(True)
     
     # Test 2: Create session
-    session_id = test_create_session()
+    session_id = await test_create_session()
     if session_id:
         results.append(True)
     else:
@@ -223,19 +277,25 @@ def run_all_tests():
         return
     
     # Test 3: Retrieve session
-    results.append(test_retrieve_session(session_id))
+    results.append(await test_retrieve_session(session_id))
     
     # Test 4: Verify code
-    results.append(test_verify_code(session_id))
+    results.append(await test_verify_code(session_id))
     
     # Test 5: Cleanup
-    results.append(test_session_cleanup(session_id))
+    results.append(await test_session_cleanup(session_id))
     
     # Test 6: Expiration
-    results.append(test_session_expiration())
+    results.append(await test_session_expiration())
     
     # Test 7: Multiple sessions
-    results.append(test_multiple_sessions())
+    results.append(await test_multiple_sessions())
+    
+    # Test 8: Concurrent verification
+    results.append(await test_concurrent_verify())
+    
+    # Test 9: TTL-preserving updates
+    results.append(await test_update_and_extend())
     
     # Summary
     print("\n" + "="*60)
@@ -252,6 +312,12 @@ def run_all_tests():
     
     print("="*60)
 
+async def main():
+    try:
+        await run_all_tests()
+    finally:
+        await close_redis_connections()
+
 if __name__ == "__main__":
-    run_all_tests()
+    asyncio.run(main())
 
@@ -0,0 +1,149 @@
+"""
+Latency comparison for the asyncio Redis client (utils/redis_client.py)
+
+Runs N concurrent admin logins' worth of 2FA session traffic (create,
+verify, invalidate) twice: with the synchronous client and the previous
+get/ttl/setex sequence, as the handlers did before, and with
+two_fa_manager on the pooled asyncio client and its Lua scripts. Prints
+per-login latency, total time and the worst event-loop stall seen by a 5 ms
+timer. Synchronous calls stall the loop for every round trip, so their
+latency grows with concurrency and with the distance to Redis.
+
+A local Redis answers in microseconds, which hides that; pass delay_ms to
+route both clients through a proxy that delays every packet by that much
+each way, like a Redis in another availability zone.
+
+Usage (from the backend directory, with REDIS_URL pointing at a test Redis):
+    python tests/test_redis_latency.py [logins] [rounds] [delay_ms]
+"""
+import sys
+import os
+import asyncio
+import json
+import threading
+import time
+import uuid
+from urllib.parse import urlparse
+
+# Add backend to path
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+
+def start_delay_proxy(target_url: str, delay: float) -> str:
+    """Forward a local port to Redis on its own thread, delaying each packet; returns the proxy URL"""
+    target = urlparse(target_url)
+    loop = asyncio.new_event_loop()
+    ready = threading.Event()
+    address = {}
+
+    async def pipe(reader, writer):
+        try:
+            while data := await reader.read(65536):
+                await asyncio.sleep(delay)
+                writer.write(data)
+                await writer.drain()
+        finally:
+            writer.close()
+
+    async def handle(client_reader, client_writer):
+        server_reader, server_writer = await asyncio.open_connection(target.hostname, target.port or 6379)
+        await asyncio.gather(pipe(client_reader, server_writer), pipe(server_reader, client_writer),
+                             return_exceptions=True)
+
+    async def serve():
+        server = await asyncio.start_server(handle, "127.0.0.1", 0)
+        address["port"] = server.sockets[0].getsockname()[1]
+        ready.set()
+        await server.serve_forever()
+
+    threading.Thread(target=loop.run_until_complete, args=(serve(),), daemon=True).start()
+    ready.wait()
+    return target._replace(netloc=f"127.0.0.1:{address['port']}").geturl()
+
+
+DELAY_MS = 0
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+async def watch_loop(stop: asyncio.Event, lag: list):
+    """Record the gap between ticks of a 5 ms timer"""
+    while not stop.is_set():
+        started = time.perf_counter()
+        await asyncio.sleep(0.005)
+        lag.append(time.perf_counter() - started - 0.005)
+
+
+async def sync_login(session_id: str) -> bool:
+    """2FA session traffic as before: synchronous client, three calls to verify"""
+    key = f"session:{session_id}"
+    redis_client.setex(key, 600, json.dumps({"user_id": "u", "email": "e", "code": "123456", "verified": False}))
+    await asyncio.sleep(0)  # the email is queued between the two requests
+    session = json.loads(redis_client.get(key))
+    if session["code"] != "123456" or session["verified"]:
+        return False
+    session["verified"] = True
+    ttl = redis_client.ttl(key)
+    redis_client.setex(key, ttl, json.dumps(session))
+    redis_client.delete(key)
+    return True
+
+
+async def async_login(session_id: str) -> bool:
+    await two_fa_manager.create_2fa_session(session_id, "u", "e", "123456")
+    await asyncio.sleep(0)
+    session = await two_fa_manager.verify_2fa_code(session_id, "123456")
+    await two_fa_manager.invalidate_2fa_session(session_id)
+    return session is not None
+
+
+async def run(label: str, login, logins: int, rounds: int) -> bool:
+    stop, lag, latencies = asyncio.Event(), [], []
+    watcher = asyncio.create_task(watch_loop(stop, lag))
+
+    async def timed_login():
+        started = time.perf_counter()
+        ok = await login(str(uuid.uuid4()))
+        latencies.append((time.perf_counter() - started) * 1000)
+        return ok
+
+    started = time.perf_counter()
+    results = []
+    for _ in range(rounds):
+        results += await asyncio.gather(*[timed_login() for _ in range(logins)])
+    elapsed = time.perf_counter() - started
+    stop.set()
+    await watcher
+
+    print(f"{label:<8} p50 {percentile(latencies, 50):7.2f} ms   p99 {percentile(latencies, 99):7.2f} ms   "
+          f"total {elapsed:6.2f}s   worst loop stall {max(lag, default=0) * 1000:6.1f} ms")
+    return all(results)
+
+
+async def main(logins: int, rounds: int):
+    try:
+        await async_login(str(uuid.uuid4()))  # warm up the pool and load the scripts
+        print(f"{logins} concurrent logins x {rounds} rounds, {DELAY_MS:g} ms added each way\n")
+        ok = await run("sync", sync_login, logins, rounds)
+        ok = await run("async", async_login, logins, rounds) and ok
+        print("\n" + ("SUCCESS" if ok else "FAILURE"))
+    finally:
+        await close_redis_connections()
+
+
+if __name__ == "__main__":
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    repeat = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+    DELAY_MS = float(sys.argv[3]) if len(sys.argv) > 3 else 0
+    if DELAY_MS:
+        os.environ["REDIS_URL"] = start_delay_proxy(
+            os.getenv("REDIS_URL", "redis://localhost:6379/0"), DELAY_MS / 1000
+        )
+    # The clients connect to REDIS_URL as they are created, so import them
+    # only once it points at the proxy
+    from utils.redis_client import redis_client, two_fa_manager, close_redis_connections
+    asyncio.run(main(count, repeat))
@@ -0,0 +1,72 @@
+"""
+Checks for the result cache (utils/result_cache.py)
+
+Fires concurrent requests at a slow cached function and checks that they
+share one computation, that tag invalidation serves the stale value once and
+refreshes it in the background, and that expired entries are recomputed.
+Requires Redis (REDIS_URL).
+
+Usage (from the backend directory):
+    python tests/test_result_cache.py [concurrency]
+"""
+import sys
+import os
+import asyncio
+import time
+import uuid
+
+# Add backend to path
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from utils.result_cache import ResultCache
+
+calls = 0
+
+
+async def slow_result():
+    global calls
+    calls += 1
+    await asyncio.sleep(0.2)
+    return {"computed": calls}
+
+
+async def main(concurrency: int):
+    cache = ResultCache()
+    key = f"result_cache:test:{uuid.uuid4().hex}"
+    tag = f"test-{uuid.uuid4().hex}"
+
+    def get():
+        return cache.get_or_compute(key, (tag,), 1, 5, slow_result)
+
+    started = time.perf_counter()
+    results = await asyncio.gather(*[get() for _ in range(concurrency)])
+    elapsed = (time.perf_counter() - started) * 1000
+    assert calls == 1, f"{concurrency} concurrent misses computed {calls} times"
+    assert all(result == {"computed": 1} for result in results)
+    print(f"✅ {concurrency} concurrent misses, one computation, {elapsed:.0f} ms")
+
+    started = time.perf_counter()
+    assert await get() == {"computed": 1}
+    print(f"✅ cached hit in {(time.perf_counter() - started) * 1000:.2f} ms")
+
+    await cache.invalidate_tags(tag)
+    assert await get() == {"computed": 1}, "invalidated entry is served stale"
+    await asyncio.sleep(0.3)
+    assert await get() == {"computed": 2}, "stale entry is refreshed in the background"
+    assert calls == 2
+    print("✅ invalidation serves stale once, then the refreshed value")
+
+    await asyncio.sleep(1.1)
+    assert await get() == {"computed": 2}, "expired entry is served stale"
+    await asyncio.sleep(0.3)
+    assert await get() == {"computed": 3}
+    print("✅ expired entry refreshed")
+
+    await cache.client.delete(key)
+    print(cache.get_stats())
+    await cache.client.aclose()
+    print("\nSUCCESS")
+
+
+if __name__ == "__main__":
+    asyncio.run(main(int(sys.argv[1]) if len(sys.argv) > 1 else 50))
@@ -0,0 +1,159 @@
+"""
+Checks for resumable uploads (utils/resumable_upload.py)
+
+For the local provider and, when S3_ENDPOINT_URL points at an S3 stand-in,
+AWSS3Provider: opens a session for a file of a few chunks, sends the chunks
+out of order, one of them cut short as by a dropped connection, and checks
+that the session reports exactly the missing ranges, that completion is
+refused until they arrive and that the stored file matches byte for byte.
+Also checks that a session can be aborted. Requires Redis (REDIS_URL).
+
+Usage (from the backend directory):
+    moto_server -p 5000 &   # optional, or any S3-compatible server
+    S3_ENDPOINT_URL=http://localhost:5000 AWS_ACCESS_KEY_ID=test AWS_SECRET_ACCESS_KEY=test \\
+        python tests/test_resumable_upload.py [size_mb]
+"""
+import sys
+import os
+import asyncio
+import hashlib
+import random
+import tempfile
+import uuid
+from types import SimpleNamespace
+
+from fastapi import HTTPException
+
+# Add backend to path
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from utils.file_upload import AWSS3Provider, LocalFileProvider, ALLOWED_VIDEO_TYPES, S3_ENDPOINT_URL, run_io
+from utils.resumable_upload import ResumableUploadService, chunk_length
+
+INSTRUCTOR = SimpleNamespace(id=uuid.uuid4(), role="instructor")
+OTHER_INSTRUCTOR = SimpleNamespace(id=uuid.uuid4(), role="instructor")
+
+
+async def body(content: bytes, piece: int = 64 * 1024):
+    """Request body as the ASGI server delivers it, in small pieces"""
+    for start in range(0, len(content), piece):
+        yield content[start:start + piece]
+
+
+async def expect_error(status_code: int, coroutine) -> bool:
+    try:
+        await coroutine
+    except HTTPException as e:
+        return e.status_code == status_code
+    return False
+
+
+def check(ok: bool, message: str) -> bool:
+    print(f"{'✅' if ok else '❌'} {message}")
+    return ok
+
+
+async def exercise(name: str, provider, read_back, size: int) -> bool:
+    service = ResumableUploadService(provider)
+    content = os.urandom(size)
+    created = await service.create_session(
+        INSTRUCTOR.id, "lecture.mp4", "video/mp4", size, "tests", ALLOWED_VIDEO_TYPES, size
+    )
+    upload_id = created["upload_id"]
+    session = await service.get_session(upload_id, INSTRUCTOR)
+    chunk_size, total = created["chunk_size"], created["total_chunks"]
+
+    def chunk(index):
+        return content[index * chunk_size:index * chunk_size + chunk_length(session, index)]
+
+    ok = check(total >= 3, f"{name}: {size // (1024 * 1024)} MB in {total} chunks of {chunk_size // (1024 * 1024)} MB")
+    ok = check(
+        await expect_error(403, service.get_session(upload_id, OTHER_INSTRUCTOR)),
+        f"{name}: other instructors cannot see the upload"
+    ) and ok
+
+    # Everything but the first chunk, out of order; chunk 1 is cut short
+    order = list(range(1, total))
+    random.shuffle(order)
+    for index in order:
+        if index == 1:
+            ok = check(
+                await expect_error(400, service.put_chunk(session, index, body(chunk(index)[:1000]))),
+                f"{name}: truncated chunk rejected"
+            ) and ok
+        else:
+            await service.put_chunk(session, index, body(chunk(index)), index * chunk_size)
+    ok = check(
+        await expect_error(409, service.put_chunk(session, 2, body(chunk(2)), 0)),
+        f"{name}: wrong offset rejected"
+    ) and ok
+
+    status = await service.status(session)
+    ok = check(
+        status["missing_chunks"] == [0, 1] and status["received_ranges"] == [[2 * chunk_size, size]],
+        f"{name}: status reports missing chunks {status['missing_chunks']}, received {status['received_ranges']}"
+    ) and ok
+    ok = check(await expect_error(409, service.complete(session)), f"{name}: incomplete upload not completed") and ok
+
+    # Resume: send only what is missing, resend one chunk for good measure
+    for index in status["missing_chunks"] + [total - 1]:
+        await service.put_chunk(session, index, body(chunk(index)))
+    result = await service.complete(session)
+    stored = await read_back(result["filename"])
+    ok = check(
+        hashlib.sha256(stored).digest() == hashlib.sha256(content).digest() and result["size"] == size,
+        f"{name}: completed file matches"
+    ) and ok
+    ok = check(
+        await expect_error(404, service.get_session(upload_id, INSTRUCTOR)),
+        f"{name}: session closed after completion"
+    ) and ok
+    await provider.delete_file(result["url"])
+
+    aborted = await service.create_session(
+        INSTRUCTOR.id, "draft.webm", "video/webm", size, "tests", ALLOWED_VIDEO_TYPES, size
+    )
+    session = await service.get_session(aborted["upload_id"], INSTRUCTOR)
+    await service.put_chunk(session, 0, body(content[:chunk_length(session, 0)]))
+    await service.abort(session)
+    ok = check(
+        await expect_error(404, service.get_session(aborted["upload_id"], INSTRUCTOR)),
+        f"{name}: aborted session removed"
+    ) and ok
+    return ok
+
+
+async def main(size: int):
+    ok = True
+    with tempfile.TemporaryDirectory() as directory:
+        local = LocalFileProvider(upload_path=os.path.join(directory, "uploads"))
+
+        async def read_local(key):
+            with open(os.path.join(local.upload_path, key), 'rb') as f:
+                return f.read()
+
+        ok = await exercise("local", local, read_local, size) and ok
+        ok = check(os.listdir(local.parts_path) == [], "local: no part files left behind") and ok
+
+    if S3_ENDPOINT_URL:
+        bucket = f"resumable-test-{uuid.uuid4().hex[:8]}"
+        s3 = AWSS3Provider(bucket_name=bucket, endpoint_url=S3_ENDPOINT_URL)
+        await run_io(s3.s3_client.create_bucket, Bucket=bucket)
+
+        async def read_s3(key):
+            response = await run_io(s3.s3_client.get_object, Bucket=bucket, Key=key)
+            return await run_io(response["Body"].read)
+
+        ok = await exercise("s3", s3, read_s3, size) and ok
+        uploads = await run_io(s3.s3_client.list_multipart_uploads, Bucket=bucket)
+        ok = check(not uploads.get("Uploads"), "s3: no multipart uploads left open") and ok
+        await run_io(s3.s3_client.delete_bucket, Bucket=bucket)
+    else:
+        print("S3_ENDPOINT_URL not set, skipping the S3 provider")
+
+    print("\n" + ("SUCCESS" if ok else "FAILURE"))
+
+
+if __name__ == "__main__":
+    megabytes = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    asyncio.run(main(megabytes * 1024 * 1024 + 12345))
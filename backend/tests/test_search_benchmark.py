@@ -0,0 +1,122 @@
+"""
+Benchmark: ILIKE scans vs the full-text search documents (utils/search.py)
+
+Seeds a course with N synthetic lessons (default 1,000,000), then times the
+old ILIKE filter against the indexed tsquery filter for a few terms and
+prints the plan of each. Requires migration 010. The seeded rows are
+removed at the end.
+
+Usage (from the backend directory, with DATABASE_URL pointing at a test DB):
+    python tests/test_search_benchmark.py [lessons] [repeats]
+"""
+import sys
+import os
+import asyncio
+import time
+import uuid
+import statistics
+
+# Add backend to path
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from database.connection import database
+from utils.search import TextSearch
+
+WORDS = [
+    "python", "javascript", "algebra", "biology", "chemistry", "history", "design",
+    "marketing", "finance", "statistics", "physics", "writing", "databases", "networks",
+    "security", "painting", "music", "photography", "economics", "philosophy",
+]
+TERMS = ["python", "stat", "machine learning", "philosophy of music", "zzzz"]
+
+SEED_QUERY = """
+    INSERT INTO lessons (course_id, title, slug, description)
+    SELECT
+        :course_id,
+        'Lesson ' || g || ': ' || (CAST(:words AS TEXT[]))[1 + g % 20] || ' ' || (CAST(:words AS TEXT[]))[1 + (g / 20) % 20],
+        'bench-' || g,
+        'An introduction to ' || (CAST(:words AS TEXT[]))[1 + (g / 400) % 20] || ' and ' || (CAST(:words AS TEXT[]))[1 + (g / 7) % 20]
+    FROM generate_series(1, :count) g
+"""
+
+
+async def seed(count: int):
+    user_id = uuid.uuid4()
+    course_id = uuid.uuid4()
+    await database.execute("""
+        INSERT INTO users (id, email, username, password_hash, first_name, last_name, role, status)
+        VALUES (:id, :email, :username, 'x', 'Search', 'Bench', 'instructor', 'active')
+    """, values={"id": user_id, "email": f"search_{user_id}@test.com", "username": f"search_{user_id}"})
+    await database.execute("""
+        INSERT INTO courses (id, title, slug, instructor_id)
+        VALUES (:id, 'Search benchmark', :slug, :instructor_id)
+    """, values={"id": course_id, "slug": f"search-bench-{course_id}", "instructor_id": user_id})
+
+    start = time.perf_counter()
+    for offset in range(0, count, 100000):
+        batch = min(100000, count - offset)
+        await database.execute(
+            SEED_QUERY.replace("generate_series(1, :count)", f"generate_series({offset + 1}, {offset + batch})"),
+            values={"course_id": course_id, "words": WORDS}
+        )
+    await database.execute("ANALYZE lessons")
+    await database.execute("ANALYZE lesson_search_documents")
+    print(f"Seeded {count:,} lessons in {time.perf_counter() - start:.1f}s")
+    return user_id, course_id
+
+
+async def cleanup(user_id, course_id):
+    await database.execute("DELETE FROM courses WHERE id = :id", values={"id": course_id})
+    await database.execute("DELETE FROM users WHERE id = :id", values={"id": user_id})
+
+
+async def time_query(query: str, values: dict, repeats: int) -> float:
+    samples = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        await database.fetch_all(query, values=values)
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples)
+
+
+async def plan_summary(query: str, values: dict) -> str:
+    rows = await database.fetch_all(f"EXPLAIN {query}", values=values)
+    return " / ".join(
+        row["QUERY PLAN"].strip().split("  (")[0] for row in rows
+        if "Scan" in row["QUERY PLAN"] or "Join" in row["QUERY PLAN"]
+    )[:120]
+
+
+async def main(count: int, repeats: int):
+    await database.connect()
+    user_id, course_id = await seed(count)
+    try:
+        print("=" * 80)
+        print(f"{'term':<22}{'ILIKE ms':>10}{'tsquery ms':>12}   plan (tsquery)")
+        print("=" * 80)
+        for term in TERMS:
+            ilike_query = """
+                SELECT l.id FROM lessons l
+                WHERE l.title ILIKE :search OR l.description ILIKE :search
+                ORDER BY l.created_at DESC LIMIT 20
+            """
+            ilike_ms = await time_query(ilike_query, {"search": f"%{term}%"}, repeats)
+
+            values = {}
+            fts_query = f"""
+                SELECT l.id FROM lessons l
+                WHERE {TextSearch(term).matches("lessons", "l.id", values)}
+                ORDER BY l.created_at DESC LIMIT 20
+            """
+            fts_ms = await time_query(fts_query, values, repeats)
+
+            print(f"{term:<22}{ilike_ms:>10.1f}{fts_ms:>12.1f}   {await plan_summary(fts_query, values)}")
+    finally:
+        await cleanup(user_id, course_id)
+        await database.disconnect()
+
+
+if __name__ == "__main__":
+    total = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+    runs = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+    asyncio.run(main(total, runs))
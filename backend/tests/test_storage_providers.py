@@ -0,0 +1,141 @@
+"""
+Checks for the async storage providers (utils/file_upload.py)
+
+Uploads N files concurrently through the local provider and, when
+S3_ENDPOINT_URL points at an S3 stand-in (MinIO, `moto_server`), through
+AWSS3Provider. Each run checks the stored bytes, deletes the files and
+reports the worst event-loop stall seen meanwhile. Every blocking call runs
+on the storage executor, so stalls should stay far below the transfer time
+(the first S3 run also pays for client setup).
+
+Then streams one large upload (default 64 MB) through each provider from an
+UploadFile, as the upload endpoints do, and checks its checksum, size and
+stored bytes along with the peak memory traced meanwhile.
+
+Usage (from the backend directory):
+    moto_server -p 5000 &   # or any S3-compatible server
+    S3_ENDPOINT_URL=http://localhost:5000 AWS_ACCESS_KEY_ID=test AWS_SECRET_ACCESS_KEY=test \\
+        python tests/test_storage_providers.py [files] [size_mb] [stream_mb]
+"""
+import sys
+import os
+import asyncio
+import hashlib
+import tempfile
+import time
+import tracemalloc
+import uuid
+
+from fastapi import UploadFile
+from starlette.datastructures import Headers
+
+# Add backend to path
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from utils.file_upload import (
+    AWSS3Provider, LocalFileProvider, FileUploadService, S3_ENDPOINT_URL, run_io
+)
+
+
+async def watch_loop(stop: asyncio.Event, lag: list):
+    """Record the longest gap between ticks of a 5 ms timer"""
+    while not stop.is_set():
+        started = time.perf_counter()
+        await asyncio.sleep(0.005)
+        lag.append(time.perf_counter() - started - 0.005)
+
+
+async def exercise(name: str, provider, read_back, files: int, size: int) -> bool:
+    payloads = {f"tests/{uuid.uuid4()}.bin": os.urandom(size) for _ in range(files)}
+    stop, lag = asyncio.Event(), []
+    watcher = asyncio.create_task(watch_loop(stop, lag))
+
+    started = time.perf_counter()
+    urls = await asyncio.gather(*[
+        provider.upload_file_content(content, key, "application/octet-stream")
+        for key, content in payloads.items()
+    ])
+    elapsed = time.perf_counter() - started
+    stop.set()
+    await watcher
+
+    ok = True
+    for (key, content), url in zip(payloads.items(), urls):
+        if await read_back(key) != content:
+            print(f"❌ {name}: {key} was not stored intact")
+            ok = False
+    deleted = await asyncio.gather(*[provider.delete_file(url) for url in urls])
+    ok = ok and all(deleted)
+
+    print(f"{'✅' if ok else '❌'} {name}: {files} x {size // (1024 * 1024)} MB in {elapsed:.2f}s, "
+          f"worst loop stall {max(lag, default=0) * 1000:.1f} ms")
+    return ok
+
+
+async def exercise_stream(name: str, provider, read_back, size: int) -> bool:
+    spooled = tempfile.SpooledTemporaryFile(max_size=1024 * 1024)
+    digest = hashlib.sha256()
+    for _ in range(size // (1024 * 1024)):
+        block = os.urandom(1024 * 1024)
+        digest.update(block)
+        spooled.write(block)
+    spooled.seek(0)
+    upload = UploadFile(spooled, filename="lecture.mp4", headers=Headers({"content-type": "video/mp4"}))
+
+    tracemalloc.start()
+    started = time.perf_counter()
+    result = await FileUploadService(provider).upload_file(
+        upload, "tests", {"video/mp4": ".mp4"}, size
+    )
+    elapsed = time.perf_counter() - started
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    stored = await read_back(result["filename"])
+    ok = (
+        result["checksum"] == digest.hexdigest()
+        and result["size"] == size
+        and hashlib.sha256(stored).hexdigest() == digest.hexdigest()
+    )
+    await provider.delete_file(result["url"])
+    spooled.close()
+    print(f"{'✅' if ok else '❌'} {name} stream: {size // (1024 * 1024)} MB in {elapsed:.2f}s, "
+          f"peak traced memory {peak / (1024 * 1024):.1f} MB")
+    return ok
+
+
+async def main(files: int, size: int, stream_size: int):
+    ok = True
+    with tempfile.TemporaryDirectory() as directory:
+        local = LocalFileProvider(upload_path=directory)
+
+        async def read_local(key):
+            with open(os.path.join(directory, key), 'rb') as f:
+                return f.read()
+
+        ok = await exercise("local", local, read_local, files, size) and ok
+        ok = await exercise_stream("local", local, read_local, stream_size) and ok
+
+    if S3_ENDPOINT_URL:
+        bucket = f"storage-test-{uuid.uuid4().hex[:8]}"
+        s3 = AWSS3Provider(bucket_name=bucket, endpoint_url=S3_ENDPOINT_URL)
+        await run_io(s3.s3_client.create_bucket, Bucket=bucket)
+
+        async def read_s3(key):
+            response = await run_io(s3.s3_client.get_object, Bucket=bucket, Key=key)
+            return await run_io(response["Body"].read)
+
+        ok = await exercise("s3", s3, read_s3, files, size) and ok
+        ok = await exercise_stream("s3", s3, read_s3, stream_size) and ok
+        await run_io(s3.s3_client.delete_bucket, Bucket=bucket)
+    else:
+        print("S3_ENDPOINT_URL not set, skipping the S3 provider")
+
+    print("\n" + ("SUCCESS" if ok else "FAILURE"))
+
+
+if __name__ == "__main__":
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    megabytes = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+    stream_megabytes = int(sys.argv[3]) if len(sys.argv) > 3 else 64
+    asyncio.run(main(count, megabytes * 1024 * 1024, stream_megabytes * 1024 * 1024))
@@ -0,0 +1,180 @@
+"""
+Concurrency stress test for the token ledger in utils/tokens.py
+
+Fires thousands of parallel awards, spends and transfers against a real
+database and checks that the final balances and transaction logs are exact.
+
+Usage (from the backend directory, with DATABASE_URL pointing at a test DB):
+    python tests/test_token_concurrency.py [operations]
+"""
+import sys
+import os
+import asyncio
+import uuid
+
+# Add backend to path
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from database.connection import database
+from utils.tokens import award_tokens, award_tokens_bulk, spend_tokens, transfer_tokens, get_token_balance
+
+AWARD_AMOUNT = 1.5
+
+
+async def seed_user(label: str) -> uuid.UUID:
+    user_id = uuid.uuid4()
+    query = """
+        INSERT INTO users (id, email, username, password_hash, first_name, last_name, role, status)
+        VALUES (:id, :email, :username, 'x', 'Token', :last_name, 'student', 'active')
+    """
+    await database.execute(query, values={
+        "id": user_id,
+        "email": f"tokens_{label}_{user_id}@test.com",
+        "username": f"tokens_{label}_{user_id}",
+        "last_name": label
+    })
+    return user_id
+
+
+async def cleanup(user_ids):
+    for user_id in user_ids:
+        await database.execute("DELETE FROM users WHERE id = :id", values={"id": user_id})
+
+
+async def transaction_count(user_id: uuid.UUID) -> int:
+    return await database.fetch_val(
+        "SELECT COUNT(*) FROM token_transactions WHERE user_id = :user_id",
+        values={"user_id": user_id}
+    )
+
+
+def check(label: str, actual, expected) -> bool:
+    if actual == expected:
+        print(f"✅ {label}: {actual}")
+        return True
+    print(f"❌ {label}: expected {expected}, got {actual}")
+    return False
+
+
+async def test_parallel_awards(operations: int) -> bool:
+    print("\n" + "=" * 60)
+    print(f"TEST 1: {operations} parallel awards to a fresh user")
+    print("=" * 60)
+
+    user_id = await seed_user("award")
+    try:
+        results = await asyncio.gather(*[
+            award_tokens(user_id, AWARD_AMOUNT, f"Stress award {i}", reference_type="stress_test")
+            for i in range(operations)
+        ])
+
+        balance = await get_token_balance(user_id)
+        ok = check("Successful awards", sum(1 for r in results if r["success"]), operations)
+        ok &= check("Final balance", balance["balance"], operations * AWARD_AMOUNT)
+        ok &= check("Total earned", balance["total_earned"], operations * AWARD_AMOUNT)
+        ok &= check("Transactions", await transaction_count(user_id), operations)
+
+        # Every balance_after must be distinct: no two awards saw the same balance
+        rows = await database.fetch_all(
+            "SELECT balance_after FROM token_transactions WHERE user_id = :user_id",
+            values={"user_id": user_id}
+        )
+        ok &= check("Distinct balance_after values", len({r.balance_after for r in rows}), operations)
+        return ok
+    finally:
+        await cleanup([user_id])
+
+
+async def test_parallel_overspend(operations: int) -> bool:
+    print("\n" + "=" * 60)
+    print(f"TEST 2: {operations} parallel spends against a balance of {operations // 2}")
+    print("=" * 60)
+
+    user_id = await seed_user("spend")
+    try:
+        await award_tokens(user_id, float(operations // 2), "Initial balance")
+
+        results = await asyncio.gather(*[
+            spend_tokens(user_id, 1.0, f"Stress spend {i}")
+            for i in range(operations)
+        ])
+
+        balance = await get_token_balance(user_id)
+        ok = check("Successful spends", sum(1 for r in results if r["success"]), operations // 2)
+        ok &= check("Final balance", balance["balance"], 0.0)
+        ok &= check("Total spent", balance["total_spent"], float(operations // 2))
+        return ok
+    finally:
+        await cleanup([user_id])
+
+
+async def test_parallel_transfers(operations: int) -> bool:
+    print("\n" + "=" * 60)
+    print(f"TEST 3: {operations} parallel transfers in both directions")
+    print("=" * 60)
+
+    alice = await seed_user("alice")
+    bob = await seed_user("bob")
+    try:
+        await award_tokens(alice, float(operations), "Initial balance")
+        await award_tokens(bob, float(operations), "Initial balance")
+
+        results = await asyncio.gather(*[
+            transfer_tokens(alice, bob, 1.0, f"a->b {i}") if i % 2 == 0
+            else transfer_tokens(bob, alice, 1.0, f"b->a {i}")
+            for i in range(operations)
+        ])
+
+        alice_balance = await get_token_balance(alice)
+        bob_balance = await get_token_balance(bob)
+        ok = check("Successful transfers", sum(1 for r in results if r["success"]), operations)
+        ok &= check("Combined balance", alice_balance["balance"] + bob_balance["balance"], 2.0 * operations)
+        return ok
+    finally:
+        await cleanup([alice, bob])
+
+
+async def test_overlapping_bulk_awards(operations: int) -> bool:
+    batches = 20
+    references = [uuid.uuid4() for _ in range(max(operations // batches, 1))]
+    print("\n" + "=" * 60)
+    print(f"TEST 4: {batches} parallel bulk awards of the same {len(references)} rewards")
+    print("=" * 60)
+
+    user_id = await seed_user("bulk")
+    try:
+        # A reference type the unique index doesn't cover: only the advisory
+        # locks keep the overlapping batches from rewarding a key twice
+        entries = [(user_id, AWARD_AMOUNT, "Stress bulk award", "stress_bulk", reference) for reference in references]
+        results = await asyncio.gather(*[award_tokens_bulk(entries[i:] + entries[:i]) for i in range(batches)])
+
+        balance = await get_token_balance(user_id)
+        ok = check("Successful batches", sum(1 for r in results if r["success"]), batches)
+        ok &= check("Awarded across batches", sum(r["awarded"] for r in results), len(references))
+        ok &= check("Final balance", balance["balance"], len(references) * AWARD_AMOUNT)
+        ok &= check("Transactions", await transaction_count(user_id), len(references))
+        return ok
+    finally:
+        await cleanup([user_id])
+
+
+async def main(operations: int):
+    await database.connect()
+    try:
+        results = [
+            await test_parallel_awards(operations),
+            await test_parallel_overspend(operations),
+            await test_parallel_transfers(operations),
+            await test_overlapping_bulk_awards(operations),
+        ]
+    finally:
+        await database.disconnect()
+
+    print("\n" + "=" * 60)
+    print("SUCCESS" if all(results) else "FAILURE")
+    print("=" * 60)
+
+
+if __name__ == "__main__":
+    total = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    asyncio.run(main(total))
@@ -1,7 +1,12 @@
 from typing import Dict, List, Any, Optional, Tuple
 from datetime import datetime, timedelta
 import uuid
+import numpy as np
 from database.connection import database
+from utils.cohort_retention import retention_triangle, month_start, add_months
+from utils.analytics_frames import (
+    fetch_columns, enrollment_summary, lesson_performance, course_health_scores
+)
 
 class AnalyticsCalculator:
     """Utility class for analytics calculations"""
@@ -197,12 +202,14 @@ class UserAnalytics:
         
         skills = await database.fetch_all(skill_query, values={"user_id": user_id})
         
+        frame = fetch_columns(enrollments, {"progress_percentage": float, "status": object})
+        
         return {
             "enrollments": [dict(enrollment) for enrollment in enrollments],
             "skill_progression": [dict(skill) for skill in skills],
-            "total_courses": len(enrollments),
-            "completed_courses": len([e for e in enrollments if e.status == 'completed']),
-            "average_progress": sum(e.progress_percentage for e in enrollments) / len(enrollments) if enrollments else 0
+            **enrollment_summary(
+                np.nan_to_num(frame["progress_percentage"]), frame["status"] == 'completed'
+            )
         }
 
 class CourseAnalytics:
@@ -211,128 +218,19 @@ class CourseAnalytics:
     @staticmethod
     async def calculate_course_health_score(course_id: uuid.UUID) -> Dict[str, Any]:
         """Calculate overall course health score"""
-        
-        # Enrollment metrics
-        enrollment_query = """
-            SELECT 
-                COUNT(*) as total_enrollments,
-                COUNT(CASE WHEN status = 'completed' THEN 1 END) as completions,
-                COUNT(CASE WHEN status = 'active' THEN 1 END) as active_enrollments,
-                COUNT(CASE WHEN status = 'dropped' THEN 1 END) as dropouts,
-                COALESCE(AVG(progress_percentage), 0) as avg_progress
-            FROM course_enrollments 
-            WHERE course_id = :course_id
-        """
-        
-        enrollment_data = await database.fetch_one(enrollment_query, values={"course_id": course_id})
-        
-        # Review metrics
-        review_query = """
-            SELECT 
-                COUNT(*) as total_reviews,
-                COALESCE(AVG(rating), 0) as avg_rating,
-                COUNT(CASE WHEN rating >= 4 THEN 1 END) as positive_reviews
-            FROM course_reviews 
-            WHERE course_id = :course_id AND is_published = true
-        """
-        
-        review_data = await database.fetch_one(review_query, values={"course_id": course_id})
-        
-        # Engagement metrics
-        engagement_query = """
-            SELECT 
-                COUNT(DISTINCT lp.user_id) as engaged_users,
-                COALESCE(AVG(lp.time_spent), 0) as avg_time_per_lesson,
-                COUNT(CASE WHEN lp.status = 'completed' THEN 1 END) as lesson_completions
-            FROM lessons l
-            LEFT JOIN lesson_progress lp ON l.id = lp.lesson_id
-            WHERE l.course_id = :course_id AND l.is_published = true
-        """
-        
-        engagement_data = await database.fetch_one(engagement_query, values={"course_id": course_id})
-        
-        # Calculate health score components
-        completion_rate = AnalyticsCalculator.calculate_completion_rate(
-            enrollment_data.completions, enrollment_data.total_enrollments
-        )
-        
-        dropout_rate = AnalyticsCalculator.calculate_churn_rate(
-            enrollment_data.dropouts, enrollment_data.total_enrollments
-        )
-        
-        rating_score = (review_data.avg_rating / 5) * 100 if review_data.avg_rating else 0
-        
-        engagement_score = min(engagement_data.avg_time_per_lesson / 300 * 100, 100)  # 5 minutes = 100%
-        
-        # Overall health score (weighted average)
-        health_score = (
-            completion_rate * 0.3 +
-            (100 - dropout_rate) * 0.2 +
-            rating_score * 0.3 +
-            engagement_score * 0.2
-        )
-        
-        return {
-            "health_score": round(health_score, 2),
-            "completion_rate": completion_rate,
-            "dropout_rate": dropout_rate,
-            "average_rating": review_data.avg_rating,
-            "engagement_score": round(engagement_score, 2),
-            "metrics": {
-                "total_enrollments": enrollment_data.total_enrollments,
-                "active_enrollments": enrollment_data.active_enrollments,
-                "total_reviews": review_data.total_reviews,
-                "engaged_users": engagement_data.engaged_users
-            }
-        }
+        scores = await course_health_scores([course_id])
+        return scores[course_id]
+    
+    @staticmethod
+    async def calculate_course_health_scores(course_ids: List[uuid.UUID]) -> Dict[uuid.UUID, Dict[str, Any]]:
+        """Calculate health scores for many courses with one query"""
+        return await course_health_scores(course_ids)
     
     @staticmethod
     async def get_lesson_performance_analytics(course_id: uuid.UUID) -> List[Dict[str, Any]]:
         """Get performance analytics for all lessons in a course"""
-        
-        query = """
-            SELECT 
-                l.id, l.title, l.type, l.sort_order,
-                COUNT(lp.id) as total_views,
-                COUNT(CASE WHEN lp.status = 'completed' THEN 1 END) as completions,
-                COUNT(CASE WHEN lp.status = 'in_progress' THEN 1 END) as in_progress,
-                COALESCE(AVG(lp.progress_percentage), 0) as avg_progress,
-                COALESCE(AVG(lp.time_spent), 0) as avg_time_spent,
-                COALESCE(MIN(lp.time_spent), 0) as min_time_spent,
-                COALESCE(MAX(lp.time_spent), 0) as max_time_spent
-            FROM lessons l
-            LEFT JOIN lesson_progress lp ON l.id = lp.lesson_id
-            WHERE l.course_id = :course_id AND l.is_published = true
-            GROUP BY l.id, l.title, l.type, l.sort_order
-            ORDER BY l.sort_order
-        """
-        
-        lessons = await database.fetch_all(query, values={"course_id": course_id})
-        
-        result = []
-        for lesson in lessons:
-            completion_rate = AnalyticsCalculator.calculate_completion_rate(
-                lesson.completions, lesson.total_views
-            ) if lesson.total_views > 0 else 0
-            
-            result.append({
-                "lesson_id": lesson.id,
-                "title": lesson.title,
-                "type": lesson.type,
-                "sort_order": lesson.sort_order,
-                "total_views": lesson.total_views,
-                "completions": lesson.completions,
-                "completion_rate": completion_rate,
-                "avg_progress": round(lesson.avg_progress, 2),
-                "avg_time_spent": round(lesson.avg_time_spent, 2),
-                "time_range": {
-                    "min": lesson.min_time_spent,
-                    "max": lesson.max_time_spent,
-                    "avg": round(lesson.avg_time_spent, 2)
-                }
-            })
-        
-        return result
+        lessons = await lesson_performance([course_id])
+        return lessons.get(course_id, [])
 
 class RevenueAnalytics:
     """Revenue-specific analytics utilities"""
@@ -426,60 +324,26 @@ class CohortAnalytics:
     async def calculate_user_retention_cohorts(months_back: int = 12) -> List[Dict[str, Any]]:
         """Calculate user retention by monthly cohorts"""
         
-        query = """
-            WITH monthly_cohorts AS (
-                SELECT 
-                    u.id as user_id,
-                    DATE_TRUNC('month', u.created_at) as cohort_month,
-                    DATE_TRUNC('month', s.created_at) as activity_month
-                FROM users u
-                LEFT JOIN user_sessions s ON u.id = s.user_id
-                WHERE u.created_at >= CURRENT_DATE - INTERVAL '%s months'
-                AND u.status = 'active'
-            ),
-            cohort_data AS (
-                SELECT 
-                    cohort_month,
-                    COUNT(DISTINCT user_id) as cohort_size,
-                    activity_month,
-                    COUNT(DISTINCT CASE WHEN activity_month IS NOT NULL THEN user_id END) as active_users,
-                    EXTRACT(MONTH FROM AGE(activity_month, cohort_month)) as period_number
-                FROM monthly_cohorts
-                GROUP BY cohort_month, activity_month
-            )
-            SELECT 
-                cohort_month,
-                cohort_size,
-                period_number,
-                active_users,
-                CASE 
-                    WHEN cohort_size > 0 THEN ROUND((active_users::float / cohort_size) * 100, 2)
-                    ELSE 0 
-                END as retention_rate
-            FROM cohort_data
-            WHERE period_number IS NOT NULL AND period_number >= 0
-            ORDER BY cohort_month, period_number
-        """ % months_back
-        
-        cohort_data = await database.fetch_all(query)
-        
-        # Group by cohort month
-        cohorts = {}
-        for row in cohort_data:
-            cohort_key = row.cohort_month.strftime('%Y-%m')
-            if cohort_key not in cohorts:
-                cohorts[cohort_key] = {
-                    "cohort_month": cohort_key,
-                    "cohort_size": row.cohort_size,
-                    "retention_by_period": {}
+        first_cohort = add_months(month_start(datetime.utcnow()), -months_back)
+        triangle = await retention_triangle(first_cohort)
+        
+        cohorts = []
+        for cohort in triangle:
+            cohorts.append({
+                "cohort_month": cohort["cohort_month"].strftime('%Y-%m'),
+                "cohort_size": cohort["cohort_size"],
+                "retention_by_period": {
+                    period: {
+                        "active_users": active_users,
+                        "retention_rate": AnalyticsCalculator.calculate_retention_rate(
+                            active_users, cohort["cohort_size"]
+                        )
+                    }
+                    for period, active_users in enumerate(cohort["active_users"])
                 }
-            
-            cohorts[cohort_key]["retention_by_period"][int(row.period_number)] = {
-                "active_users": row.active_users,
-                "retention_rate": row.retention_rate
-            }
+            })
         
-        return list(cohorts.values())
+        return cohorts
 
 # Utility functions for common analytics operations
 async def get_top_performing_content(
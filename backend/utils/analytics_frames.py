@@ -0,0 +1,326 @@
+"""
+Columnar analytics
+
+Fetches one result set per question, turns its columns into NumPy arrays and
+computes per-lesson and per-course statistics for every group at once, in
+place of one query or Python loop iteration per lesson or course.
+
+Rows are grouped by sorting them on the group key in SQL; group_codes() turns
+the sorted key column into 0..n-1 codes, and the grouped_* helpers reduce
+value columns by those codes with bincount and ufunc.at. ArrayCalculator mirrors
+AnalyticsCalculator for arrays.
+"""
+from typing import Any, Dict, Iterable, List, Sequence
+import uuid
+
+import numpy as np
+
+from database.connection import database
+
+# |z| at or above this marks a lesson as an outlier within its course
+OUTLIER_Z_SCORE = 2.0
+
+
+def fetch_columns(rows: Sequence[Any], columns: Dict[str, Any]) -> Dict[str, np.ndarray]:
+    """
+    Turn fetched rows into one array per column. `columns` maps names to
+    dtypes; NULLs become NaN in float columns and 0 in other numeric ones.
+    """
+    count = len(rows)
+    frame = {}
+    for name, dtype in columns.items():
+        if dtype is object:
+            frame[name] = np.array([row[name] for row in rows], dtype=object)
+        else:
+            default = np.nan if np.dtype(dtype).kind == "f" else 0
+            frame[name] = np.fromiter(
+                (default if row[name] is None else row[name] for row in rows), dtype=dtype, count=count
+            )
+    return frame
+
+
+def group_codes(keys: np.ndarray) -> np.ndarray:
+    """0-based group number of each row, for rows already sorted by key"""
+    if len(keys) == 0:
+        return np.zeros(0, dtype=np.int64)
+    starts = np.empty(len(keys), dtype=bool)
+    starts[0] = True
+    starts[1:] = keys[1:] != keys[:-1]
+    return np.cumsum(starts) - 1
+
+
+def _divide(numerator: np.ndarray, denominator: np.ndarray) -> np.ndarray:
+    numerator = np.asarray(numerator, dtype=float)
+    denominator = np.asarray(denominator, dtype=float)
+    out = np.zeros(np.broadcast(numerator, denominator).shape)
+    np.divide(numerator, denominator, out=out, where=denominator != 0)
+    return out
+
+
+def grouped_sum(codes: np.ndarray, values: np.ndarray, groups: int) -> np.ndarray:
+    return np.bincount(codes, weights=values, minlength=groups)
+
+
+def grouped_mean(codes: np.ndarray, values: np.ndarray, mask: np.ndarray, groups: int) -> np.ndarray:
+    """Mean of values where mask is set, per group; 0 for empty groups"""
+    return _divide(
+        grouped_sum(codes, np.where(mask, values, 0), groups),
+        grouped_sum(codes, mask.astype(float), groups)
+    )
+
+
+def grouped_extreme(codes: np.ndarray, values: np.ndarray, mask: np.ndarray, groups: int, maximum: bool) -> np.ndarray:
+    """Min or max of values where mask is set, per group; 0 for empty groups"""
+    fill = -np.inf if maximum else np.inf
+    result = np.full(groups, fill)
+    reduce = np.maximum if maximum else np.minimum
+    reduce.at(result, codes[mask], values[mask])
+    result[np.isinf(result)] = 0
+    return result
+
+
+def grouped_percentiles(codes: np.ndarray, values: np.ndarray, mask: np.ndarray,
+                        groups: int, quantiles: Iterable[float]) -> Dict[float, np.ndarray]:
+    """
+    Percentiles of values where mask is set, per group, with linear
+    interpolation (numpy's default method); 0 for empty groups
+    """
+    codes, values = codes[mask], values[mask].astype(float)
+    order = np.lexsort((values, codes))
+    ordered = values[order]
+    counts = np.bincount(codes, minlength=groups)
+    offsets = np.concatenate(([0], np.cumsum(counts)[:-1]))
+    present = counts > 0
+
+    result = {}
+    for quantile in quantiles:
+        position = offsets + quantile * np.maximum(counts - 1, 0)
+        lower = np.floor(position).astype(np.int64)
+        upper = np.ceil(position).astype(np.int64)
+        values_at = np.zeros(groups)
+        if present.any():
+            low, high = ordered[lower[present]], ordered[upper[present]]
+            values_at[present] = low + (high - low) * (position[present] - lower[present])
+        result[quantile] = values_at
+    return result
+
+
+def grouped_z_scores(codes: np.ndarray, values: np.ndarray, groups: int) -> np.ndarray:
+    """z-score of each value within its group; 0 where the group has no spread"""
+    counts = np.bincount(codes, minlength=groups)
+    means = _divide(grouped_sum(codes, values, groups), counts)
+    deviations = values - means[codes]
+    stds = np.sqrt(_divide(grouped_sum(codes, deviations ** 2, groups), counts))
+    return _divide(deviations, stds[codes])
+
+
+class ArrayCalculator:
+    """AnalyticsCalculator for arrays: element-wise, rounded to 2 places"""
+
+    @staticmethod
+    def calculate_completion_rate(completed: np.ndarray, total: np.ndarray) -> np.ndarray:
+        return np.round(_divide(completed, total) * 100, 2)
+
+    @staticmethod
+    def calculate_growth_rate(current: np.ndarray, previous: np.ndarray) -> np.ndarray:
+        current = np.asarray(current, dtype=float)
+        previous = np.asarray(previous, dtype=float)
+        no_base = np.where(current > 0, 100.0, 0.0)
+        return np.where(previous == 0, no_base, np.round(_divide(current - previous, previous) * 100, 2))
+
+    calculate_retention_rate = calculate_completion_rate
+    calculate_churn_rate = calculate_completion_rate
+
+    @staticmethod
+    def calculate_average_session_duration(total_time: np.ndarray, sessions: np.ndarray) -> np.ndarray:
+        return np.round(_divide(total_time, sessions) / 60, 2)
+
+
+def _number(value) -> float:
+    return round(float(value), 2)
+
+
+LESSON_ROWS_QUERY = """
+    SELECT
+        l.course_id, l.id AS lesson_id, l.title, l.type, l.sort_order,
+        lp.id IS NOT NULL AS has_progress,
+        lp.status = 'completed' AS completed,
+        lp.status = 'in_progress' AS in_progress,
+        lp.progress_percentage, lp.time_spent
+    FROM lessons l
+    LEFT JOIN lesson_progress lp ON l.id = lp.lesson_id
+    WHERE l.course_id = ANY(:course_ids) AND l.is_published = true
+    ORDER BY l.course_id, l.sort_order, l.id
+"""
+
+
+async def lesson_performance(course_ids: List[uuid.UUID]) -> Dict[uuid.UUID, List[Dict[str, Any]]]:
+    """
+    Per-lesson performance for every published lesson of the given courses,
+    from one result set: views, completion rate, progress, time spent
+    (mean, min, max, p50, p90), dropoff from the previous lesson and
+    z-score outliers within the course
+    """
+    rows = await database.fetch_all(LESSON_ROWS_QUERY, values={"course_ids": list(course_ids)})
+    frame = fetch_columns(rows, {
+        "course_id": object, "lesson_id": object,
+        "has_progress": bool, "completed": bool, "in_progress": bool,
+        "progress_percentage": float, "time_spent": float,
+    })
+
+    codes = group_codes(frame["lesson_id"])
+    lessons = int(codes[-1]) + 1 if len(codes) else 0
+    firsts = np.flatnonzero(np.diff(codes, prepend=-1))
+    has = frame["has_progress"]
+    time_spent = np.nan_to_num(frame["time_spent"])
+
+    views = grouped_sum(codes, has.astype(float), lessons)
+    completions = grouped_sum(codes, frame["completed"].astype(float), lessons)
+    in_progress = grouped_sum(codes, frame["in_progress"].astype(float), lessons)
+    completion_rate = ArrayCalculator.calculate_completion_rate(completions, views)
+    avg_progress = grouped_mean(codes, np.nan_to_num(frame["progress_percentage"]), has, lessons)
+    avg_time = grouped_mean(codes, time_spent, has, lessons)
+    min_time = grouped_extreme(codes, time_spent, has, lessons, maximum=False)
+    max_time = grouped_extreme(codes, time_spent, has, lessons, maximum=True)
+    percentiles = grouped_percentiles(codes, time_spent, has, lessons, (0.5, 0.9))
+
+    # Funnel: learners who reached each lesson, relative to the previous
+    # lesson and to the first lesson of the course. Learners can skip
+    # lessons, so both are capped to 0..100
+    course_codes = group_codes(frame["course_id"][firsts])
+    courses = int(course_codes[-1]) + 1 if len(course_codes) else 0
+    course_starts = np.diff(course_codes, prepend=-1) != 0
+    previous_views = np.where(course_starts, views, np.roll(views, 1))
+    first_views = views[np.flatnonzero(course_starts)][course_codes]
+    dropoff_rate = np.clip(100 - ArrayCalculator.calculate_retention_rate(views, previous_views), 0, 100)
+    dropoff_rate[course_starts | (previous_views == 0)] = 0
+    reach_rate = np.minimum(ArrayCalculator.calculate_retention_rate(views, first_views), 100)
+
+    completion_z = grouped_z_scores(course_codes, completion_rate, courses)
+    time_z = grouped_z_scores(course_codes, avg_time, courses)
+
+    result: Dict[uuid.UUID, List[Dict[str, Any]]] = {}
+    for index, row_index in enumerate(firsts):
+        row = rows[row_index]
+        result.setdefault(row["course_id"], []).append({
+            "lesson_id": row["lesson_id"],
+            "title": row["title"],
+            "type": row["type"],
+            "sort_order": row["sort_order"],
+            "total_views": int(views[index]),
+            "completions": int(completions[index]),
+            "in_progress": int(in_progress[index]),
+            "completion_rate": float(completion_rate[index]),
+            "avg_progress": _number(avg_progress[index]),
+            "avg_time_spent": _number(avg_time[index]),
+            "time_range": {
+                "min": int(min_time[index]),
+                "max": int(max_time[index]),
+                "avg": _number(avg_time[index]),
+                "p50": _number(percentiles[0.5][index]),
+                "p90": _number(percentiles[0.9][index])
+            },
+            "funnel": {
+                "reach_rate": float(reach_rate[index]),
+                "dropoff_rate": float(dropoff_rate[index])
+            },
+            "outliers": {
+                "completion_rate_z": _number(completion_z[index]),
+                "avg_time_spent_z": _number(time_z[index]),
+                "is_outlier": bool(
+                    abs(completion_z[index]) >= OUTLIER_Z_SCORE or abs(time_z[index]) >= OUTLIER_Z_SCORE
+                )
+            }
+        })
+    return result
+
+
+COURSE_HEALTH_QUERY = """
+    SELECT
+        c.id AS course_id,
+        COALESCE(e.total_enrollments, 0) AS total_enrollments,
+        COALESCE(e.completions, 0) AS completions,
+        COALESCE(e.active_enrollments, 0) AS active_enrollments,
+        COALESCE(e.dropouts, 0) AS dropouts,
+        COALESCE(r.total_reviews, 0) AS total_reviews,
+        COALESCE(r.avg_rating, 0) AS avg_rating,
+        COALESCE(g.engaged_users, 0) AS engaged_users,
+        COALESCE(g.avg_time_per_lesson, 0) AS avg_time_per_lesson
+    FROM UNNEST(CAST(:course_ids AS UUID[])) AS c(id)
+    LEFT JOIN (
+        SELECT
+            course_id,
+            COUNT(*) AS total_enrollments,
+            COUNT(*) FILTER (WHERE status = 'completed') AS completions,
+            COUNT(*) FILTER (WHERE status = 'active') AS active_enrollments,
+            COUNT(*) FILTER (WHERE status = 'dropped') AS dropouts
+        FROM course_enrollments
+        WHERE course_id = ANY(:course_ids)
+        GROUP BY course_id
+    ) e ON e.course_id = c.id
+    LEFT JOIN (
+        SELECT course_id, COUNT(*) AS total_reviews, AVG(rating) AS avg_rating
+        FROM course_reviews
+        WHERE course_id = ANY(:course_ids) AND is_published = true
+        GROUP BY course_id
+    ) r ON r.course_id = c.id
+    LEFT JOIN (
+        SELECT
+            l.course_id,
+            COUNT(DISTINCT lp.user_id) AS engaged_users,
+            AVG(lp.time_spent) AS avg_time_per_lesson
+        FROM lessons l
+        JOIN lesson_progress lp ON l.id = lp.lesson_id
+        WHERE l.course_id = ANY(:course_ids) AND l.is_published = true
+        GROUP BY l.course_id
+    ) g ON g.course_id = c.id
+"""
+
+
+async def course_health_scores(course_ids: List[uuid.UUID]) -> Dict[uuid.UUID, Dict[str, Any]]:
+    """Health score of every given course, from one result set"""
+    rows = await database.fetch_all(COURSE_HEALTH_QUERY, values={"course_ids": list(course_ids)})
+    frame = fetch_columns(rows, {
+        "total_enrollments": np.int64, "completions": np.int64, "active_enrollments": np.int64,
+        "dropouts": np.int64, "total_reviews": np.int64, "avg_rating": float,
+        "engaged_users": np.int64, "avg_time_per_lesson": float,
+    })
+
+    completion_rate = ArrayCalculator.calculate_completion_rate(frame["completions"], frame["total_enrollments"])
+    dropout_rate = ArrayCalculator.calculate_churn_rate(frame["dropouts"], frame["total_enrollments"])
+    rating_score = frame["avg_rating"] / 5 * 100
+    engagement_score = np.minimum(frame["avg_time_per_lesson"] / 300 * 100, 100)  # 5 minutes = 100%
+
+    # Overall health score (weighted average)
+    health_score = (
+        completion_rate * 0.3 +
+        (100 - dropout_rate) * 0.2 +
+        rating_score * 0.3 +
+        engagement_score * 0.2
+    )
+
+    return {
+        row["course_id"]: {
+            "health_score": _number(health_score[index]),
+            "completion_rate": float(completion_rate[index]),
+            "dropout_rate": float(dropout_rate[index]),
+            "average_rating": row["avg_rating"],
+            "engagement_score": _number(engagement_score[index]),
+            "metrics": {
+                "total_enrollments": row["total_enrollments"],
+                "active_enrollments": row["active_enrollments"],
+                "total_reviews": row["total_reviews"],
+                "engaged_users": row["engaged_users"]
+            }
+        }
+        for index, row in enumerate(rows)
+    }
+
+
+def enrollment_summary(progress: np.ndarray, completed: np.ndarray) -> Dict[str, Any]:
+    """Totals for a learner's enrollments, from their progress and completed flags"""
+    return {
+        "total_courses": int(len(progress)),
+        "completed_courses": int(np.count_nonzero(completed)),
+        "average_progress": float(progress.mean()) if len(progress) else 0
+    }
@@ -0,0 +1,393 @@
+"""
+Daily analytics rollups
+
+Keeps course_analytics_daily (per course and day) and user_analytics_daily
+(platform-wide, per day) current, so routers/analytics.py sums a few daily
+rows instead of aggregating users, course_enrollments, lesson_progress,
+quiz_attempts and revenue_records on every request.
+
+There are two kinds of columns:
+- state columns bucket rows by a fixed date (enrolled_at, created_at,
+  issued_at, ...) and count them by their current status. A rolled-up day is
+  recomputed when one of its rows changed after the watermark.
+- activity columns bucket rows by when they were last touched
+  (lesson_progress.updated_at, users.last_login_at). They are recomputed for
+  the last ANALYTICS_ROLLUP_RECOMPUTE_DAYS days only and then frozen, so a
+  later update does not move yesterday's activity to today.
+
+run_rollups() is called by the Celery beat task in tasks/analytics_tasks.py.
+Days after rolled_up_through (normally just today) are not in the tables;
+daily_source() computes them from the source tables when queried.
+"""
+import os
+from datetime import date, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+from dotenv import load_dotenv
+
+from database.connection import database
+
+load_dotenv()
+
+# Days before yesterday that are recomputed on every run, state and activity
+ANALYTICS_ROLLUP_RECOMPUTE_DAYS = int(os.getenv("ANALYTICS_ROLLUP_RECOMPUTE_DAYS", "2"))
+# Rows committed this long before the previous run started are re-checked,
+# to cover transactions that were still open when it read the watermark
+ANALYTICS_ROLLUP_OVERLAP_SECONDS = int(os.getenv("ANALYTICS_ROLLUP_OVERLAP_SECONDS", "300"))
+# Days recomputed per statement while backfilling
+ANALYTICS_ROLLUP_CHUNK_DAYS = int(os.getenv("ANALYTICS_ROLLUP_CHUNK_DAYS", "31"))
+
+ROLLUP_NAME = "daily"
+ROLLUP_LOCK_KEY = 7301
+ROLLED_UP_THROUGH = f"(SELECT rolled_up_through FROM analytics_rollup_state WHERE name = '{ROLLUP_NAME}')"
+
+
+class RollupPart:
+    """Aggregates of one source table, bucketed by DATE(date_column)"""
+
+    def __init__(self, table: str, date_column: str, columns: Dict[str, str],
+                 where: Optional[str] = None, activity: bool = False):
+        self.table = table
+        self.date_column = date_column
+        self.columns = columns
+        self.where = where
+        self.activity = activity
+
+
+COURSE_PARTS = [
+    RollupPart("course_enrollments", "enrolled_at", {
+        "enrollments": "COUNT(*)",
+        "active_enrollments": "COUNT(*) FILTER (WHERE status = 'active')",
+        "completed_enrollments": "COUNT(*) FILTER (WHERE status = 'completed')",
+        "dropped_enrollments": "COUNT(*) FILTER (WHERE status = 'dropped')",
+        "enrollment_progress_total": "COALESCE(SUM(progress_percentage), 0)",
+    }),
+    RollupPart("course_enrollments", "completed_at", {
+        "completions": "COUNT(*)",
+    }, where="status = 'completed'"),
+    RollupPart("lesson_progress", "created_at", {
+        "views": "COUNT(*)",
+    }),
+    RollupPart("revenue_records", "created_at", {
+        "gross_revenue": "COALESCE(SUM(amount), 0)",
+        "gross_transactions": "COUNT(*)",
+        "revenue": "COALESCE(SUM(amount) FILTER (WHERE status = 'completed'), 0)",
+        "revenue_transactions": "COUNT(*) FILTER (WHERE status = 'completed')",
+    }, where="course_id IS NOT NULL"),
+]
+
+USER_PARTS = [
+    RollupPart("users", "created_at", {
+        "new_users": "COUNT(*)",
+        "new_active_users": "COUNT(*) FILTER (WHERE status = 'active')",
+        "new_students": "COUNT(*) FILTER (WHERE status = 'active' AND role = 'student')",
+        "new_instructors": "COUNT(*) FILTER (WHERE status = 'active' AND role = 'instructor')",
+    }),
+    RollupPart("course_enrollments", "enrolled_at", {
+        "course_enrollments": "COUNT(*)",
+    }),
+    RollupPart("lesson_progress", "completed_at", {
+        "lesson_completions": "COUNT(*)",
+    }, where="status = 'completed'"),
+    RollupPart("quiz_attempts", "created_at", {
+        "quiz_attempts": "COUNT(*)",
+    }),
+    RollupPart("token_transactions", "created_at", {
+        "tokens_earned": "COALESCE(SUM(amount), 0)",
+    }, where="type = 'earned'"),
+    RollupPart("certificates", "issued_at", {
+        "certificates_issued": "COUNT(*)",
+        "certificates_minted": "COUNT(*) FILTER (WHERE status = 'minted')",
+    }),
+    RollupPart("revenue_records", "created_at", {
+        "revenue_total": "COALESCE(SUM(amount), 0)",
+        "revenue_transactions": "COUNT(*)",
+        "revenue_completed": "COALESCE(SUM(amount) FILTER (WHERE status = 'completed'), 0)",
+        "revenue_completed_transactions": "COUNT(*) FILTER (WHERE status = 'completed')",
+    }),
+    RollupPart("users", "last_login_at", {
+        "active_users": "COUNT(*)",
+    }, where="status = 'active'", activity=True),
+    RollupPart("lesson_progress", "updated_at", {
+        "engaged_users": "COUNT(DISTINCT user_id)",
+        "lesson_interactions": "COUNT(*)",
+        "time_spent_total": "COALESCE(SUM(time_spent), 0)",
+    }, activity=True),
+]
+
+# rollup table -> (key columns, parts)
+ROLLUPS = {
+    "course_analytics_daily": (["course_id", "date"], COURSE_PARTS),
+    "user_analytics_daily": (["date"], USER_PARTS),
+}
+
+# Days whose state columns are affected by rows changed since :since
+CHANGED_DAYS_QUERY = """
+    SELECT DISTINCT day FROM (
+        SELECT DATE(enrolled_at) AS day FROM course_enrollments WHERE updated_at > :since
+        UNION ALL
+        SELECT DATE(completed_at) FROM course_enrollments
+        WHERE updated_at > :since AND completed_at IS NOT NULL
+        UNION ALL
+        SELECT DATE(completed_at) FROM lesson_progress
+        WHERE updated_at > :since AND completed_at IS NOT NULL
+        UNION ALL
+        SELECT DATE(created_at) FROM users WHERE updated_at > :since
+        UNION ALL
+        SELECT DATE(issued_at) FROM certificates WHERE updated_at > :since
+        UNION ALL
+        SELECT DATE(created_at) FROM revenue_records WHERE processed_at > :since
+    ) changed
+    WHERE day < :before
+    ORDER BY day
+"""
+
+# Oldest day of any source row or stored rollup row. Rollup rows older than
+# every source row (seed data, rows whose sources were deleted) are inside
+# the first backfill, which overwrites them.
+FIRST_DAY_QUERY = "SELECT LEAST({})".format(", ".join(
+    list(dict.fromkeys(
+        f"(SELECT DATE(MIN({part.date_column})) FROM {part.table})"
+        for _, parts in ROLLUPS.values() for part in parts
+    ))
+    + [f"(SELECT MIN(date) FROM {table})" for table in ROLLUPS]
+))
+
+
+def rollup_columns(table: str, activity: bool = True) -> List[str]:
+    _, parts = ROLLUPS[table]
+    columns = []
+    for part in parts:
+        if activity or not part.activity:
+            columns.extend(column for column in part.columns if column not in columns)
+    return columns
+
+
+def daily_select(table: str, lower: str, upper: str, activity: bool = True,
+                 where: Optional[str] = None) -> str:
+    """
+    Daily rows for `table` computed from the source tables, for days in
+    [lower, upper). lower and upper are SQL date expressions; `where` is an
+    extra condition applied to every source table.
+    """
+    keys, parts = ROLLUPS[table]
+    columns = rollup_columns(table, activity)
+    key_list = ", ".join(keys)
+
+    selects = []
+    for part in parts:
+        if part.activity and not activity:
+            continue
+        key_exprs = [f"DATE({part.date_column}) AS date" if key == "date" else key for key in keys]
+        conditions = [f"{part.date_column} >= {lower}", f"{part.date_column} < {upper}"]
+        if part.where:
+            conditions.append(part.where)
+        if where:
+            conditions.append(where)
+        expressions = [f"{part.columns.get(column, '0')} AS {column}" for column in columns]
+        positions = ", ".join(str(n) for n in range(1, len(keys) + 1))
+        selects.append(f"""
+            SELECT {', '.join(key_exprs)}, {', '.join(expressions)}
+            FROM {part.table}
+            WHERE {' AND '.join(conditions)}
+            GROUP BY {positions}""")
+
+    sums = ", ".join(f"SUM({column}) AS {column}" for column in columns)
+    return f"""
+        SELECT {key_list}, {sums}
+        FROM ({' UNION ALL '.join(selects)}) parts
+        GROUP BY {key_list}"""
+
+
+def daily_source(table: str, values: Dict[str, Any], start: Optional[date], end: date,
+                 param: str = "rollup", course_filter: Optional[str] = None) -> str:
+    """
+    Derived table with the daily rows of `table` for days in [start, end]
+    (start None means from the beginning). Days up to rolled_up_through come
+    from the rollup table, later days are computed live from the sources.
+    course_filter is an extra condition on course_id for per-course tables;
+    the caller binds its values.
+    """
+    keys, _ = ROLLUPS[table]
+    columns = ", ".join(keys + rollup_columns(table))
+    values[f"{param}_start"] = start or date.min
+    values[f"{param}_end"] = end
+    start_sql = f"CAST(:{param}_start AS DATE)"
+    end_sql = f"CAST(:{param}_end AS DATE)"
+    live = daily_select(
+        table,
+        lower=f"GREATEST({start_sql}, COALESCE({ROLLED_UP_THROUGH} + 1, {start_sql}))",
+        upper=f"{end_sql} + 1",
+        where=course_filter
+    )
+    # A NULL rolled_up_through (no run yet) leaves everything to the live part
+    conditions = [f"date >= {start_sql}", f"date <= {end_sql}", f"date <= {ROLLED_UP_THROUGH}"]
+    if course_filter:
+        conditions.append(course_filter)
+    return f"""(
+        SELECT {columns} FROM {table}
+        WHERE {' AND '.join(conditions)}
+        UNION ALL
+        {live}
+    )"""
+
+
+def total(column: str, where: Optional[str] = None) -> str:
+    """Integer sum of a daily column for SELECT lists, optionally filtered"""
+    filtered = f" FILTER (WHERE {where})" if where else ""
+    return f"CAST(COALESCE(SUM({column}){filtered}, 0) AS BIGINT)"
+
+
+def amount(column: str, where: Optional[str] = None) -> str:
+    """Decimal sum of a daily column for SELECT lists, optionally filtered"""
+    filtered = f" FILTER (WHERE {where})" if where else ""
+    return f"COALESCE(SUM({column}){filtered}, 0)"
+
+
+def ratio(numerator: str, denominator: str) -> str:
+    """SUM(numerator) / SUM(denominator), 0 when there is nothing to divide"""
+    return f"COALESCE(SUM({numerator})::numeric / NULLIF(SUM({denominator}), 0), 0)"
+
+
+def day_ranges(days: List[date]) -> List[Tuple[date, date]]:
+    """Merge sorted days into inclusive (first, last) runs of consecutive days"""
+    ranges: List[Tuple[date, date]] = []
+    for day in days:
+        if ranges and day == ranges[-1][1] + timedelta(days=1):
+            ranges[-1] = (ranges[-1][0], day)
+        else:
+            ranges.append((day, day))
+    return ranges
+
+
+def chunked(first: date, last: date, size: int) -> List[Tuple[date, date]]:
+    chunks = []
+    while first <= last:
+        chunk_last = min(last, first + timedelta(days=size - 1))
+        chunks.append((first, chunk_last))
+        first = chunk_last + timedelta(days=1)
+    return chunks
+
+
+async def recompute(table: str, first: date, last: date, activity: bool):
+    """
+    Recompute the days first..last of a rollup table. Without `activity`,
+    the activity columns of those days are left as they are.
+    """
+    keys, _ = ROLLUPS[table]
+    columns = rollup_columns(table, activity)
+    values = {"range_start": first, "range_end": last + timedelta(days=1)}
+
+    # Buckets whose source rows are gone would otherwise keep their old counts
+    await database.execute(f"""
+        UPDATE {table}
+        SET {', '.join(f'{column} = 0' for column in columns)}, updated_at = NOW()
+        WHERE date >= :range_start AND date < :range_end
+    """, values=values)
+
+    select = daily_select(
+        table, "CAST(:range_start AS DATE)", "CAST(:range_end AS DATE)", activity
+    )
+    await database.execute(f"""
+        INSERT INTO {table} ({', '.join(keys + columns)})
+        SELECT {', '.join(keys + columns)} FROM ({select}) daily
+        ON CONFLICT ({', '.join(keys)}) DO UPDATE SET
+            {', '.join(f'{column} = EXCLUDED.{column}' for column in columns)},
+            updated_at = NOW()
+    """, values=values)
+
+
+SAVE_STATE_QUERY = """
+    INSERT INTO analytics_rollup_state (name, watermark, rolled_up_through, updated_at)
+    VALUES (:name, :watermark, :through, NOW())
+    ON CONFLICT (name) DO UPDATE SET
+        watermark = EXCLUDED.watermark,
+        rolled_up_through = EXCLUDED.rolled_up_through,
+        updated_at = NOW()
+"""
+
+# A chunk moves rolled_up_through forward but keeps the watermark of the
+# last completed run, so a run cut short still re-checks the same changes.
+# On the first run there is none yet; its start time is the right one, as
+# everything before it is covered by the chunks.
+SAVE_CHUNK_QUERY = """
+    INSERT INTO analytics_rollup_state (name, watermark, rolled_up_through, updated_at)
+    VALUES (:name, :watermark, :through, NOW())
+    ON CONFLICT (name) DO UPDATE SET
+        watermark = COALESCE(analytics_rollup_state.watermark, EXCLUDED.watermark),
+        rolled_up_through = GREATEST(analytics_rollup_state.rolled_up_through, EXCLUDED.rolled_up_through),
+        updated_at = NOW()
+"""
+
+
+async def run_rollups(recompute_days: int = ANALYTICS_ROLLUP_RECOMPUTE_DAYS) -> Dict[str, Any]:
+    """
+    Bring the rollup tables up to yesterday. Recomputes the days touched by
+    rows changed since the last run plus the last `recompute_days` days; on
+    the first run, backfills from the oldest source or rollup row.
+
+    Every day range and backfill chunk commits on its own and records how
+    far the tables are rolled up, so a run that is stopped (the Celery time
+    limit, a deploy) is continued by the next one instead of starting over.
+    A session-level advisory lock keeps runs from overlapping.
+    """
+    # Hold one connection: the advisory lock belongs to the session
+    async with database.connection():
+        locked = await database.fetch_val(
+            "SELECT pg_try_advisory_lock(:key)", values={"key": ROLLUP_LOCK_KEY}
+        )
+        if not locked:
+            return {"status": "skipped", "reason": "another rollup is running"}
+        try:
+            return await _run_rollups(recompute_days)
+        finally:
+            await database.execute("SELECT pg_advisory_unlock(:key)", values={"key": ROLLUP_LOCK_KEY})
+
+
+async def _run_rollups(recompute_days: int) -> Dict[str, Any]:
+    clock = await database.fetch_one("SELECT NOW() AS now, CURRENT_DATE AS today")
+    through = clock["today"] - timedelta(days=1)
+    state = await database.fetch_one(
+        "SELECT watermark, rolled_up_through FROM analytics_rollup_state WHERE name = :name",
+        values={"name": ROLLUP_NAME}
+    )
+
+    changed_days: List[date] = []
+    if state is None or state["rolled_up_through"] is None:
+        first_day = await database.fetch_val(FIRST_DAY_QUERY)
+        window_start = first_day or clock["today"]
+    else:
+        window_start = min(
+            state["rolled_up_through"] + timedelta(days=1),
+            through - timedelta(days=recompute_days - 1)
+        )
+        since = (state["watermark"] or clock["now"]) - timedelta(seconds=ANALYTICS_ROLLUP_OVERLAP_SECONDS)
+        rows = await database.fetch_all(
+            CHANGED_DAYS_QUERY, values={"since": since, "before": window_start}
+        )
+        changed_days = [row["day"] for row in rows if row["day"] is not None]
+
+    for first, last in day_ranges(changed_days):
+        async with database.transaction():
+            for table in ROLLUPS:
+                await recompute(table, first, last, activity=False)
+
+    chunks = chunked(window_start, through, ANALYTICS_ROLLUP_CHUNK_DAYS)
+    for first, last in chunks:
+        async with database.transaction():
+            for table in ROLLUPS:
+                await recompute(table, first, last, activity=True)
+            await database.execute(SAVE_CHUNK_QUERY, values={
+                "name": ROLLUP_NAME, "watermark": clock["now"], "through": last
+            })
+
+    await database.execute(SAVE_STATE_QUERY, values={
+        "name": ROLLUP_NAME, "watermark": clock["now"], "through": through
+    })
+
+    return {
+        "status": "success",
+        "rolled_up_through": through.isoformat(),
+        "changed_days": len(changed_days),
+        "recomputed_from": window_start.isoformat(),
+        "chunks": len(chunks),
+    }
@@ -1,8 +1,10 @@
 import os
 import json
 import asyncio
-from typing import Dict, Any, Optional
-from web3 import Web3
+from typing import Dict, Any, List, Optional, Tuple
+from web3 import AsyncWeb3, Web3
+from web3.exceptions import ContractLogicError, TransactionNotFound
+from web3.logs import DISCARD
 from eth_account import Account
 import httpx
 from datetime import datetime
@@ -14,9 +16,16 @@ PRIVATE_KEY = os.getenv("BLOCKCHAIN_PRIVATE_KEY")
 IPFS_GATEWAY = os.getenv("IPFS_GATEWAY", "https://ipfs.io/ipfs/")
 PINATA_API_KEY = os.getenv("PINATA_API_KEY")
 PINATA_SECRET_KEY = os.getenv("PINATA_SECRET_KEY")
+BLOCKCHAIN_NETWORK = os.getenv("BLOCKCHAIN_NETWORK", "polygon")
+MINT_GAS_LIMIT = int(os.getenv("MINT_GAS_LIMIT", "200000"))
+# Certificates per mintCertificateBatch call; 1 mints each with mintCertificate,
+# for contracts without the batch function
+MINT_BATCH_SIZE = int(os.getenv("MINT_BATCH_SIZE", "50"))
+MINT_BATCH_GAS_BUFFER = float(os.getenv("MINT_BATCH_GAS_BUFFER", "1.2"))
 
-# Initialize Web3
+# Initialize Web3; the asyncio client is used by the minting worker
 w3 = Web3(Web3.HTTPProvider(POLYGON_RPC_URL))
+async_w3 = AsyncWeb3(AsyncWeb3.AsyncHTTPProvider(POLYGON_RPC_URL))
 
 # Certificate NFT Contract ABI (simplified)
 CERTIFICATE_ABI = [
@@ -30,6 +39,16 @@ CERTIFICATE_ABI = [
         "stateMutability": "nonpayable",
         "type": "function"
     },
+    {
+        "inputs": [
+            {"name": "recipients", "type": "address[]"},
+            {"name": "tokenURIs", "type": "string[]"}
+        ],
+        "name": "mintCertificateBatch",
+        "outputs": [{"name": "tokenIds", "type": "uint256[]"}],
+        "stateMutability": "nonpayable",
+        "type": "function"
+    },
     {
         "inputs": [{"name": "tokenId", "type": "uint256"}],
         "name": "tokenURI",
@@ -43,6 +62,16 @@ CERTIFICATE_ABI = [
         "outputs": [{"name": "", "type": "address"}],
         "stateMutability": "view",
         "type": "function"
+    },
+    {
+        "anonymous": False,
+        "inputs": [
+            {"indexed": True, "name": "from", "type": "address"},
+            {"indexed": True, "name": "to", "type": "address"},
+            {"indexed": True, "name": "tokenId", "type": "uint256"}
+        ],
+        "name": "Transfer",
+        "type": "event"
     }
 ]
 
@@ -55,6 +84,18 @@ class BlockchainService:
                 address=CERTIFICATE_CONTRACT_ADDRESS,
                 abi=CERTIFICATE_ABI
             )
+        self.async_w3 = async_w3
+        self.async_contract = None
+        if CERTIFICATE_CONTRACT_ADDRESS:
+            self.async_contract = async_w3.eth.contract(
+                address=CERTIFICATE_CONTRACT_ADDRESS,
+                abi=CERTIFICATE_ABI
+            )
+        self.account = Account.from_key(PRIVATE_KEY) if PRIVATE_KEY else None
+
+    @property
+    def can_mint(self) -> bool:
+        return bool(self.async_contract and self.account)
     
     async def upload_to_ipfs(self, metadata: Dict[str, Any]) -> str:
         """Upload certificate metadata to IPFS"""
@@ -92,101 +133,162 @@ class BlockchainService:
             # Return a placeholder URI for development
             return f"https://api.DCA.com/certificates/{metadata.get('certificate_id')}/metadata"
     
-    async def mint_certificate_nft(
-        self, 
-        recipient_address: str, 
-        certificate_data: Dict[str, Any]
-    ) -> Dict[str, Any]:
-        """Mint a certificate as NFT on Polygon"""
+    def certificate_metadata(self, certificate_data: Dict[str, Any]) -> Dict[str, Any]:
+        """NFT metadata for a certificate"""
+        return {
+            "name": f"DCA Certificate - {certificate_data['course_title']}",
+            "description": certificate_data.get('description', ''),
+            "image": certificate_data.get('image_url', ''),
+            "attributes": [
+                {
+                    "trait_type": "Certificate ID",
+                    "value": certificate_data['certificate_id']
+                },
+                {
+                    "trait_type": "Recipient",
+                    "value": certificate_data['recipient_name']
+                },
+                {
+                    "trait_type": "Course",
+                    "value": certificate_data['course_title']
+                },
+                {
+                    "trait_type": "Issue Date",
+                    "value": certificate_data['issued_at']
+                },
+                {
+                    "trait_type": "Platform",
+                    "value": "DCA LMS"
+                }
+            ],
+            "external_url": f"https://DCA.com/certificates/{certificate_data['certificate_id']}"
+        }
+
+    async def pending_nonce(self) -> int:
+        """Transaction count of the minting account, including transactions still in the mempool"""
+        return await self.async_w3.eth.get_transaction_count(self.account.address, "pending")
+
+    def _mint_call(self, recipient_addresses: List[str], token_uris: List[str]):
+        if len(recipient_addresses) == 1:
+            return self.async_contract.functions.mintCertificate(
+                Web3.to_checksum_address(recipient_addresses[0]), token_uris[0]
+            )
+        return self.async_contract.functions.mintCertificateBatch(
+            [Web3.to_checksum_address(address) for address in recipient_addresses],
+            token_uris
+        )
+
+    async def estimate_mint_gas(self, recipient_addresses: List[str], token_uris: List[str]) -> int:
+        """
+        Gas for minting to the recipients in one transaction, with
+        MINT_BATCH_GAS_BUFFER headroom. Raises ContractLogicError when the
+        contract would revert the mint.
+        """
+        if not self.can_mint:
+            raise Exception("Blockchain not properly configured")
+
+        gas = await self._mint_call(recipient_addresses, token_uris).estimate_gas({'from': self.account.address})
+        return int(gas * MINT_BATCH_GAS_BUFFER)
+
+    async def sign_mint(
+        self, recipient_address: str, token_uri: str, nonce: int, gas: Optional[int] = None
+    ) -> Tuple[str, str]:
+        """
+        Build and sign a mintCertificate transaction without sending it.
+        Returns its hash and the raw signed transaction, both as hex.
+        """
+        if not self.can_mint:
+            raise Exception("Blockchain not properly configured")
+
+        transaction = await self._mint_call([recipient_address], [token_uri]).build_transaction({
+            'from': self.account.address,
+            'nonce': nonce,
+            'gas': gas or MINT_GAS_LIMIT,
+            'gasPrice': await self.async_w3.eth.gas_price
+        })
+        signed_txn = self.account.sign_transaction(transaction)
+        return signed_txn.hash.hex(), signed_txn.rawTransaction.hex()
+
+    async def sign_mint_batch(
+        self, recipient_addresses: List[str], token_uris: List[str], nonce: int, gas: Optional[int] = None
+    ) -> Tuple[str, str]:
+        """
+        Build and sign one mintCertificateBatch transaction for several
+        certificates, with gas estimated for the batch unless it is given.
+        Returns its hash and the raw signed transaction, both as hex.
+        """
+        if len(recipient_addresses) == 1:
+            return await self.sign_mint(recipient_addresses[0], token_uris[0], nonce, gas)
+        if not self.can_mint:
+            raise Exception("Blockchain not properly configured")
+
+        gas = gas or await self.estimate_mint_gas(recipient_addresses, token_uris)
+        transaction = await self._mint_call(recipient_addresses, token_uris).build_transaction({
+            'from': self.account.address,
+            'nonce': nonce,
+            'gas': gas,
+            'gasPrice': await self.async_w3.eth.gas_price
+        })
+        signed_txn = self.account.sign_transaction(transaction)
+        return signed_txn.hash.hex(), signed_txn.rawTransaction.hex()
+
+    async def send_raw_transaction(self, raw_transaction: str) -> None:
+        await self.async_w3.eth.send_raw_transaction(raw_transaction)
+
+    async def is_transaction_known(self, transaction_hash: str) -> bool:
+        """Whether the node has the transaction, mined or in its mempool"""
         try:
-            if not self.contract or not PRIVATE_KEY:
-                raise Exception("Blockchain not properly configured")
-            
-            # Create metadata
-            metadata = {
-                "name": f"DCA Certificate - {certificate_data['course_title']}",
-                "description": certificate_data.get('description', ''),
-                "image": certificate_data.get('image_url', ''),
-                "attributes": [
-                    {
-                        "trait_type": "Certificate ID",
-                        "value": certificate_data['certificate_id']
-                    },
-                    {
-                        "trait_type": "Recipient",
-                        "value": certificate_data['recipient_name']
-                    },
-                    {
-                        "trait_type": "Course",
-                        "value": certificate_data['course_title']
-                    },
-                    {
-                        "trait_type": "Issue Date",
-                        "value": certificate_data['issued_at']
-                    },
-                    {
-                        "trait_type": "Platform",
-                        "value": "DCA LMS"
-                    }
-                ],
-                "external_url": f"https://DCA.com/certificates/{certificate_data['certificate_id']}"
-            }
-            
-            # Upload metadata to IPFS
-            token_uri = await self.upload_to_ipfs(metadata)
-            
-            # Prepare transaction
-            account = Account.from_key(PRIVATE_KEY)
-            nonce = self.w3.eth.get_transaction_count(account.address)
-            
-            # Build transaction
-            transaction = self.contract.functions.mintCertificate(
-                recipient_address,
-                token_uri
-            ).build_transaction({
-                'from': account.address,
-                'nonce': nonce,
-                'gas': 200000,
-                'gasPrice': self.w3.to_wei('30', 'gwei')
-            })
-            
-            # Sign and send transaction
-            signed_txn = self.w3.eth.account.sign_transaction(transaction, PRIVATE_KEY)
-            tx_hash = self.w3.eth.send_raw_transaction(signed_txn.rawTransaction)
-            
-            # Wait for transaction receipt
-            receipt = self.w3.eth.wait_for_transaction_receipt(tx_hash)
-            
-            # Extract token ID from logs
-            token_id = None
-            for log in receipt.logs:
-                try:
-                    decoded_log = self.contract.events.Transfer().process_log(log)
-                    token_id = decoded_log['args']['tokenId']
-                    break
-                except:
-                    continue
-            
-            return {
-                "token_id": str(token_id) if token_id else None,
-                "contract_address": CERTIFICATE_CONTRACT_ADDRESS,
-                "transaction_hash": tx_hash.hex(),
-                "network": "polygon",
-                "token_uri": token_uri,
-                "gas_used": receipt.gasUsed,
-                "block_number": receipt.blockNumber
-            }
-            
-        except Exception as e:
-            print(f"NFT minting failed: {e}")
-            # For development, return mock data
-            return {
-                "token_id": f"mock_{certificate_data['certificate_id']}",
-                "contract_address": "0x1234567890123456789012345678901234567890",
-                "transaction_hash": f"0x{''.join(['a' for _ in range(64)])}",
-                "network": "polygon-testnet",
-                "token_uri": f"https://api.DCA.com/certificates/{certificate_data['certificate_id']}/metadata"
-            }
+            await self.async_w3.eth.get_transaction(transaction_hash)
+            return True
+        except TransactionNotFound:
+            return False
+
+    async def get_receipt(self, transaction_hash: str) -> Optional[Dict[str, Any]]:
+        """The transaction's receipt, None while it is not mined"""
+        try:
+            return await self.async_w3.eth.get_transaction_receipt(transaction_hash)
+        except TransactionNotFound:
+            return None
+
+    def minted_tokens(self, receipt: Dict[str, Any]) -> List[Tuple[str, str]]:
+        """
+        (recipient, token ID) of every Transfer event in a mint receipt, in
+        log order, which is the order of the recipients in a batch
+        """
+        return [
+            (event['args']['to'], str(event['args']['tokenId']))
+            for event in self.async_contract.events.Transfer().process_receipt(receipt, errors=DISCARD)
+        ]
+
+    def token_id_from_receipt(self, receipt: Dict[str, Any]) -> Optional[str]:
+        """Token ID from the Transfer event of a mint"""
+        tokens = self.minted_tokens(receipt)
+        return tokens[0][1] if tokens else None
+    
+    def _certificate_contract(self, contract_address: str):
+        """Async contract for the address a certificate was minted on"""
+        address = Web3.to_checksum_address(contract_address)
+        if self.async_contract is not None and self.async_contract.address == address:
+            return self.async_contract
+        return self.async_w3.eth.contract(address=address, abi=CERTIFICATE_ABI)
+
+    async def check_certificate_token(
+        self,
+        contract_address: str,
+        token_id: str,
+        block_identifier: Any = "latest"
+    ) -> bool:
+        """
+        Whether the token exists (has a URI) at the given block. A revert
+        means it does not; RPC errors are raised, as the answer is unknown.
+        """
+        try:
+            token_uri = await self._certificate_contract(contract_address).functions.tokenURI(
+                int(token_id)
+            ).call(block_identifier=block_identifier)
+            return bool(token_uri)
+        except ContractLogicError:
+            return False
     
     async def verify_certificate_on_chain(
         self, 
@@ -195,12 +297,7 @@ class BlockchainService:
     ) -> bool:
         """Verify certificate exists on blockchain"""
         try:
-            if not self.contract:
-                return False
-            
-            # Check if token exists by trying to get its URI
-            token_uri = self.contract.functions.tokenURI(int(token_id)).call()
-            return bool(token_uri)
+            return await self.check_certificate_token(contract_address, token_id)
             
         except Exception as e:
             print(f"Blockchain verification failed: {e}")
@@ -213,10 +310,7 @@ class BlockchainService:
     ) -> Optional[str]:
         """Get the owner of a certificate NFT"""
         try:
-            if not self.contract:
-                return None
-            
-            owner = self.contract.functions.ownerOf(int(token_id)).call()
+            owner = await self._certificate_contract(contract_address).functions.ownerOf(int(token_id)).call()
             return owner
             
         except Exception as e:
@@ -227,9 +321,6 @@ class BlockchainService:
 blockchain_service = BlockchainService()
 
 # Export functions for use in routers
-async def mint_certificate_nft(recipient_address: str, certificate_data: Dict[str, Any]) -> Dict[str, Any]:
-    return await blockchain_service.mint_certificate_nft(recipient_address, certificate_data)
-
 async def verify_certificate_on_chain(contract_address: str, token_id: str) -> bool:
     return await blockchain_service.verify_certificate_on_chain(contract_address, token_id)
 
@@ -0,0 +1,209 @@
+"""
+Broadcast notifications with push fan-out
+
+POST /api/notifications/broadcast used to insert the notifications and then,
+inside the request, run two queries and one provider call per device for
+every target user, which timed out for platform-wide broadcasts.
+
+- create_broadcast() inserts the in-app notifications with one
+  INSERT ... SELECT and records a push_broadcasts row, then queues the push
+  fan-out; the endpoint returns the broadcast id.
+- send_push_broadcast() runs in a Celery worker
+  (tasks/notification_tasks.py). It pages through the opted-in device
+  tokens of the target users, PUSH_FANOUT_PAGE_SIZE at a time with one
+  keyset query, and sends each page in provider-sized multicast batches
+  (utils/notifications.deliver_push). After every page it adds the counts
+  to the row and moves its cursor, so a retried task resumes where the last
+  one stopped and GET /api/notifications/broadcasts/{id} shows progress.
+  Tokens the provider reports as unregistered are deleted.
+"""
+import json
+import os
+from typing import Any, Dict, List, Optional, Tuple
+
+from celery_app import celery_app
+from database.connection import database
+from utils.notifications import deliver_push, remove_device_tokens
+from utils.push import PushProvider
+
+# Device tokens read per query; each page is sent before the next is read
+PUSH_FANOUT_PAGE_SIZE = int(os.getenv("PUSH_FANOUT_PAGE_SIZE", "5000"))
+
+BROADCAST_TASK = "tasks.notification_tasks.send_push_broadcast_task"
+
+
+def _target_filter(role: Optional[str], user_ids: Optional[List]) -> Tuple[str, Dict[str, Any]]:
+    """WHERE clause on users u selecting a broadcast's recipients"""
+    if user_ids:
+        return "u.id = ANY(:user_ids)", {"user_ids": list(user_ids)}
+    if role:
+        return "u.role = :role AND u.status = 'active'", {"role": role}
+    return "u.status = 'active'", {}
+
+
+async def create_broadcast(notification, user_ids: Optional[List], role: Optional[str], created_by) -> Optional[Dict[str, Any]]:
+    """
+    Create a notification for every target user and queue the push fan-out.
+    Returns None when no user matches.
+    """
+    where, values = _target_filter(role, user_ids)
+
+    async with database.transaction():
+        recipients = await database.fetch_val(f"""
+            WITH inserted AS (
+                INSERT INTO notifications (id, user_id, type, title, message, data, priority)
+                SELECT uuid_generate_v4(), u.id, :type, :title, :message, CAST(:data AS JSONB), :priority
+                FROM users u
+                WHERE {where}
+                RETURNING 1
+            )
+            SELECT COUNT(*) FROM inserted
+        """, values={
+            **values,
+            "type": notification.type,
+            "title": notification.title,
+            "message": notification.message,
+            "data": json.dumps(notification.data) if notification.data is not None else None,
+            "priority": notification.priority
+        })
+        if not recipients:
+            return None
+
+        broadcast_id = await database.fetch_val("""
+            INSERT INTO push_broadcasts (
+                title, message, data, target_role, target_user_ids, recipients, created_by
+            )
+            VALUES (
+                :title, :message, CAST(:data AS JSONB), :target_role, :target_user_ids, :recipients, :created_by
+            )
+            RETURNING id
+        """, values={
+            "title": notification.title,
+            "message": notification.message,
+            "data": json.dumps(notification.data) if notification.data is not None else None,
+            "target_role": None if user_ids else role,
+            "target_user_ids": list(user_ids) if user_ids else None,
+            "recipients": recipients,
+            "created_by": created_by
+        })
+
+    celery_app.send_task(BROADCAST_TASK, args=[str(broadcast_id)])
+    return {"broadcast_id": str(broadcast_id), "recipients": recipients, "status": "queued"}
+
+
+def _devices_query(where: str, after_cursor: bool) -> str:
+    keyset = "AND (d.user_id, d.device_token) > (:after_user_id, :after_token)" if after_cursor else ""
+    return f"""
+        SELECT d.user_id, d.device_token
+        FROM users u
+        JOIN notification_settings ns ON ns.user_id = u.id AND ns.push_notifications
+        JOIN user_devices d ON d.user_id = u.id AND d.device_token IS NOT NULL
+        WHERE {where} {keyset}
+        ORDER BY d.user_id, d.device_token
+        LIMIT :limit
+    """
+
+
+async def send_push_broadcast(broadcast_id, provider: Optional[PushProvider] = None) -> Dict[str, Any]:
+    """Send a broadcast's pushes, resuming after its cursor; returns its final counts"""
+    broadcast = await database.fetch_one("""
+        UPDATE push_broadcasts
+        SET status = 'sending', started_at = COALESCE(started_at, NOW()), updated_at = NOW()
+        WHERE id = :id AND status IN ('queued', 'sending')
+        RETURNING *
+    """, values={"id": broadcast_id})
+    if not broadcast:
+        return {"status": "skipped"}
+
+    where, values = _target_filter(broadcast.target_role, broadcast.target_user_ids)
+    data = json.loads(broadcast.data) if isinstance(broadcast.data, str) else broadcast.data
+
+    if broadcast.devices_total is None:
+        await database.execute(f"""
+            UPDATE push_broadcasts
+            SET devices_total = (
+                SELECT COUNT(*)
+                FROM users u
+                JOIN notification_settings ns ON ns.user_id = u.id AND ns.push_notifications
+                JOIN user_devices d ON d.user_id = u.id AND d.device_token IS NOT NULL
+                WHERE {where}
+            )
+            WHERE id = :id
+        """, values={**values, "id": broadcast_id})
+
+    cursor = (broadcast.cursor_user_id, broadcast.cursor_device_token)
+    while True:
+        after_cursor = cursor[0] is not None
+        page = await database.fetch_all(_devices_query(where, after_cursor), values={
+            **values,
+            **({"after_user_id": cursor[0], "after_token": cursor[1]} if after_cursor else {}),
+            "limit": PUSH_FANOUT_PAGE_SIZE
+        })
+        if not page:
+            break
+
+        result = await deliver_push(
+            [row.device_token for row in page], broadcast.title, broadcast.message, data, provider
+        )
+        await remove_device_tokens(result["invalid_tokens"])
+
+        cursor = (page[-1].user_id, page[-1].device_token)
+        await database.execute("""
+            UPDATE push_broadcasts
+            SET devices_sent = devices_sent + :sent,
+                delivered = delivered + :delivered,
+                failed = failed + :failed,
+                invalid_tokens = invalid_tokens + :invalid,
+                batches = batches + :batches,
+                cursor_user_id = :cursor_user_id,
+                cursor_device_token = :cursor_device_token,
+                updated_at = NOW()
+            WHERE id = :id
+        """, values={
+            "id": broadcast_id,
+            "sent": len(page),
+            "delivered": result["delivered"],
+            "failed": result["failed"],
+            "invalid": len(result["invalid_tokens"]),
+            "batches": result["batches"],
+            "cursor_user_id": cursor[0],
+            "cursor_device_token": cursor[1]
+        })
+
+        if len(page) < PUSH_FANOUT_PAGE_SIZE:
+            break
+
+    await database.execute("""
+        UPDATE push_broadcasts
+        SET status = 'completed', completed_at = NOW(), updated_at = NOW()
+        WHERE id = :id
+    """, values={"id": broadcast_id})
+    return await get_broadcast(broadcast_id)
+
+
+async def mark_broadcast_failed(broadcast_id, error: str):
+    await database.execute("""
+        UPDATE push_broadcasts
+        SET status = 'failed', error = :error, updated_at = NOW()
+        WHERE id = :id AND status IN ('queued', 'sending')
+    """, values={"id": broadcast_id, "error": error})
+
+
+async def get_broadcast(broadcast_id) -> Optional[Dict[str, Any]]:
+    """A broadcast's status, progress and delivery counts"""
+    row = await database.fetch_one("""
+        SELECT id, title, status, recipients, devices_total, devices_sent, delivered, failed,
+               invalid_tokens, batches, error, created_by, started_at, completed_at, created_at
+        FROM push_broadcasts
+        WHERE id = :id
+    """, values={"id": broadcast_id})
+    if not row:
+        return None
+
+    broadcast = dict(row)
+    broadcast["id"] = str(broadcast["id"])
+    total = broadcast["devices_total"]
+    broadcast["progress"] = round(broadcast["devices_sent"] / total, 4) if total else (
+        1.0 if broadcast["status"] == "completed" else 0.0
+    )
+    return broadcast
@@ -0,0 +1,422 @@
+"""
+In-memory search index for the public course catalog
+
+Published course titles, descriptions and lesson titles, plus active
+category names and descriptions, are kept in a per-process inverted index so
+anonymous catalog searches (GET /api/courses?status=published&search=...,
+GET /api/categories/search) are answered without a database round trip.
+
+- postings are compact arrays of document ordinals and weighted term counts
+- results are ranked with BM25 over the field-weighted term counts
+- every query word also matches as a prefix ("pyth" finds "python"); a word
+  that matches nothing is retried with one or two typos allowed
+- every query word must match, as in utils/search.py
+
+The index is built at startup and updated in place by the course, lesson and
+category routers. Each worker process holds its own copy, so it is also
+rebuilt every CATALOG_INDEX_REFRESH_SECONDS to pick up writes made by other
+workers and counters such as enrollment_count.
+
+Enable it with CATALOG_SEARCH_INDEX=true.
+"""
+import asyncio
+import logging
+import math
+import os
+import re
+from array import array
+from bisect import bisect_left, insort
+from collections import Counter
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+from dotenv import load_dotenv
+
+from database.connection import database
+
+load_dotenv()
+logger = logging.getLogger(__name__)
+
+CATALOG_SEARCH_INDEX = os.getenv("CATALOG_SEARCH_INDEX", "false").lower() == "true"
+CATALOG_INDEX_REFRESH_SECONDS = float(os.getenv("CATALOG_INDEX_REFRESH_SECONDS", "300"))
+
+# BM25 parameters
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+# Score multipliers for words matched by prefix or with typos
+PREFIX_MATCH_FACTOR = 0.8
+FUZZY_MATCH_FACTOR = 0.5
+# Longest run of vocabulary terms a single prefix expands to
+PREFIX_EXPANSION_LIMIT = 64
+# Shortest query word that is retried with typos
+FUZZY_MIN_LENGTH = 4
+# Fuzzy candidates are found through single-character deletions of the
+# first FUZZY_KEY_LENGTH characters of each term
+FUZZY_KEY_LENGTH = 6
+# Deleted documents are compacted away once they outnumber live ones
+COMPACT_MIN_DELETED = 64
+
+COURSE_FIELD_WEIGHTS = {
+    "title": 3.0,
+    "short_description": 1.5,
+    "description": 1.0,
+    "lesson_titles": 1.5,
+}
+CATEGORY_FIELD_WEIGHTS = {
+    "name": 3.0,
+    "description": 1.0,
+}
+
+STOP_WORDS = frozenset("""
+    a an and are as at be but by for from has have in into is it its of on or
+    that the their this to was were will with
+""".split())
+
+COURSES_QUERY = """
+    SELECT c.*,
+           c.enrollment_count AS total_students,
+           u.first_name AS instructor_first_name,
+           u.last_name AS instructor_last_name,
+           cat.name AS category_name,
+           COALESCE(
+               (SELECT array_agg(l.title ORDER BY l.sort_order)
+                FROM lessons l
+                WHERE l.course_id = c.id AND l.is_published = true),
+               ARRAY[]::TEXT[]
+           ) AS lesson_titles
+    FROM courses c
+    LEFT JOIN users u ON c.instructor_id = u.id
+    LEFT JOIN categories cat ON c.category_id = cat.id
+    WHERE c.status = 'published'
+"""
+
+CATEGORIES_QUERY = """
+    SELECT c.*,
+           COUNT(DISTINCT co.id) as course_count
+    FROM categories c
+    LEFT JOIN courses co ON co.category_id = c.id
+    WHERE c.is_active = true
+    GROUP BY c.id, c.name, c.slug, c.description, c.icon, c.color,
+             c.parent_id, c.sort_order, c.is_active, c.created_at, c.updated_at
+"""
+
+
+def normalize_term(word: str) -> str:
+    """Lowercase a word and strip a plural 's' so "courses" finds "course" """
+    word = word.lower()
+    if len(word) > 3 and word.endswith("s") and not word.endswith("ss"):
+        return word[:-1]
+    return word
+
+
+def tokenize(text: Optional[str]) -> List[str]:
+    if not text:
+        return []
+    return [
+        normalize_term(word) for word in re.findall(r"\w+", text.lower())
+        if word not in STOP_WORDS
+    ]
+
+
+def _deletions(key: str) -> Set[str]:
+    return {key} | {key[:i] + key[i + 1:] for i in range(len(key))}
+
+
+def edit_distance(a: str, b: str, limit: int) -> int:
+    """Edit distance counting adjacent transpositions; stops early above limit"""
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    previous2 = None
+    previous = list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        current = [i] + [0] * len(b)
+        for j in range(1, len(b) + 1):
+            cost = 0 if a[i - 1] == b[j - 1] else 1
+            current[j] = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + cost)
+            if (previous2 is not None and i > 1 and j > 1
+                    and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]):
+                current[j] = min(current[j], previous2[j - 2] + 1)
+        if min(current) > limit:
+            return limit + 1
+        previous2, previous = previous, current
+    return previous[-1]
+
+
+class InvertedIndex:
+    """BM25-ranked inverted index with in-place add and remove"""
+
+    def __init__(self, field_weights: Dict[str, float]):
+        self.field_weights = field_weights
+        # Per document ordinal; a removed document keeps its slot with key None
+        self._keys: List[Optional[str]] = []
+        self._terms: List[Optional[Dict[str, float]]] = []
+        self._lengths = array("f")
+        self._ordinals: Dict[str, int] = {}
+        # term -> (document ordinals, weighted term counts), ordinals ascending
+        self._postings: Dict[str, Tuple[array, array]] = {}
+        # Live documents containing each term
+        self._document_frequency: Dict[str, int] = {}
+        self._vocabulary: List[str] = []
+        self._fuzzy: Dict[str, Set[str]] = {}
+        self._live = 0
+        self._deleted = 0
+        self._total_length = 0.0
+
+    def __len__(self) -> int:
+        return self._live
+
+    def __contains__(self, key) -> bool:
+        return str(key) in self._ordinals
+
+    def _weighted_terms(self, fields: Dict[str, Any]) -> Dict[str, float]:
+        counts: Counter = Counter()
+        for field, weight in self.field_weights.items():
+            value = fields.get(field)
+            if isinstance(value, (list, tuple)):
+                value = " ".join(v for v in value if v)
+            for term in tokenize(value):
+                counts[term] += weight
+        return dict(counts)
+
+    def _index_term(self, term: str):
+        insort(self._vocabulary, term)
+        for variant in _deletions(term[:FUZZY_KEY_LENGTH]):
+            self._fuzzy.setdefault(variant, set()).add(term)
+
+    def _append(self, key: str, terms: Dict[str, float]):
+        ordinal = len(self._keys)
+        length = sum(terms.values())
+        self._keys.append(key)
+        self._terms.append(terms)
+        self._lengths.append(length)
+        self._ordinals[key] = ordinal
+        for term, count in terms.items():
+            postings = self._postings.get(term)
+            if postings is None:
+                postings = self._postings[term] = (array("I"), array("f"))
+                self._index_term(term)
+            postings[0].append(ordinal)
+            postings[1].append(count)
+            self._document_frequency[term] = self._document_frequency.get(term, 0) + 1
+        self._live += 1
+        self._total_length += length
+
+    def add(self, key, fields: Dict[str, Any]):
+        """Index a document, replacing any earlier version with the same key"""
+        key = str(key)
+        self.remove(key)
+        self._append(key, self._weighted_terms(fields))
+
+    def remove(self, key):
+        ordinal = self._ordinals.pop(str(key), None)
+        if ordinal is None:
+            return
+        for term in self._terms[ordinal]:
+            self._document_frequency[term] -= 1
+        self._keys[ordinal] = None
+        self._terms[ordinal] = None
+        self._live -= 1
+        self._deleted += 1
+        self._total_length -= self._lengths[ordinal]
+        if self._deleted > max(COMPACT_MIN_DELETED, self._live):
+            self.compact()
+
+    def compact(self):
+        """Rebuild the postings without the slots of removed documents"""
+        documents = [
+            (key, terms) for key, terms in zip(self._keys, self._terms) if key is not None
+        ]
+        self.__init__(self.field_weights)
+        for key, terms in documents:
+            self._append(key, terms)
+
+    def _expand(self, word: str) -> List[Tuple[str, float]]:
+        """Vocabulary terms a query word stands for, with their score factor"""
+        expansions = []
+        if self._document_frequency.get(word):
+            expansions.append((word, 1.0))
+
+        start = bisect_left(self._vocabulary, word)
+        for term in self._vocabulary[start:start + PREFIX_EXPANSION_LIMIT + 1]:
+            if not term.startswith(word):
+                break
+            if term != word and self._document_frequency.get(term):
+                expansions.append((term, PREFIX_MATCH_FACTOR))
+        if expansions or len(word) < FUZZY_MIN_LENGTH:
+            return expansions
+
+        limit = 1 if len(word) < 8 else 2
+        candidates: Set[str] = set()
+        for variant in _deletions(word[:FUZZY_KEY_LENGTH]):
+            candidates.update(self._fuzzy.get(variant, ()))
+        for term in candidates:
+            if not self._document_frequency.get(term):
+                continue
+            # Compare against the term and its prefixes of similar length,
+            # so a typo in a partly typed word still matches
+            lengths = {len(term)} | {
+                n for n in range(len(word) - limit, len(word) + limit + 1) if 0 < n < len(term)
+            }
+            if any(edit_distance(word, term[:n], limit) <= limit for n in lengths):
+                expansions.append((term, FUZZY_MATCH_FACTOR))
+        return expansions
+
+    def search(self, query: str) -> List[Tuple[str, float]]:
+        """Keys of documents matching every query word, best BM25 score first"""
+        words = list(dict.fromkeys(tokenize(query)))
+        if not words or not self._live:
+            return []
+
+        average_length = self._total_length / self._live or 1.0
+        scores: Optional[Dict[int, float]] = None
+        for word in words:
+            word_scores: Dict[int, float] = {}
+            for term, factor in self._expand(word):
+                frequency = self._document_frequency[term]
+                idf = math.log(1 + (self._live - frequency + 0.5) / (frequency + 0.5))
+                ordinals, counts = self._postings[term]
+                for ordinal, count in zip(ordinals, counts):
+                    if self._keys[ordinal] is None:
+                        continue
+                    norm = BM25_K1 * (1 - BM25_B + BM25_B * self._lengths[ordinal] / average_length)
+                    score = factor * idf * count * (BM25_K1 + 1) / (count + norm)
+                    # A word counts once per document, through its best term
+                    if score > word_scores.get(ordinal, 0.0):
+                        word_scores[ordinal] = score
+            if scores is None:
+                scores = word_scores
+            else:
+                scores = {
+                    ordinal: scores[ordinal] + score
+                    for ordinal, score in word_scores.items() if ordinal in scores
+                }
+            if not scores:
+                return []
+
+        ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)
+        return [(self._keys[ordinal], score) for ordinal, score in ranked]
+
+
+def _same(value, expected) -> bool:
+    expected = getattr(expected, "value", expected)
+    return value == expected or str(value) == str(expected)
+
+
+class CatalogIndex:
+    """Published courses and active categories, searchable in memory"""
+
+    def __init__(self, refresh_interval: float = CATALOG_INDEX_REFRESH_SECONDS):
+        self.refresh_interval = refresh_interval
+        self.ready = False
+        self._courses = InvertedIndex(COURSE_FIELD_WEIGHTS)
+        self._course_rows: Dict[str, Dict[str, Any]] = {}
+        self._categories = InvertedIndex(CATEGORY_FIELD_WEIGHTS)
+        self._category_rows: Dict[str, Dict[str, Any]] = {}
+        self._task: Optional[asyncio.Task] = None
+
+    def load_courses(self, rows: Iterable[Dict[str, Any]]):
+        courses = InvertedIndex(COURSE_FIELD_WEIGHTS)
+        course_rows = {}
+        for row in rows:
+            row = dict(row)
+            key = str(row["id"])
+            courses.add(key, row)
+            course_rows[key] = row
+        self._courses, self._course_rows = courses, course_rows
+
+    def load_categories(self, rows: Iterable[Dict[str, Any]]):
+        categories = InvertedIndex(CATEGORY_FIELD_WEIGHTS)
+        category_rows = {}
+        for row in rows:
+            row = dict(row)
+            key = str(row["id"])
+            categories.add(key, row)
+            category_rows[key] = row
+        self._categories, self._category_rows = categories, category_rows
+
+    async def build(self):
+        """Load the whole catalog from the database"""
+        courses = await database.fetch_all(COURSES_QUERY)
+        categories = await database.fetch_all(CATEGORIES_QUERY)
+        self.load_courses(courses)
+        self.load_categories(categories)
+        self.ready = True
+        logger.info(f"Catalog index built: {len(courses)} courses, {len(categories)} categories")
+
+    async def refresh_course(self, course_id):
+        """
+        Re-read one course after it was created, updated, published,
+        unpublished or archived, or one of its lessons changed. Also refreshes
+        the categories, whose course counts may have moved.
+        """
+        if not self.ready:
+            return
+        try:
+            row = await database.fetch_one(
+                f"{COURSES_QUERY} AND c.id = :course_id", values={"course_id": course_id}
+            )
+            key = str(course_id)
+            if row is None:
+                self._courses.remove(key)
+                self._course_rows.pop(key, None)
+            else:
+                self._course_rows[key] = dict(row)
+                self._courses.add(key, self._course_rows[key])
+            await self.refresh_categories()
+        except Exception as e:
+            logger.error(f"Catalog index refresh of course {course_id} failed: {str(e)}")
+
+    async def refresh_categories(self):
+        """Re-read the categories after one was created, changed or removed"""
+        if not self.ready:
+            return
+        try:
+            self.load_categories(await database.fetch_all(CATEGORIES_QUERY))
+        except Exception as e:
+            logger.error(f"Catalog index refresh of categories failed: {str(e)}")
+
+    def search_courses(self, term: str, **filters) -> List[Dict[str, Any]]:
+        """
+        Published courses matching the term, best first. Filters compare
+        column values and skip None, like the WHERE clause in get_courses.
+        """
+        filters = {column: value for column, value in filters.items() if value is not None}
+        results = []
+        for key, _ in self._courses.search(term):
+            row = self._course_rows[key]
+            if all(_same(row.get(column), value) for column, value in filters.items()):
+                results.append(row)
+        return results
+
+    def search_categories(self, term: str, limit: int = 20) -> List[Dict[str, Any]]:
+        return [self._category_rows[key] for key, _ in self._categories.search(term)[:limit]]
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.refresh_interval)
+            try:
+                await self.build()
+            except Exception as e:
+                logger.error(f"Catalog index rebuild failed: {str(e)}")
+
+    async def start(self):
+        """Build the index and keep rebuilding it on the running event loop"""
+        try:
+            await self.build()
+        except Exception as e:
+            # Searches go to the database until the next rebuild succeeds
+            logger.error(f"Catalog index build failed: {str(e)}")
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        self.ready = False
+
+
+catalog_index = CatalogIndex()
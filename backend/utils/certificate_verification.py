@@ -0,0 +1,339 @@
+"""
+Cached verification for the public certificate verify endpoint
+
+GET /api/certificates/verify/{id} needs no login and is polled by employers
+and scrapers. Its answer is cached per certificate at two levels, as in
+utils/result_cache.py:
+- L1: in-process LRU, trusted for at most VERIFY_CACHE_L1_TTL_SECONDS
+- L2: Redis, shared by all workers
+
+An entry keeps the chain state it was checked against (contract, token and
+block) next to the response, and lives according to what it says:
+- unknown or unissued ids: VERIFY_NEGATIVE_TTL_SECONDS
+- issued, or minted and checked on chain: VERIFY_CACHE_TTL_SECONDS
+- minted but not checked yet: VERIFY_UNCHECKED_TTL_SECONDS
+Concurrent misses for one certificate share one load (single-flight). A
+load only goes to the chain while the budget of
+VERIFY_CHAIN_CHECKS_PER_SECOND, shared by all workers, allows; otherwise
+blockchain_verified is None until the refresher or a later request checks it.
+
+refresh_minted_verifications() runs on the beat schedule and re-checks the
+next VERIFY_REFRESH_BATCH_SIZE minted certificates, all against one block.
+Writes to certificates call invalidate_certificate_verification(); other
+workers may serve their L1 copy for up to VERIFY_CACHE_L1_TTL_SECONDS.
+"""
+import asyncio
+import json
+import os
+import time
+from collections import OrderedDict
+from datetime import datetime, timezone
+from typing import Any, Awaitable, Callable, Dict, Iterable, Optional, Tuple
+from dotenv import load_dotenv
+
+from database.connection import database
+from utils.blockchain import BlockchainService, blockchain_service
+from utils.redis_client import async_redis_client, redis_client
+
+load_dotenv()
+
+VERIFY_CACHE_ENABLED = os.getenv("VERIFY_CACHE_ENABLED", "true").lower() == "true"
+VERIFY_CACHE_MAX_ENTRIES = int(os.getenv("VERIFY_CACHE_MAX_ENTRIES", "10000"))
+VERIFY_CACHE_L1_TTL_SECONDS = float(os.getenv("VERIFY_CACHE_L1_TTL_SECONDS", "30"))
+VERIFY_CACHE_TTL_SECONDS = int(os.getenv("VERIFY_CACHE_TTL_SECONDS", "86400"))
+VERIFY_NEGATIVE_TTL_SECONDS = int(os.getenv("VERIFY_NEGATIVE_TTL_SECONDS", "300"))
+VERIFY_UNCHECKED_TTL_SECONDS = int(os.getenv("VERIFY_UNCHECKED_TTL_SECONDS", "60"))
+VERIFY_CHAIN_CHECKS_PER_SECOND = int(os.getenv("VERIFY_CHAIN_CHECKS_PER_SECOND", "5"))
+VERIFY_REFRESH_BATCH_SIZE = int(os.getenv("VERIFY_REFRESH_BATCH_SIZE", "500"))
+VERIFY_REFRESH_CONCURRENCY = int(os.getenv("VERIFY_REFRESH_CONCURRENCY", "20"))
+
+KEY_PREFIX = "certificate_verify"
+REFRESH_CURSOR_KEY = f"{KEY_PREFIX}:refresh_cursor"
+
+NOT_FOUND = {"valid": False, "message": "Certificate not found or not issued"}
+
+Loader = Callable[[], Awaitable[Tuple[Dict[str, Any], int]]]
+
+
+def _key(certificate_id) -> str:
+    return f"{KEY_PREFIX}:{certificate_id}"
+
+
+class CertificateVerificationCache:
+    """Two-level cache of verify responses with a shared budget for chain checks"""
+
+    def __init__(
+        self,
+        client=async_redis_client,
+        enabled: bool = VERIFY_CACHE_ENABLED,
+        max_entries: int = VERIFY_CACHE_MAX_ENTRIES,
+        l1_ttl: float = VERIFY_CACHE_L1_TTL_SECONDS,
+        chain_checks_per_second: int = VERIFY_CHAIN_CHECKS_PER_SECOND
+    ):
+        self.client = client
+        self.enabled = enabled
+        self.max_entries = max_entries
+        self.l1_ttl = l1_ttl
+        self.chain_checks_per_second = chain_checks_per_second
+        # certificate id -> (trusted until, entry)
+        self._l1: "OrderedDict[str, Tuple[float, Dict[str, Any]]]" = OrderedDict()
+        self._inflight: Dict[str, asyncio.Task] = {}
+        self.stats = {
+            "l1_hits": 0, "l2_hits": 0, "negative_hits": 0, "misses": 0,
+            "chain_checks": 0, "chain_throttled": 0
+        }
+
+    async def get(self, certificate_id) -> Optional[Dict[str, Any]]:
+        """The cached entry for a certificate, None on a miss"""
+        key = str(certificate_id)
+        cached = self._l1.get(key)
+        if cached is not None:
+            trusted_until, entry = cached
+            if trusted_until > time.monotonic():
+                self._l1.move_to_end(key)
+                self.stats["l1_hits"] += 1
+                return entry
+            del self._l1[key]
+
+        try:
+            data = await self.client.get(_key(key))
+        except Exception as e:
+            print(f"[VerifyCache] Error reading {key}: {e}")
+            return None
+        if data is None:
+            return None
+
+        entry = json.loads(data)
+        self._store_l1(key, entry, await self._ttl(key))
+        self.stats["l2_hits"] += 1
+        return entry
+
+    async def _ttl(self, key: str) -> float:
+        try:
+            return max(0, await self.client.ttl(_key(key)))
+        except Exception:
+            return 0
+
+    async def put_many(self, entries: Iterable[Tuple[Any, Dict[str, Any], int]]):
+        """Store (certificate id, entry, ttl) triples in one round trip"""
+        try:
+            pipe = self.client.pipeline()
+            for certificate_id, entry, ttl in entries:
+                self._store_l1(str(certificate_id), entry, ttl)
+                pipe.set(_key(certificate_id), json.dumps(entry), ex=ttl)
+            await pipe.execute()
+        except Exception as e:
+            print(f"[VerifyCache] Error writing entries: {e}")
+
+    def _store_l1(self, key: str, entry: Dict[str, Any], ttl: float):
+        self._l1[key] = (time.monotonic() + min(self.l1_ttl, ttl), entry)
+        self._l1.move_to_end(key)
+        while len(self._l1) > self.max_entries:
+            self._l1.popitem(last=False)
+
+    def forget(self, *certificate_ids):
+        """Drop certificates from this process's L1"""
+        for certificate_id in certificate_ids:
+            self._l1.pop(str(certificate_id), None)
+
+    async def take_chain_budget(self) -> bool:
+        """Whether a request may check the chain now: a per-second allowance shared by all workers"""
+        key = f"{KEY_PREFIX}:chain_budget:{int(time.time())}"
+        try:
+            pipe = self.client.pipeline()
+            pipe.incr(key)
+            pipe.expire(key, 2)
+            used, _ = await pipe.execute()
+        except Exception as e:
+            print(f"[VerifyCache] Error reading chain budget: {e}")
+            return False
+        if used > self.chain_checks_per_second:
+            self.stats["chain_throttled"] += 1
+            return False
+        self.stats["chain_checks"] += 1
+        return True
+
+    async def _load(self, certificate_id, load: Loader) -> Dict[str, Any]:
+        entry, ttl = await load()
+        await self.put_many([(certificate_id, entry, ttl)])
+        return entry
+
+    async def get_or_load(self, certificate_id, load: Loader) -> Dict[str, Any]:
+        """The verify response for a certificate, loading it on a miss"""
+        if not self.enabled:
+            entry, _ = await load()
+            return entry["result"]
+
+        entry = await self.get(certificate_id)
+        if entry is not None:
+            if not entry["result"]["valid"]:
+                self.stats["negative_hits"] += 1
+            return entry["result"]
+
+        self.stats["misses"] += 1
+        key = str(certificate_id)
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self._load(certificate_id, load))
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        entry = await asyncio.shield(task)
+        return entry["result"]
+
+    def get_stats(self) -> Dict[str, Any]:
+        hits = self.stats["l1_hits"] + self.stats["l2_hits"]
+        total = hits + self.stats["misses"]
+        return {
+            **self.stats,
+            "l1_size": len(self._l1),
+            "hit_rate": round(hits / total, 4) if total else 0.0
+        }
+
+
+verification_cache = CertificateVerificationCache()
+
+
+CERTIFICATE_QUERY = """
+    SELECT c.id, c.issued_at, c.blockchain_network, c.token_id, c.contract_address,
+           co.title as course_title, u.first_name, u.last_name
+    FROM certificates c
+    JOIN courses co ON c.course_id = co.id
+    JOIN users u ON c.user_id = u.id
+    WHERE c.status IN ('issued', 'minted')
+"""
+
+
+def _entry(certificate, chain: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    if chain:
+        blockchain_verified = chain["verified"]
+    else:
+        # Minted but not checked yet: unknown rather than unverified
+        blockchain_verified = None if certificate.token_id and certificate.contract_address else False
+    return {
+        "result": {
+            "valid": True,
+            "certificate_id": str(certificate.id),
+            "recipient_name": f"{certificate.first_name} {certificate.last_name}",
+            "course_title": certificate.course_title,
+            "issued_at": certificate.issued_at.isoformat(),
+            "blockchain_verified": blockchain_verified,
+            "blockchain_checked_at": chain["checked_at"] if chain else None,
+            "blockchain_network": certificate.blockchain_network,
+            "token_id": certificate.token_id
+        },
+        "chain": chain
+    }
+
+
+async def _check_chain(certificate, service: BlockchainService, block_number: Optional[int] = None) -> Dict[str, Any]:
+    verified = await service.check_certificate_token(
+        certificate.contract_address,
+        certificate.token_id,
+        block_identifier=block_number if block_number is not None else "latest"
+    )
+    return {
+        "contract_address": certificate.contract_address,
+        "token_id": certificate.token_id,
+        "block_number": block_number,
+        "verified": verified,
+        "checked_at": datetime.now(timezone.utc).isoformat()
+    }
+
+
+async def _load_verification(
+    certificate_id,
+    cache: CertificateVerificationCache,
+    service: BlockchainService
+) -> Tuple[Dict[str, Any], int]:
+    certificate = await database.fetch_one(
+        CERTIFICATE_QUERY + " AND c.id = :certificate_id",
+        values={"certificate_id": certificate_id}
+    )
+    if not certificate:
+        return {"result": NOT_FOUND, "chain": None}, VERIFY_NEGATIVE_TTL_SECONDS
+    if not (certificate.token_id and certificate.contract_address):
+        return _entry(certificate, None), VERIFY_CACHE_TTL_SECONDS
+
+    if await cache.take_chain_budget():
+        try:
+            return _entry(certificate, await _check_chain(certificate, service)), VERIFY_CACHE_TTL_SECONDS
+        except Exception as e:
+            print(f"[VerifyCache] Chain check of {certificate_id} failed: {e}")
+    return _entry(certificate, None), VERIFY_UNCHECKED_TTL_SECONDS
+
+
+async def get_certificate_verification(
+    certificate_id,
+    cache: Optional[CertificateVerificationCache] = None,
+    service: Optional[BlockchainService] = None
+) -> Dict[str, Any]:
+    """The public verify response for a certificate"""
+    cache = cache or verification_cache
+    service = service or blockchain_service
+    return await cache.get_or_load(certificate_id, lambda: _load_verification(certificate_id, cache, service))
+
+
+async def refresh_minted_verifications(
+    cache: Optional[CertificateVerificationCache] = None,
+    service: Optional[BlockchainService] = None
+) -> Dict[str, Any]:
+    """
+    Re-check the next slice of minted certificates on chain, all at the
+    same block, and rewrite their entries. The cursor wraps around once
+    every minted certificate was checked.
+    """
+    cache = cache or verification_cache
+    service = service or blockchain_service
+    cursor = await cache.client.get(REFRESH_CURSOR_KEY)
+    certificates = await database.fetch_all(
+        CERTIFICATE_QUERY + """
+          AND c.token_id IS NOT NULL AND c.contract_address IS NOT NULL
+          AND c.id > CAST(:cursor AS UUID)
+        ORDER BY c.id
+        LIMIT :limit
+        """,
+        values={"cursor": cursor or "00000000-0000-0000-0000-000000000000", "limit": VERIFY_REFRESH_BATCH_SIZE}
+    )
+    if not certificates:
+        await cache.client.delete(REFRESH_CURSOR_KEY)
+        return {"checked": 0, "failed": 0, "wrapped": True}
+
+    block_number = await service.async_w3.eth.block_number
+    checking = asyncio.Semaphore(VERIFY_REFRESH_CONCURRENCY)
+
+    async def check(certificate):
+        async with checking:
+            return await _check_chain(certificate, service, block_number)
+
+    chains = await asyncio.gather(*[check(certificate) for certificate in certificates], return_exceptions=True)
+    entries = []
+    failed = 0
+    for certificate, chain in zip(certificates, chains):
+        if isinstance(chain, Exception):
+            # Keep the current entry; the next pass tries again
+            failed += 1
+            continue
+        entries.append((certificate.id, _entry(certificate, chain), VERIFY_CACHE_TTL_SECONDS))
+    await cache.put_many(entries)
+
+    wrapped = len(certificates) < VERIFY_REFRESH_BATCH_SIZE
+    if wrapped:
+        await cache.client.delete(REFRESH_CURSOR_KEY)
+    else:
+        await cache.client.set(REFRESH_CURSOR_KEY, str(certificates[-1].id))
+    return {"checked": len(entries), "failed": failed, "block_number": block_number, "wrapped": wrapped}
+
+
+async def invalidate_certificate_verification(*certificate_ids):
+    """
+    Call after a write that changes a certificate's status, token or holder
+    has committed. The delete goes through the sync client on a thread, so
+    it works from request handlers and from Celery tasks' own event loops.
+    """
+    if not certificate_ids:
+        return
+    verification_cache.forget(*certificate_ids)
+    try:
+        await asyncio.to_thread(redis_client.delete, *[_key(certificate_id) for certificate_id in certificate_ids])
+    except Exception as e:
+        print(f"[VerifyCache] Error invalidating {certificate_ids}: {e}")
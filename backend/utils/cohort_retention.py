@@ -0,0 +1,210 @@
+"""
+Monthly cohort retention
+
+Keeps a cohort x month matrix of active users, so retention triangles are
+read from a few hundred small rows instead of joining users with their whole
+session and progress history on every request.
+
+- user_activity_months holds each (user, month) the user was active in:
+  logged in (users.last_login_at), opened a session or touched a lesson.
+- retention_cohort_members records the cohort and status each user is
+  currently counted under.
+- retention_cohorts and retention_matrix hold the counts. They are only
+  adjusted by deltas: +1 per new (user, month) pair, and -1/+1 for the
+  months of a user whose cohort or status changed.
+
+update_cohort_retention() is called by the Celery beat task in
+tasks/analytics_tasks.py and only reads rows changed since its previous run.
+"""
+from datetime import date, datetime, timedelta
+from typing import Any, Dict, List, Optional
+
+from database.connection import database
+from utils.analytics_rollups import ANALYTICS_ROLLUP_OVERLAP_SECONDS
+
+COHORT_STATE_NAME = "cohorts"
+COHORT_LOCK_KEY = 7302
+
+
+def months_between(earlier: str, later: str) -> str:
+    """SQL for the number of calendar months from one month to another"""
+    return (
+        f"CAST((EXTRACT(YEAR FROM {later}) - EXTRACT(YEAR FROM {earlier})) * 12"
+        f" + EXTRACT(MONTH FROM {later}) - EXTRACT(MONTH FROM {earlier}) AS INTEGER)"
+    )
+
+
+def month_start(value: datetime) -> date:
+    return date(value.year, value.month, 1)
+
+
+def add_months(month: date, count: int) -> date:
+    index = month.year * 12 + month.month - 1 + count
+    return date(index // 12, index % 12 + 1, 1)
+
+
+# Users whose cohort or counted status differs from what the matrix holds.
+# The first statement moves their whole history between cohorts, the second
+# counts activity months that are new since the previous run.
+MEMBER_CHANGES_QUERY = f"""
+    WITH changes AS (
+        SELECT
+            u.id AS user_id,
+            m.cohort_month AS old_cohort,
+            COALESCE(m.is_active, FALSE) AS old_active,
+            CAST(DATE_TRUNC('month', u.created_at) AS DATE) AS new_cohort,
+            u.status = 'active' AS new_active
+        FROM users u
+        LEFT JOIN retention_cohort_members m ON m.user_id = u.id
+        WHERE (CAST(:since AS TIMESTAMPTZ) IS NULL OR u.updated_at > CAST(:since AS TIMESTAMPTZ))
+        AND (
+            m.user_id IS NULL
+            OR m.cohort_month <> CAST(DATE_TRUNC('month', u.created_at) AS DATE)
+            OR m.is_active <> (u.status = 'active')
+        )
+    ),
+    deltas AS (
+        SELECT user_id, old_cohort AS cohort_month, -1 AS delta FROM changes WHERE old_active
+        UNION ALL
+        SELECT user_id, new_cohort AS cohort_month, 1 AS delta FROM changes WHERE new_active
+    ),
+    sizes AS (
+        INSERT INTO retention_cohorts (cohort_month, cohort_size, updated_at)
+        SELECT cohort_month, SUM(delta), NOW() FROM deltas GROUP BY cohort_month
+        ON CONFLICT (cohort_month) DO UPDATE SET
+            cohort_size = retention_cohorts.cohort_size + EXCLUDED.cohort_size,
+            updated_at = NOW()
+    ),
+    cells AS (
+        INSERT INTO retention_matrix (cohort_month, period_number, active_users, updated_at)
+        SELECT d.cohort_month, {months_between("d.cohort_month", "a.activity_month")}, SUM(d.delta), NOW()
+        FROM deltas d
+        JOIN user_activity_months a ON a.user_id = d.user_id
+        WHERE a.activity_month >= d.cohort_month
+        GROUP BY 1, 2
+        ON CONFLICT (cohort_month, period_number) DO UPDATE SET
+            active_users = retention_matrix.active_users + EXCLUDED.active_users,
+            updated_at = NOW()
+    )
+    INSERT INTO retention_cohort_members (user_id, cohort_month, is_active)
+    SELECT user_id, new_cohort, new_active FROM changes
+    ON CONFLICT (user_id) DO UPDATE SET
+        cohort_month = EXCLUDED.cohort_month,
+        is_active = EXCLUDED.is_active
+    RETURNING user_id
+"""
+
+NEW_ACTIVITY_QUERY = f"""
+    WITH activity AS (
+        SELECT user_id, CAST(DATE_TRUNC('month', created_at) AS DATE) AS activity_month
+        FROM user_sessions
+        WHERE CAST(:since AS TIMESTAMPTZ) IS NULL OR created_at > CAST(:since AS TIMESTAMPTZ)
+        UNION
+        SELECT user_id, CAST(DATE_TRUNC('month', updated_at) AS DATE)
+        FROM lesson_progress
+        WHERE CAST(:since AS TIMESTAMPTZ) IS NULL OR updated_at > CAST(:since AS TIMESTAMPTZ)
+        UNION
+        SELECT user_id, CAST(DATE_TRUNC('month', created_at) AS DATE)
+        FROM lesson_progress
+        WHERE CAST(:since AS TIMESTAMPTZ) IS NULL OR created_at > CAST(:since AS TIMESTAMPTZ)
+        UNION
+        SELECT id, CAST(DATE_TRUNC('month', last_login_at) AS DATE)
+        FROM users
+        WHERE last_login_at IS NOT NULL
+        AND (CAST(:since AS TIMESTAMPTZ) IS NULL OR updated_at > CAST(:since AS TIMESTAMPTZ))
+    ),
+    added AS (
+        INSERT INTO user_activity_months (user_id, activity_month)
+        SELECT user_id, activity_month FROM activity
+        ON CONFLICT DO NOTHING
+        RETURNING user_id, activity_month
+    )
+    INSERT INTO retention_matrix (cohort_month, period_number, active_users, updated_at)
+    SELECT m.cohort_month, {months_between("m.cohort_month", "a.activity_month")}, COUNT(*), NOW()
+    FROM added a
+    JOIN retention_cohort_members m ON m.user_id = a.user_id AND m.is_active
+    WHERE a.activity_month >= m.cohort_month
+    GROUP BY 1, 2
+    ON CONFLICT (cohort_month, period_number) DO UPDATE SET
+        active_users = retention_matrix.active_users + EXCLUDED.active_users,
+        updated_at = NOW()
+"""
+
+
+async def update_cohort_retention() -> Dict[str, Any]:
+    """
+    Apply users, sessions and lesson progress changed since the previous run
+    to the retention matrix; on the first run, builds it from all history
+    """
+    async with database.transaction():
+        locked = await database.fetch_val(
+            "SELECT pg_try_advisory_xact_lock(:key)", values={"key": COHORT_LOCK_KEY}
+        )
+        if not locked:
+            return {"status": "skipped", "reason": "another cohort update is running"}
+
+        now = await database.fetch_val("SELECT NOW()")
+        state = await database.fetch_one(
+            "SELECT watermark FROM analytics_rollup_state WHERE name = :name",
+            values={"name": COHORT_STATE_NAME}
+        )
+        since = None
+        if state is not None and state["watermark"] is not None:
+            since = state["watermark"] - timedelta(seconds=ANALYTICS_ROLLUP_OVERLAP_SECONDS)
+
+        # Memberships first, so new activity is counted under the current cohort
+        moved = await database.fetch_all(MEMBER_CHANGES_QUERY, values={"since": since})
+        await database.execute(NEW_ACTIVITY_QUERY, values={"since": since})
+
+        await database.execute("""
+            INSERT INTO analytics_rollup_state (name, watermark, updated_at)
+            VALUES (:name, :watermark, NOW())
+            ON CONFLICT (name) DO UPDATE SET
+                watermark = EXCLUDED.watermark,
+                updated_at = NOW()
+        """, values={"name": COHORT_STATE_NAME, "watermark": now})
+
+    return {
+        "status": "success",
+        "full_rebuild": since is None,
+        "members_changed": len(moved),
+    }
+
+
+async def retention_triangle(
+    first_cohort: date,
+    last_cohort: Optional[date] = None,
+    periods: Optional[int] = None
+) -> List[Dict[str, Any]]:
+    """
+    Cohorts from first_cohort to last_cohort (months, inclusive), each with
+    active users per period up to `periods` wide or up to the current month.
+    Periods without activity are reported as 0.
+    """
+    current_month = month_start(datetime.utcnow())
+    last_cohort = last_cohort or current_month
+    values = {"first": month_start(first_cohort), "last": month_start(last_cohort)}
+
+    cohorts = await database.fetch_all("""
+        SELECT cohort_month, cohort_size FROM retention_cohorts
+        WHERE cohort_month >= :first AND cohort_month <= :last AND cohort_size > 0
+        ORDER BY cohort_month
+    """, values=values)
+    cells = await database.fetch_all(f"""
+        SELECT cohort_month, period_number, active_users FROM retention_matrix
+        WHERE cohort_month >= :first AND cohort_month <= :last
+        {"AND period_number < :periods" if periods is not None else ""}
+    """, values={**values, "periods": periods} if periods is not None else values)
+
+    active = {(row["cohort_month"], row["period_number"]): row["active_users"] for row in cells}
+    triangle = []
+    for cohort in cohorts:
+        month, size = cohort["cohort_month"], cohort["cohort_size"]
+        elapsed = (current_month.year - month.year) * 12 + current_month.month - month.month + 1
+        width = min(elapsed, periods) if periods is not None else elapsed
+        triangle.append({
+            "cohort_month": month,
+            "cohort_size": size,
+            "active_users": [active.get((month, period), 0) for period in range(width)],
+        })
+    return triangle
@@ -1,13 +1,18 @@
 import os
 import uuid
+import asyncio
+import hashlib
+import shutil
 import aiofiles
-from typing import Optional, Dict, Any, Protocol
+import aiofiles.os
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import Optional, Dict, Any, AsyncIterator, Protocol
 from fastapi import UploadFile, HTTPException
 import boto3
+from botocore.config import Config as BotoConfig
 from botocore.exceptions import ClientError
 import magic
-from PIL import Image
-import subprocess
 from datetime import datetime
 from abc import ABC, abstractmethod
 
@@ -17,6 +22,8 @@ AWS_SECRET_ACCESS_KEY = os.getenv("AWS_SECRET_ACCESS_KEY")
 AWS_REGION = os.getenv("AWS_REGION", "us-east-1")
 S3_BUCKET_NAME = os.getenv("S3_BUCKET_NAME")
 CLOUDFRONT_DOMAIN = os.getenv("CLOUDFRONT_DOMAIN")
+# Point the AWS S3 provider at an S3-compatible server (MinIO, moto) instead of AWS
+S3_ENDPOINT_URL = os.getenv("S3_ENDPOINT_URL")
 LOCAL_UPLOAD_PATH = os.getenv("LOCAL_UPLOAD_PATH", "./uploads")
 BACKEND_URL = os.getenv("BACKEND_URL", "http://localhost:8000")
 
@@ -51,6 +58,61 @@ if USE_S3 and FILE_UPLOAD_PROVIDER == "local":
 # For Local storage:
 # - LOCAL_UPLOAD_PATH (optional, defaults to ./uploads)
 
+# Blocking storage calls (boto3, file system) run on this many dedicated
+# threads, which is also the number of transfers in flight per process and
+# the size of each S3 client's connection pool. Further calls queue.
+STORAGE_IO_WORKERS = int(os.getenv("STORAGE_IO_WORKERS", "16"))
+
+_storage_executor = ThreadPoolExecutor(max_workers=STORAGE_IO_WORKERS, thread_name_prefix="storage-io")
+
+async def run_io(func, *args, **kwargs):
+    """Run a blocking storage call on the storage I/O executor"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_storage_executor, partial(func, *args, **kwargs))
+
+# Uploads are read in chunks of this size. S3 uploads larger than one part use
+# multipart upload with this many parts in flight, so an upload holds at most
+# about (STORAGE_PART_CONCURRENCY + 1) parts in memory.
+UPLOAD_CHUNK_SIZE = int(os.getenv("UPLOAD_CHUNK_SIZE", str(1024 * 1024)))
+STORAGE_PART_SIZE = max(int(os.getenv("STORAGE_PART_SIZE", str(5 * 1024 * 1024))), 5 * 1024 * 1024)  # S3 minimum
+STORAGE_PART_CONCURRENCY = int(os.getenv("STORAGE_PART_CONCURRENCY", "2"))
+
+class UploadChecksum:
+    """SHA-256 and size of an upload, updated as its chunks go by"""
+
+    def __init__(self):
+        self._sha256 = hashlib.sha256()
+        self.size = 0
+
+    def update(self, chunk: bytes):
+        self._sha256.update(chunk)
+        self.size += len(chunk)
+
+    @property
+    def sha256(self) -> str:
+        return self._sha256.hexdigest()
+
+async def read_upload_chunks(
+    file: UploadFile,
+    checksum: Optional[UploadChecksum] = None,
+    max_size: Optional[int] = None,
+    chunk_size: int = UPLOAD_CHUNK_SIZE
+) -> AsyncIterator[bytes]:
+    """Yield an uploaded file from the start in chunks, enforcing max_size"""
+    checksum = checksum or UploadChecksum()
+    await file.seek(0)
+    while True:
+        chunk = await file.read(chunk_size)
+        if not chunk:
+            break
+        checksum.update(chunk)
+        if max_size is not None and checksum.size > max_size:
+            raise HTTPException(
+                status_code=413,
+                detail=f"File too large. Maximum size is {max_size // (1024*1024)}MB"
+            )
+        yield chunk
+
 # File type configurations
 ALLOWED_IMAGE_TYPES = {
     "image/jpeg": ".jpg",
@@ -90,90 +152,258 @@ class FileUploadProvider(ABC):
         """Upload file content directly and return the URL"""
         pass
 
+    @abstractmethod
+    async def upload_stream(self, chunks: AsyncIterator[bytes], filename: str, content_type: str) -> str:
+        """Upload content arriving in chunks and return the URL"""
+        pass
+
+    @abstractmethod
+    async def read_file(self, file_path: str) -> bytes:
+        """Read a stored file, by its path/URL, into memory"""
+        pass
+
+    @abstractmethod
+    def media_source(self, file_path: str, expires_in: int = 3600) -> str:
+        """Path or URL that media tools (ffprobe) can read a stored file from"""
+        pass
+
+    @abstractmethod
+    async def start_multipart(self, filename: str, content_type: str) -> str:
+        """Begin an upload assembled from numbered parts and return its id"""
+        pass
+
+    @abstractmethod
+    async def upload_part(self, filename: str, upload_id: str, part_number: int, body: bytes) -> str:
+        """Store one part (numbered from 1) and return its ETag"""
+        pass
+
+    @abstractmethod
+    async def complete_multipart(self, filename: str, upload_id: str, parts: Dict[int, str]) -> str:
+        """Join the parts, given as {part_number: etag}, in order and return the URL"""
+        pass
+
+    @abstractmethod
+    async def abort_multipart(self, filename: str, upload_id: str) -> None:
+        """Discard an unfinished multipart upload and its parts"""
+        pass
+
     @abstractmethod
     async def delete_file(self, file_path: str) -> bool:
         """Delete a file by its path/URL"""
         pass
 
-class AWSS3Provider(FileUploadProvider):
-    """AWS S3 file upload provider"""
+class S3CompatibleProvider(FileUploadProvider):
+    """
+    Shared logic for storage behind the S3 API. boto3 blocks, so every call
+    runs on the storage I/O executor; its client pools as many connections
+    as the executor has threads.
+    """
 
-    def __init__(self, bucket_name: str, region: str = "us-east-1", cloudfront_domain: Optional[str] = None):
-        self.bucket_name = bucket_name
-        self.region = region
-        self.cloudfront_domain = cloudfront_domain
+    service_name = "S3"
+
+    def __init__(self, bucket: str, access_key: Optional[str], secret_key: Optional[str],
+                 region: str, endpoint_url: Optional[str] = None):
+        self.bucket = bucket
         self.s3_client = boto3.client(
             's3',
-            aws_access_key_id=AWS_ACCESS_KEY_ID,
-            aws_secret_access_key=AWS_SECRET_ACCESS_KEY,
-            region_name=region
+            aws_access_key_id=access_key,
+            aws_secret_access_key=secret_key,
+            region_name=region,
+            endpoint_url=endpoint_url,
+            config=BotoConfig(
+                max_pool_connections=STORAGE_IO_WORKERS,
+                retries={"max_attempts": 3, "mode": "standard"}
+            )
         )
 
-    async def upload_file(self, file: UploadFile, filename: str) -> str:
-        """Upload file to AWS S3"""
-        try:
-            file_content = await file.read()
-
-            self.s3_client.put_object(
-                Bucket=self.bucket_name,
-                Key=filename,
-                Body=file_content,
-                ContentType=file.content_type,
-                ACL='public-read'
-            )
+    @abstractmethod
+    def public_url(self, key: str) -> str:
+        """URL a stored object is served from"""
+        pass
 
-            if self.cloudfront_domain:
-                return f"https://{self.cloudfront_domain}/{filename}"
-            else:
-                return f"https://{self.bucket_name}.s3.{self.region}.amazonaws.com/{filename}"
+    @abstractmethod
+    def key_from_url(self, file_path: str) -> str:
+        """Object key of a URL returned by public_url"""
+        pass
 
-        except ClientError as e:
-            raise HTTPException(
-                status_code=500,
-                detail=f"Failed to upload to AWS S3: {str(e)}"
-            )
+    async def upload_file(self, file: UploadFile, filename: str) -> str:
+        """Upload file to the bucket"""
+        return await self.upload_stream(read_upload_chunks(file), filename, file.content_type)
 
     async def upload_file_content(self, content: bytes, filename: str, content_type: str) -> str:
-        """Upload file content to AWS S3"""
+        """Upload file content to the bucket"""
         try:
-            self.s3_client.put_object(
-                Bucket=self.bucket_name,
+            await run_io(
+                self.s3_client.put_object,
+                Bucket=self.bucket,
                 Key=filename,
                 Body=content,
                 ContentType=content_type,
                 ACL='public-read'
             )
+            return self.public_url(filename)
+
+        except ClientError as e:
+            raise self._upload_error(e)
+
+    async def upload_stream(self, chunks: AsyncIterator[bytes], filename: str, content_type: str) -> str:
+        """
+        Upload chunks to the bucket: one put_object when everything fits in a
+        part, otherwise a multipart upload with parts sent in parallel
+        """
+        buffer = bytearray()
+        upload_id = None
+        parts = {}
+        pending = set()
+        part_number = 0
+
+        async def send_part(number: int, body: bytes):
+            parts[number] = await self.upload_part(filename, upload_id, number, body)
+
+        async def queue_part(body: bytes):
+            nonlocal pending, part_number
+            if len(pending) >= STORAGE_PART_CONCURRENCY:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    task.result()
+            part_number += 1
+            pending.add(asyncio.ensure_future(send_part(part_number, body)))
+
+        try:
+            async for chunk in chunks:
+                buffer += chunk
+                while len(buffer) >= STORAGE_PART_SIZE:
+                    if upload_id is None:
+                        upload_id = await self.start_multipart(filename, content_type)
+                    body = bytes(memoryview(buffer)[:STORAGE_PART_SIZE])
+                    del buffer[:STORAGE_PART_SIZE]
+                    await queue_part(body)
+
+            if upload_id is None:
+                return await self.upload_file_content(bytes(buffer), filename, content_type)
+
+            if buffer:
+                await queue_part(bytes(buffer))
+            await asyncio.gather(*pending)
+            pending = set()
+            return await self.complete_multipart(filename, upload_id, parts)
+
+        except BaseException:
+            for task in pending:
+                task.cancel()
+            if upload_id is not None:
+                try:
+                    await self.abort_multipart(filename, upload_id)
+                except Exception as abort_error:
+                    print(f"{self.service_name} multipart abort failed: {abort_error}")
+            raise
+
+    async def read_file(self, file_path: str) -> bytes:
+        """Download an object from the bucket"""
+        response = await run_io(self.s3_client.get_object, Bucket=self.bucket, Key=self.key_from_url(file_path))
+        return await run_io(response["Body"].read)
+
+    def media_source(self, file_path: str, expires_in: int = 3600) -> str:
+        """Presigned GET URL, so tools read only the byte ranges they need"""
+        return self.s3_client.generate_presigned_url(
+            'get_object',
+            Params={"Bucket": self.bucket, "Key": self.key_from_url(file_path)},
+            ExpiresIn=expires_in
+        )
 
-            if self.cloudfront_domain:
-                return f"https://{self.cloudfront_domain}/{filename}"
-            else:
-                return f"https://{self.bucket_name}.s3.{self.region}.amazonaws.com/{filename}"
+    def _upload_error(self, error: ClientError) -> HTTPException:
+        return HTTPException(
+            status_code=500,
+            detail=f"Failed to upload to {self.service_name}: {str(error)}"
+        )
 
+    async def start_multipart(self, filename: str, content_type: str) -> str:
+        """Create a multipart upload in the bucket"""
+        try:
+            created = await run_io(
+                self.s3_client.create_multipart_upload,
+                Bucket=self.bucket, Key=filename, ContentType=content_type, ACL='public-read'
+            )
+            return created["UploadId"]
         except ClientError as e:
-            raise HTTPException(
-                status_code=500,
-                detail=f"Failed to upload to AWS S3: {str(e)}"
+            raise self._upload_error(e)
+
+    async def upload_part(self, filename: str, upload_id: str, part_number: int, body: bytes) -> str:
+        """Send one part of a multipart upload; resending a part number replaces it"""
+        try:
+            response = await run_io(
+                self.s3_client.upload_part,
+                Bucket=self.bucket, Key=filename, UploadId=upload_id, PartNumber=part_number, Body=body
             )
+            return response["ETag"]
+        except ClientError as e:
+            raise self._upload_error(e)
 
-    async def delete_file(self, file_path: str) -> bool:
-        """Delete file from AWS S3"""
+    async def complete_multipart(self, filename: str, upload_id: str, parts: Dict[int, str]) -> str:
+        """Complete a multipart upload from its parts' ETags"""
         try:
-            # Extract key from URL
-            if self.cloudfront_domain and self.cloudfront_domain in file_path:
-                key = file_path.replace(f"https://{self.cloudfront_domain}/", "")
-            else:
-                key = file_path.split(f"{self.bucket_name}.s3.{self.region}.amazonaws.com/")[1]
+            await run_io(
+                self.s3_client.complete_multipart_upload,
+                Bucket=self.bucket, Key=filename, UploadId=upload_id,
+                MultipartUpload={"Parts": [
+                    {"PartNumber": number, "ETag": parts[number]} for number in sorted(parts)
+                ]}
+            )
+            return self.public_url(filename)
+        except ClientError as e:
+            raise self._upload_error(e)
 
-            self.s3_client.delete_object(Bucket=self.bucket_name, Key=key)
+    async def abort_multipart(self, filename: str, upload_id: str) -> None:
+        """Abort a multipart upload so the bucket drops its parts"""
+        await run_io(
+            self.s3_client.abort_multipart_upload,
+            Bucket=self.bucket, Key=filename, UploadId=upload_id
+        )
+
+    async def delete_file(self, file_path: str) -> bool:
+        """Delete file from the bucket"""
+        try:
+            key = self.key_from_url(file_path)
+            await run_io(self.s3_client.delete_object, Bucket=self.bucket, Key=key)
             return True
 
         except Exception as e:
-            print(f"AWS S3 file deletion failed: {e}")
+            print(f"{self.service_name} file deletion failed: {e}")
             return False
 
-class DigitalOceanProvider(FileUploadProvider):
+class AWSS3Provider(S3CompatibleProvider):
+    """AWS S3 file upload provider"""
+
+    service_name = "AWS S3"
+
+    def __init__(self, bucket_name: str, region: str = "us-east-1", cloudfront_domain: Optional[str] = None,
+                 endpoint_url: Optional[str] = None):
+        self.bucket_name = bucket_name
+        self.region = region
+        self.cloudfront_domain = cloudfront_domain
+        # Set for S3-compatible stand-ins (MinIO, moto server) in development and tests
+        self.endpoint_url = endpoint_url
+        super().__init__(bucket_name, AWS_ACCESS_KEY_ID, AWS_SECRET_ACCESS_KEY, region, endpoint_url)
+
+    def public_url(self, key: str) -> str:
+        if self.cloudfront_domain:
+            return f"https://{self.cloudfront_domain}/{key}"
+        if self.endpoint_url:
+            return f"{self.endpoint_url.rstrip('/')}/{self.bucket_name}/{key}"
+        return f"https://{self.bucket_name}.s3.{self.region}.amazonaws.com/{key}"
+
+    def key_from_url(self, file_path: str) -> str:
+        if self.cloudfront_domain and self.cloudfront_domain in file_path:
+            return file_path.replace(f"https://{self.cloudfront_domain}/", "")
+        if self.endpoint_url and file_path.startswith(self.endpoint_url):
+            return file_path.split(f"/{self.bucket_name}/", 1)[1]
+        return file_path.split(f"{self.bucket_name}.s3.{self.region}.amazonaws.com/")[1]
+
+class DigitalOceanProvider(S3CompatibleProvider):
     """DigitalOcean Spaces file upload provider"""
 
+    service_name = "DigitalOcean Spaces"
+
     def __init__(self, space_name: str, region: str = "nyc3", cdn_domain: Optional[str] = None):
         self.space_name = space_name
         self.region = region
@@ -187,92 +417,38 @@ class DigitalOceanProvider(FileUploadProvider):
         if not access_key or not secret_key:
             raise ValueError("DigitalOcean Spaces credentials not configured. Set DO_ACCESS_KEY_ID and DO_SECRET_ACCESS_KEY.")
 
-        self.s3_client = boto3.client(
-            's3',
-            aws_access_key_id=access_key,
-            aws_secret_access_key=secret_key,
-            region_name=region,
-            endpoint_url=self.endpoint_url
-        )
-
-    async def upload_file(self, file: UploadFile, filename: str) -> str:
-        """Upload file to DigitalOcean Spaces"""
-        try:
-            file_content = await file.read()
-
-            self.s3_client.put_object(
-                Bucket=self.space_name,
-                Key=filename,
-                Body=file_content,
-                ContentType=file.content_type,
-                ACL='public-read'
-            )
-
-            if self.cdn_domain:
-                return f"https://{self.cdn_domain}/{filename}"
-            else:
-                return f"https://{self.space_name}.{self.region}.digitaloceanspaces.com/{filename}"
-
-        except ClientError as e:
-            raise HTTPException(
-                status_code=500,
-                detail=f"Failed to upload to DigitalOcean Spaces: {str(e)}"
-            )
-
-    async def upload_file_content(self, content: bytes, filename: str, content_type: str) -> str:
-        """Upload file content to DigitalOcean Spaces"""
-        try:
-            self.s3_client.put_object(
-                Bucket=self.space_name,
-                Key=filename,
-                Body=content,
-                ContentType=content_type,
-                ACL='public-read'
-            )
+        super().__init__(space_name, access_key, secret_key, region, self.endpoint_url)
 
-            if self.cdn_domain:
-                return f"https://{self.cdn_domain}/{filename}"
-            else:
-                return f"https://{self.space_name}.{self.region}.digitaloceanspaces.com/{filename}"
+    def public_url(self, key: str) -> str:
+        if self.cdn_domain:
+            return f"https://{self.cdn_domain}/{key}"
+        return f"https://{self.space_name}.{self.region}.digitaloceanspaces.com/{key}"
 
-        except ClientError as e:
-            raise HTTPException(
-                status_code=500,
-                detail=f"Failed to upload to DigitalOcean Spaces: {str(e)}"
-            )
-
-    async def delete_file(self, file_path: str) -> bool:
-        """Delete file from DigitalOcean Spaces"""
-        try:
-            # Extract key from URL
-            if self.cdn_domain and self.cdn_domain in file_path:
-                key = file_path.replace(f"https://{self.cdn_domain}/", "")
-            else:
-                key = file_path.split(f"{self.space_name}.{self.region}.digitaloceanspaces.com/")[1]
-
-            self.s3_client.delete_object(Bucket=self.space_name, Key=key)
-            return True
-
-        except Exception as e:
-            print(f"DigitalOcean Spaces file deletion failed: {e}")
-            return False
+    def key_from_url(self, file_path: str) -> str:
+        if self.cdn_domain and self.cdn_domain in file_path:
+            return file_path.replace(f"https://{self.cdn_domain}/", "")
+        return file_path.split(f"{self.space_name}.{self.region}.digitaloceanspaces.com/")[1]
 
 class LocalFileProvider(FileUploadProvider):
     """Local file system upload provider"""
 
-    def __init__(self, upload_path: str = "./uploads"):
+    def __init__(self, upload_path: str = "./uploads", parts_path: Optional[str] = None):
         self.upload_path = upload_path
+        # Multipart parts live outside upload_path, which is served publicly
+        self.parts_path = parts_path or f"{upload_path.rstrip('/')}-parts"
         os.makedirs(upload_path, exist_ok=True)
 
     async def upload_file(self, file: UploadFile, filename: str) -> str:
         """Upload file to local storage"""
+        return await self.upload_stream(read_upload_chunks(file), filename, file.content_type)
+
+    async def upload_file_content(self, content: bytes, filename: str, content_type: str) -> str:
+        """Upload file content to local storage"""
         try:
             file_path = os.path.join(self.upload_path, filename)
-            directory = os.path.dirname(file_path)
-            os.makedirs(directory, exist_ok=True)
+            await aiofiles.os.makedirs(os.path.dirname(file_path), exist_ok=True)
 
             async with aiofiles.open(file_path, 'wb') as f:
-                content = await file.read()
                 await f.write(content)
 
             # Return full URL
@@ -284,33 +460,91 @@ class LocalFileProvider(FileUploadProvider):
                 detail=f"Failed to save file locally: {str(e)}"
             )
 
-    async def upload_file_content(self, content: bytes, filename: str, content_type: str) -> str:
-        """Upload file content to local storage"""
+    async def upload_stream(self, chunks: AsyncIterator[bytes], filename: str, content_type: str) -> str:
+        """Write chunks to local storage; the file appears only once complete"""
+        file_path = os.path.join(self.upload_path, filename)
+        partial_path = f"{file_path}.part"
         try:
-            file_path = os.path.join(self.upload_path, filename)
-            directory = os.path.dirname(file_path)
-            os.makedirs(directory, exist_ok=True)
-
-            with open(file_path, 'wb') as f:
-                f.write(content)
+            await aiofiles.os.makedirs(os.path.dirname(file_path), exist_ok=True)
+            async with aiofiles.open(partial_path, 'wb') as f:
+                async for chunk in chunks:
+                    await f.write(chunk)
+            await aiofiles.os.replace(partial_path, file_path)
 
             # Return full URL
             return f"{BACKEND_URL}/uploads/{filename}"
 
-        except Exception as e:
+        except BaseException as e:
+            if await aiofiles.os.path.exists(partial_path):
+                await aiofiles.os.remove(partial_path)
+            if isinstance(e, OSError):
+                raise HTTPException(
+                    status_code=500,
+                    detail=f"Failed to save file locally: {str(e)}"
+                )
+            raise
+
+    def _local_path(self, file_path: str) -> str:
+        return os.path.join(self.upload_path, file_path.split("/uploads/", 1)[-1])
+
+    async def read_file(self, file_path: str) -> bytes:
+        """Read a file from local storage"""
+        async with aiofiles.open(self._local_path(file_path), 'rb') as f:
+            return await f.read()
+
+    def media_source(self, file_path: str, expires_in: int = 3600) -> str:
+        """Local path of the stored file"""
+        return self._local_path(file_path)
+
+    def _part_path(self, upload_id: str, part_number: int) -> str:
+        return os.path.join(self.parts_path, upload_id, f"{part_number:05d}")
+
+    async def start_multipart(self, filename: str, content_type: str) -> str:
+        """Create a directory for the parts of a multipart upload"""
+        upload_id = uuid.uuid4().hex
+        await aiofiles.os.makedirs(os.path.join(self.parts_path, upload_id), exist_ok=True)
+        return upload_id
+
+    async def upload_part(self, filename: str, upload_id: str, part_number: int, body: bytes) -> str:
+        """Write one part to its own file; resending a part number replaces it"""
+        part_path = self._part_path(upload_id, part_number)
+        try:
+            async with aiofiles.open(f"{part_path}.tmp", 'wb') as f:
+                await f.write(body)
+            await aiofiles.os.replace(f"{part_path}.tmp", part_path)
+        except OSError as e:
             raise HTTPException(
                 status_code=500,
                 detail=f"Failed to save file locally: {str(e)}"
             )
+        return hashlib.md5(body).hexdigest()
+
+    async def _read_parts(self, upload_id: str, part_numbers) -> AsyncIterator[bytes]:
+        for part_number in part_numbers:
+            async with aiofiles.open(self._part_path(upload_id, part_number), 'rb') as f:
+                while True:
+                    chunk = await f.read(UPLOAD_CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    yield chunk
+
+    async def complete_multipart(self, filename: str, upload_id: str, parts: Dict[int, str]) -> str:
+        """Concatenate the part files into the stored file"""
+        url = await self.upload_stream(self._read_parts(upload_id, sorted(parts)), filename, "")
+        await self.abort_multipart(filename, upload_id)
+        return url
+
+    async def abort_multipart(self, filename: str, upload_id: str) -> None:
+        """Remove the parts of a multipart upload"""
+        await run_io(shutil.rmtree, os.path.join(self.parts_path, upload_id), ignore_errors=True)
 
     async def delete_file(self, file_path: str) -> bool:
         """Delete file from local storage"""
         try:
             # Extract local path from URL
-            local_path = file_path.replace("/uploads/", "")
-            full_path = os.path.join(self.upload_path, local_path)
-            if os.path.exists(full_path):
-                os.remove(full_path)
+            full_path = self._local_path(file_path)
+            if await aiofiles.os.path.exists(full_path):
+                await aiofiles.os.remove(full_path)
             return True
 
         except Exception as e:
@@ -326,7 +560,8 @@ def create_file_upload_provider(provider_type: str) -> FileUploadProvider:
         return AWSS3Provider(
             bucket_name=S3_BUCKET_NAME,
             region=AWS_REGION,
-            cloudfront_domain=CLOUDFRONT_DOMAIN
+            cloudfront_domain=CLOUDFRONT_DOMAIN,
+            endpoint_url=S3_ENDPOINT_URL
         )
 
     elif provider_type == "digitalocean":
@@ -355,12 +590,7 @@ class FileUploadService:
         # Backward compatibility: keep old methods for legacy support
         self.s3_client = None
         if USE_S3 and AWS_ACCESS_KEY_ID and AWS_SECRET_ACCESS_KEY and FILE_UPLOAD_PROVIDER == "aws_s3":
-            self.s3_client = boto3.client(
-                's3',
-                aws_access_key_id=AWS_ACCESS_KEY_ID,
-                aws_secret_access_key=AWS_SECRET_ACCESS_KEY,
-                region_name=AWS_REGION
-            )
+            self.s3_client = getattr(self.provider, "s3_client", None)
     
     def validate_file(self, file: UploadFile, allowed_types: Dict[str, str], max_size: int) -> None:
         """Validate file type and size"""
@@ -395,47 +625,15 @@ class FileUploadService:
     
     async def upload_to_s3(self, file: UploadFile, key: str) -> str:
         """Upload file to S3"""
-        try:
-            file_content = await file.read()
-            
-            self.s3_client.put_object(
-                Bucket=S3_BUCKET_NAME,
-                Key=key,
-                Body=file_content,
-                ContentType=file.content_type,
-                ACL='public-read'
-            )
-            
-            if CLOUDFRONT_DOMAIN:
-                return f"https://{CLOUDFRONT_DOMAIN}/{key}"
-            else:
-                return f"https://{S3_BUCKET_NAME}.s3.{AWS_REGION}.amazonaws.com/{key}"
-                
-        except ClientError as e:
-            raise HTTPException(
-                status_code=500,
-                detail=f"Failed to upload to S3: {str(e)}"
-            )
+        return await self.provider.upload_stream(read_upload_chunks(file), key, file.content_type)
     
     async def upload_to_local(self, file: UploadFile, filename: str) -> str:
         """Upload file to local storage"""
-        try:
-            file_path = os.path.join(LOCAL_UPLOAD_PATH, filename)
-            directory = os.path.dirname(file_path)
-            os.makedirs(directory, exist_ok=True)
-            
-            async with aiofiles.open(file_path, 'wb') as f:
-                content = await file.read()
-                await f.write(content)
-            
-            # Return URL path
-            return f"/uploads/{filename}"
-            
-        except Exception as e:
-            raise HTTPException(
-                status_code=500,
-                detail=f"Failed to save file locally: {str(e)}"
-            )
+        await LocalFileProvider(LOCAL_UPLOAD_PATH).upload_stream(
+            read_upload_chunks(file), filename, file.content_type
+        )
+        # Return URL path
+        return f"/uploads/{filename}"
     
     async def upload_file(
         self,
@@ -457,12 +655,11 @@ class FileUploadService:
         # Generate filename
         filename = self.generate_filename(file.filename, prefix)
 
-        # Read file content once
-        file_content = await file.read()
-        file_size = len(file_content)
-
-        # Upload file using provider (pass content instead of file object)
-        url = await self.provider.upload_file_content(file_content, filename, file.content_type)
+        # Stream the file to the provider, checksumming it on the way
+        checksum = UploadChecksum()
+        url = await self.provider.upload_stream(
+            read_upload_chunks(file, checksum, max_size), filename, file.content_type
+        )
 
         # Reset file position for potential reuse
         await file.seek(0)
@@ -472,170 +669,26 @@ class FileUploadService:
             "original_filename": file.filename,
             "url": url,
             "content_type": file.content_type,
-            "size": file_size,
+            "size": checksum.size,
+            "checksum": checksum.sha256,
             "uploaded_at": datetime.utcnow()
         }
     
     async def upload_image(self, file: UploadFile, prefix: str = "images") -> Dict[str, Any]:
-        """Upload and process image file"""
+        """
+        Upload an image file. Thumbnails are made in the background, see
+        utils/media_processing.py.
+        """
         self.validate_file(file, ALLOWED_IMAGE_TYPES, MAX_IMAGE_SIZE)
-        
-        # Upload original image
-        result = await self.upload_file(file, prefix, ALLOWED_IMAGE_TYPES, MAX_IMAGE_SIZE)
-        
-        # Generate thumbnail if needed
-        try:
-            await file.seek(0)
-            thumbnail_url = await self.generate_thumbnail(file, prefix)
-            result["thumbnail_url"] = thumbnail_url
-        except Exception as e:
-            print(f"Failed to generate thumbnail: {e}")
-        
-        return result
+        return await self.upload_file(file, prefix, ALLOWED_IMAGE_TYPES, MAX_IMAGE_SIZE)
     
     async def upload_video(self, file: UploadFile, prefix: str = "videos") -> Dict[str, Any]:
-        """Upload and process video file"""
+        """
+        Upload a video file. Its metadata is extracted in the background,
+        see utils/media_processing.py.
+        """
         self.validate_file(file, ALLOWED_VIDEO_TYPES, MAX_VIDEO_SIZE)
-        
-        # Upload original video
-        result = await self.upload_file(file, prefix, ALLOWED_VIDEO_TYPES, MAX_VIDEO_SIZE)
-        
-        # Extract video metadata
-        try:
-            await file.seek(0)
-            metadata = await self.extract_video_metadata(file)
-            result.update(metadata)
-        except Exception as e:
-            print(f"Failed to extract video metadata: {e}")
-        
-        return result
-    
-    async def generate_thumbnail(self, file: UploadFile, prefix: str) -> str:
-        """Generate thumbnail for image"""
-        try:
-            # Save temporary file
-            temp_path = f"/tmp/{uuid.uuid4()}.jpg"
-            async with aiofiles.open(temp_path, 'wb') as f:
-                content = await file.read()
-                await f.write(content)
-
-            # Generate thumbnail
-            with Image.open(temp_path) as img:
-                img.thumbnail((300, 300), Image.Resampling.LANCZOS)
-                thumbnail_path = f"/tmp/{uuid.uuid4()}_thumb.jpg"
-                img.save(thumbnail_path, "JPEG", quality=85)
-
-            # Upload thumbnail using provider directly
-            with open(thumbnail_path, 'rb') as thumb_file:
-                thumbnail_filename = self.generate_filename("thumbnail.jpg", f"{prefix}/thumbnails")
-                thumb_content = thumb_file.read()
-
-                # For cloud providers, upload directly
-                if hasattr(self.provider, 's3_client'):
-                    # AWS S3 or DigitalOcean Spaces
-                    self.provider.s3_client.put_object(
-                        Bucket=self.provider.bucket_name if hasattr(self.provider, 'bucket_name') else self.provider.space_name,
-                        Key=thumbnail_filename,
-                        Body=thumb_content,
-                        ContentType="image/jpeg",
-                        ACL='public-read'
-                    )
-
-                    if hasattr(self.provider, 'cloudfront_domain') and self.provider.cloudfront_domain:
-                        thumbnail_url = f"https://{self.provider.cloudfront_domain}/{thumbnail_filename}"
-                    elif hasattr(self.provider, 'cdn_domain') and self.provider.cdn_domain:
-                        thumbnail_url = f"https://{self.provider.cdn_domain}/{thumbnail_filename}"
-                    else:
-                        base_domain = (
-                            self.provider.bucket_name if hasattr(self.provider, 'bucket_name')
-                            else self.provider.space_name
-                        )
-                        region = (
-                            self.provider.region if hasattr(self.provider, 'region')
-                            else 'nyc3'
-                        )
-                        domain_suffix = (
-                            f".s3.{self.provider.region}.amazonaws.com" if hasattr(self.provider, 'bucket_name')
-                            else f".{region}.digitaloceanspaces.com"
-                        )
-                        thumbnail_url = f"https://{base_domain}{domain_suffix}/{thumbnail_filename}"
-                else:
-                    # Local provider
-                    file_path = os.path.join(self.provider.upload_path, thumbnail_filename)
-                    directory = os.path.dirname(file_path)
-                    os.makedirs(directory, exist_ok=True)
-
-                    with open(file_path, 'wb') as local_file:
-                        local_file.write(thumb_content)
-
-                    thumbnail_url = f"{BACKEND_URL}/uploads/{thumbnail_filename}"
-
-            # Clean up temp files
-            os.remove(temp_path)
-            os.remove(thumbnail_path)
-
-            return thumbnail_url
-
-        except Exception as e:
-            print(f"Thumbnail generation failed: {e}")
-            return ""
-    
-    async def extract_video_metadata(self, file: UploadFile) -> Dict[str, Any]:
-        """Extract video metadata using ffprobe"""
-        try:
-            # Save temporary file
-            temp_path = f"/tmp/{uuid.uuid4()}.mp4"
-            async with aiofiles.open(temp_path, 'wb') as f:
-                content = await file.read()
-                await f.write(content)
-            
-            # Use ffprobe to get metadata
-            cmd = [
-                'ffprobe', '-v', 'quiet', '-print_format', 'json',
-                '-show_format', '-show_streams', temp_path
-            ]
-            
-            result = subprocess.run(cmd, capture_output=True, text=True)
-            
-            if result.returncode == 0:
-                import json
-                metadata = json.loads(result.stdout)
-                
-                # Extract relevant information
-                duration = float(metadata.get('format', {}).get('duration', 0))
-                
-                # Find video stream
-                video_stream = None
-                for stream in metadata.get('streams', []):
-                    if stream.get('codec_type') == 'video':
-                        video_stream = stream
-                        break
-                
-                video_metadata = {
-                    "duration": int(duration),
-                    "format": metadata.get('format', {}).get('format_name', ''),
-                    "size": int(metadata.get('format', {}).get('size', 0))
-                }
-                
-                if video_stream:
-                    video_metadata.update({
-                        "width": video_stream.get('width'),
-                        "height": video_stream.get('height'),
-                        "codec": video_stream.get('codec_name'),
-                        "bitrate": int(video_stream.get('bit_rate', 0))
-                    })
-                
-                # Clean up temp file
-                os.remove(temp_path)
-                
-                return video_metadata
-            else:
-                os.remove(temp_path)
-                return {"duration": 0}
-                
-        except Exception as e:
-            print(f"Video metadata extraction failed: {e}")
-            return {"duration": 0}
+        return await self.upload_file(file, prefix, ALLOWED_VIDEO_TYPES, MAX_VIDEO_SIZE)
     
     async def delete_file(self, file_path: str) -> bool:
         """Delete file from storage using provider"""
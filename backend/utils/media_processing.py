@@ -0,0 +1,237 @@
+"""
+Background media processing
+
+Uploads return as soon as the original is stored. Image thumbnails and video
+metadata are produced afterwards by the Celery media queue
+(tasks/media_tasks.py), which runs on its own workers so CPU-heavy resizing
+and ffprobe never hold an API worker or the email queue.
+
+- upload_image() / upload_video() store the file, record it in media_files
+  with status 'processing' and queue it; responses carry media_id and status.
+- process_media() runs in the worker. Images are decoded once and every
+  size in THUMBNAIL_SIZES is written as JPEG and WebP. Videos are probed in
+  place (a presigned URL for S3), and the duration is copied to the lesson.
+- media_status() is what clients poll until status is 'ready' or 'failed'.
+"""
+import io
+import json
+import os
+import subprocess
+import asyncio
+from typing import Any, Dict, List, Optional, Tuple
+
+from fastapi import UploadFile
+from PIL import Image, ImageOps
+
+from celery_app import celery_app
+from database.connection import database
+from utils.file_upload import FileUploadProvider, file_upload_service
+
+# Longest side of each thumbnail, in pixels
+THUMBNAIL_SIZES = sorted(
+    (int(size) for size in os.getenv("THUMBNAIL_SIZES", "150,300,600").split(",")),
+    reverse=True
+)
+THUMBNAIL_FORMATS = {"jpeg": ("JPEG", "image/jpeg", ".jpg"), "webp": ("WEBP", "image/webp", ".webp")}
+THUMBNAIL_QUALITY = int(os.getenv("THUMBNAIL_QUALITY", "85"))
+MEDIA_PROBE_TIMEOUT_SECONDS = int(os.getenv("MEDIA_PROBE_TIMEOUT_SECONDS", "120"))
+
+MEDIA_TASKS = {
+    "image": "tasks.media_tasks.process_image_task",
+    "video": "tasks.media_tasks.process_video_task",
+}
+
+
+def render_thumbnails(content: bytes, sizes: List[int] = THUMBNAIL_SIZES) -> Tuple[Dict[str, Any], Dict[int, Dict[str, bytes]]]:
+    """
+    Decode an image once and encode it at every size, largest first, each
+    size resized from the one before. Returns the image's metadata and
+    {size: {format: bytes}}.
+    """
+    with Image.open(io.BytesIO(content)) as img:
+        metadata = {"width": img.width, "height": img.height, "format": img.format}
+        # JPEG can decode straight at a reduced scale (1/2 .. 1/8)
+        img.draft("RGB", (sizes[0], sizes[0]))
+        current = ImageOps.exif_transpose(img)
+        if current.mode not in ("RGB", "RGBA"):
+            has_alpha = current.mode in ("LA", "PA") or "transparency" in img.info
+            current = current.convert("RGBA" if has_alpha else "RGB")
+
+    variants = {}
+    for size in sizes:
+        current = current.copy()
+        current.thumbnail((size, size), Image.Resampling.LANCZOS)
+        encoded = {}
+        for name, (pil_format, _, _) in THUMBNAIL_FORMATS.items():
+            image = current
+            if pil_format == "JPEG" and image.mode == "RGBA":
+                image = Image.new("RGB", image.size, (255, 255, 255))
+                image.paste(current, mask=current.getchannel("A"))
+            buffer = io.BytesIO()
+            image.save(buffer, pil_format, quality=THUMBNAIL_QUALITY)
+            encoded[name] = buffer.getvalue()
+        variants[size] = encoded
+    return metadata, variants
+
+
+def probe_video(source: str) -> Dict[str, Any]:
+    """Duration, format and video stream details of a file or URL, using ffprobe"""
+    cmd = [
+        'ffprobe', '-v', 'quiet', '-print_format', 'json',
+        '-show_format', '-show_streams', source
+    ]
+    result = subprocess.run(cmd, capture_output=True, text=True, timeout=MEDIA_PROBE_TIMEOUT_SECONDS)
+    if result.returncode != 0:
+        raise RuntimeError(f"ffprobe exited with {result.returncode}")
+
+    metadata = json.loads(result.stdout)
+    video_metadata = {
+        "duration": int(float(metadata.get('format', {}).get('duration', 0))),
+        "format": metadata.get('format', {}).get('format_name', ''),
+        "size": int(metadata.get('format', {}).get('size', 0))
+    }
+    video_stream = next(
+        (stream for stream in metadata.get('streams', []) if stream.get('codec_type') == 'video'), None
+    )
+    if video_stream:
+        video_metadata.update({
+            "width": video_stream.get('width'),
+            "height": video_stream.get('height'),
+            "codec": video_stream.get('codec_name'),
+            "bitrate": int(video_stream.get('bit_rate', 0))
+        })
+    return video_metadata
+
+
+async def queue_media_processing(
+    kind: str,
+    upload_result: Dict[str, Any],
+    owner_id: Optional[Any] = None,
+    lesson_id: Optional[Any] = None
+) -> Dict[str, Any]:
+    """
+    Record an uploaded file in media_files and queue its processing. A video's
+    duration is only copied to lesson_id while the lesson's video_url is the
+    file's URL, so set it, committed, before calling this.
+    """
+    media_id = await database.fetch_val("""
+        INSERT INTO media_files (owner_id, lesson_id, kind, filename, url, content_type, size, status)
+        VALUES (:owner_id, :lesson_id, :kind, :filename, :url, :content_type, :size, 'processing')
+        RETURNING id
+    """, values={
+        "owner_id": owner_id,
+        "lesson_id": lesson_id,
+        "kind": kind,
+        "filename": upload_result["filename"],
+        "url": upload_result["url"],
+        "content_type": upload_result["content_type"],
+        "size": upload_result["size"],
+    })
+    celery_app.send_task(MEDIA_TASKS[kind], args=[str(media_id)])
+    return {"media_id": str(media_id), "status": "processing"}
+
+
+async def upload_image(
+    file: UploadFile,
+    prefix: str = "images",
+    owner_id: Optional[Any] = None,
+    lesson_id: Optional[Any] = None
+) -> Dict[str, Any]:
+    """Upload an image and queue its thumbnails"""
+    result = await file_upload_service.upload_image(file, prefix)
+    result.update(await queue_media_processing("image", result, owner_id, lesson_id))
+    return result
+
+
+async def upload_video(
+    file: UploadFile,
+    prefix: str = "videos",
+    owner_id: Optional[Any] = None
+) -> Dict[str, Any]:
+    """
+    Upload a video and queue its metadata extraction. To attach it to a
+    lesson, store the file, set the lesson's video_url, then call
+    queue_media_processing() with the lesson id.
+    """
+    result = await file_upload_service.upload_video(file, prefix)
+    result.update(await queue_media_processing("video", result, owner_id))
+    return result
+
+
+def _json_column(value) -> Any:
+    return json.loads(value) if isinstance(value, str) else value
+
+
+async def media_status(media_id) -> Optional[Dict[str, Any]]:
+    """A media_files row with its JSON columns decoded, None if missing"""
+    row = await database.fetch_one("SELECT * FROM media_files WHERE id = :id", values={"id": media_id})
+    if row is None:
+        return None
+    media = dict(row)
+    media["metadata"] = _json_column(media["metadata"])
+    media["variants"] = _json_column(media["variants"])
+    return media
+
+
+async def _process_image(media: Dict[str, Any], provider: FileUploadProvider) -> Dict[str, Any]:
+    content = await provider.read_file(media["url"])
+    metadata, rendered = await asyncio.to_thread(render_thumbnails, content)
+
+    stem = os.path.splitext(media["filename"])[0]
+    uploads = []
+    for size, encoded in rendered.items():
+        for name, data in encoded.items():
+            _, content_type, extension = THUMBNAIL_FORMATS[name]
+            uploads.append((size, name, provider.upload_file_content(data, f"{stem}_{size}{extension}", content_type)))
+    urls = await asyncio.gather(*[upload for _, _, upload in uploads])
+
+    variants: Dict[str, Dict[str, str]] = {}
+    for (size, name, _), url in zip(uploads, urls):
+        variants.setdefault(str(size), {})[name] = url
+    return {"metadata": metadata, "variants": variants}
+
+
+async def _process_video(media: Dict[str, Any], provider: FileUploadProvider) -> Dict[str, Any]:
+    metadata = await asyncio.to_thread(probe_video, provider.media_source(media["url"]))
+    if media["lesson_id"] and metadata["duration"]:
+        # Only while the lesson still points at this upload
+        await database.execute("""
+            UPDATE lessons
+            SET video_duration = :duration, updated_at = NOW()
+            WHERE id = :lesson_id AND video_url = :url
+        """, values={"duration": metadata["duration"], "lesson_id": media["lesson_id"], "url": media["url"]})
+    return {"metadata": metadata, "variants": None}
+
+
+async def process_media(media_id: str, provider: Optional[FileUploadProvider] = None) -> Dict[str, Any]:
+    """Produce thumbnails or metadata for a media_files row and store them"""
+    provider = provider or file_upload_service.provider
+    media = await media_status(media_id)
+    if media is None:
+        return {"status": "skipped", "reason": "media not found"}
+
+    if media["kind"] == "image":
+        result = await _process_image(media, provider)
+    else:
+        result = await _process_video(media, provider)
+
+    await database.execute("""
+        UPDATE media_files
+        SET status = 'ready', metadata = CAST(:metadata AS JSONB), variants = CAST(:variants AS JSONB),
+            error = NULL, processed_at = NOW(), updated_at = NOW()
+        WHERE id = :id
+    """, values={
+        "id": media_id,
+        "metadata": json.dumps(result["metadata"]),
+        "variants": json.dumps(result["variants"]) if result["variants"] is not None else None,
+    })
+    return {"status": "ready", "media_id": str(media_id), **result}
+
+
+async def mark_media_failed(media_id: str, error: str) -> None:
+    """Record that processing gave up on a media_files row"""
+    await database.execute("""
+        UPDATE media_files
+        SET status = 'failed', error = :error, processed_at = NOW(), updated_at = NOW()
+        WHERE id = :id
+    """, values={"id": media_id, "error": error[:1000]})
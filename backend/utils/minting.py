@@ -0,0 +1,598 @@
+"""
+Certificate NFT minting queue
+
+Minting used to run inside the request: sign, send, then block on
+wait_for_transaction_receipt until the block was confirmed. It is now a
+durable job in mint_jobs, worked by the Celery blockchain queue
+(tasks/blockchain_tasks.py).
+
+- queue_mint() records the job and queues it; the endpoint returns the job id.
+- submit_mint() runs in the worker: pins the metadata, takes the next nonce
+  of the minting account from signer_nonces, signs, stores the signed
+  transaction and only then sends it, so a crash can never lose track of a
+  transaction that reached the node.
+- queue_course_mints() queues every unminted certificate of a course and
+  submit_mint_batch() mints them MINT_BATCH_SIZE to a transaction with
+  mintCertificateBatch. The batches get consecutive nonces up front and are
+  all sent at once, so a cohort confirms in a block or two rather than one
+  confirmation wait per certificate. Each job keeps its batch_index, its
+  position in the call, to find its token among the receipt's Transfer events.
+  Holders whose wallet address is malformed are skipped, and a batch the
+  contract would revert is split until the certificate behind the revert is
+  alone, so one bad recipient fails only its own job.
+- poll_mint_receipts() runs on the beat schedule. It fetches the receipts of
+  every submitted job concurrently, writes token_id and transaction_hash to
+  certificates and blockchain_transactions, re-broadcasts transactions the
+  node has dropped and re-queues jobs whose task message was lost.
+"""
+import asyncio
+import json
+import os
+import re
+from typing import Any, Dict, List, Optional, Tuple
+
+from web3.exceptions import ContractLogicError
+
+from celery_app import celery_app
+from database.connection import database
+from utils.blockchain import BlockchainService, BLOCKCHAIN_NETWORK, MINT_BATCH_SIZE, blockchain_service
+from utils.certificate_verification import invalidate_certificate_verification
+from utils.notifications import send_certificate_notification
+
+# Submitted transactions without a receipt for this long are checked against
+# the node's mempool and sent again if it no longer has them
+MINT_REBROADCAST_SECONDS = int(os.getenv("MINT_REBROADCAST_SECONDS", "120"))
+# Queued or submitting jobs untouched for this long are queued again
+MINT_STALLED_SECONDS = int(os.getenv("MINT_STALLED_SECONDS", "600"))
+MINT_POLL_BATCH_SIZE = int(os.getenv("MINT_POLL_BATCH_SIZE", "500"))
+# Metadata pinned to IPFS at once while a batch is prepared
+MINT_PIN_CONCURRENCY = int(os.getenv("MINT_PIN_CONCURRENCY", "10"))
+
+MINT_TASK = "tasks.blockchain_tasks.submit_mint_task"
+MINT_BATCH_TASK = "tasks.blockchain_tasks.submit_mint_batch_task"
+ACTIVE_STATUSES = "('queued', 'submitting', 'submitted')"
+# A hex Ethereum address; anything else cannot be a mint recipient
+WALLET_ADDRESS_PATTERN = "^0x[0-9a-fA-F]{40}$"
+
+
+async def queue_mint(certificate_id, user_id, recipient_address: str) -> Dict[str, Any]:
+    """Queue a certificate for minting; returns the job already in flight if there is one"""
+    job_id = await database.fetch_val(f"""
+        INSERT INTO mint_jobs (certificate_id, user_id, recipient_address)
+        VALUES (:certificate_id, :user_id, :recipient_address)
+        ON CONFLICT (certificate_id) WHERE status IN {ACTIVE_STATUSES} DO NOTHING
+        RETURNING id
+    """, values={"certificate_id": certificate_id, "user_id": user_id, "recipient_address": recipient_address})
+
+    if job_id is None:
+        job = await latest_mint_job(certificate_id)
+        return {"job_id": str(job["id"]), "status": job["status"], "queued": False}
+
+    celery_app.send_task(MINT_TASK, args=[str(job_id)])
+    return {"job_id": str(job_id), "status": "queued", "queued": True}
+
+
+async def queue_course_mints(course_id) -> Dict[str, Any]:
+    """
+    Queue every certificate of a course that is not minted or being minted
+    and whose holder has a well-formed wallet address, as one batch task
+    """
+    rows = await database.fetch_all(f"""
+        INSERT INTO mint_jobs (certificate_id, user_id, recipient_address)
+        SELECT c.id, c.user_id, u.wallet_address
+        FROM certificates c
+        JOIN users u ON c.user_id = u.id
+        WHERE c.course_id = :course_id
+          AND c.status IN ('pending', 'issued')
+          AND c.token_id IS NULL
+          AND u.wallet_address ~ :wallet_pattern
+        ORDER BY c.issued_at
+        ON CONFLICT (certificate_id) WHERE status IN {ACTIVE_STATUSES} DO NOTHING
+        RETURNING id
+    """, values={"course_id": course_id, "wallet_pattern": WALLET_ADDRESS_PATTERN})
+    job_ids = [str(row.id) for row in rows]
+
+    skipped = await database.fetch_one("""
+        SELECT COUNT(*) FILTER (WHERE u.wallet_address IS NULL) AS without_wallet,
+               COUNT(*) FILTER (WHERE u.wallet_address !~ :wallet_pattern) AS invalid_wallet
+        FROM certificates c
+        JOIN users u ON c.user_id = u.id
+        WHERE c.course_id = :course_id
+          AND c.status IN ('pending', 'issued')
+          AND c.token_id IS NULL
+    """, values={"course_id": course_id, "wallet_pattern": WALLET_ADDRESS_PATTERN})
+
+    if job_ids:
+        celery_app.send_task(MINT_BATCH_TASK, args=[job_ids])
+    return {
+        "queued": len(job_ids),
+        "job_ids": job_ids,
+        "without_wallet": skipped.without_wallet,
+        "invalid_wallet": skipped.invalid_wallet,
+    }
+
+
+async def latest_mint_job(certificate_id) -> Optional[Dict[str, Any]]:
+    """The certificate's most recent mint job, None if it was never queued"""
+    row = await database.fetch_one("""
+        SELECT id, certificate_id, status, transaction_hash, token_id, attempts, error,
+               submitted_at, confirmed_at, created_at
+        FROM mint_jobs
+        WHERE certificate_id = :certificate_id
+        ORDER BY created_at DESC
+        LIMIT 1
+    """, values={"certificate_id": certificate_id})
+    return dict(row) if row else None
+
+
+async def allocate_nonce(address: str, chain_nonce: int, count: int = 1) -> int:
+    """
+    Reserve count consecutive nonces for the minting account and return the
+    first: they start at the higher of the stored counter and the node's
+    pending transaction count, which covers transactions sent from elsewhere
+    and a counter that was never stored
+    """
+    return await database.fetch_val("""
+        INSERT INTO signer_nonces (address, next_nonce)
+        VALUES (:address, CAST(:chain_nonce AS BIGINT) + :count)
+        ON CONFLICT (address) DO UPDATE
+        SET next_nonce = GREATEST(signer_nonces.next_nonce, CAST(:chain_nonce AS BIGINT)) + :count,
+            updated_at = NOW()
+        RETURNING next_nonce - :count
+    """, values={"address": address, "chain_nonce": chain_nonce, "count": count})
+
+
+async def release_nonce(address: str, nonce: int, count: int = 1) -> None:
+    """Hand back nonces that were never sent, unless a later one was already taken"""
+    await database.execute("""
+        UPDATE signer_nonces
+        SET next_nonce = :nonce, updated_at = NOW()
+        WHERE address = :address AND next_nonce = CAST(:nonce AS BIGINT) + :count
+    """, values={"address": address, "nonce": nonce, "count": count})
+
+
+async def _pin_metadata(job: Dict[str, Any], service: BlockchainService) -> str:
+    certificate = await database.fetch_one("""
+        SELECT c.id, c.description, c.image_url, c.issued_at, co.title as course_title,
+               u.first_name, u.last_name
+        FROM certificates c
+        JOIN courses co ON c.course_id = co.id
+        JOIN users u ON c.user_id = u.id
+        WHERE c.id = :certificate_id
+    """, values={"certificate_id": job["certificate_id"]})
+    metadata = service.certificate_metadata({
+        "certificate_id": str(certificate.id),
+        "recipient_name": f"{certificate.first_name} {certificate.last_name}",
+        "course_title": certificate.course_title,
+        "issued_at": certificate.issued_at.isoformat(),
+        "description": certificate.description,
+        "image_url": certificate.image_url,
+    })
+    token_uri = await service.upload_to_ipfs(metadata)
+    await database.execute(
+        "UPDATE mint_jobs SET token_uri = :token_uri, updated_at = NOW() WHERE id = :id",
+        values={"id": job["id"], "token_uri": token_uri}
+    )
+    return token_uri
+
+
+async def _requeue(job_ids: List[str], error: str) -> None:
+    await database.execute("""
+        UPDATE mint_jobs
+        SET status = 'queued', nonce = NULL, transaction_hash = NULL, raw_transaction = NULL,
+            batch_index = NULL, submitted_at = NULL, error = :error, updated_at = NOW()
+        WHERE id = ANY(:ids)
+    """, values={"ids": [str(job_id) for job_id in job_ids], "error": error[:1000]})
+
+
+async def _reject(rejected: List[Tuple[Dict[str, Any], str]]) -> None:
+    """Fail claimed jobs that can never be minted, leaving the rest of their batch to go ahead"""
+    for job, error in rejected:
+        print(f"[Minting] Certificate {job['certificate_id']} cannot be minted: {error}")
+        await database.execute("""
+            UPDATE mint_jobs
+            SET status = 'failed', error = :error, updated_at = NOW()
+            WHERE id = :id AND status = 'submitting'
+        """, values={"id": job["id"], "error": error[:1000]})
+
+
+async def _mintable_batches(
+    batches: List[List[Dict[str, Any]]], service: BlockchainService
+) -> Tuple[List[Tuple[List[Dict[str, Any]], int]], List[Tuple[Dict[str, Any], str]]]:
+    """
+    Estimate the gas of every batch at once. A batch the contract would
+    revert is split in halves until the certificate behind the revert is
+    alone, and that one is rejected with the reason. Returns the batches
+    that will mint, in order and with their gas, and the rejected jobs.
+    Errors other than a revert, such as the node being unreachable, are
+    raised.
+    """
+    async def estimate(batch):
+        try:
+            gas = await service.estimate_mint_gas(
+                [job["recipient_address"] for job in batch], [job["token_uri"] for job in batch]
+            )
+            return [(batch, gas)], []
+        except ContractLogicError as e:
+            if len(batch) == 1:
+                return [], [(batch[0], f"Mint would revert: {e}")]
+        middle = len(batch) // 2
+        halves = await asyncio.gather(estimate(batch[:middle]), estimate(batch[middle:]))
+        return [group for mintable, _ in halves for group in mintable], [job for _, rejected in halves for job in rejected]
+
+    results = await asyncio.gather(*[estimate(batch) for batch in batches])
+    return [group for mintable, _ in results for group in mintable], [job for _, rejected in results for job in rejected]
+
+
+async def _store_submission(
+    jobs: List[Dict[str, Any]],
+    sender: str,
+    nonce: int,
+    transaction_hash: str,
+    raw_transaction: str,
+    service: BlockchainService
+) -> None:
+    """Mark jobs submitted in one transaction, in call order, and log it in blockchain_transactions"""
+    job_ids = [str(job["id"]) for job in jobs]
+    batch = len(jobs) > 1
+    async with database.transaction():
+        await database.execute("""
+            UPDATE mint_jobs m
+            SET status = 'submitted', sender_address = :sender, nonce = :nonce,
+                transaction_hash = :transaction_hash, raw_transaction = :raw_transaction,
+                batch_index = b.position - 1, error = NULL, submitted_at = NOW(), updated_at = NOW()
+            FROM unnest(CAST(:ids AS UUID[])) WITH ORDINALITY AS b(id, position)
+            WHERE m.id = b.id
+        """, values={
+            "ids": job_ids,
+            "sender": sender,
+            "nonce": nonce,
+            "transaction_hash": transaction_hash,
+            "raw_transaction": raw_transaction,
+        })
+        await database.execute("""
+            INSERT INTO blockchain_transactions (
+                user_id, transaction_hash, blockchain_network, contract_address,
+                function_name, transaction_type, status, metadata
+            )
+            VALUES (
+                :user_id, :transaction_hash, :network, :contract_address,
+                :function_name, :transaction_type, 'pending', CAST(:metadata AS JSONB)
+            )
+        """, values={
+            "user_id": None if batch else jobs[0]["user_id"],
+            "transaction_hash": transaction_hash,
+            "network": BLOCKCHAIN_NETWORK,
+            "contract_address": service.async_contract.address,
+            "function_name": "mintCertificateBatch" if batch else "mintCertificate",
+            "transaction_type": "mint_certificate_batch" if batch else "mint_certificate",
+            "metadata": json.dumps({
+                "mint_job_ids": job_ids,
+                "certificate_ids": [str(job["certificate_id"]) for job in jobs],
+                "nonce": nonce,
+            }),
+        })
+
+
+async def submit_mint(job_id: str, service: Optional[BlockchainService] = None) -> Dict[str, Any]:
+    """Sign and send a queued job's mint transaction; the receipt is left to poll_mint_receipts()"""
+    service = service or blockchain_service
+    if not service.can_mint:
+        raise Exception("Blockchain not properly configured")
+
+    row = await database.fetch_one("""
+        UPDATE mint_jobs
+        SET status = 'submitting', attempts = attempts + 1, updated_at = NOW()
+        WHERE id = :id AND status = 'queued'
+        RETURNING *
+    """, values={"id": job_id})
+    if row is None:
+        return {"status": "skipped", "job_id": str(job_id), "reason": "job not queued"}
+    job = dict(row)
+    address = service.account.address
+    if not re.fullmatch(WALLET_ADDRESS_PATTERN, job["recipient_address"] or ""):
+        await _reject([(job, f"Invalid recipient address: {job['recipient_address']}")])
+        return {"status": "failed", "job_id": str(job_id), "reason": "invalid recipient address"}
+
+    nonce = None
+    try:
+        token_uri = job["token_uri"] or await _pin_metadata(job, service)
+        nonce = await allocate_nonce(address, await service.pending_nonce())
+        transaction_hash, raw_transaction = await service.sign_mint(job["recipient_address"], token_uri, nonce)
+    except Exception as e:
+        if nonce is not None:
+            await release_nonce(address, nonce)
+        await _requeue([job_id], str(e))
+        raise
+
+    await _store_submission([job], address, nonce, transaction_hash, raw_transaction, service)
+
+    try:
+        await service.send_raw_transaction(raw_transaction)
+    except Exception as e:
+        # A timeout can hide a send that went through; only a transaction the
+        # node does not have is given up and its nonce handed back
+        if not await service.is_transaction_known(transaction_hash):
+            await database.execute(
+                "UPDATE blockchain_transactions SET status = 'failed', updated_at = NOW() WHERE transaction_hash = :hash",
+                values={"hash": transaction_hash}
+            )
+            await release_nonce(address, nonce)
+            await _requeue([job_id], str(e))
+            raise
+
+    return {"status": "submitted", "job_id": str(job_id), "transaction_hash": transaction_hash, "nonce": nonce}
+
+
+async def submit_mint_batch(job_ids: List[str], service: Optional[BlockchainService] = None) -> Dict[str, Any]:
+    """
+    Mint queued jobs MINT_BATCH_SIZE to a transaction. Nonces for all the
+    transactions are reserved at once and every transaction is sent without
+    waiting for the one before; receipts are left to poll_mint_receipts().
+    Jobs with a malformed recipient, or whose mint the contract would
+    revert, are failed on their own and the rest of the cohort goes ahead.
+    """
+    service = service or blockchain_service
+    if not service.can_mint:
+        raise Exception("Blockchain not properly configured")
+
+    rows = await database.fetch_all("""
+        UPDATE mint_jobs
+        SET status = 'submitting', attempts = attempts + 1, updated_at = NOW()
+        WHERE id = ANY(:ids) AND status = 'queued'
+        RETURNING *
+    """, values={"ids": [str(job_id) for job_id in job_ids]})
+    if not rows:
+        return {"status": "skipped", "reason": "no queued jobs"}
+    order = {str(job_id): index for index, job_id in enumerate(job_ids)}
+    jobs = sorted((dict(row) for row in rows), key=lambda job: order[str(job["id"])])
+    valid, rejected = [], []
+    for job in jobs:
+        if re.fullmatch(WALLET_ADDRESS_PATTERN, job["recipient_address"] or ""):
+            valid.append(job)
+        else:
+            rejected.append((job, f"Invalid recipient address: {job['recipient_address']}"))
+    await _reject(rejected)
+    jobs = valid
+    address = service.account.address
+
+    pinning = asyncio.Semaphore(MINT_PIN_CONCURRENCY)
+
+    async def token_uri(job):
+        if job["token_uri"]:
+            return job["token_uri"]
+        async with pinning:
+            return await _pin_metadata(job, service)
+
+    first_nonce = None
+    batches = []
+    try:
+        token_uris = await asyncio.gather(*[token_uri(job) for job in jobs])
+        for job, uri in zip(jobs, token_uris):
+            job["token_uri"] = uri
+        mintable, reverting = await _mintable_batches(
+            [jobs[start:start + MINT_BATCH_SIZE] for start in range(0, len(jobs), MINT_BATCH_SIZE)], service
+        )
+        await _reject(reverting)
+        rejected += reverting
+        jobs = [job for batch, _ in mintable for job in batch]
+        batches = [batch for batch, _ in mintable]
+        if not batches:
+            return {"status": "failed", "certificates": 0, "transactions": 0, "rejected": len(rejected)}
+        first_nonce = await allocate_nonce(address, await service.pending_nonce(), len(batches))
+        signed = await asyncio.gather(*[
+            service.sign_mint_batch(
+                [job["recipient_address"] for job in batch], [job["token_uri"] for job in batch],
+                first_nonce + index, gas
+            )
+            for index, (batch, gas) in enumerate(mintable)
+        ])
+    except Exception as e:
+        if first_nonce is not None:
+            await release_nonce(address, first_nonce, len(batches))
+        await _requeue([job["id"] for job in jobs], str(e))
+        raise
+
+    for index, (batch, (transaction_hash, raw_transaction)) in enumerate(zip(batches, signed)):
+        await _store_submission(batch, address, first_nonce + index, transaction_hash, raw_transaction, service)
+
+    # Every nonce is already taken by a stored transaction, so a send that
+    # fails is left to the poller to re-broadcast rather than handed back,
+    # which would leave a gap in front of the batches sent after it
+    sent = await asyncio.gather(
+        *[service.send_raw_transaction(raw_transaction) for _, raw_transaction in signed], return_exceptions=True
+    )
+    failed = 0
+    for batch, (transaction_hash, _), result in zip(batches, signed, sent):
+        if isinstance(result, Exception):
+            failed += 1
+            print(f"[Minting] Sending batch {transaction_hash} failed, the poller will re-broadcast it: {result}")
+            await database.execute(
+                "UPDATE mint_jobs SET error = :error WHERE id = ANY(:ids)",
+                values={"ids": [str(job["id"]) for job in batch], "error": str(result)[:1000]}
+            )
+
+    return {
+        "status": "submitted",
+        "certificates": len(jobs),
+        "transactions": len(batches),
+        "first_nonce": first_nonce,
+        "send_failures": failed,
+        "rejected": len(rejected),
+    }
+
+
+async def _confirm(job, token_id: str, service: BlockchainService) -> bool:
+    updated = await database.fetch_val("""
+        UPDATE mint_jobs
+        SET status = 'confirmed', token_id = :token_id, raw_transaction = NULL,
+            confirmed_at = NOW(), updated_at = NOW()
+        WHERE id = :id AND status = 'submitted'
+        RETURNING id
+    """, values={"id": job.id, "token_id": token_id})
+    if updated is None:
+        return False
+
+    await database.execute("""
+        UPDATE certificates
+        SET token_id = :token_id,
+            contract_address = :contract_address,
+            token_uri = :token_uri,
+            transaction_hash = :transaction_hash,
+            blockchain_network = :blockchain_network,
+            status = 'minted',
+            minted_at = NOW(),
+            updated_at = NOW()
+        WHERE id = :certificate_id
+    """, values={
+        "token_id": token_id,
+        "contract_address": service.async_contract.address,
+        "token_uri": job.token_uri,
+        "transaction_hash": job.transaction_hash,
+        "blockchain_network": BLOCKCHAIN_NETWORK,
+        "certificate_id": job.certificate_id,
+    })
+    return True
+
+
+async def _fail(job, error: str) -> None:
+    await database.execute("""
+        UPDATE mint_jobs
+        SET status = 'failed', error = :error, raw_transaction = NULL, updated_at = NOW()
+        WHERE id = :id AND status = 'submitted'
+    """, values={"id": job.id, "error": error})
+
+
+async def _record_receipt(transaction_hash: str, receipt, status: str) -> None:
+    await database.execute("""
+        UPDATE blockchain_transactions
+        SET status = :status, gas_used = :gas_used, gas_price = :gas_price,
+            block_number = :block_number, updated_at = NOW()
+        WHERE transaction_hash = :transaction_hash
+    """, values={
+        "status": status,
+        "gas_used": receipt["gasUsed"],
+        "gas_price": receipt.get("effectiveGasPrice"),
+        "block_number": receipt["blockNumber"],
+        "transaction_hash": transaction_hash,
+    })
+
+
+async def _reconcile(jobs, receipt, service: BlockchainService, counts: Dict[str, int]) -> list:
+    """
+    Apply a mined transaction's receipt to its jobs. Each job's token is the
+    Transfer event at its batch_index, which must go to its recipient.
+    Returns the confirmed jobs.
+    """
+    confirmed = []
+    async with database.transaction():
+        if receipt["status"] != 1:
+            for job in jobs:
+                await _fail(job, f"Transaction reverted in block {receipt['blockNumber']}")
+            counts["reverted"] += len(jobs)
+            await _record_receipt(jobs[0].transaction_hash, receipt, "failed")
+            return confirmed
+
+        minted = service.minted_tokens(receipt)
+        for job in jobs:
+            index = job.batch_index or 0
+            if index < len(minted) and minted[index][0].lower() == job.recipient_address.lower():
+                if await _confirm(job, minted[index][1], service):
+                    confirmed.append(job)
+            else:
+                await _fail(job, f"No matching Transfer event in {job.transaction_hash}")
+                counts["reverted"] += 1
+        await _record_receipt(jobs[0].transaction_hash, receipt, "confirmed")
+    counts["confirmed"] += len(confirmed)
+    return confirmed
+
+
+async def _rebroadcast(transaction_hash: str, raw_transaction: str, service: BlockchainService) -> bool:
+    if await service.is_transaction_known(transaction_hash):
+        return False
+    try:
+        await service.send_raw_transaction(raw_transaction)
+        return True
+    except Exception as e:
+        print(f"[Minting] Re-broadcast of {transaction_hash} failed: {e}")
+        return False
+
+
+async def _requeue_stalled() -> int:
+    """Queue again jobs whose task message or worker was lost"""
+    rows = await database.fetch_all("""
+        UPDATE mint_jobs
+        SET status = 'queued', updated_at = NOW()
+        WHERE status IN ('queued', 'submitting')
+          AND updated_at < NOW() - make_interval(secs => :seconds)
+        RETURNING id
+    """, values={"seconds": MINT_STALLED_SECONDS})
+    for row in rows:
+        celery_app.send_task(MINT_TASK, args=[str(row.id)])
+    return len(rows)
+
+
+async def poll_mint_receipts(service: Optional[BlockchainService] = None) -> Dict[str, int]:
+    """Check every submitted transaction for its receipt, all requests in flight at once"""
+    service = service or blockchain_service
+    counts = {"confirmed": 0, "reverted": 0, "pending": 0, "rebroadcast": 0}
+    rows = await database.fetch_all("""
+        SELECT id, certificate_id, user_id, recipient_address, token_uri, batch_index,
+               transaction_hash, raw_transaction,
+               submitted_at < NOW() - make_interval(secs => :seconds) as overdue
+        FROM mint_jobs
+        WHERE status = 'submitted'
+        ORDER BY nonce, batch_index
+        LIMIT :limit
+    """, values={"seconds": MINT_REBROADCAST_SECONDS, "limit": MINT_POLL_BATCH_SIZE})
+
+    # Jobs of one batch share a transaction: one receipt lookup each
+    transactions: Dict[str, list] = {}
+    for job in rows:
+        transactions.setdefault(job.transaction_hash, []).append(job)
+    receipts = await asyncio.gather(
+        *[service.get_receipt(transaction_hash) for transaction_hash in transactions], return_exceptions=True
+    )
+
+    confirmed = []
+    overdue = []
+    for (transaction_hash, jobs), receipt in zip(transactions.items(), receipts):
+        if isinstance(receipt, Exception):
+            print(f"[Minting] Receipt lookup for {transaction_hash} failed: {receipt}")
+            counts["pending"] += len(jobs)
+        elif receipt is None:
+            counts["pending"] += len(jobs)
+            if jobs[0].overdue:
+                overdue.append(jobs[0])
+        else:
+            confirmed += await _reconcile(jobs, receipt, service, counts)
+
+    if overdue:
+        sent = await asyncio.gather(
+            *[_rebroadcast(job.transaction_hash, job.raw_transaction, service) for job in overdue]
+        )
+        counts["rebroadcast"] = sum(sent)
+    counts["requeued"] = await _requeue_stalled()
+
+    if confirmed:
+        # Only now that the updates are committed, or a verify request could
+        # cache the pre-mint row again
+        await invalidate_certificate_verification(*[job.certificate_id for job in confirmed])
+        titles = await database.fetch_all("""
+            SELECT c.id, co.title FROM certificates c JOIN courses co ON c.course_id = co.id
+            WHERE c.id = ANY(:ids)
+        """, values={"ids": [str(job.certificate_id) for job in confirmed]})
+        course_titles = {str(row.id): row.title for row in titles}
+        for job in confirmed:
+            if job.user_id:
+                await send_certificate_notification(job.user_id, course_titles.get(str(job.certificate_id)), "minted")
+    return counts
+
+
+async def mark_mint_failed(job_id: str, error: str) -> None:
+    """Record that the worker gave up on a job it could not submit"""
+    await database.execute("""
+        UPDATE mint_jobs
+        SET status = 'failed', error = :error, updated_at = NOW()
+        WHERE id = :id AND status IN ('queued', 'submitting')
+    """, values={"id": job_id, "error": error[:1000]})
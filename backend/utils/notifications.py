@@ -1,9 +1,15 @@
+import asyncio
+import os
 import uuid
 import json
 from typing import Optional, Dict, Any, List
 from datetime import datetime
 
 from database.connection import database
+from utils.push import PushBatchResult, PushProvider, get_push_provider
+
+# Multicast calls to the push provider in flight at once
+PUSH_SEND_CONCURRENCY = int(os.getenv("PUSH_SEND_CONCURRENCY", "10"))
 
 async def create_notification(
     user_id: uuid.UUID,
@@ -141,56 +147,66 @@ async def send_course_update_notification(user_ids: List[uuid.UUID], course_titl
             action_url=f"/courses/{course_id}"
         )
 
+async def deliver_push(
+    tokens: List[str],
+    title: str,
+    message: str,
+    data: Optional[Dict[str, Any]] = None,
+    provider: Optional[PushProvider] = None,
+    concurrency: int = PUSH_SEND_CONCURRENCY
+) -> Dict[str, Any]:
+    """
+    Send one notification to many device tokens, max_batch_size of them to
+    a provider call with up to `concurrency` calls in flight. A batch whose
+    call fails is counted as failed rather than retried.
+    """
+    provider = provider or get_push_provider()
+    batches = [tokens[i:i + provider.max_batch_size] for i in range(0, len(tokens), provider.max_batch_size)]
+    sending = asyncio.Semaphore(concurrency)
+
+    async def send(batch: List[str]) -> PushBatchResult:
+        async with sending:
+            try:
+                return await provider.send_multicast(batch, title, message, data)
+            except Exception as e:
+                print(f"[Push] Batch of {len(batch)} failed: {e}")
+                return PushBatchResult(failed=len(batch))
+
+    results = await asyncio.gather(*[send(batch) for batch in batches])
+    return {
+        "batches": len(batches),
+        "delivered": sum(result.delivered for result in results),
+        "failed": sum(result.failed for result in results),
+        "invalid_tokens": [token for result in results for token in result.invalid_tokens]
+    }
+
+async def remove_device_tokens(tokens: List[str]):
+    """Forget tokens the push provider reported as no longer registered"""
+    if tokens:
+        await database.execute(
+            "DELETE FROM user_devices WHERE device_token = ANY(:tokens)",
+            values={"tokens": tokens}
+        )
+
 async def send_push_notification(user_id: uuid.UUID, title: str, message: str, data: Optional[Dict[str, Any]] = None):
     """Send push notification to user's devices"""
     
     try:
-        # Check if user has push notifications enabled
-        settings_query = """
-            SELECT push_notifications FROM notification_settings 
-            WHERE user_id = :user_id
-        """
-        settings = await database.fetch_one(settings_query, values={"user_id": user_id})
-        
-        if not settings or not settings.push_notifications:
-            return
-        
-        # Get user's push tokens
+        # Device tokens of the user, if push notifications are enabled
         tokens_query = """
-            SELECT device_token FROM user_devices 
-            WHERE user_id = :user_id AND device_token IS NOT NULL
+            SELECT d.device_token
+            FROM notification_settings ns
+            JOIN user_devices d ON d.user_id = ns.user_id
+            WHERE ns.user_id = :user_id AND ns.push_notifications
+              AND d.device_token IS NOT NULL
         """
         device_tokens = await database.fetch_all(tokens_query, values={"user_id": user_id})
         
         if not device_tokens:
             return
         
-        # Here you would integrate with your push notification service
-        # For example, Firebase Cloud Messaging (FCM) or OneSignal
-        
-        # Example FCM integration (commented out):
-        """
-        import firebase_admin
-        from firebase_admin import messaging
-        
-        for token_record in device_tokens:
-            message = messaging.Message(
-                notification=messaging.Notification(
-                    title=title,
-                    body=message,
-                ),
-                data=data or {},
-                token=token_record.device_token,
-            )
-            
-            try:
-                response = messaging.send(message)
-                print(f'Successfully sent message: {response}')
-            except Exception as e:
-                print(f'Error sending push notification: {e}')
-        """
-        
-        print(f"Push notification sent to {len(device_tokens)} devices for user {user_id}")
+        result = await deliver_push([row.device_token for row in device_tokens], title, message, data)
+        await remove_device_tokens(result["invalid_tokens"])
         
     except Exception as e:
         print(f"Failed to send push notification: {e}")
@@ -0,0 +1,181 @@
+"""
+Keyset (cursor) pagination and row-count helpers for list endpoints
+
+Keyset mode replaces OFFSET with a WHERE on the last row's (sort key, id),
+so deep pages cost the same as the first one. The cursor is opaque to
+clients: base64 JSON of the sort key name, its value and the row id.
+NULL sort values are encoded as such and ordered as Postgres does by
+default, after every value ascending and before every value descending.
+
+Endpoints opt in via KeysetPaginationParams (or cursor/total_mode query
+params): passing `cursor` (empty for the first page) switches to keyset
+mode, and total_mode=estimated takes the total from planner statistics
+instead of an exact COUNT(*).
+"""
+import base64
+import json
+import re
+import uuid
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+from fastapi import HTTPException, status
+
+from database.connection import database
+
+
+def encode_cursor(sort_key: str, sort_value: Any, row_id: Any) -> str:
+    """Build the opaque cursor that points just past a row"""
+    if sort_value is None:
+        value, value_type = None, "null"
+    elif isinstance(sort_value, datetime):
+        value, value_type = sort_value.isoformat(), "datetime"
+    elif isinstance(sort_value, int):
+        value, value_type = sort_value, "int"
+    else:
+        value, value_type = str(sort_value), "str"
+
+    payload = json.dumps({"k": sort_key, "t": value_type, "v": value, "id": str(row_id)})
+    return base64.urlsafe_b64encode(payload.encode('utf-8')).decode('ascii').rstrip("=")
+
+
+def decode_cursor(cursor: str, sort_key: str) -> Tuple[Any, uuid.UUID]:
+    """Return (sort value, row id) from a cursor, or raise 400 if it is invalid"""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+        if payload["k"] != sort_key:
+            raise ValueError("cursor was issued for a different sort order")
+
+        value = payload["v"]
+        if payload["t"] == "null":
+            value = None
+        elif payload["t"] == "datetime":
+            value = datetime.fromisoformat(value)
+        elif payload["t"] == "int":
+            value = int(value)
+        return value, uuid.UUID(payload["id"])
+    except Exception:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid pagination cursor"
+        )
+
+
+class Keyset:
+    """
+    Keyset pagination over (sort_column, id_column). Pass nullable=False for
+    a NOT NULL sort column to keep its ascending condition a plain row
+    comparison.
+    """
+
+    def __init__(
+        self,
+        cursor: Optional[str],
+        size: int,
+        sort_key: str,
+        sort_column: str,
+        id_column: str,
+        descending: bool = True,
+        nullable: bool = True
+    ):
+        self.cursor = cursor
+        self.size = size
+        self.sort_key = sort_key
+        self.sort_column = sort_column
+        self.id_column = id_column
+        self.descending = descending
+        self.nullable = nullable
+
+    @property
+    def enabled(self) -> bool:
+        return self.cursor is not None
+
+    @property
+    def order_by(self) -> str:
+        """ORDER BY with the id tiebreaker that keeps pages stable"""
+        # Postgres' default NULL placement, spelled out because condition()
+        # depends on it; an index on the sort column still serves it
+        if self.descending:
+            return f"{self.sort_column} DESC NULLS FIRST, {self.id_column} DESC"
+        return f"{self.sort_column} ASC NULLS LAST, {self.id_column} ASC"
+
+    def condition(self, values: Dict[str, Any]) -> Optional[str]:
+        """Condition selecting rows after the cursor; adds its bind values"""
+        if not self.cursor:
+            return None
+        sort_value, row_id = decode_cursor(self.cursor, self.sort_key)
+        values["cursor_id"] = row_id
+        operator = "<" if self.descending else ">"
+        after_id = f"{self.sort_column} IS NULL AND {self.id_column} {operator} :cursor_id"
+
+        # A row comparison with a NULL sort value is never true, so the rows
+        # on the NULL side of the cursor are matched with IS NULL
+        if sort_value is None:
+            if self.descending:
+                return f"(({after_id}) OR {self.sort_column} IS NOT NULL)"
+            return f"({after_id})"
+
+        values["cursor_value"] = sort_value
+        condition = f"({self.sort_column}, {self.id_column}) {operator} (:cursor_value, :cursor_id)"
+        if self.nullable and not self.descending:
+            return f"({condition} OR {self.sort_column} IS NULL)"
+        return condition
+
+    def clauses(
+        self,
+        where_conditions: List[str],
+        values: Dict[str, Any],
+        size_param: str = "size",
+        offset_param: str = "offset"
+    ) -> Tuple[str, str]:
+        """
+        Return (where_clause, limit_clause) for the page query. Offset mode
+        keeps LIMIT/OFFSET; keyset mode adds the cursor condition and fetches
+        one extra row to tell whether there is a next page.
+        """
+        conditions = list(where_conditions)
+        if not self.enabled:
+            limit_clause = f"LIMIT :{size_param} OFFSET :{offset_param}"
+        else:
+            cursor_condition = self.condition(values)
+            if cursor_condition:
+                conditions.append(cursor_condition)
+            values[size_param] = self.size + 1
+            values.pop(offset_param, None)
+            limit_clause = f"LIMIT :{size_param}"
+
+        where_clause = "WHERE " + " AND ".join(conditions) if conditions else ""
+        return where_clause, limit_clause
+
+    def page(self, rows: List[Any]) -> Tuple[List[Any], Optional[str]]:
+        """Trim the look-ahead row (fetch size + 1) and build next_cursor"""
+        if not self.enabled or len(rows) <= self.size:
+            return rows, None
+        rows = rows[:self.size]
+        last = rows[-1]
+        return rows, encode_cursor(self.sort_key, last[self.sort_key], last["id"])
+
+
+def _used_values(query: str, values: Dict[str, Any]) -> Dict[str, Any]:
+    return {k: v for k, v in values.items() if re.search(rf":{k}\b", query)}
+
+
+async def fetch_total(from_clause: str, values: Dict[str, Any], total_mode: str = "exact") -> Tuple[int, bool]:
+    """
+    Count the rows matched by `from_clause` ("FROM ... WHERE ...").
+    Returns (total, estimated).
+    """
+    if total_mode == "estimated":
+        query = f"EXPLAIN (FORMAT JSON) SELECT 1 {from_clause}"
+        try:
+            plan = await database.fetch_val(query, values=_used_values(query, values))
+            if isinstance(plan, str):
+                plan = json.loads(plan)
+            return int(plan[0]["Plan"]["Plan Rows"]), True
+        except Exception as e:
+            print(f"[Pagination] Row estimate failed, counting instead: {e}")
+
+    query = f"SELECT COUNT(*) as total {from_clause}"
+    result = await database.fetch_one(query, values=_used_values(query, values))
+    return (result["total"] if result else 0), False
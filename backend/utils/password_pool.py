@@ -0,0 +1,139 @@
+"""
+Bounded worker pool for bcrypt hashing and verification
+
+bcrypt is deliberately slow (~200 ms per call). Running it inline in an async
+handler blocks the event loop for every other request on the worker, so the
+auth paths hand it to a small thread pool instead (bcrypt releases the GIL).
+
+The pool is bounded: once PASSWORD_HASH_WORKERS jobs are running and
+PASSWORD_HASH_MAX_QUEUE more are waiting, new requests are rejected with
+503 instead of piling up behind a login storm.
+"""
+import asyncio
+import os
+import secrets
+import string
+import time
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from typing import Callable, Dict, Any, List, Optional
+from fastapi import HTTPException, status
+from dotenv import load_dotenv
+
+load_dotenv()
+
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", str(min(4, os.cpu_count() or 1))))
+PASSWORD_HASH_MAX_QUEUE = int(os.getenv("PASSWORD_HASH_MAX_QUEUE", "64"))
+
+
+class PasswordHashPool:
+    """Thread pool with admission control and queue-depth metrics"""
+
+    def __init__(self, workers: int = PASSWORD_HASH_WORKERS, max_queue: int = PASSWORD_HASH_MAX_QUEUE):
+        self.workers = workers
+        self.max_queue = max_queue
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="bcrypt")
+        self._in_flight = 0
+        self.stats = {
+            "completed": 0,
+            "rejected": 0,
+            "max_queue_depth": 0,
+            "total_wait_seconds": 0.0,
+            "total_run_seconds": 0.0,
+        }
+
+    @property
+    def queue_depth(self) -> int:
+        """Jobs admitted but not yet running"""
+        return max(0, self._in_flight - self.workers)
+
+    async def run(self, func: Callable, *args):
+        """Run func(*args) on the pool, or raise 503 if the pool is saturated"""
+        if self._in_flight >= self.workers + self.max_queue:
+            self.stats["rejected"] += 1
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Authentication service is busy. Please try again.",
+                headers={"Retry-After": "1"}
+            )
+
+        self._in_flight += 1
+        self.stats["max_queue_depth"] = max(self.stats["max_queue_depth"], self.queue_depth)
+        submitted_at = time.perf_counter()
+
+        def timed():
+            started_at = time.perf_counter()
+            try:
+                return func(*args)
+            finally:
+                self.stats["total_wait_seconds"] += started_at - submitted_at
+                self.stats["total_run_seconds"] += time.perf_counter() - started_at
+
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._executor, timed)
+        finally:
+            self._in_flight -= 1
+            self.stats["completed"] += 1
+
+    def get_stats(self) -> Dict[str, Any]:
+        completed = self.stats["completed"] or 1
+        return {
+            "workers": self.workers,
+            "max_queue": self.max_queue,
+            "in_flight": self._in_flight,
+            "queue_depth": self.queue_depth,
+            "completed": self.stats["completed"],
+            "rejected": self.stats["rejected"],
+            "max_queue_depth": self.stats["max_queue_depth"],
+            "avg_wait_ms": round(self.stats["total_wait_seconds"] / completed * 1000, 2),
+            "avg_run_ms": round(self.stats["total_run_seconds"] / completed * 1000, 2),
+        }
+
+
+password_pool = PasswordHashPool()
+
+
+# Bulk hashing for imports runs on processes rather than threads so a
+# 50k-row roster can use every core without starving the request pool above.
+PASSWORD_HASH_PROCESSES = int(os.getenv("PASSWORD_HASH_PROCESSES", str(os.cpu_count() or 1)))
+
+_process_pool: Optional[ProcessPoolExecutor] = None
+
+
+def hash_random_passwords(count: int) -> List[str]:
+    """
+    Generate `count` random temporary passwords and return only their bcrypt
+    hashes. Runs inside a worker process; the plaintext never leaves it.
+    """
+    import bcrypt
+
+    alphabet = string.ascii_letters + string.digits + string.punctuation
+    hashes = []
+    for _ in range(count):
+        password = ''.join(secrets.choice(alphabet) for _ in range(16))
+        hashes.append(bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8'))
+    return hashes
+
+
+async def bulk_random_password_hashes(count: int) -> List[str]:
+    """Hash `count` random passwords spread across the process pool"""
+    global _process_pool
+    if count <= 0:
+        return []
+    if _process_pool is None:
+        _process_pool = ProcessPoolExecutor(max_workers=PASSWORD_HASH_PROCESSES)
+
+    loop = asyncio.get_running_loop()
+    per_worker = -(-count // PASSWORD_HASH_PROCESSES)
+    sizes = [min(per_worker, count - start) for start in range(0, count, per_worker)]
+    batches = await asyncio.gather(*[
+        loop.run_in_executor(_process_pool, hash_random_passwords, size) for size in sizes
+    ])
+    return [hashed for batch in batches for hashed in batch]
+
+
+def shutdown_process_pool():
+    global _process_pool
+    if _process_pool is not None:
+        _process_pool.shutdown(wait=False, cancel_futures=True)
+        _process_pool = None
@@ -0,0 +1,242 @@
+"""
+Write-behind buffer for lesson progress heartbeats
+
+Video players report progress every few seconds. Heartbeats that do not move
+a lesson across a status boundary (not_started -> in_progress -> completed)
+are absorbed here, coalesced per (user_id, lesson_id) to the latest value and
+flushed to lesson_progress in bulk. Status transitions always write through.
+
+The last row written through for each lesson is kept in Redis, so a quiz or
+assignment handled by one worker makes every worker's next heartbeat for
+that lesson write through. Pending heartbeats are buffered per process; the
+flush never replaces a row that already has more watch time, so a buffered
+heartbeat cannot undo a newer write from another worker or request.
+Enable it with PROGRESS_WRITE_BEHIND=true.
+"""
+import asyncio
+import json
+import os
+import uuid
+from datetime import datetime, UTC
+from typing import Optional, Dict, Any, Tuple
+from dotenv import load_dotenv
+from fastapi.encoders import jsonable_encoder
+
+from database.connection import database
+from utils.redis_client import async_redis_client
+
+load_dotenv()
+
+PROGRESS_WRITE_BEHIND = os.getenv("PROGRESS_WRITE_BEHIND", "false").lower() == "true"
+PROGRESS_FLUSH_INTERVAL_SECONDS = float(os.getenv("PROGRESS_FLUSH_INTERVAL_SECONDS", "5"))
+PROGRESS_FLUSH_BATCH_SIZE = int(os.getenv("PROGRESS_FLUSH_BATCH_SIZE", "1000"))
+# How long a written-through row is trusted before the next heartbeat
+# is sent to the database again (re-checks enrollment and assessments)
+PROGRESS_STATE_TTL_SECONDS = int(os.getenv("PROGRESS_STATE_TTL_SECONDS", "300"))
+
+ProgressKey = Tuple[str, str]
+
+FLUSH_QUERY = """
+    UPDATE lesson_progress AS lp
+    SET progress_percentage = v.progress_percentage,
+        time_spent = COALESCE(v.time_spent, lp.time_spent),
+        last_position = COALESCE(v.last_position, lp.last_position),
+        notes = COALESCE(v.notes, lp.notes),
+        updated_at = NOW()
+    FROM UNNEST(
+        CAST(:user_ids AS UUID[]),
+        CAST(:lesson_ids AS UUID[]),
+        CAST(:statuses AS completion_status[]),
+        CAST(:progress_percentages AS INTEGER[]),
+        CAST(:time_spents AS INTEGER[]),
+        CAST(:last_positions AS INTEGER[]),
+        CAST(:notes AS TEXT[])
+    ) AS v(user_id, lesson_id, status, progress_percentage, time_spent, last_position, notes)
+    WHERE lp.user_id = v.user_id
+      AND lp.lesson_id = v.lesson_id
+      -- Never overwrite a row whose status moved on since it was buffered,
+      -- or one a newer write already took further
+      AND lp.status = v.status
+      AND COALESCE(v.time_spent, 0) >= COALESCE(lp.time_spent, 0)
+"""
+
+
+def buffered_progress_percentage(status: str, progress_percentage: int) -> Optional[int]:
+    """
+    Return the progress percentage to store for a heartbeat that stays in
+    `status`, or None if the heartbeat crosses a status boundary and must
+    write through.
+
+    Mirrors the decision in routers/progress.py: a completed lesson stays at
+    100%, an in-progress lesson with pending assessments is capped at 95%.
+    """
+    if status == "completed":
+        return 100
+    if status == "in_progress":
+        return 95 if progress_percentage >= 100 else progress_percentage
+    if status == "not_started" and progress_percentage <= 0:
+        return 0
+    return None
+
+
+class ProgressWriteBuffer:
+    """Coalescing in-memory buffer with a periodic bulk flush"""
+
+    def __init__(
+        self,
+        client=async_redis_client,
+        flush_interval: float = PROGRESS_FLUSH_INTERVAL_SECONDS,
+        batch_size: int = PROGRESS_FLUSH_BATCH_SIZE,
+        state_ttl: int = PROGRESS_STATE_TTL_SECONDS
+    ):
+        self.client = client
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self.state_ttl = state_ttl
+        # Latest unflushed heartbeat per key
+        self._pending: Dict[ProgressKey, Dict[str, Any]] = {}
+        self._task: Optional[asyncio.Task] = None
+        self.stats = {"absorbed": 0, "written_through": 0, "flushed_rows": 0, "flushes": 0}
+
+    @staticmethod
+    def _key(user_id, lesson_id) -> ProgressKey:
+        return (str(user_id), str(lesson_id))
+
+    @staticmethod
+    def _state_key(key: ProgressKey) -> str:
+        return f"progress_state:{key[0]}:{key[1]}"
+
+    async def remember(self, row: Dict[str, Any]):
+        """Record a row that was just written through to the database"""
+        key = self._key(row["user_id"], row["lesson_id"])
+        # The write-through carried the newest values already
+        self._pending.pop(key, None)
+        self.stats["written_through"] += 1
+        try:
+            await self.client.set(self._state_key(key), json.dumps(jsonable_encoder(row)), ex=self.state_ttl)
+        except Exception as e:
+            print(f"[ProgressBuffer] Error storing state for {key}: {e}")
+
+    async def forget(self, user_id, lesson_id):
+        """
+        Drop cached state so the next heartbeat writes through, on every
+        worker. Call this when something other than the heartbeat can change
+        the lesson status (quiz attempts, assignment submissions and grading).
+        """
+        key = self._key(user_id, lesson_id)
+        try:
+            await self.client.delete(self._state_key(key))
+        except Exception as e:
+            print(f"[ProgressBuffer] Error dropping state for {key}: {e}")
+
+    async def absorb(
+        self,
+        user_id,
+        lesson_id,
+        progress_percentage: int,
+        time_spent: Optional[int] = None,
+        last_position: Optional[int] = None,
+        notes: Optional[str] = None
+    ) -> Optional[Dict[str, Any]]:
+        """
+        Try to buffer a heartbeat. Returns the row as it will look after the
+        next flush, or None if the caller must write through.
+        """
+        key = self._key(user_id, lesson_id)
+        try:
+            cached = await self.client.get(self._state_key(key))
+        except Exception as e:
+            print(f"[ProgressBuffer] Error reading state for {key}: {e}")
+            return None
+        if cached is None:
+            return None
+
+        row = json.loads(cached)
+        percentage = buffered_progress_percentage(str(row["status"]), progress_percentage)
+        if percentage is None:
+            return None
+
+        merged = dict(row)
+        merged["progress_percentage"] = percentage
+        if time_spent is not None:
+            merged["time_spent"] = time_spent
+        if last_position is not None:
+            merged["last_position"] = last_position
+        if notes is not None:
+            merged["notes"] = notes
+        merged["updated_at"] = datetime.now(UTC)
+
+        # Keep the original expiry so the state is re-checked on time; xx so
+        # state dropped by forget() in the meantime is not brought back
+        try:
+            await self.client.set(self._state_key(key), json.dumps(jsonable_encoder(merged)), keepttl=True, xx=True)
+        except Exception as e:
+            print(f"[ProgressBuffer] Error storing state for {key}: {e}")
+        self._pending[key] = {
+            "status": str(row["status"]),
+            "progress_percentage": percentage,
+            "time_spent": merged.get("time_spent"),
+            "last_position": merged.get("last_position"),
+            "notes": merged.get("notes"),
+        }
+        self.stats["absorbed"] += 1
+        return merged
+
+    async def flush(self) -> int:
+        """Write every pending heartbeat to lesson_progress in bulk batches"""
+        if not self._pending:
+            return 0
+
+        pending, self._pending = self._pending, {}
+        items = list(pending.items())
+        flushed = 0
+
+        for start in range(0, len(items), self.batch_size):
+            batch = items[start:start + self.batch_size]
+            try:
+                await database.execute(FLUSH_QUERY, values={
+                    "user_ids": [uuid.UUID(user_id) for (user_id, _), _ in batch],
+                    "lesson_ids": [uuid.UUID(lesson_id) for (_, lesson_id), _ in batch],
+                    "statuses": [entry["status"] for _, entry in batch],
+                    "progress_percentages": [entry["progress_percentage"] for _, entry in batch],
+                    "time_spents": [entry["time_spent"] for _, entry in batch],
+                    "last_positions": [entry["last_position"] for _, entry in batch],
+                    "notes": [entry["notes"] for _, entry in batch],
+                })
+                flushed += len(batch)
+            except Exception as e:
+                print(f"[ProgressBuffer] Flush of {len(batch)} rows failed: {e}")
+                # Requeue unless a newer heartbeat arrived in the meantime
+                for key, entry in batch:
+                    self._pending.setdefault(key, entry)
+
+        self.stats["flushed_rows"] += flushed
+        self.stats["flushes"] += 1
+        return flushed
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush()
+            except Exception as e:
+                print(f"[ProgressBuffer] Flush loop error: {e}")
+
+    def start(self):
+        """Start the periodic flush loop on the running event loop"""
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Stop the flush loop and write out anything still buffered"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+
+
+progress_buffer = ProgressWriteBuffer()
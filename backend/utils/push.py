@@ -0,0 +1,135 @@
+"""
+Push notification providers
+
+Set PUSH_PROVIDER to choose one:
+- 'log': print what would be sent (development default)
+- 'fcm': Firebase Cloud Messaging through firebase_admin, with the service
+  account file in FIREBASE_CREDENTIALS_FILE
+
+Providers send one message to many device tokens at once, at most
+max_batch_size per call, and report per token which were delivered and
+which the provider no longer recognises, so callers can delete them.
+"""
+import asyncio
+import json
+import os
+from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from functools import partial
+from typing import Any, Dict, List, Optional
+from dotenv import load_dotenv
+
+load_dotenv()
+
+PUSH_PROVIDER = os.getenv("PUSH_PROVIDER", "log")
+FIREBASE_CREDENTIALS_FILE = os.getenv("FIREBASE_CREDENTIALS_FILE")
+# firebase_admin blocks; its multicast calls run on this many threads
+PUSH_IO_WORKERS = int(os.getenv("PUSH_IO_WORKERS", "8"))
+
+
+@dataclass
+class PushBatchResult:
+    """Outcome of one multicast call"""
+    delivered: int = 0
+    failed: int = 0
+    invalid_tokens: List[str] = field(default_factory=list)
+
+
+def push_data(data: Optional[Dict[str, Any]]) -> Dict[str, str]:
+    """Push payloads carry string values only"""
+    return {
+        key: value if isinstance(value, str) else json.dumps(value, default=str)
+        for key, value in (data or {}).items()
+    }
+
+
+class PushProvider(ABC):
+    """Abstract base class for push notification providers"""
+
+    max_batch_size: int = 500
+
+    @abstractmethod
+    async def send_multicast(
+        self,
+        tokens: List[str],
+        title: str,
+        message: str,
+        data: Optional[Dict[str, Any]] = None
+    ) -> PushBatchResult:
+        """Send one notification to up to max_batch_size device tokens"""
+        pass
+
+
+class LogPushProvider(PushProvider):
+    """Prints each batch instead of sending it"""
+
+    async def send_multicast(self, tokens, title, message, data=None) -> PushBatchResult:
+        print(f"[Push] {title!r} to {len(tokens)} devices")
+        return PushBatchResult(delivered=len(tokens))
+
+
+class FCMPushProvider(PushProvider):
+    """Firebase Cloud Messaging; send_each_for_multicast takes up to 500 tokens"""
+
+    max_batch_size = 500
+
+    def __init__(self, credentials_file: str):
+        import firebase_admin
+        from firebase_admin import credentials, messaging
+
+        try:
+            self.app = firebase_admin.get_app()
+        except ValueError:
+            self.app = firebase_admin.initialize_app(credentials.Certificate(credentials_file))
+        self.messaging = messaging
+        self._executor = ThreadPoolExecutor(max_workers=PUSH_IO_WORKERS, thread_name_prefix="push-io")
+
+    def _send(self, tokens, title, message, data) -> PushBatchResult:
+        response = self.messaging.send_each_for_multicast(
+            self.messaging.MulticastMessage(
+                tokens=tokens,
+                notification=self.messaging.Notification(title=title, body=message),
+                data=push_data(data)
+            ),
+            app=self.app
+        )
+        result = PushBatchResult(delivered=response.success_count)
+        for token, send_response in zip(tokens, response.responses):
+            if send_response.success:
+                continue
+            if isinstance(send_response.exception, self.messaging.UnregisteredError):
+                result.invalid_tokens.append(token)
+            else:
+                result.failed += 1
+        return result
+
+    async def send_multicast(self, tokens, title, message, data=None) -> PushBatchResult:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, partial(self._send, tokens, title, message, data))
+
+
+def create_push_provider(provider_type: str) -> PushProvider:
+    """Factory function to create the configured push provider"""
+
+    if provider_type == "fcm":
+        if not FIREBASE_CREDENTIALS_FILE:
+            raise ValueError("FIREBASE_CREDENTIALS_FILE environment variable not set")
+        return FCMPushProvider(FIREBASE_CREDENTIALS_FILE)
+
+    elif provider_type == "log":
+        return LogPushProvider()
+
+    else:
+        raise ValueError(f"Unknown push provider type: {provider_type}")
+
+
+_push_provider: Optional[PushProvider] = None
+
+
+def get_push_provider() -> PushProvider:
+    """The configured provider, created on first use"""
+    global _push_provider
+    if _push_provider is None:
+        _push_provider = create_push_provider(PUSH_PROVIDER)
+    return _push_provider
@@ -2,9 +2,12 @@
 Redis client for session management and caching
 """
 import redis
+import redis.asyncio as aioredis
 import json
 import os
-from typing import Optional, Dict, Any
+import time
+from collections import OrderedDict
+from typing import Optional, Dict, Any, Tuple
 from datetime import timedelta
 from dotenv import load_dotenv
 
@@ -12,8 +15,18 @@ load_dotenv()
 
 # Get Redis URL from environment
 REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+# Connections in the asyncio client's pool; callers beyond it wait up to
+# REDIS_POOL_TIMEOUT seconds for one to free up
+REDIS_MAX_CONNECTIONS = int(os.getenv("REDIS_MAX_CONNECTIONS", "50"))
+REDIS_POOL_TIMEOUT = float(os.getenv("REDIS_POOL_TIMEOUT", "5"))
+# Users whose token version is kept in-process; the least recently used is
+# dropped beyond this
+TOKEN_VERSION_CACHE_MAX_ENTRIES = int(os.getenv("TOKEN_VERSION_CACHE_MAX_ENTRIES", "10000"))
+# How long token version lookups skip Redis after one fails
+TOKEN_VERSION_FAILURE_TTL_SECONDS = float(os.getenv("TOKEN_VERSION_FAILURE_TTL_SECONDS", "5"))
 
-# Create Redis client
+# Create Redis client (synchronous: Celery tasks, caches and other code that
+# runs off the event loop or can't await)
 redis_client = redis.from_url(
     REDIS_URL,
     decode_responses=True,  # Automatically decode responses to strings
@@ -23,14 +36,60 @@ redis_client = redis.from_url(
     health_check_interval=30
 )
 
+# Asyncio Redis client for request handlers, sharing one connection pool
+# across the process so a Redis round trip never blocks the event loop
+async_redis_client = aioredis.Redis(
+    connection_pool=aioredis.BlockingConnectionPool.from_url(
+        REDIS_URL,
+        max_connections=REDIS_MAX_CONNECTIONS,
+        timeout=REDIS_POOL_TIMEOUT,
+        decode_responses=True,
+        socket_connect_timeout=5,
+        socket_timeout=5,
+        retry_on_timeout=True,
+        health_check_interval=30
+    )
+)
+
+# Add seconds to a key's remaining TTL, in one round trip
+EXTEND_TTL_SCRIPT = """
+local ttl = redis.call('TTL', KEYS[1])
+if ttl <= 0 then
+    return 0
+end
+redis.call('EXPIRE', KEYS[1], ttl + tonumber(ARGV[1]))
+return 1
+"""
+
+# Check a 2FA code and mark the session verified, atomically so a code
+# can't be used twice by concurrent requests
+VERIFY_2FA_SCRIPT = """
+local data = redis.call('GET', KEYS[1])
+if not data then
+    return {'missing'}
+end
+local session = cjson.decode(data)
+if session['code'] ~= ARGV[1] then
+    return {'invalid'}
+end
+if session['verified'] then
+    return {'used'}
+end
+session['verified'] = true
+data = cjson.encode(session)
+redis.call('SET', KEYS[1], data, 'KEEPTTL')
+return {'ok', data}
+"""
+
 
 class RedisSessionManager:
     """Manager for Redis-based session storage"""
     
-    def __init__(self, client: redis.Redis):
+    def __init__(self, client: aioredis.Redis):
         self.client = client
+        self._extend_ttl = client.register_script(EXTEND_TTL_SCRIPT)
     
-    def set_session(
+    async def set_session(
         self,
         session_id: str,
         data: Dict[str, Any],
@@ -52,9 +111,9 @@ class RedisSessionManager:
             json_data = json.dumps(data)
             
             # Store with expiration
-            self.client.setex(
+            await self.client.setex(
                 name=f"session:{session_id}",
-                time=expiry_seconds,
+                time=int(expiry_seconds),
                 value=json_data
             )
             return True
@@ -62,7 +121,7 @@ class RedisSessionManager:
             print(f"[Redis] Error setting session {session_id}: {e}")
             return False
     
-    def get_session(self, session_id: str) -> Optional[Dict[str, Any]]:
+    async def get_session(self, session_id: str) -> Optional[Dict[str, Any]]:
         """
         Retrieve session data from Redis
         
@@ -74,7 +133,7 @@ class RedisSessionManager:
         """
         try:
             # Get data from Redis
-            json_data = self.client.get(f"session:{session_id}")
+            json_data = await self.client.get(f"session:{session_id}")
             
             if json_data is None:
                 return None
@@ -85,7 +144,7 @@ class RedisSessionManager:
             print(f"[Redis] Error getting session {session_id}: {e}")
             return None
     
-    def delete_session(self, session_id: str) -> bool:
+    async def delete_session(self, session_id: str) -> bool:
         """
         Delete session from Redis
         
@@ -96,13 +155,13 @@ class RedisSessionManager:
             bool: True if deleted, False otherwise
         """
         try:
-            result = self.client.delete(f"session:{session_id}")
+            result = await self.client.delete(f"session:{session_id}")
             return result > 0
         except Exception as e:
             print(f"[Redis] Error deleting session {session_id}: {e}")
             return False
     
-    def update_session(
+    async def update_session(
         self,
         session_id: str,
         data: Dict[str, Any],
@@ -121,28 +180,21 @@ class RedisSessionManager:
         """
         try:
             key = f"session:{session_id}"
+            json_data = json.dumps(data)
             
             if keep_ttl:
-                # Get remaining TTL
-                ttl = self.client.ttl(key)
-                if ttl <= 0:
-                    # Session expired or doesn't exist
-                    return False
-                
-                # Update with same TTL
-                json_data = json.dumps(data)
-                self.client.setex(name=key, time=ttl, value=json_data)
-            else:
-                # Update without TTL (will persist)
-                json_data = json.dumps(data)
-                self.client.set(key, json_data)
+                # Only if the session still exists, keeping its TTL (SET XX KEEPTTL)
+                result = await self.client.set(key, json_data, xx=True, keepttl=True)
+                return bool(result)
             
+            # Update without TTL (will persist)
+            await self.client.set(key, json_data)
             return True
         except Exception as e:
             print(f"[Redis] Error updating session {session_id}: {e}")
             return False
     
-    def session_exists(self, session_id: str) -> bool:
+    async def session_exists(self, session_id: str) -> bool:
         """
         Check if session exists in Redis
         
@@ -153,12 +205,12 @@ class RedisSessionManager:
             bool: True if exists, False otherwise
         """
         try:
-            return self.client.exists(f"session:{session_id}") > 0
+            return await self.client.exists(f"session:{session_id}") > 0
         except Exception as e:
             print(f"[Redis] Error checking session {session_id}: {e}")
             return False
     
-    def get_session_ttl(self, session_id: str) -> int:
+    async def get_session_ttl(self, session_id: str) -> int:
         """
         Get remaining time to live for session
         
@@ -169,12 +221,12 @@ class RedisSessionManager:
             int: Remaining seconds (-1 if no expiry, -2 if doesn't exist)
         """
         try:
-            return self.client.ttl(f"session:{session_id}")
+            return await self.client.ttl(f"session:{session_id}")
         except Exception as e:
             print(f"[Redis] Error getting TTL for session {session_id}: {e}")
             return -2
     
-    def extend_session(self, session_id: str, additional_seconds: int) -> bool:
+    async def extend_session(self, session_id: str, additional_seconds: int) -> bool:
         """
         Extend session expiration time
         
@@ -186,15 +238,8 @@ class RedisSessionManager:
             bool: True if successful, False otherwise
         """
         try:
-            key = f"session:{session_id}"
-            current_ttl = self.client.ttl(key)
-            
-            if current_ttl <= 0:
-                return False
-            
-            new_ttl = current_ttl + additional_seconds
-            self.client.expire(key, new_ttl)
-            return True
+            extended = await self._extend_ttl(keys=[f"session:{session_id}"], args=[int(additional_seconds)])
+            return extended == 1
         except Exception as e:
             print(f"[Redis] Error extending session {session_id}: {e}")
             return False
@@ -203,7 +248,11 @@ class RedisSessionManager:
 class TwoFactorSessionManager(RedisSessionManager):
     """Specialized manager for 2FA sessions"""
     
-    def create_2fa_session(
+    def __init__(self, client: aioredis.Redis):
+        super().__init__(client)
+        self._verify_code = client.register_script(VERIFY_2FA_SCRIPT)
+    
+    async def create_2fa_session(
         self,
         session_id: str,
         user_id: str,
@@ -232,13 +281,13 @@ class TwoFactorSessionManager(RedisSessionManager):
             'created_at': str(timedelta(seconds=0))  # Will be replaced by Redis timestamp
         }
         
-        return self.set_session(
+        return await self.set_session(
             session_id=session_id,
             data=data,
             expiry_seconds=expiry_minutes * 60
         )
     
-    def verify_2fa_code(self, session_id: str, code: str) -> Optional[Dict[str, Any]]:
+    async def verify_2fa_code(self, session_id: str, code: str) -> Optional[Dict[str, Any]]:
         """
         Verify 2FA code and return session data if valid
         
@@ -249,27 +298,27 @@ class TwoFactorSessionManager(RedisSessionManager):
         Returns:
             dict: Session data if code is valid, None otherwise
         """
-        session = self.get_session(session_id)
+        try:
+            result = await self._verify_code(keys=[f"session:{session_id}"], args=[code])
+        except Exception as e:
+            print(f"[Redis] Error verifying 2FA session {session_id}: {e}")
+            return None
         
-        if session is None:
+        if result[0] == 'missing':
             print(f"[2FA] Session {session_id} not found or expired")
             return None
         
-        if session.get('code') != code:
+        if result[0] == 'invalid':
             print(f"[2FA] Invalid code for session {session_id}")
             return None
         
-        if session.get('verified'):
+        if result[0] == 'used':
             print(f"[2FA] Session {session_id} already verified")
             return None
         
-        # Mark as verified
-        session['verified'] = True
-        self.update_session(session_id, session)
-        
-        return session
+        return json.loads(result[1])
     
-    def invalidate_2fa_session(self, session_id: str) -> bool:
+    async def invalidate_2fa_session(self, session_id: str) -> bool:
         """
         Invalidate (delete) a 2FA session
         
@@ -279,16 +328,277 @@ class TwoFactorSessionManager(RedisSessionManager):
         Returns:
             bool: True if deleted, False otherwise
         """
-        return self.delete_session(session_id)
+        return await self.delete_session(session_id)
+
+
+class TokenVersionManager:
+    """
+    Per-user token version counter used to revoke claims-mode access tokens.
+
+    Tokens embed the version current at issue time; bumping the counter makes
+    every older token stale. Lookups are cached in-process for a few seconds
+    so revocation takes effect within that window without a Redis round trip
+    on every request. The in-process cache is an LRU of at most
+    max_entries users. After a failed lookup Redis is not asked again for
+    failure_ttl_seconds, so an outage sends requests straight to the
+    database instead of each waiting out the socket timeout.
+    """
+    
+    def __init__(
+        self,
+        client: aioredis.Redis,
+        local_ttl_seconds: float = 2.0,
+        max_entries: int = TOKEN_VERSION_CACHE_MAX_ENTRIES,
+        failure_ttl_seconds: float = TOKEN_VERSION_FAILURE_TTL_SECONDS
+    ):
+        self.client = client
+        self.local_ttl_seconds = local_ttl_seconds
+        self.max_entries = max_entries
+        self.failure_ttl_seconds = failure_ttl_seconds
+        self._local: "OrderedDict[str, Tuple[float, int]]" = OrderedDict()
+        self._unavailable_until = 0.0
+    
+    async def get_version(self, user_id: str) -> Optional[int]:
+        """
+        Get the current token version for a user
+        
+        Args:
+            user_id: User ID
+        
+        Returns:
+            int: Current version (0 if never bumped), None if Redis is unavailable
+        """
+        key = str(user_id)
+        cached = self._local.get(key)
+        now = time.monotonic()
+        if cached is not None:
+            if cached[0] > now:
+                self._local.move_to_end(key)
+                return cached[1]
+            del self._local[key]
+        if now < self._unavailable_until:
+            return None
+        
+        try:
+            value = await self.client.get(f"token_version:{key}")
+            version = int(value) if value is not None else 0
+        except Exception as e:
+            print(f"[Redis] Error getting token version for {user_id}: {e}")
+            self._unavailable_until = time.monotonic() + self.failure_ttl_seconds
+            return None
+        
+        self._local[key] = (now + self.local_ttl_seconds, version)
+        self._local.move_to_end(key)
+        while len(self._local) > self.max_entries:
+            self._local.popitem(last=False)
+        return version
+    
+    async def bump_version(self, user_id: str) -> bool:
+        """
+        Invalidate every outstanding claims token for a user. Always tries
+        Redis, even while lookups are backing off.
+        
+        Args:
+            user_id: User ID
+        
+        Returns:
+            bool: True if successful, False otherwise
+        """
+        key = str(user_id)
+        self._local.pop(key, None)
+        try:
+            await self.client.incr(f"token_version:{key}")
+            return True
+        except Exception as e:
+            print(f"[Redis] Error bumping token version for {user_id}: {e}")
+            return False
+
+
+class UploadSessionManager:
+    """
+    State of resumable uploads (utils/resumable_upload.py).
+
+    The session itself is JSON under upload:{id}; chunks received so far are
+    a hash of chunk index -> JSON {etag, size} under upload:{id}:chunks, so
+    chunks arriving in parallel never overwrite each other. Both keys expire
+    together and every stored chunk pushes the expiry back.
+    """
+    
+    def __init__(self, client: aioredis.Redis):
+        self.client = client
+    
+    async def create_upload(self, upload_id: str, data: Dict[str, Any], expiry_seconds: int) -> bool:
+        """
+        Store a new upload session
+        
+        Args:
+            upload_id: Unique upload identifier
+            data: Session data to store
+            expiry_seconds: Time to live without activity
+        
+        Returns:
+            bool: True if successful, False otherwise
+        """
+        try:
+            await self.client.setex(f"upload:{upload_id}", expiry_seconds, json.dumps(data))
+            return True
+        except Exception as e:
+            print(f"[Redis] Error creating upload {upload_id}: {e}")
+            return False
+    
+    async def get_upload(self, upload_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Retrieve an upload session
+        
+        Args:
+            upload_id: Unique upload identifier
+        
+        Returns:
+            dict: Session data if found, None otherwise
+        """
+        try:
+            json_data = await self.client.get(f"upload:{upload_id}")
+            return json.loads(json_data) if json_data is not None else None
+        except Exception as e:
+            print(f"[Redis] Error getting upload {upload_id}: {e}")
+            return None
+    
+    async def record_chunk(self, upload_id: str, index: int, etag: str, size: int, expiry_seconds: int) -> bool:
+        """
+        Mark a chunk as received and extend the session's expiry
+        
+        Args:
+            upload_id: Unique upload identifier
+            index: Chunk number, from 0
+            etag: Storage ETag of the chunk
+            size: Chunk size in bytes
+            expiry_seconds: Time to live from now
+        
+        Returns:
+            bool: True if successful, False otherwise
+        """
+        try:
+            async with self.client.pipeline(transaction=False) as pipe:
+                pipe.hset(f"upload:{upload_id}:chunks", str(index), json.dumps({"etag": etag, "size": size}))
+                pipe.expire(f"upload:{upload_id}:chunks", expiry_seconds)
+                pipe.expire(f"upload:{upload_id}", expiry_seconds)
+                await pipe.execute()
+            return True
+        except Exception as e:
+            print(f"[Redis] Error recording chunk {index} of upload {upload_id}: {e}")
+            return False
+    
+    async def get_chunks(self, upload_id: str) -> Optional[Dict[int, Dict[str, Any]]]:
+        """
+        Get the chunks received so far
+        
+        Args:
+            upload_id: Unique upload identifier
+        
+        Returns:
+            dict: {chunk index: {etag, size}}, None if Redis is unavailable
+        """
+        try:
+            chunks = await self.client.hgetall(f"upload:{upload_id}:chunks")
+            return {int(index): json.loads(value) for index, value in chunks.items()}
+        except Exception as e:
+            print(f"[Redis] Error getting chunks of upload {upload_id}: {e}")
+            return None
+    
+    async def get_upload_ttl(self, upload_id: str) -> int:
+        """
+        Get remaining time to live for an upload session
+        
+        Args:
+            upload_id: Unique upload identifier
+        
+        Returns:
+            int: Remaining seconds (-1 if no expiry, -2 if doesn't exist)
+        """
+        try:
+            return await self.client.ttl(f"upload:{upload_id}")
+        except Exception as e:
+            print(f"[Redis] Error getting TTL for upload {upload_id}: {e}")
+            return -2
+    
+    async def claim_completion(self, upload_id: str, lock_seconds: int) -> bool:
+        """
+        Take the right to complete (or abort) an upload, once
+        
+        Args:
+            upload_id: Unique upload identifier
+            lock_seconds: How long the claim holds if never released
+        
+        Returns:
+            bool: True if this caller holds the claim, False otherwise
+        """
+        try:
+            return bool(await self.client.set(f"upload:{upload_id}:completing", "1", nx=True, ex=lock_seconds))
+        except Exception as e:
+            print(f"[Redis] Error claiming upload {upload_id}: {e}")
+            return False
+    
+    async def is_completing(self, upload_id: str) -> bool:
+        """
+        Check whether an upload is being completed or aborted
+        
+        Args:
+            upload_id: Unique upload identifier
+        
+        Returns:
+            bool: True if claimed, False otherwise
+        """
+        try:
+            return await self.client.exists(f"upload:{upload_id}:completing") > 0
+        except Exception as e:
+            print(f"[Redis] Error checking upload {upload_id}: {e}")
+            return False
+    
+    async def release_completion(self, upload_id: str) -> bool:
+        """
+        Give up a completion claim, e.g. after a failed completion
+        
+        Args:
+            upload_id: Unique upload identifier
+        
+        Returns:
+            bool: True if released, False otherwise
+        """
+        try:
+            return await self.client.delete(f"upload:{upload_id}:completing") > 0
+        except Exception as e:
+            print(f"[Redis] Error releasing upload {upload_id}: {e}")
+            return False
+    
+    async def delete_upload(self, upload_id: str) -> bool:
+        """
+        Delete an upload session with its chunk list and claim
+        
+        Args:
+            upload_id: Unique upload identifier
+        
+        Returns:
+            bool: True if deleted, False otherwise
+        """
+        try:
+            result = await self.client.delete(
+                f"upload:{upload_id}", f"upload:{upload_id}:chunks", f"upload:{upload_id}:completing"
+            )
+            return result > 0
+        except Exception as e:
+            print(f"[Redis] Error deleting upload {upload_id}: {e}")
+            return False
 
 
 # Initialize managers
-session_manager = RedisSessionManager(redis_client)
-two_fa_manager = TwoFactorSessionManager(redis_client)
+session_manager = RedisSessionManager(async_redis_client)
+two_fa_manager = TwoFactorSessionManager(async_redis_client)
+token_version_manager = TokenVersionManager(async_redis_client)
+upload_session_manager = UploadSessionManager(async_redis_client)
 
 
 # Health check function
-def check_redis_connection() -> bool:
+async def check_redis_connection() -> bool:
     """
     Check if Redis is connected and responsive
     
@@ -296,8 +606,12 @@ def check_redis_connection() -> bool:
         bool: True if connected, False otherwise
     """
     try:
-        return redis_client.ping()
+        return await async_redis_client.ping()
     except Exception as e:
         print(f"[Redis] Connection check failed: {e}")
         return False
 
+
+async def close_redis_connections() -> None:
+    """Close the asyncio client's pooled connections (application shutdown)"""
+    await async_redis_client.connection_pool.disconnect()
@@ -0,0 +1,292 @@
+"""
+Result cache for expensive read endpoints (admin dashboard, analytics)
+
+@cached(...) wraps an async router function. Results are stored JSON-encoded
+at two levels:
+- L1: in-process LRU, trusted for at most RESULT_CACHE_L1_TTL_SECONDS
+- L2: Redis, shared by all workers
+
+Each entry is fresh for `ttl` seconds and may then be served stale for
+another `stale_ttl` seconds while one background task recomputes it
+(stale-while-revalidate). Concurrent misses for the same key in a process
+share one computation (single-flight); across workers, a short Redis lock
+keeps background refreshes to one at a time.
+
+Entries carry tags ("users", "courses", "enrollments", "progress", ...). Writes call
+invalidate_tags(), which bumps a version counter per tag in Redis. An entry
+recorded with an older tag version counts as stale: it is still served
+within its stale window, but the next read refreshes it. Other workers may
+serve their L1 copy for up to RESULT_CACHE_L1_TTL_SECONDS after a write.
+"""
+import asyncio
+import hashlib
+import json
+import os
+import time
+from collections import OrderedDict
+from functools import wraps
+from typing import Any, Awaitable, Callable, Dict, Iterable, Optional, Tuple
+from dotenv import load_dotenv
+from fastapi.encoders import jsonable_encoder
+
+from utils.redis_client import async_redis_client
+
+load_dotenv()
+
+RESULT_CACHE_ENABLED = os.getenv("RESULT_CACHE_ENABLED", "true").lower() == "true"
+RESULT_CACHE_MAX_ENTRIES = int(os.getenv("RESULT_CACHE_MAX_ENTRIES", "1000"))
+RESULT_CACHE_L1_TTL_SECONDS = float(os.getenv("RESULT_CACHE_L1_TTL_SECONDS", "5"))
+# How long a worker holds the right to refresh a stale entry
+RESULT_CACHE_REFRESH_LOCK_SECONDS = int(os.getenv("RESULT_CACHE_REFRESH_LOCK_SECONDS", "30"))
+
+KEY_PREFIX = "result_cache"
+
+# Request-scoped arguments that never change the result of a cached function
+DEFAULT_IGNORED_ARGUMENTS = ("current_user",)
+
+
+class CacheEntry:
+    def __init__(self, value: Any, fresh_until: float, stale_until: float, tag_versions: Dict[str, int]):
+        self.value = value
+        self.fresh_until = fresh_until
+        self.stale_until = stale_until
+        self.tag_versions = tag_versions
+
+    def to_json(self) -> str:
+        return json.dumps({
+            "value": self.value,
+            "fresh_until": self.fresh_until,
+            "stale_until": self.stale_until,
+            "tag_versions": self.tag_versions,
+        })
+
+    @classmethod
+    def from_json(cls, data: str) -> "CacheEntry":
+        entry = json.loads(data)
+        return cls(entry["value"], entry["fresh_until"], entry["stale_until"], entry["tag_versions"])
+
+
+class ResultCache:
+    """Two-level result cache with tag versions and single-flight refreshes"""
+
+    def __init__(
+        self,
+        client=async_redis_client,
+        enabled: bool = RESULT_CACHE_ENABLED,
+        max_entries: int = RESULT_CACHE_MAX_ENTRIES,
+        l1_ttl: float = RESULT_CACHE_L1_TTL_SECONDS
+    ):
+        self.client = client
+        self.enabled = enabled
+        self.max_entries = max_entries
+        self.l1_ttl = l1_ttl
+        # key -> (trusted until, tags, entry)
+        self._l1: "OrderedDict[str, Tuple[float, Tuple[str, ...], CacheEntry]]" = OrderedDict()
+        self._inflight: Dict[str, asyncio.Task] = {}
+        self.stats = {
+            "l1_hits": 0, "l2_hits": 0, "stale_hits": 0, "misses": 0,
+            "refreshes": 0, "invalidations": 0
+        }
+
+    @staticmethod
+    def _tag_key(tag: str) -> str:
+        return f"{KEY_PREFIX}:tag:{tag}"
+
+    async def _tag_versions(self, tags: Tuple[str, ...]) -> Dict[str, int]:
+        if not tags:
+            return {}
+        versions = await self.client.mget([self._tag_key(tag) for tag in tags])
+        return {tag: int(version or 0) for tag, version in zip(tags, versions)}
+
+    async def _read(self, key: str, tags: Tuple[str, ...]) -> Tuple[Optional[CacheEntry], bool]:
+        """Return (entry, stale) for a key, or (None, False) on a miss"""
+        now = time.time()
+        cached = self._l1.get(key)
+        if cached is not None:
+            trusted_until, _, entry = cached
+            if trusted_until > time.monotonic() and entry.fresh_until > now:
+                self._l1.move_to_end(key)
+                self.stats["l1_hits"] += 1
+                return entry, False
+            del self._l1[key]
+
+        try:
+            pipe = self.client.pipeline()
+            pipe.get(key)
+            pipe.mget([self._tag_key(tag) for tag in tags] or [self._tag_key("_")])
+            data, versions = await pipe.execute()
+        except Exception as e:
+            print(f"[ResultCache] Error reading {key}: {e}")
+            return None, False
+
+        if data is None:
+            return None, False
+        entry = CacheEntry.from_json(data)
+        if entry.stale_until <= now:
+            return None, False
+
+        current = {tag: int(version or 0) for tag, version in zip(tags, versions)}
+        invalidated = any(entry.tag_versions.get(tag, 0) != version for tag, version in current.items())
+        if invalidated or entry.fresh_until <= now:
+            return entry, True
+
+        self._store_l1(key, tags, entry)
+        self.stats["l2_hits"] += 1
+        return entry, False
+
+    async def _write(self, key: str, tags: Tuple[str, ...], entry: CacheEntry):
+        self._store_l1(key, tags, entry)
+        try:
+            ttl = max(1, int(entry.stale_until - time.time()) + 1)
+            await self.client.set(key, entry.to_json(), ex=ttl)
+        except Exception as e:
+            print(f"[ResultCache] Error writing {key}: {e}")
+
+    def _store_l1(self, key: str, tags: Tuple[str, ...], entry: CacheEntry):
+        self._l1[key] = (time.monotonic() + self.l1_ttl, tags, entry)
+        self._l1.move_to_end(key)
+        while len(self._l1) > self.max_entries:
+            self._l1.popitem(last=False)
+
+    async def _compute(
+        self,
+        key: str,
+        tags: Tuple[str, ...],
+        ttl: int,
+        stale_ttl: int,
+        compute: Callable[[], Awaitable[Any]]
+    ) -> Any:
+        # Read the tag versions first, so a write that lands during the
+        # computation leaves the new entry already outdated
+        try:
+            tag_versions = await self._tag_versions(tags)
+        except Exception as e:
+            print(f"[ResultCache] Error reading tag versions: {e}")
+            tag_versions = {}
+        value = jsonable_encoder(await compute())
+        now = time.time()
+        await self._write(key, tags, CacheEntry(value, now + ttl, now + ttl + stale_ttl, tag_versions))
+        return value
+
+    def _single_flight(self, key: str, factory: Callable[[], Awaitable[Any]]) -> asyncio.Task:
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(factory())
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        return task
+
+    async def _refresh(self, key: str, tags, ttl, stale_ttl, compute):
+        """Background refresh of a stale entry, one worker at a time"""
+        try:
+            if not await self.client.set(f"{key}:refreshing", "1", nx=True, ex=RESULT_CACHE_REFRESH_LOCK_SECONDS):
+                return
+        except Exception as e:
+            print(f"[ResultCache] Error locking {key}: {e}")
+            return
+        try:
+            await self._compute(key, tags, ttl, stale_ttl, compute)
+            self.stats["refreshes"] += 1
+        except Exception as e:
+            print(f"[ResultCache] Refresh of {key} failed: {e}")
+        finally:
+            try:
+                await self.client.delete(f"{key}:refreshing")
+            except Exception:
+                pass
+
+    async def get_or_compute(
+        self,
+        key: str,
+        tags: Iterable[str],
+        ttl: int,
+        stale_ttl: int,
+        compute: Callable[[], Awaitable[Any]]
+    ) -> Any:
+        """Return the cached result for key, computing it when missing"""
+        tags = tuple(tags)
+        if not self.enabled:
+            return await compute()
+
+        entry, stale = await self._read(key, tags)
+        if entry is not None and not stale:
+            return entry.value
+        if entry is not None:
+            self.stats["stale_hits"] += 1
+            self._single_flight(f"{key}:refresh", lambda: self._refresh(key, tags, ttl, stale_ttl, compute))
+            return entry.value
+
+        self.stats["misses"] += 1
+        return await asyncio.shield(
+            self._single_flight(key, lambda: self._compute(key, tags, ttl, stale_ttl, compute))
+        )
+
+    async def invalidate_tags(self, *tags: str):
+        """Mark every entry carrying one of the tags as stale"""
+        for key in [k for k, (_, entry_tags, _) in self._l1.items() if set(entry_tags) & set(tags)]:
+            del self._l1[key]
+
+        self.stats["invalidations"] += 1
+        try:
+            pipe = self.client.pipeline()
+            for tag in tags:
+                pipe.incr(self._tag_key(tag))
+            await pipe.execute()
+        except Exception as e:
+            print(f"[ResultCache] Error invalidating tags {tags}: {e}")
+
+    def get_stats(self) -> Dict[str, Any]:
+        hits = self.stats["l1_hits"] + self.stats["l2_hits"] + self.stats["stale_hits"]
+        total = hits + self.stats["misses"]
+        return {
+            **self.stats,
+            "l1_size": len(self._l1),
+            "hit_rate": round(hits / total, 4) if total else 0.0
+        }
+
+
+result_cache = ResultCache()
+
+
+def _cache_key(namespace: str, arguments: Dict[str, Any]) -> str:
+    encoded = json.dumps(jsonable_encoder(arguments), sort_keys=True)
+    digest = hashlib.sha1(encoded.encode()).hexdigest()
+    return f"{KEY_PREFIX}:{namespace}:{digest}"
+
+
+def cached(
+    namespace: str,
+    ttl: int,
+    tags: Iterable[str] = (),
+    stale_ttl: int = 0,
+    per_user: bool = False,
+    ignore: Iterable[str] = DEFAULT_IGNORED_ARGUMENTS
+):
+    """
+    Cache the result of an async router function.
+
+    The key is built from the keyword arguments FastAPI passes in, minus
+    `ignore`. Set per_user when the function checks permissions itself, so
+    one user's result is never served to another.
+    """
+    tags = tuple(tags)
+    ignored = set(ignore)
+
+    def decorator(func):
+        @wraps(func)
+        async def wrapper(**kwargs):
+            arguments = {name: value for name, value in kwargs.items() if name not in ignored}
+            if per_user:
+                current_user = kwargs.get("current_user")
+                arguments["_user"] = str(current_user.id) if current_user is not None else None
+            key = _cache_key(namespace, arguments)
+            return await result_cache.get_or_compute(
+                key, tags, ttl, stale_ttl, lambda: func(**kwargs)
+            )
+        return wrapper
+    return decorator
+
+
+async def invalidate_tags(*tags: str):
+    """Call after a write that changes data behind cached results"""
+    await result_cache.invalidate_tags(*tags)
@@ -0,0 +1,262 @@
+"""
+Resumable uploads
+
+Large media is sent as a session of fixed-size numbered chunks instead of
+one long request, so a dropped connection costs only the chunk in flight:
+
+1. create_session() fixes the storage key and chunk size and starts a
+   multipart upload with the storage provider.
+2. put_chunk() stores chunk N as part N + 1, straight to S3 or to a part
+   file for local storage. Chunks can arrive in any order, in parallel or
+   again; a resent chunk replaces the earlier one.
+3. status() lists the byte ranges received, so a client that lost track
+   resends only what is missing.
+4. complete() joins the parts (S3 CompleteMultipartUpload, or concatenation
+   on disk) once every chunk is in.
+
+Session state lives in Redis (UploadSessionManager) and expires after
+RESUMABLE_UPLOAD_TTL_SECONDS without a chunk; each request only holds a
+worker for one chunk. Parts of expired sessions stay behind, so buckets
+should have an AbortIncompleteMultipartUpload lifecycle rule.
+"""
+import os
+import uuid
+from datetime import datetime, timedelta
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+from fastapi import HTTPException
+
+from utils.file_upload import (
+    FileUploadProvider, file_upload_service, STORAGE_PART_SIZE
+)
+from utils.redis_client import UploadSessionManager, upload_session_manager
+
+# Chunks are this size (except the last), never below the S3 minimum part
+# size, and grow for uploads that would otherwise exceed MAX_UPLOAD_PARTS
+RESUMABLE_CHUNK_SIZE = max(int(os.getenv("RESUMABLE_CHUNK_SIZE", str(8 * 1024 * 1024))), STORAGE_PART_SIZE)
+RESUMABLE_UPLOAD_TTL_SECONDS = int(os.getenv("RESUMABLE_UPLOAD_TTL_SECONDS", str(24 * 3600)))
+MAX_RESUMABLE_VIDEO_SIZE = int(os.getenv("MAX_RESUMABLE_VIDEO_SIZE", str(10 * 1024 * 1024 * 1024)))  # 10GB
+MAX_UPLOAD_PARTS = 10000  # S3 limit
+COMPLETION_LOCK_SECONDS = 600
+
+
+def chunk_size_for(size: int) -> int:
+    """Chunk size for an upload of `size` bytes, in whole megabytes"""
+    megabyte = 1024 * 1024
+    needed = -(-size // MAX_UPLOAD_PARTS)
+    return max(RESUMABLE_CHUNK_SIZE, -(-needed // megabyte) * megabyte)
+
+
+def chunk_count(size: int, chunk_size: int) -> int:
+    return max(1, -(-size // chunk_size))
+
+
+def chunk_length(session: Dict[str, Any], index: int) -> int:
+    """Expected byte length of chunk `index`"""
+    offset = index * session["chunk_size"]
+    return min(session["chunk_size"], session["size"] - offset)
+
+
+def received_ranges(session: Dict[str, Any], indexes) -> List[List[int]]:
+    """Received chunks as merged [start, end) byte ranges"""
+    ranges: List[List[int]] = []
+    for index in sorted(indexes):
+        start = index * session["chunk_size"]
+        end = start + chunk_length(session, index)
+        if ranges and ranges[-1][1] == start:
+            ranges[-1][1] = end
+        else:
+            ranges.append([start, end])
+    return ranges
+
+
+class ResumableUploadService:
+    """Create, fill and complete resumable upload sessions"""
+
+    def __init__(
+        self,
+        provider: Optional[FileUploadProvider] = None,
+        sessions: UploadSessionManager = upload_session_manager
+    ):
+        self.provider = provider or file_upload_service.provider
+        self.sessions = sessions
+
+    async def create_session(
+        self,
+        owner_id: str,
+        filename: str,
+        content_type: str,
+        size: int,
+        prefix: str,
+        allowed_types: Dict[str, str],
+        max_size: int,
+        target: Optional[Dict[str, Any]] = None
+    ) -> Dict[str, Any]:
+        """Validate the announced file and open a session for its chunks"""
+        if content_type not in allowed_types:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Invalid file type. Allowed types: {list(allowed_types.keys())}"
+            )
+        if size <= 0:
+            raise HTTPException(status_code=400, detail="File size must be positive")
+        if size > max_size:
+            raise HTTPException(
+                status_code=413,
+                detail=f"File too large. Maximum size is {max_size // (1024*1024)}MB"
+            )
+
+        key = file_upload_service.generate_filename(filename, prefix)
+        upload_id = uuid.uuid4().hex
+        chunk_size = chunk_size_for(size)
+        storage_upload_id = await self.provider.start_multipart(key, content_type)
+        session = {
+            "upload_id": upload_id,
+            "owner_id": str(owner_id),
+            "filename": key,
+            "original_filename": filename,
+            "content_type": content_type,
+            "size": size,
+            "chunk_size": chunk_size,
+            "total_chunks": chunk_count(size, chunk_size),
+            "storage_upload_id": storage_upload_id,
+            "target": target or {},
+            "created_at": datetime.utcnow().isoformat(),
+        }
+        if not await self.sessions.create_upload(upload_id, session, RESUMABLE_UPLOAD_TTL_SECONDS):
+            await self.provider.abort_multipart(key, storage_upload_id)
+            raise HTTPException(status_code=503, detail="Upload sessions are unavailable")
+
+        return {**await self._public(session), "received_ranges": [], "missing_chunks": list(range(session["total_chunks"]))}
+
+    async def get_session(self, upload_id: str, user) -> Dict[str, Any]:
+        """Session for `upload_id`, if it exists and belongs to `user` (or user is an admin)"""
+        session = await self.sessions.get_upload(upload_id)
+        if session is None:
+            raise HTTPException(status_code=404, detail="Upload not found or expired")
+        if user.role != "admin" and session["owner_id"] != str(user.id):
+            raise HTTPException(status_code=403, detail="Not authorized to access this upload")
+        return session
+
+    async def put_chunk(
+        self,
+        session: Dict[str, Any],
+        index: int,
+        body: AsyncIterator[bytes],
+        offset: Optional[int] = None
+    ) -> Dict[str, Any]:
+        """
+        Store chunk `index` from a request body. `offset`, when sent, must be
+        where the chunk starts; the body must be exactly the chunk's length.
+        """
+        upload_id = session["upload_id"]
+        if not 0 <= index < session["total_chunks"]:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Chunk index must be between 0 and {session['total_chunks'] - 1}"
+            )
+        if offset is not None and offset != index * session["chunk_size"]:
+            raise HTTPException(
+                status_code=409,
+                detail=f"Chunk {index} starts at offset {index * session['chunk_size']}"
+            )
+        if await self.sessions.is_completing(upload_id):
+            raise HTTPException(status_code=409, detail="Upload is being completed")
+
+        expected = chunk_length(session, index)
+        content = bytearray()
+        async for data in body:
+            content += data
+            if len(content) > expected:
+                raise HTTPException(
+                    status_code=413,
+                    detail=f"Chunk {index} must be {expected} bytes"
+                )
+        if len(content) != expected:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Chunk {index} must be {expected} bytes, received {len(content)}"
+            )
+
+        etag = await self.provider.upload_part(
+            session["filename"], session["storage_upload_id"], index + 1, bytes(content)
+        )
+        if not await self.sessions.record_chunk(upload_id, index, etag, expected, RESUMABLE_UPLOAD_TTL_SECONDS):
+            raise HTTPException(status_code=503, detail="Upload sessions are unavailable")
+
+        return await self.status(session)
+
+    async def _received(self, session: Dict[str, Any]) -> Dict[int, Dict[str, Any]]:
+        chunks = await self.sessions.get_chunks(session["upload_id"])
+        if chunks is None:
+            raise HTTPException(status_code=503, detail="Upload sessions are unavailable")
+        return chunks
+
+    async def _public(self, session: Dict[str, Any]) -> Dict[str, Any]:
+        ttl = await self.sessions.get_upload_ttl(session["upload_id"])
+        return {
+            "upload_id": session["upload_id"],
+            "filename": session["original_filename"],
+            "content_type": session["content_type"],
+            "size": session["size"],
+            "chunk_size": session["chunk_size"],
+            "total_chunks": session["total_chunks"],
+            "expires_at": datetime.utcnow() + timedelta(seconds=ttl) if ttl > 0 else None,
+        }
+
+    async def status(self, session: Dict[str, Any]) -> Dict[str, Any]:
+        """Received byte ranges and the chunk indexes still missing"""
+        chunks = await self._received(session)
+        return {
+            **await self._public(session),
+            "received_bytes": sum(chunk["size"] for chunk in chunks.values()),
+            "received_ranges": received_ranges(session, chunks.keys()),
+            "missing_chunks": [index for index in range(session["total_chunks"]) if index not in chunks],
+        }
+
+    async def complete(self, session: Dict[str, Any]) -> Dict[str, Any]:
+        """Join all chunks into the stored file and close the session"""
+        upload_id = session["upload_id"]
+        if not await self.sessions.claim_completion(upload_id, COMPLETION_LOCK_SECONDS):
+            raise HTTPException(status_code=409, detail="Upload is already being completed")
+
+        try:
+            chunks = await self._received(session)
+            missing = [index for index in range(session["total_chunks"]) if index not in chunks]
+            if missing:
+                raise HTTPException(
+                    status_code=409,
+                    detail=f"Upload is missing {len(missing)} chunks, first {missing[:20]}"
+                )
+            url = await self.provider.complete_multipart(
+                session["filename"], session["storage_upload_id"],
+                {index + 1: chunk["etag"] for index, chunk in chunks.items()}
+            )
+        except BaseException:
+            await self.sessions.release_completion(upload_id)
+            raise
+
+        await self.sessions.delete_upload(upload_id)
+        return {
+            "filename": session["filename"],
+            "original_filename": session["original_filename"],
+            "url": url,
+            "content_type": session["content_type"],
+            "size": session["size"],
+            "uploaded_at": datetime.utcnow()
+        }
+
+    async def abort(self, session: Dict[str, Any]) -> None:
+        """Discard the chunks received and close the session"""
+        upload_id = session["upload_id"]
+        if not await self.sessions.claim_completion(upload_id, COMPLETION_LOCK_SECONDS):
+            raise HTTPException(status_code=409, detail="Upload is being completed")
+        try:
+            await self.provider.abort_multipart(session["filename"], session["storage_upload_id"])
+        except Exception as e:
+            print(f"[Uploads] Failed to discard parts of upload {upload_id}: {e}")
+        await self.sessions.delete_upload(upload_id)
+
+
+# Initialize resumable upload service
+resumable_upload_service = ResumableUploadService()
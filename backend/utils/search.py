@@ -0,0 +1,118 @@
+"""
+Shared search query builder
+
+Courses, lessons, assignments and categories are matched against the
+tsvector documents in the *_search_documents tables (kept current by the
+triggers in scripts/010_add_full_text_search.sql). Every word of the search
+term must match, and each word also matches as a prefix, so typing "pyth"
+finds "Python".
+
+User names, emails and usernames stay substring matches (ILIKE) backed by
+trigram indexes.
+"""
+import html
+import re
+from typing import Any, Dict, Optional
+
+SEARCH_CONFIG = "english"
+
+# entity -> (documents table, key column)
+SEARCH_DOCUMENTS = {
+    "courses": ("course_search_documents", "course_id"),
+    "lessons": ("lesson_search_documents", "lesson_id"),
+    "assignments": ("assignment_search_documents", "assignment_id"),
+    "categories": ("category_search_documents", "category_id"),
+}
+
+# ts_headline markers; swapped for <mark> after the text is HTML-escaped
+HIGHLIGHT_START = "[[mark]]"
+HIGHLIGHT_STOP = "[[/mark]]"
+HIGHLIGHT_OPTIONS = (
+    f"StartSel={HIGHLIGHT_START}, StopSel={HIGHLIGHT_STOP}, "
+    "MaxWords=30, MinWords=10, MaxFragments=2"
+)
+
+
+def prefix_tsquery(term: str) -> Optional[str]:
+    """Turn free text into a tsquery string: every word, each as a prefix"""
+    words = re.findall(r"\w+", term.lower())
+    if not words:
+        return None
+    return " & ".join(f"{word}:*" for word in words)
+
+
+def render_highlight(fragment: Optional[str]) -> Optional[str]:
+    """HTML-escape a ts_headline fragment and turn its markers into <mark> tags"""
+    if fragment is None:
+        return None
+    return (
+        html.escape(fragment)
+        .replace(HIGHLIGHT_START, "<mark>")
+        .replace(HIGHLIGHT_STOP, "</mark>")
+    )
+
+
+class TextSearch:
+    """SQL fragments for one search term; each method adds its bind values"""
+
+    def __init__(self, term: str, param: str = "search_query"):
+        self.term = term.strip()
+        self.param = param
+        self.tsquery = prefix_tsquery(self.term)
+
+    @property
+    def query_sql(self) -> str:
+        return f"to_tsquery('{SEARCH_CONFIG}', :{self.param})"
+
+    def _bind_query(self, values: Dict[str, Any]):
+        values[self.param] = self.tsquery
+
+    def document_ids(self, entity: str, values: Dict[str, Any]) -> str:
+        """Subquery selecting the ids of `entity` rows whose document matches"""
+        table, key = SEARCH_DOCUMENTS[entity]
+        if not self.tsquery:
+            return f"SELECT {key} FROM {table} WHERE FALSE"
+        self._bind_query(values)
+        return f"SELECT {key} FROM {table} WHERE document @@ {self.query_sql}"
+
+    def matches(self, entity: str, id_column: str, values: Dict[str, Any]) -> str:
+        """Condition: the row identified by id_column matches the term"""
+        return f"{id_column} IN ({self.document_ids(entity, values)})"
+
+    def matches_document(self, document_column: str, values: Dict[str, Any]) -> str:
+        """Condition on an already-joined documents table"""
+        if not self.tsquery:
+            return "FALSE"
+        self._bind_query(values)
+        return f"{document_column} @@ {self.query_sql}"
+
+    def contains(self, values: Dict[str, Any], *expressions: str) -> str:
+        """Condition: any expression contains the term (trigram-indexed ILIKE)"""
+        values[f"{self.param}_pattern"] = f"%{self.term}%"
+        return "(" + " OR ".join(
+            f"{expression} ILIKE :{self.param}_pattern" for expression in expressions
+        ) + ")"
+
+    def similarity(self, values: Dict[str, Any], *expressions: str) -> str:
+        """Trigram similarity of the closest expression, for ranking substring matches"""
+        values[f"{self.param}_term"] = self.term
+        return "GREATEST(" + ", ".join(
+            f"similarity({expression}, :{self.param}_term)" for expression in expressions
+        ) + ")"
+
+    def rank(self, document_column: str, values: Dict[str, Any]) -> str:
+        """Relevance expression for ORDER BY (higher is better)"""
+        if not self.tsquery:
+            return "0"
+        self._bind_query(values)
+        return f"ts_rank_cd({document_column}, {self.query_sql})"
+
+    def highlight(self, text_column: str, values: Dict[str, Any]) -> str:
+        """Fragments of text_column around the matches; pass through render_highlight"""
+        if not self.tsquery:
+            return f"LEFT({text_column}, 200)"
+        self._bind_query(values)
+        return (
+            f"ts_headline('{SEARCH_CONFIG}', COALESCE({text_column}, ''), "
+            f"{self.query_sql}, '{HIGHLIGHT_OPTIONS}')"
+        )
@@ -1,9 +1,100 @@
 import uuid
-from typing import Optional
+import json
+from typing import Optional, Iterable, Tuple
 from datetime import datetime
 
 from database.connection import database
 
+# Credit and transaction record in one statement: the upsert row lock
+# serialises concurrent awards, so balance_after is always exact
+CREDIT_QUERY = """
+    WITH balance AS (
+        INSERT INTO l_tokens (user_id, balance, total_earned, total_spent)
+        VALUES (:user_id, :amount, :amount, 0)
+        ON CONFLICT (user_id) DO UPDATE SET
+            balance = l_tokens.balance + EXCLUDED.balance,
+            total_earned = l_tokens.total_earned + EXCLUDED.total_earned,
+            updated_at = NOW()
+        RETURNING balance
+    )
+    INSERT INTO token_transactions (
+        id, user_id, type, amount, balance_after, description,
+        reference_type, reference_id, metadata
+    )
+    SELECT
+        CAST(:id AS UUID), CAST(:user_id AS UUID), 'earned',
+        CAST(:amount AS NUMERIC), balance.balance, CAST(:description AS TEXT),
+        CAST(:reference_type AS VARCHAR), CAST(:reference_id AS UUID), CAST(:metadata AS JSONB)
+    FROM balance
+    RETURNING *
+"""
+
+# Debit only succeeds if the balance covers it; no row means insufficient funds
+DEBIT_QUERY = """
+    WITH balance AS (
+        UPDATE l_tokens
+        SET balance = balance - :amount,
+            total_spent = total_spent + :amount,
+            updated_at = NOW()
+        WHERE user_id = :user_id AND balance >= :amount
+        RETURNING balance
+    )
+    INSERT INTO token_transactions (
+        id, user_id, type, amount, balance_after, description,
+        reference_type, reference_id, metadata
+    )
+    SELECT
+        CAST(:id AS UUID), CAST(:user_id AS UUID), 'spent',
+        -CAST(:amount AS NUMERIC), balance.balance, CAST(:description AS TEXT),
+        CAST(:reference_type AS VARCHAR), CAST(:reference_id AS UUID), CAST(:metadata AS JSONB)
+    FROM balance
+    RETURNING *
+"""
+
+async def _credit(
+    user_id: uuid.UUID,
+    amount: float,
+    description: str,
+    reference_type: Optional[str] = None,
+    reference_id: Optional[uuid.UUID] = None,
+    metadata: Optional[dict] = None
+):
+    """Atomically add to a balance and record the transaction"""
+    return await database.fetch_one(CREDIT_QUERY, values={
+        "id": uuid.uuid4(),
+        "user_id": user_id,
+        "amount": amount,
+        "description": description,
+        "reference_type": reference_type,
+        "reference_id": reference_id,
+        "metadata": json.dumps(metadata) if metadata is not None else None
+    })
+
+async def _debit(
+    user_id: uuid.UUID,
+    amount: float,
+    description: str,
+    reference_type: Optional[str] = None,
+    reference_id: Optional[uuid.UUID] = None,
+    metadata: Optional[dict] = None
+):
+    """Atomically subtract from a balance; returns None if funds are insufficient"""
+    return await database.fetch_one(DEBIT_QUERY, values={
+        "id": uuid.uuid4(),
+        "user_id": user_id,
+        "amount": amount,
+        "description": description,
+        "reference_type": reference_type,
+        "reference_id": reference_id,
+        "metadata": json.dumps(metadata) if metadata is not None else None
+    })
+
+async def _debit_failure_reason(user_id: uuid.UUID) -> str:
+    balance_query = "SELECT 1 FROM l_tokens WHERE user_id = :user_id"
+    if await database.fetch_one(balance_query, values={"user_id": user_id}):
+        return "Insufficient token balance"
+    return "No token balance found"
+
 async def award_tokens(
     user_id: uuid.UUID,
     amount: float,
@@ -15,68 +106,15 @@ async def award_tokens(
     """Award tokens to a user and create transaction record"""
     
     try:
-        # Get current balance
-        balance_query = "SELECT balance FROM l_tokens WHERE user_id = :user_id"
-        current_balance = await database.fetch_one(balance_query, values={"user_id": user_id})
-        
-        if not current_balance:
-            # Create initial balance record
-            create_balance_query = """
-                INSERT INTO l_tokens (user_id, balance, total_earned, total_spent)
-                VALUES (:user_id, 0, 0, 0)
-            """
-            await database.execute(create_balance_query, values={"user_id": user_id})
-            current_balance_amount = 0.0
-        else:
-            current_balance_amount = float(current_balance.balance)
-        
-        new_balance = current_balance_amount + amount
-        
-        # Update balance
-        update_balance_query = """
-            UPDATE l_tokens 
-            SET balance = :new_balance, 
-                total_earned = total_earned + :amount,
-                updated_at = NOW()
-            WHERE user_id = :user_id
-        """
-        
-        await database.execute(update_balance_query, values={
-            "new_balance": new_balance,
-            "amount": amount,
-            "user_id": user_id
-        })
-        
-        # Create transaction record
-        transaction_id = uuid.uuid4()
-        transaction_query = """
-            INSERT INTO token_transactions (
-                id, user_id, type, amount, balance_after, description,
-                reference_type, reference_id, metadata
-            )
-            VALUES (
-                :id, :user_id, 'earned', :amount, :balance_after, :description,
-                :reference_type, :reference_id, :metadata
-            )
-            RETURNING *
-        """
-        
-        transaction = await database.fetch_one(transaction_query, values={
-            "id": transaction_id,
-            "user_id": user_id,
-            "amount": amount,
-            "balance_after": new_balance,
-            "description": description,
-            "reference_type": reference_type,
-            "reference_id": reference_id,
-            "metadata": metadata
-        })
+        transaction = await _credit(
+            user_id, amount, description, reference_type, reference_id, metadata
+        )
         
         return {
             "success": True,
-            "transaction_id": transaction_id,
+            "transaction_id": transaction.id,
             "amount": amount,
-            "new_balance": new_balance,
+            "new_balance": float(transaction.balance_after),
             "description": description
         }
         
@@ -98,71 +136,21 @@ async def spend_tokens(
     """Spend tokens from user balance"""
     
     try:
-        # Get current balance
-        balance_query = "SELECT balance FROM l_tokens WHERE user_id = :user_id"
-        current_balance = await database.fetch_one(balance_query, values={"user_id": user_id})
-        
-        if not current_balance:
-            return {
-                "success": False,
-                "error": "No token balance found"
-            }
-        
-        current_balance_amount = float(current_balance.balance)
+        transaction = await _debit(
+            user_id, amount, description, reference_type, reference_id, metadata
+        )
         
-        if current_balance_amount < amount:
+        if not transaction:
             return {
                 "success": False,
-                "error": "Insufficient token balance"
+                "error": await _debit_failure_reason(user_id)
             }
         
-        new_balance = current_balance_amount - amount
-        
-        # Update balance
-        update_balance_query = """
-            UPDATE l_tokens 
-            SET balance = :new_balance, 
-                total_spent = total_spent + :amount,
-                updated_at = NOW()
-            WHERE user_id = :user_id
-        """
-        
-        await database.execute(update_balance_query, values={
-            "new_balance": new_balance,
-            "amount": amount,
-            "user_id": user_id
-        })
-        
-        # Create transaction record
-        transaction_id = uuid.uuid4()
-        transaction_query = """
-            INSERT INTO token_transactions (
-                id, user_id, type, amount, balance_after, description,
-                reference_type, reference_id, metadata
-            )
-            VALUES (
-                :id, :user_id, 'spent', :amount, :balance_after, :description,
-                :reference_type, :reference_id, :metadata
-            )
-            RETURNING *
-        """
-        
-        transaction = await database.fetch_one(transaction_query, values={
-            "id": transaction_id,
-            "user_id": user_id,
-            "amount": -amount,  # Negative for spending
-            "balance_after": new_balance,
-            "description": description,
-            "reference_type": reference_type,
-            "reference_id": reference_id,
-            "metadata": metadata
-        })
-        
         return {
             "success": True,
-            "transaction_id": transaction_id,
+            "transaction_id": transaction.id,
             "amount": amount,
-            "new_balance": new_balance,
+            "new_balance": float(transaction.balance_after),
             "description": description
         }
         
@@ -173,6 +161,144 @@ async def spend_tokens(
             "error": str(e)
         }
 
+# Set-based award: dedupe the batch, drop entries that were already
+# rewarded, bump every balance with one upsert and write one transaction per
+# entry. balance_after is reconstructed per user by subtracting the amounts
+# of the entries that follow it in the batch.
+#
+# Run inside the transaction after BULK_AWARD_LOCK_QUERY: NOT EXISTS only sees
+# rows committed before the statement started, so the locks must be held
+# before it runs.
+BULK_AWARD_QUERY = """
+    WITH entries AS (
+        SELECT DISTINCT ON (e.user_id, e.reference_type, e.reference_id) e.*
+        FROM UNNEST(
+            CAST(:user_ids AS UUID[]),
+            CAST(:amounts AS NUMERIC[]),
+            CAST(:descriptions AS TEXT[]),
+            CAST(:reference_types AS VARCHAR[]),
+            CAST(:reference_ids AS UUID[])
+        ) AS e(user_id, amount, description, reference_type, reference_id)
+        ORDER BY e.user_id, e.reference_type, e.reference_id
+    ),
+    fresh AS (
+        SELECT e.* FROM entries e
+        WHERE NOT EXISTS (
+            SELECT 1 FROM token_transactions t
+            WHERE t.user_id = e.user_id
+              AND t.reference_type = e.reference_type
+              AND t.reference_id = e.reference_id
+        )
+    ),
+    balances AS (
+        INSERT INTO l_tokens (user_id, balance, total_earned, total_spent)
+        SELECT user_id, SUM(amount), SUM(amount), 0
+        FROM fresh
+        GROUP BY user_id
+        -- Fixed lock order so overlapping batches can't deadlock
+        ORDER BY user_id
+        ON CONFLICT (user_id) DO UPDATE SET
+            balance = l_tokens.balance + EXCLUDED.balance,
+            total_earned = l_tokens.total_earned + EXCLUDED.total_earned,
+            updated_at = NOW()
+        RETURNING user_id, balance
+    )
+    INSERT INTO token_transactions (
+        user_id, type, amount, balance_after, description, reference_type, reference_id
+    )
+    SELECT
+        f.user_id, 'earned', f.amount,
+        b.balance - COALESCE(SUM(f.amount) OVER (
+            PARTITION BY f.user_id
+            ORDER BY f.reference_type, f.reference_id
+            ROWS BETWEEN 1 FOLLOWING AND UNBOUNDED FOLLOWING
+        ), 0),
+        f.description, f.reference_type, f.reference_id
+    FROM fresh f
+    JOIN balances b ON b.user_id = f.user_id
+    RETURNING user_id, amount
+"""
+
+# Transaction-scoped advisory lock per (user_id, reference_type,
+# reference_id), taken in key order so overlapping batches can't deadlock.
+# A concurrent award of the same key waits for this one to commit and then
+# finds it already rewarded, whatever the reference type; the unique index
+# from migration 008 only covers lesson and course completion.
+BULK_AWARD_LOCK_QUERY = """
+    SELECT pg_advisory_xact_lock(k.key)
+    FROM (
+        SELECT DISTINCT hashtextextended(
+            CAST(e.user_id AS TEXT) || ':' || e.reference_type || ':' || CAST(e.reference_id AS TEXT), 0
+        ) AS key
+        FROM UNNEST(
+            CAST(:user_ids AS UUID[]),
+            CAST(:reference_types AS VARCHAR[]),
+            CAST(:reference_ids AS UUID[])
+        ) AS e(user_id, reference_type, reference_id)
+        ORDER BY key
+    ) AS k
+"""
+
+BULK_AWARD_CHUNK_SIZE = 5000
+
+async def award_tokens_bulk(
+    entries: Iterable[Tuple[uuid.UUID, float, str, str, uuid.UUID]]
+) -> dict:
+    """
+    Award tokens to many users with a constant number of statements.
+
+    Each entry is (user_id, amount, description, reference_type, reference_id).
+    Awards are idempotent on (user_id, reference_type, reference_id): entries
+    that were already rewarded, or repeat within the batch, are skipped.
+    """
+    
+    entries = list(entries)
+    if any(entry[3] is None or entry[4] is None for entry in entries):
+        return {
+            "success": False,
+            "error": "Bulk awards require reference_type and reference_id"
+        }
+    
+    awarded = 0
+    total_amount = 0.0
+    
+    try:
+        for start in range(0, len(entries), BULK_AWARD_CHUNK_SIZE):
+            chunk = entries[start:start + BULK_AWARD_CHUNK_SIZE]
+            values = {
+                "user_ids": [entry[0] for entry in chunk],
+                "amounts": [entry[1] for entry in chunk],
+                "descriptions": [entry[2] for entry in chunk],
+                "reference_types": [entry[3] for entry in chunk],
+                "reference_ids": [entry[4] for entry in chunk]
+            }
+            
+            async with database.transaction():
+                await database.fetch_all(BULK_AWARD_LOCK_QUERY, values={
+                    "user_ids": values["user_ids"],
+                    "reference_types": values["reference_types"],
+                    "reference_ids": values["reference_ids"]
+                })
+                rows = await database.fetch_all(BULK_AWARD_QUERY, values=values)
+            
+            awarded += len(rows)
+            total_amount += sum(float(row.amount) for row in rows)
+        
+        return {
+            "success": True,
+            "awarded": awarded,
+            "skipped": len(entries) - awarded,
+            "total_amount": total_amount
+        }
+        
+    except Exception as e:
+        print(f"Bulk token award failed: {e}")
+        return {
+            "success": False,
+            "awarded": awarded,
+            "error": str(e)
+        }
+
 async def get_token_balance(user_id: uuid.UUID) -> dict:
     """Get user's current token balance"""
     
@@ -216,48 +342,44 @@ async def transfer_tokens(
     amount: float,
     description: str
 ) -> dict:
-    """Transfer tokens between users"""
+    """Transfer tokens between users in a single database transaction"""
     
     try:
-        # Check sender balance
-        sender_balance = await get_token_balance(from_user_id)
-        
-        if sender_balance["balance"] < amount:
-            return {
-                "success": False,
-                "error": "Insufficient balance for transfer"
-            }
-        
-        # Spend from sender
-        spend_result = await spend_tokens(
-            user_id=from_user_id,
-            amount=amount,
-            description=f"Transfer to user: {description}",
-            reference_type="transfer_out",
-            reference_id=to_user_id
-        )
-        
-        if not spend_result["success"]:
-            return spend_result
-        
-        # Award to recipient
-        award_result = await award_tokens(
-            user_id=to_user_id,
-            amount=amount,
-            description=f"Transfer from user: {description}",
-            reference_type="transfer_in",
-            reference_id=from_user_id
-        )
-        
-        if not award_result["success"]:
-            # Rollback sender transaction if recipient fails
-            await award_tokens(
+        async with database.transaction():
+            # Lock both balances in a fixed order so opposite transfers can't deadlock
+            lock_query = """
+                SELECT user_id FROM l_tokens
+                WHERE user_id IN (:from_user_id, :to_user_id)
+                ORDER BY user_id
+                FOR UPDATE
+            """
+            await database.fetch_all(lock_query, values={
+                "from_user_id": from_user_id,
+                "to_user_id": to_user_id
+            })
+            
+            spent = await _debit(
                 user_id=from_user_id,
                 amount=amount,
-                description=f"Rollback failed transfer: {description}",
-                reference_type="transfer_rollback"
+                description=f"Transfer to user: {description}",
+                reference_type="transfer_out",
+                reference_id=to_user_id
+            )
+            
+            if not spent:
+                return {
+                    "success": False,
+                    "error": "Insufficient balance for transfer"
+                }
+            
+            # Any failure here raises and rolls back the debit as well
+            await _credit(
+                user_id=to_user_id,
+                amount=amount,
+                description=f"Transfer from user: {description}",
+                reference_type="transfer_in",
+                reference_id=from_user_id
             )
-            return award_result
         
         return {
             "success": True,
@@ -0,0 +1,178 @@
+"""
+Authenticated-user (principal) cache for middleware.auth.get_current_user
+
+Two levels:
+- L1: in-process LRU with a short TTL, keyed by (user_id, token iat)
+- L2: Redis hash per user (field = token iat), shared by all workers
+
+Writes that change a user's profile, role or status must call
+invalidate_user() so the next request reloads the row from Postgres.
+Other workers may serve their L1 copy for up to USER_CACHE_L1_TTL_SECONDS.
+"""
+import json
+import os
+import time
+import uuid
+from collections import OrderedDict
+from datetime import date, datetime
+from typing import Optional, Dict, Any, Tuple
+from dotenv import load_dotenv
+
+from utils.redis_client import async_redis_client
+
+load_dotenv()
+
+USER_CACHE_ENABLED = os.getenv("USER_CACHE_ENABLED", "true").lower() == "true"
+USER_CACHE_MAX_ENTRIES = int(os.getenv("USER_CACHE_MAX_ENTRIES", "10000"))
+USER_CACHE_L1_TTL_SECONDS = float(os.getenv("USER_CACHE_L1_TTL_SECONDS", "5"))
+USER_CACHE_L2_TTL_SECONDS = int(os.getenv("USER_CACHE_L2_TTL_SECONDS", "60"))
+
+# Never keep credentials in the cache
+EXCLUDED_FIELDS = {"password_hash"}
+
+
+class CachedUser(dict):
+    """User row that supports attribute access like a database record"""
+
+    def __getattr__(self, name):
+        try:
+            return self[name]
+        except KeyError:
+            raise AttributeError(name)
+
+
+def _encode(value):
+    if isinstance(value, uuid.UUID):
+        return str(value)
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    raise TypeError(f"Cannot serialize {type(value)}")
+
+
+def _decode(data: Dict[str, Any]) -> CachedUser:
+    """Restore the column types that JSON flattens to strings"""
+    user = CachedUser(data)
+    if user.get("id"):
+        user["id"] = uuid.UUID(user["id"])
+    for field, value in data.items():
+        if value is None:
+            continue
+        if field.endswith("_at"):
+            user[field] = datetime.fromisoformat(value)
+        elif field == "date_of_birth":
+            user[field] = date.fromisoformat(value)
+    return user
+
+
+class UserPrincipalCache:
+    """Two-level cache of user rows for request authentication"""
+
+    def __init__(
+        self,
+        client=async_redis_client,
+        enabled: bool = USER_CACHE_ENABLED,
+        max_entries: int = USER_CACHE_MAX_ENTRIES,
+        l1_ttl: float = USER_CACHE_L1_TTL_SECONDS,
+        l2_ttl: int = USER_CACHE_L2_TTL_SECONDS
+    ):
+        self.client = client
+        self.enabled = enabled
+        self.max_entries = max_entries
+        self.l1_ttl = l1_ttl
+        self.l2_ttl = l2_ttl
+        self._l1: "OrderedDict[Tuple[str, int], Tuple[float, CachedUser]]" = OrderedDict()
+        self.stats = {"l1_hits": 0, "l2_hits": 0, "misses": 0, "invalidations": 0}
+
+    @staticmethod
+    def _redis_key(user_id) -> str:
+        return f"user_principal:{user_id}"
+
+    async def get(self, user_id, iat: int) -> Optional[CachedUser]:
+        """Return the cached user for this token, or None on a miss"""
+        if not self.enabled:
+            return None
+
+        key = (str(user_id), iat)
+        entry = self._l1.get(key)
+        if entry is not None:
+            expires_at, user = entry
+            if expires_at > time.monotonic():
+                self._l1.move_to_end(key)
+                self.stats["l1_hits"] += 1
+                return user
+            del self._l1[key]
+
+        try:
+            json_data = await self.client.hget(self._redis_key(user_id), str(iat))
+        except Exception as e:
+            print(f"[UserCache] Error reading user {user_id}: {e}")
+            json_data = None
+
+        if json_data is None:
+            self.stats["misses"] += 1
+            return None
+
+        user = _decode(json.loads(json_data))
+        self._store_l1(key, user)
+        self.stats["l2_hits"] += 1
+        return user
+
+    async def set(self, user_id, iat: int, row) -> CachedUser:
+        """Cache a freshly loaded user row and return its cached form"""
+        data = {k: v for k, v in dict(row).items() if k not in EXCLUDED_FIELDS}
+        json_data = json.dumps(data, default=_encode)
+        user = _decode(json.loads(json_data))
+
+        if not self.enabled:
+            return user
+
+        self._store_l1((str(user_id), iat), user)
+
+        try:
+            redis_key = self._redis_key(user_id)
+            pipe = self.client.pipeline()
+            pipe.hset(redis_key, str(iat), json_data)
+            pipe.expire(redis_key, self.l2_ttl)
+            await pipe.execute()
+        except Exception as e:
+            print(f"[UserCache] Error caching user {user_id}: {e}")
+
+        return user
+
+    async def invalidate(self, user_id):
+        """Drop every cached copy of a user (all tokens, both levels)"""
+        user_key = str(user_id)
+        for key in [k for k in self._l1 if k[0] == user_key]:
+            del self._l1[key]
+
+        self.stats["invalidations"] += 1
+        try:
+            await self.client.delete(self._redis_key(user_id))
+        except Exception as e:
+            print(f"[UserCache] Error invalidating user {user_id}: {e}")
+
+    def _store_l1(self, key: Tuple[str, int], user: CachedUser):
+        self._l1[key] = (time.monotonic() + self.l1_ttl, user)
+        self._l1.move_to_end(key)
+        while len(self._l1) > self.max_entries:
+            self._l1.popitem(last=False)
+
+    def hit_rate(self) -> float:
+        hits = self.stats["l1_hits"] + self.stats["l2_hits"]
+        total = hits + self.stats["misses"]
+        return hits / total if total else 0.0
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            **self.stats,
+            "l1_size": len(self._l1),
+            "hit_rate": round(self.hit_rate(), 4)
+        }
+
+
+user_cache = UserPrincipalCache()
+
+
+async def invalidate_user(user_id):
+    """Invalidate the cached principal after a profile, role or status change"""
+    await user_cache.invalidate(user_id)
@@ -0,0 +1,18 @@
+-- Migration 008: Make one-time token rewards idempotent
+-- Run after 007_seed_data.sql
+--
+-- award_tokens_bulk() skips entries whose (user_id, reference_type, reference_id)
+-- already has a transaction, and holds a transaction-scoped advisory lock per
+-- key while it checks and inserts, so concurrent awards of any reference type
+-- can't both write. This index backs that up for the one-time rewards, against
+-- writers that don't take the lock. Remove duplicate rewards before applying,
+-- e.g.:
+--
+--   SELECT user_id, reference_type, reference_id, COUNT(*)
+--   FROM token_transactions
+--   WHERE reference_type IN ('lesson_completed', 'course_completed')
+--   GROUP BY 1, 2, 3 HAVING COUNT(*) > 1;
+
+CREATE UNIQUE INDEX IF NOT EXISTS idx_token_transactions_one_time_reward
+    ON token_transactions(user_id, reference_type, reference_id)
+    WHERE reference_type IN ('lesson_completed', 'course_completed');
@@ -0,0 +1,13 @@
+-- Migration 009: Indexes for keyset (cursor) pagination
+-- Run after 008_add_token_award_idempotency.sql
+--
+-- Cursor pages filter on (sort key, id) < (cursor) and order by both, so each
+-- list needs an index that leads with its filter columns and ends in (sort key, id).
+
+CREATE INDEX IF NOT EXISTS idx_courses_created_at_id ON courses(created_at DESC, id DESC);
+CREATE INDEX IF NOT EXISTS idx_lessons_created_at_id ON lessons(created_at DESC, id DESC);
+CREATE INDEX IF NOT EXISTS idx_users_created_at_id ON users(created_at DESC, id DESC);
+CREATE INDEX IF NOT EXISTS idx_admin_audit_log_created_at_id ON admin_audit_log(created_at DESC, id DESC);
+CREATE INDEX IF NOT EXISTS idx_notifications_user_created_at_id ON notifications(user_id, created_at DESC, id DESC);
+CREATE INDEX IF NOT EXISTS idx_course_enrollments_course_enrolled_at_id ON course_enrollments(course_id, enrolled_at DESC, id DESC);
+CREATE INDEX IF NOT EXISTS idx_token_transactions_user_created_at_id ON token_transactions(user_id, created_at DESC, id DESC);
@@ -0,0 +1,157 @@
+-- Migration 010: Full-text search indexes
+-- Run after 009_add_keyset_pagination_indexes.sql
+--
+-- Courses, lessons, assignments and categories each get a side table holding
+-- a weighted tsvector document, kept current by AFTER INSERT/UPDATE triggers
+-- and indexed with GIN. Keeping the documents out of the content tables means
+-- the many SELECT c.* / l.* queries don't start returning tsvector columns.
+-- Queries are built by backend/utils/search.py (prefix matching, ts_rank_cd
+-- ranking, ts_headline highlighting).
+--
+-- Names, emails and usernames are not natural-language text, so users keep
+-- substring (ILIKE) search backed by trigram indexes instead.
+--
+-- The backfill INSERTs read every row; on large tables run this in a
+-- maintenance window.
+
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
+-- Courses
+CREATE TABLE IF NOT EXISTS course_search_documents (
+    course_id UUID PRIMARY KEY REFERENCES courses(id) ON DELETE CASCADE,
+    document tsvector NOT NULL
+);
+
+CREATE OR REPLACE FUNCTION course_search_document(title TEXT, short_description TEXT, description TEXT)
+RETURNS tsvector AS $$
+    SELECT setweight(to_tsvector('english', COALESCE(title, '')), 'A') ||
+           setweight(to_tsvector('english', COALESCE(short_description, '')), 'B') ||
+           setweight(to_tsvector('english', COALESCE(description, '')), 'C');
+$$ LANGUAGE sql IMMUTABLE;
+
+CREATE OR REPLACE FUNCTION courses_search_document_update()
+RETURNS TRIGGER AS $$
+BEGIN
+    INSERT INTO course_search_documents (course_id, document)
+    VALUES (NEW.id, course_search_document(NEW.title, NEW.short_description, NEW.description))
+    ON CONFLICT (course_id) DO UPDATE SET document = EXCLUDED.document;
+    RETURN NEW;
+END;
+$$ language 'plpgsql';
+
+DROP TRIGGER IF EXISTS courses_search_document_trigger ON courses;
+CREATE TRIGGER courses_search_document_trigger
+    AFTER INSERT OR UPDATE OF title, short_description, description ON courses
+    FOR EACH ROW EXECUTE FUNCTION courses_search_document_update();
+
+INSERT INTO course_search_documents (course_id, document)
+SELECT id, course_search_document(title, short_description, description) FROM courses
+ON CONFLICT (course_id) DO UPDATE SET document = EXCLUDED.document;
+
+CREATE INDEX IF NOT EXISTS idx_course_search_documents_document ON course_search_documents USING GIN(document);
+
+-- Lessons
+CREATE TABLE IF NOT EXISTS lesson_search_documents (
+    lesson_id UUID PRIMARY KEY REFERENCES lessons(id) ON DELETE CASCADE,
+    document tsvector NOT NULL
+);
+
+CREATE OR REPLACE FUNCTION lesson_search_document(title TEXT, description TEXT)
+RETURNS tsvector AS $$
+    SELECT setweight(to_tsvector('english', COALESCE(title, '')), 'A') ||
+           setweight(to_tsvector('english', COALESCE(description, '')), 'B');
+$$ LANGUAGE sql IMMUTABLE;
+
+CREATE OR REPLACE FUNCTION lessons_search_document_update()
+RETURNS TRIGGER AS $$
+BEGIN
+    INSERT INTO lesson_search_documents (lesson_id, document)
+    VALUES (NEW.id, lesson_search_document(NEW.title, NEW.description))
+    ON CONFLICT (lesson_id) DO UPDATE SET document = EXCLUDED.document;
+    RETURN NEW;
+END;
+$$ language 'plpgsql';
+
+DROP TRIGGER IF EXISTS lessons_search_document_trigger ON lessons;
+CREATE TRIGGER lessons_search_document_trigger
+    AFTER INSERT OR UPDATE OF title, description ON lessons
+    FOR EACH ROW EXECUTE FUNCTION lessons_search_document_update();
+
+INSERT INTO lesson_search_documents (lesson_id, document)
+SELECT id, lesson_search_document(title, description) FROM lessons
+ON CONFLICT (lesson_id) DO UPDATE SET document = EXCLUDED.document;
+
+CREATE INDEX IF NOT EXISTS idx_lesson_search_documents_document ON lesson_search_documents USING GIN(document);
+
+-- Assignments
+CREATE TABLE IF NOT EXISTS assignment_search_documents (
+    assignment_id UUID PRIMARY KEY REFERENCES assignments(id) ON DELETE CASCADE,
+    document tsvector NOT NULL
+);
+
+CREATE OR REPLACE FUNCTION assignment_search_document(title TEXT, description TEXT)
+RETURNS tsvector AS $$
+    SELECT setweight(to_tsvector('english', COALESCE(title, '')), 'A') ||
+           setweight(to_tsvector('english', COALESCE(description, '')), 'B');
+$$ LANGUAGE sql IMMUTABLE;
+
+CREATE OR REPLACE FUNCTION assignments_search_document_update()
+RETURNS TRIGGER AS $$
+BEGIN
+    INSERT INTO assignment_search_documents (assignment_id, document)
+    VALUES (NEW.id, assignment_search_document(NEW.title, NEW.description))
+    ON CONFLICT (assignment_id) DO UPDATE SET document = EXCLUDED.document;
+    RETURN NEW;
+END;
+$$ language 'plpgsql';
+
+DROP TRIGGER IF EXISTS assignments_search_document_trigger ON assignments;
+CREATE TRIGGER assignments_search_document_trigger
+    AFTER INSERT OR UPDATE OF title, description ON assignments
+    FOR EACH ROW EXECUTE FUNCTION assignments_search_document_update();
+
+INSERT INTO assignment_search_documents (assignment_id, document)
+SELECT id, assignment_search_document(title, description) FROM assignments
+ON CONFLICT (assignment_id) DO UPDATE SET document = EXCLUDED.document;
+
+CREATE INDEX IF NOT EXISTS idx_assignment_search_documents_document ON assignment_search_documents USING GIN(document);
+
+-- Categories
+CREATE TABLE IF NOT EXISTS category_search_documents (
+    category_id UUID PRIMARY KEY REFERENCES categories(id) ON DELETE CASCADE,
+    document tsvector NOT NULL
+);
+
+CREATE OR REPLACE FUNCTION category_search_document(name TEXT, description TEXT)
+RETURNS tsvector AS $$
+    SELECT setweight(to_tsvector('english', COALESCE(name, '')), 'A') ||
+           setweight(to_tsvector('english', COALESCE(description, '')), 'B');
+$$ LANGUAGE sql IMMUTABLE;
+
+CREATE OR REPLACE FUNCTION categories_search_document_update()
+RETURNS TRIGGER AS $$
+BEGIN
+    INSERT INTO category_search_documents (category_id, document)
+    VALUES (NEW.id, category_search_document(NEW.name, NEW.description))
+    ON CONFLICT (category_id) DO UPDATE SET document = EXCLUDED.document;
+    RETURN NEW;
+END;
+$$ language 'plpgsql';
+
+DROP TRIGGER IF EXISTS categories_search_document_trigger ON categories;
+CREATE TRIGGER categories_search_document_trigger
+    AFTER INSERT OR UPDATE OF name, description ON categories
+    FOR EACH ROW EXECUTE FUNCTION categories_search_document_update();
+
+INSERT INTO category_search_documents (category_id, document)
+SELECT id, category_search_document(name, description) FROM categories
+ON CONFLICT (category_id) DO UPDATE SET document = EXCLUDED.document;
+
+CREATE INDEX IF NOT EXISTS idx_category_search_documents_document ON category_search_documents USING GIN(document);
+
+-- Users: trigram indexes make the existing ILIKE '%term%' filters index-backed
+CREATE INDEX IF NOT EXISTS idx_users_first_name_trgm ON users USING GIN(first_name gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS idx_users_last_name_trgm ON users USING GIN(last_name gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS idx_users_email_trgm ON users USING GIN(email gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS idx_users_username_trgm ON users USING GIN(username gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS idx_users_full_name_trgm ON users USING GIN((first_name || ' ' || last_name) gin_trgm_ops);
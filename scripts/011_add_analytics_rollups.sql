@@ -0,0 +1,63 @@
+-- Migration 011: Daily analytics rollups
+-- Run after 010_add_full_text_search.sql
+--
+-- course_analytics_daily and user_analytics_daily are filled by the rollup
+-- job in backend/utils/analytics_rollups.py (Celery beat). The extra columns
+-- below are what routers/analytics.py needs to answer from the rollups.
+
+-- Per course and day. Enrollment columns bucket by enrolled_at and count the
+-- current status; completions bucket by completed_at. gross_* count revenue
+-- records of any status, revenue/revenue_transactions only completed ones.
+ALTER TABLE course_analytics_daily
+    ADD COLUMN IF NOT EXISTS active_enrollments INTEGER DEFAULT 0,
+    ADD COLUMN IF NOT EXISTS completed_enrollments INTEGER DEFAULT 0,
+    ADD COLUMN IF NOT EXISTS dropped_enrollments INTEGER DEFAULT 0,
+    ADD COLUMN IF NOT EXISTS enrollment_progress_total BIGINT DEFAULT 0,
+    ADD COLUMN IF NOT EXISTS revenue_transactions INTEGER DEFAULT 0,
+    ADD COLUMN IF NOT EXISTS gross_revenue DECIMAL(12,2) DEFAULT 0,
+    ADD COLUMN IF NOT EXISTS gross_transactions INTEGER DEFAULT 0,
+    ADD COLUMN IF NOT EXISTS updated_at TIMESTAMP WITH TIME ZONE DEFAULT NOW();
+
+-- Platform-wide per day. new_active_users/new_students/new_instructors
+-- count users created that day whose status is currently active.
+-- active_users, engaged_users, lesson_interactions and time_spent_total
+-- describe activity on that day and are frozen once the day is rolled up.
+ALTER TABLE user_analytics_daily
+    ADD COLUMN IF NOT EXISTS new_active_users INTEGER DEFAULT 0,
+    ADD COLUMN IF NOT EXISTS new_students INTEGER DEFAULT 0,
+    ADD COLUMN IF NOT EXISTS new_instructors INTEGER DEFAULT 0,
+    ADD COLUMN IF NOT EXISTS certificates_minted INTEGER DEFAULT 0,
+    ADD COLUMN IF NOT EXISTS engaged_users INTEGER DEFAULT 0,
+    ADD COLUMN IF NOT EXISTS lesson_interactions INTEGER DEFAULT 0,
+    ADD COLUMN IF NOT EXISTS time_spent_total BIGINT DEFAULT 0,
+    ADD COLUMN IF NOT EXISTS revenue_total DECIMAL(14,2) DEFAULT 0,
+    ADD COLUMN IF NOT EXISTS revenue_transactions INTEGER DEFAULT 0,
+    ADD COLUMN IF NOT EXISTS revenue_completed DECIMAL(14,2) DEFAULT 0,
+    ADD COLUMN IF NOT EXISTS revenue_completed_transactions INTEGER DEFAULT 0,
+    ADD COLUMN IF NOT EXISTS updated_at TIMESTAMP WITH TIME ZONE DEFAULT NOW();
+
+-- Where the rollup job left off: rows changed after watermark are checked
+-- on the next run, days up to rolled_up_through are in the rollup tables.
+CREATE TABLE IF NOT EXISTS analytics_rollup_state (
+    name VARCHAR(50) PRIMARY KEY,
+    watermark TIMESTAMP WITH TIME ZONE,
+    rolled_up_through DATE,
+    updated_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
+);
+
+CREATE INDEX IF NOT EXISTS idx_course_analytics_daily_date_course ON course_analytics_daily(date, course_id);
+
+-- Change detection since the watermark
+CREATE INDEX IF NOT EXISTS idx_users_updated_at ON users(updated_at);
+CREATE INDEX IF NOT EXISTS idx_course_enrollments_updated_at ON course_enrollments(updated_at);
+CREATE INDEX IF NOT EXISTS idx_lesson_progress_updated_at ON lesson_progress(updated_at);
+CREATE INDEX IF NOT EXISTS idx_certificates_updated_at ON certificates(updated_at);
+CREATE INDEX IF NOT EXISTS idx_revenue_records_processed_at ON revenue_records(processed_at);
+
+-- Day-range scans when a day is recomputed or computed live
+CREATE INDEX IF NOT EXISTS idx_users_last_login_at ON users(last_login_at);
+CREATE INDEX IF NOT EXISTS idx_course_enrollments_completed_at ON course_enrollments(completed_at);
+CREATE INDEX IF NOT EXISTS idx_lesson_progress_created_at ON lesson_progress(created_at);
+CREATE INDEX IF NOT EXISTS idx_lesson_progress_completed_at ON lesson_progress(completed_at);
+CREATE INDEX IF NOT EXISTS idx_quiz_attempts_created_at ON quiz_attempts(created_at);
+CREATE INDEX IF NOT EXISTS idx_certificates_issued_at ON certificates(issued_at);
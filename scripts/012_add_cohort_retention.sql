@@ -0,0 +1,38 @@
+-- Migration 012: Cohort retention matrix
+-- Run after 011_add_analytics_rollups.sql
+--
+-- Maintained by backend/utils/cohort_retention.py (Celery beat). A user's
+-- cohort is the month they signed up; a user is active in a month when they
+-- logged in, opened a session or touched a lesson that month.
+
+-- Every (user, month) the user was active in, kept after last_login_at moves on
+CREATE TABLE IF NOT EXISTS user_activity_months (
+    user_id UUID NOT NULL,
+    activity_month DATE NOT NULL,
+    PRIMARY KEY (user_id, activity_month)
+);
+
+-- The cohort each user is currently counted in; only active users count
+CREATE TABLE IF NOT EXISTS retention_cohort_members (
+    user_id UUID PRIMARY KEY,
+    cohort_month DATE NOT NULL,
+    is_active BOOLEAN NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS retention_cohorts (
+    cohort_month DATE PRIMARY KEY,
+    cohort_size INTEGER NOT NULL DEFAULT 0,
+    updated_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
+);
+
+-- Active users of a cohort in its period_number-th month (0 = signup month)
+CREATE TABLE IF NOT EXISTS retention_matrix (
+    cohort_month DATE NOT NULL,
+    period_number INTEGER NOT NULL,
+    active_users INTEGER NOT NULL DEFAULT 0,
+    updated_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
+    PRIMARY KEY (cohort_month, period_number)
+);
+
+-- Progress is tracked in analytics_rollup_state under the name 'cohorts'
+CREATE INDEX IF NOT EXISTS idx_user_sessions_created_at ON user_sessions(created_at);
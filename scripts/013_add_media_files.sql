@@ -0,0 +1,27 @@
+-- Migration 013: Uploaded media and their background processing results
+-- Run after 012_add_cohort_retention.sql
+--
+-- Rows are created by the upload endpoints with status 'processing' and
+-- filled in by the Celery media queue (backend/tasks/media_tasks.py):
+-- image thumbnails for images, ffprobe metadata for videos.
+
+CREATE TABLE IF NOT EXISTS media_files (
+    id UUID PRIMARY KEY DEFAULT uuid_generate_v4(),
+    owner_id UUID REFERENCES users(id) ON DELETE SET NULL,
+    lesson_id UUID REFERENCES lessons(id) ON DELETE SET NULL,
+    kind VARCHAR(20) NOT NULL, -- 'image' or 'video'
+    filename TEXT NOT NULL, -- Storage key
+    url TEXT NOT NULL,
+    content_type VARCHAR(100),
+    size BIGINT,
+    status VARCHAR(20) NOT NULL DEFAULT 'processing', -- 'processing', 'ready' or 'failed'
+    metadata JSONB, -- Image dimensions, or duration, codec and resolution of a video
+    variants JSONB, -- Thumbnail URLs by size and format: {"300": {"jpeg": ..., "webp": ...}}
+    error TEXT,
+    processed_at TIMESTAMP WITH TIME ZONE,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
+    updated_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
+);
+
+CREATE INDEX IF NOT EXISTS idx_media_files_lesson_id ON media_files(lesson_id);
+CREATE INDEX IF NOT EXISTS idx_media_files_owner_id ON media_files(owner_id);
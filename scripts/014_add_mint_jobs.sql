@@ -0,0 +1,38 @@
+-- Migration 014: Queue for minting certificates as NFTs
+-- Run after 013_add_media_files.sql
+--
+-- POST /api/certificates/{id}/mint only inserts a mint_jobs row; the Celery
+-- blockchain queue (backend/tasks/blockchain_tasks.py) signs and sends the
+-- transaction and a periodic poller records the receipt.
+
+CREATE TABLE IF NOT EXISTS mint_jobs (
+    id UUID PRIMARY KEY DEFAULT uuid_generate_v4(),
+    certificate_id UUID NOT NULL REFERENCES certificates(id) ON DELETE CASCADE,
+    user_id UUID REFERENCES users(id) ON DELETE SET NULL,
+    recipient_address VARCHAR(42) NOT NULL,
+    status VARCHAR(20) NOT NULL DEFAULT 'queued', -- 'queued', 'submitting', 'submitted', 'confirmed' or 'failed'
+    token_uri TEXT, -- Pinned once, reused if the job is sent again
+    sender_address VARCHAR(42),
+    nonce BIGINT,
+    transaction_hash VARCHAR(66),
+    raw_transaction TEXT, -- Signed transaction, re-broadcast if the node drops it
+    token_id VARCHAR(100),
+    attempts INTEGER NOT NULL DEFAULT 0,
+    error TEXT,
+    submitted_at TIMESTAMP WITH TIME ZONE,
+    confirmed_at TIMESTAMP WITH TIME ZONE,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
+    updated_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
+);
+
+-- At most one job in flight per certificate
+CREATE UNIQUE INDEX IF NOT EXISTS idx_mint_jobs_active_certificate
+    ON mint_jobs(certificate_id) WHERE status IN ('queued', 'submitting', 'submitted');
+CREATE INDEX IF NOT EXISTS idx_mint_jobs_status ON mint_jobs(status, updated_at);
+
+-- Next nonce for each signing account, so concurrent sends never reuse one
+CREATE TABLE IF NOT EXISTS signer_nonces (
+    address VARCHAR(42) PRIMARY KEY,
+    next_nonce BIGINT NOT NULL,
+    updated_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
+);
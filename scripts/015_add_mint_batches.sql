@@ -0,0 +1,9 @@
+-- Migration 015: Batch minting of certificates
+-- Run after 014_add_mint_jobs.sql
+--
+-- Certificates of a cohort are minted many to a transaction with
+-- mintCertificateBatch; the jobs of a batch share nonce and transaction_hash.
+
+ALTER TABLE mint_jobs ADD COLUMN IF NOT EXISTS batch_index INTEGER; -- Position in the mint call's recipients, 0 for a single mint
+
+CREATE INDEX IF NOT EXISTS idx_mint_jobs_transaction_hash ON mint_jobs(transaction_hash);
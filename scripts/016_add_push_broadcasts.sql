@@ -0,0 +1,62 @@
+-- Migration 016: Push notification fan-out for broadcasts
+-- Run after 015_add_mint_batches.sql
+--
+-- POST /api/notifications/broadcast inserts the in-app notifications and a
+-- push_broadcasts row; a Celery worker (backend/tasks/notification_tasks.py)
+-- sends the pushes in provider-sized batches and records progress here.
+
+-- Used by backend/utils/notifications.py and routers/notifications.py; created
+-- here for databases set up from these scripts alone
+CREATE TABLE IF NOT EXISTS notification_settings (
+    id UUID PRIMARY KEY DEFAULT uuid_generate_v4(),
+    user_id UUID NOT NULL UNIQUE REFERENCES users(id) ON DELETE CASCADE,
+    email_notifications BOOLEAN DEFAULT TRUE,
+    push_notifications BOOLEAN DEFAULT TRUE,
+    course_updates BOOLEAN DEFAULT TRUE,
+    assignment_reminders BOOLEAN DEFAULT TRUE,
+    certificate_notifications BOOLEAN DEFAULT TRUE,
+    marketing_emails BOOLEAN DEFAULT FALSE,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
+    updated_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
+);
+
+CREATE TABLE IF NOT EXISTS user_devices (
+    id UUID PRIMARY KEY DEFAULT uuid_generate_v4(),
+    user_id UUID NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+    device_token TEXT,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
+    updated_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
+);
+
+-- Fan-out walks device tokens in (user_id, device_token) order
+CREATE INDEX IF NOT EXISTS idx_user_devices_user_token
+    ON user_devices(user_id, device_token) WHERE device_token IS NOT NULL;
+CREATE INDEX IF NOT EXISTS idx_notification_settings_push
+    ON notification_settings(user_id) WHERE push_notifications;
+
+CREATE TABLE IF NOT EXISTS push_broadcasts (
+    id UUID PRIMARY KEY DEFAULT uuid_generate_v4(),
+    title VARCHAR(255) NOT NULL,
+    message TEXT NOT NULL,
+    data JSONB,
+    target_role VARCHAR(50), -- Active users with this role, when target_user_ids is NULL
+    target_user_ids UUID[], -- NULL with no role means every active user
+    status VARCHAR(20) NOT NULL DEFAULT 'queued', -- 'queued', 'sending', 'completed' or 'failed'
+    recipients INTEGER NOT NULL DEFAULT 0, -- In-app notifications created
+    devices_total INTEGER, -- Opted-in device tokens, counted when sending starts
+    devices_sent INTEGER NOT NULL DEFAULT 0,
+    delivered INTEGER NOT NULL DEFAULT 0,
+    failed INTEGER NOT NULL DEFAULT 0,
+    invalid_tokens INTEGER NOT NULL DEFAULT 0, -- Unregistered tokens, deleted from user_devices
+    batches INTEGER NOT NULL DEFAULT 0,
+    cursor_user_id UUID, -- Last device sent, so a retried task resumes after it
+    cursor_device_token TEXT,
+    error TEXT,
+    created_by UUID REFERENCES users(id) ON DELETE SET NULL,
+    started_at TIMESTAMP WITH TIME ZONE,
+    completed_at TIMESTAMP WITH TIME ZONE,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
+    updated_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
+);
+
+CREATE INDEX IF NOT EXISTS idx_push_broadcasts_created ON push_broadcasts(created_at DESC);